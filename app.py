@@ -9,9 +9,14 @@ import os
 #  INTERNAL MODULE SETUP
 # -----------------------------
 from backend.app_config import load_config
-from backend.mongo import init_mongo
+from backend.mongo import init_mongo, mongo
 from backend.blockchain import init_blockchain
 from backend.register_blueprints import register_all_blueprints
+from backend.utils.fast_json import FastJSONProvider
+from backend.utils.rpc_governor import init_flask as init_rpc_governor
+from backend.utils.metrics import install_mongo_listener, init_flask as init_metrics
+from backend.utils import tracing
+from backend.utils.status_events import broker as status_broker
 
 # -----------------------------
 #  JWT (Used for Mobile App)
@@ -20,6 +25,10 @@ from flask_jwt_extended import JWTManager
 
 from backend.services.auth_api_client import warmup
 def create_app():
+    # command timings for /metrics + trace spans; must be registered before any MongoClient exists
+    install_mongo_listener()
+    tracing.install_mongo_listener()
+
     app = Flask(
         __name__,
         template_folder="templates",
@@ -28,6 +37,9 @@ def create_app():
 
     load_config(app)
 
+    # jsonify / get_json via orjson (datetime, ObjectId, dataclasses handled natively)
+    app.json = FastJSONProvider(app)
+
     app.secret_key = os.getenv("SECRET_KEY", os.urandom(24))
     app.permanent_session_lifetime = timedelta(days=7)
 
@@ -40,6 +52,8 @@ def create_app():
         print("⚠️ Mongo disabled by DISABLE_MONGO=1")
     else:
         init_mongo(app)
+        # status events reach the FastAPI stream through a capped collection
+        status_broker.use_mongo(lambda: mongo.db)
 
     print("USE_REMOTE_AUTH_API:", USE_REMOTE_AUTH_API, "DISABLE_MONGO:", DISABLE_MONGO)
 
@@ -55,15 +69,25 @@ def create_app():
 
     register_all_blueprints(app)
 
+    # chain RPC admission control: shed load as 503 + Retry-After
+    init_rpc_governor(app)
+
+    # request timing by route template + GET /metrics
+    init_metrics(app)
+
+    # sampled span tree per request (Mongo / web3 / auth API / templates)
+    tracing.init_flask(app)
+
     return app
 
 # -----------------------------
-#  ENTRY POINT
+#  ENTRY POINT (development only)
+#  Production: python serve.py flask   (see serve.py / wsgi.py)
 # -----------------------------
 if __name__ == "__main__":
     app = create_app()
     app.run(
         host="0.0.0.0",
         port=5000,
-        debug=True  # ❗ Disable in production
+        debug=os.getenv("FLASK_DEBUG", "1") == "1"
     )
@@ -0,0 +1,5 @@
+# asgi.py — production ASGI entry point for the FastAPI mobile API (server.py)
+#   TRUSOURCE_APP=fastapi gunicorn -c serve.py
+#   python serve.py fastapi
+
+from server import app  # noqa: F401
@@ -3,7 +3,7 @@ from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 
-from auth_routes import auth_bp, bcrypt  # ✅ correct for Root Directory = auth_api
+from auth_routes import auth_bp  # ✅ correct for Root Directory = auth_api
 
 def create_app():
     app = Flask(__name__)
@@ -12,7 +12,6 @@ def create_app():
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "change-this")
     JWTManager(app)
 
-    bcrypt.init_app(app)
     app.register_blueprint(auth_bp)
 
     # ✅ Debug: print all registered routes once at boot
@@ -3,12 +3,12 @@ import os
 from datetime import datetime, timezone
 
 from flask import Blueprint, request, jsonify
-from flask_bcrypt import Bcrypt
 from flask_jwt_extended import create_access_token, create_refresh_token, JWTManager, get_jwt_identity, jwt_required
 from pymongo import MongoClient
 
+from passwords import PasswordPoolBusy, hash_password, verify_and_upgrade
+
 auth_bp = Blueprint("auth", __name__)
-bcrypt = Bcrypt()
 
 client = MongoClient(os.getenv("MONGO_URI"))
 db = client["crop_traceability_db"]
@@ -40,6 +40,12 @@ def _claims_from_public_user(pu: dict) -> dict:
     }
 
 
+def _busy():
+    resp = jsonify(message="Server busy, retry shortly")
+    resp.headers["Retry-After"] = "2"
+    return resp, 503
+
+
 def _norm(v):
     return (v or "").strip()
 
@@ -76,7 +82,10 @@ def register():
     if users.find_one({"email": email, "role": role}):
         return jsonify(message="User already exists for this role"), 409
 
-    hashed = bcrypt.generate_password_hash(password).decode("utf-8")
+    try:
+        hashed = hash_password(password)
+    except PasswordPoolBusy:
+        return _busy()
     now = datetime.now(timezone.utc)
 
     doc = dict(data)
@@ -118,8 +127,15 @@ def login():
     if not user:
         return jsonify(message="User not found"), 404
 
-    if not bcrypt.check_password_hash(user["password"], password):
+    try:
+        ok, new_hash = verify_and_upgrade(password, user.get("password"))
+    except PasswordPoolBusy:
+        return _busy()
+    if not ok:
         return jsonify(message="Invalid password"), 401
+    if new_hash:
+        # BCRYPT_ROUNDS changed -> store the re-hashed password
+        users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
 
     ident = _public_user(user)
     claims = _claims_from_public_user(ident)
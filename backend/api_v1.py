@@ -1,12 +1,15 @@
 # backend/routes/api_v1.py  (add to your existing file)
 from flask import Blueprint, jsonify, request, current_app
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from blockchain_setup import contract, web3
+from backend.utils.rpc_governor import RpcOverloaded, fan_out
 import hashlib
+import os
 
 bp = Blueprint("api_v1", __name__, url_prefix="/api/v1")
 
+INBOX_BUDGET_SECONDS = float(os.getenv("INBOX_BUDGET_SECONDS", "5"))
+
 # ---------- small helpers ----------
 def _ts_to_str(ts):
     try: return datetime.utcfromtimestamp(int(ts)).strftime('%Y-%m-%d %H:%M:%S')
@@ -87,6 +90,8 @@ def _get_user_crops_cached(user_id):
         return cached
     try:
         ids = contract.functions.getUserCrops(user_id).call() or []
+    except RpcOverloaded:
+        raise
     except Exception:
         ids = []
     # unique, non-empty
@@ -103,6 +108,8 @@ def _get_history_cached(crop_id):
     try:
         tuples = contract.functions.getCropHistory(crop_id).call() or []
         decoded = [_decode_event_tuple(t) for t in tuples]
+    except RpcOverloaded:
+        raise  # don't cache an empty history because the node was busy
     except Exception:
         decoded = []
     _cache_put(mongo, "api_cache", key, decoded, ttl_seconds=300)
@@ -122,25 +129,18 @@ def manufacturer_inbox(user_id):
     received_latest = {}
     processed_latest = {}
 
-    # Fetch histories concurrently (bounded pool)
-    with ThreadPoolExecutor(max_workers=8) as pool:
-        futures = {pool.submit(_get_history_cached, cid): cid for cid in crop_ids}
-        for fut in as_completed(futures):
-            cid = futures[fut]
-            try:
-                history = fut.result() or []
-            except Exception:
-                history = []
-
-            for ev in history:
-                if _event_is_processed(ev, user_id):
-                    cur = processed_latest.get(ev["cropId"])
-                    if (cur is None) or (ev["timestamp"] > cur["timestamp"]):
-                        processed_latest[ev["cropId"]] = ev
-                elif _event_is_received(ev, user_id):
-                    cur = received_latest.get(ev["cropId"])
-                    if (cur is None) or (ev["timestamp"] > cur["timestamp"]):
-                        received_latest[ev["cropId"]] = ev
+    # Fetch histories concurrently (shared, admission-controlled RPC pool)
+    histories, _failed = fan_out(_get_history_cached, crop_ids, INBOX_BUDGET_SECONDS)
+    for cid, history in histories.items():
+        for ev in history or []:
+            if _event_is_processed(ev, user_id):
+                cur = processed_latest.get(ev["cropId"])
+                if (cur is None) or (ev["timestamp"] > cur["timestamp"]):
+                    processed_latest[ev["cropId"]] = ev
+            elif _event_is_received(ev, user_id):
+                cur = received_latest.get(ev["cropId"])
+                if (cur is None) or (ev["timestamp"] > cur["timestamp"]):
+                    received_latest[ev["cropId"]] = ev
 
     # If a crop is already processed, don’t also show it in received
     for cid in list(received_latest.keys()):
@@ -362,6 +362,66 @@ def register_rfids_onchain(
     return tx_hash.hex()
 
 
+def has_contract_function(name: str) -> bool:
+    """True when the deployed trace contract ABI exposes `name`."""
+    try:
+        return any(item.get("type") == "function" and item.get("name") == name for item in contract.abi)
+    except Exception:
+        return False
+
+
+def register_rfid_ranges_onchain(
+    user_id: str,
+    username: str,
+    crop_name: str,
+    crop_type: str,
+    crop_id: str,
+    packaging_date: str,
+    expiry_date: str,
+    bag_capacity: str,
+    total_bags: str,
+    start_epcs: List[str],
+    end_epcs: List[str],
+) -> str:
+    """
+    Calls contract.registerRFIDRanges(...): inclusive [start, end] EPC ranges
+    instead of one string per tag. Only for contracts whose ABI has it
+    (check has_contract_function("registerRFIDRanges")).
+    Returns tx hash.
+    """
+    fn = contract.functions.registerRFIDRanges(
+        user_id,
+        username,
+        crop_name,
+        crop_type,
+        crop_id,
+        packaging_date,
+        expiry_date,
+        bag_capacity,
+        total_bags,
+        start_epcs,
+        end_epcs,
+    )
+
+    gas_est = fn.estimate_gas({"from": account.address})
+    prio, max_fee = suggest_fees()
+
+    tx = fn.build_transaction(
+        {
+            "from": account.address,
+            "nonce": web3.eth.get_transaction_count(account.address, "pending"),
+            "chainId": 80002,
+            "gas": int(gas_est * 1.20),
+            "maxPriorityFeePerGas": prio,
+            "maxFeePerGas": max_fee,
+        }
+    )
+    signed = account.sign_transaction(tx)
+    raw_tx = _raw_tx_bytes(signed)
+    tx_hash = web3.eth.send_raw_transaction(raw_tx)
+    return tx_hash.hex()
+
+
 def get_rfid_epcs_by_crop(crop_id: str):
     try:
         return contract.functions.getRFIDEpcsByCrop(crop_id).call()
@@ -462,6 +522,8 @@ __all__ = [
     "register_harvest_onchain",
     "register_rfid_onchain_single",
     "register_rfids_onchain",
+    "has_contract_function",
+    "register_rfid_ranges_onchain",
     "get_rfid_epcs_by_crop",
     "get_rfid_record",
     "generate_user_id",
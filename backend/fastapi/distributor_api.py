@@ -4,17 +4,14 @@ import os
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Security
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from pymongo import MongoClient
-import jwt
 
 # ------------ Mongo / JWT (must match Flask) ------------
 MONGO_URI      = os.environ.get("MONGO_URI", "mongodb://localhost:27017/crop_traceability_db")
-JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "change-me-super-secret")
 
-mongo = MongoClient(MONGO_URI)
+mongo = MongoClient(MONGO_URI, connect=False)  # connect lazily (per worker after fork)
 db    = mongo.get_database()
 ManReq = db["manufacturer_request"]
 TransReq = db["transporter_requests"]
@@ -22,46 +19,11 @@ QrCodes = db["qr_codes"]
 
 router = APIRouter(prefix="/api/v1/distributor", tags=["distributor"])
 
-# --- one HTTPBearer scheme for this router (docs will show a lock) ---
-bearer = HTTPBearer(scheme_name="AccessToken", bearerFormat="JWT", auto_error=False)
-
-# ------------ JWT helpers ------------
-def _jwt_decode(token: str) -> Dict[str, Any]:
-    try:
-        # allow legacy tokens with dict sub
-        return jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"], options={"verify_sub": False})
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-def auth_identity(credentials: HTTPAuthorizationCredentials = Security(bearer)) -> Dict[str, Any]:
-    if not credentials or (credentials.scheme or "").lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-
-    payload = _jwt_decode(credentials.credentials.strip())
-    if payload.get("type") != "access":
-        raise HTTPException(status_code=401, detail="Not an access token")
-
-    # prefer new tokens: identity in 'user'; fallback to legacy 'sub'
-    identity = payload.get("user")
-    if not identity and isinstance(payload.get("sub"), dict):
-        identity = payload["sub"]
-    if not identity and isinstance(payload.get("sub"), str):
-        identity = {"userId": payload["sub"]}
-
-    if not identity:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-    return identity
+from backend.utils.jwt_auth import auth_identity, check_role  # shared JWT auth (verified-token cache)
 
 def _require_distributor(identity: Dict[str, Any]) -> str:
-    role = (identity.get("role") or "").lower()
-    if role != "distributor":
-        raise HTTPException(status_code=403, detail="Only distributors can access this endpoint")
-    uid = identity.get("userId")
-    if not uid:
-        raise HTTPException(status_code=401, detail="Missing userId in token")
-    return uid
+    """Ensure role is distributor; return userId."""
+    return check_role(identity, "distributor")
 
 # ------------ Utils (mirror your Flask helpers) ------------
 def _parse_dt(val):
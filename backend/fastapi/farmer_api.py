@@ -9,24 +9,15 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 from pymongo import MongoClient
-import jwt
-
-# top of farmer_api.py (add imports)
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-
-
-security = HTTPBearer(auto_error=False)
-
 
 # ======= Config (match your FastAPI app) =======
 MONGO_URI      = os.environ.get("MONGO_URI", "mongodb://localhost:27017/crop_traceability_db")
-JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "change-me-super-secret")
 
-mongo      = MongoClient(MONGO_URI)
+mongo      = MongoClient(MONGO_URI, connect=False)  # connect lazily (per worker after fork)
 db         = mongo.get_database()
 Users      = db["users"]
 FarmerReq  = db["farmer_request"]
@@ -35,61 +26,24 @@ Lots       = db["composite_lots"]
 
 router = APIRouter(prefix="/api/v1/farmer", tags=["farmer"])
 
-# ========= Auth helper (must match fastapi_mobile_api.py) =========
-# --- add imports ---
-from fastapi import APIRouter, Depends, HTTPException, Query, Security
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import jwt
-
-# --- one HTTPBearer scheme for this router (docs will show a lock) ---
-bearer = HTTPBearer(scheme_name="AccessToken", bearerFormat="JWT", auto_error=False)
-
-def _jwt_decode(token: str) -> Dict[str, Any]:
-    try:
-        # allow legacy tokens with dict sub
-        return jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"], options={"verify_sub": False})
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-# <<< REPLACE your old auth_identity(...) with this >>>
-def auth_identity(credentials: HTTPAuthorizationCredentials = Security(bearer)) -> Dict[str, Any]:
-    if not credentials or (credentials.scheme or "").lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-
-    payload = _jwt_decode(credentials.credentials.strip())
-    if payload.get("type") != "access":
-        raise HTTPException(status_code=401, detail="Not an access token")
-
-    # prefer new tokens: identity in 'user'; fallback to legacy 'sub'
-    identity = payload.get("user")
-    if not identity and isinstance(payload.get("sub"), dict):
-        identity = payload["sub"]
-    if not identity and isinstance(payload.get("sub"), str):
-        identity = {"userId": payload["sub"]}
-
-    if not identity:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-    return identity
+# Idempotency-Key support for chain/Mongo writes (mobile retries)
+from backend.utils.idempotency import idempotent_fastapi
+from backend.utils.fast_json import dumps_bytes, json_response
+from backend.utils.status_events import jobs, tx_watcher, watch_tx
+from backend.services.rfid.tag_writer_bridge import TagWriteError, tag_writers
+from backend.services.rfid.tag_payload import bag_tags, dumps_tag, get_signer, harvest_tag
+from backend.services.rfid import tag_codec
+from backend.services.rfid.scan_session import expected_bags_from_doc
 
+def _idem_col():
+    return db["idempotency_keys"]
 
+# ========= Auth (shared JWT helpers, verified-token cache) =========
+from backend.utils.jwt_auth import auth_identity, check_role
 
 def _require_farmer(identity: Dict[str, Any]) -> str:
     """Ensure role is farmer; return userId."""
-    if not identity:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    uid = identity.get("userId")
-    role = (identity.get("role") or "").lower()
-    if role != "farmer":
-        raise HTTPException(status_code=403, detail="Only farmers can access this endpoint")
-    if not uid:
-        raise HTTPException(status_code=401, detail="Missing userId in token")
-    return uid
-
-bearer_scheme = HTTPBearer(auto_error=False)
-
-
+    return check_role(identity, "farmer")
 
 
 # ========= Pydantic models =========
@@ -281,13 +235,14 @@ def farmer_overview(
     reg  = _registered_crops_for_farmer(user_id, limit)
     reqs = _farmer_requests(user_id, limit)
     poly = _polygons_and_totals(user_id)
-    return {
+    # large payload (polygons) -> orjson directly, skip jsonable_encoder
+    return json_response({
         "ok": True,
         "userId": user_id,
         "registered_crops": reg,
         "farmer_requests": reqs,
         **poly
-    }
+    })
 
 @router.get("/crops")
 def farmer_crops(
@@ -308,10 +263,11 @@ def farmer_requests_list(
 @router.get("/polygons")
 def farmer_polygons(identity: Dict[str, Any] = Depends(auth_identity)):
     user_id = _require_farmer(identity)
-    return {"ok": True, **_polygons_and_totals(user_id)}
+    return json_response({"ok": True, **_polygons_and_totals(user_id)})
 
 # ---------- Composite Lot (Create / List) ----------
 @router.post("/lots/composite")
+@idempotent_fastapi(_idem_col, "farmer.lots.composite")
 def composite_lot_create(
     payload: CompositeCreateRequest,
     identity: Dict[str, Any] = Depends(auth_identity)
@@ -426,10 +382,8 @@ def composite_lot_list(
     cur = (Lots.find({"farmerId": user_id})
                .sort([("created_at", -1), ("_id", -1)])
                .limit(limit))
-    for d in cur:
-        d["_id"] = str(d.get("_id"))
-        items.append(d)
-    return {"ok": True, "items": items}
+    items.extend(cur)
+    return json_response({"ok": True, "items": items})
 
 # ---------- Recall notifications (farmer) ----------
 @router.get("/recall/notifications")
@@ -549,7 +503,12 @@ def farmer_save_coordinates(payload: SaveCoordinatesRequest, identity: Dict[str,
 
 # POST: register crop on-chain (optional; requires blockchain_setup.py)
 @router.post("/crops/register")
-def farmer_register_crop(payload: RegisterCropRequest, identity: Dict[str, Any] = Depends(auth_identity)):
+@idempotent_fastapi(_idem_col, "farmer.crops.register")
+def farmer_register_crop(
+    payload: RegisterCropRequest,
+    identity: Dict[str, Any] = Depends(auth_identity),
+    wait: bool = Query(True, description="false: return once submitted; status arrives on /api/v1/status/stream"),
+):
     user_id = _require_farmer(identity)
 
     if not _CHAIN_READY:
@@ -593,9 +552,20 @@ def farmer_register_crop(payload: RegisterCropRequest, identity: Dict[str, Any]
             raise HTTPException(status_code=500, detail="unable_to_read_signed_raw_tx")
 
         tx_hash = web3.eth.send_raw_transaction(raw)
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
-
-        if not receipt or receipt.status != 1:
+        tx_hex = watch_tx(tx_hash, user_id, "crop_register", {"cropId": payload.cropId})
+
+        if not wait:
+            return {"ok": True, "txHash": tx_hash.hex(), "cropId": payload.cropId, "txStatus": "submitted"}
+
+        # the shared watcher polls the receipt; no per-request wait loop
+        result = tx_watcher.wait(tx_hex, timeout=180)
+        if result is None:
+            # broadcast but no receipt yet: not an error, the tx may still land
+            return JSONResponse(status_code=202, content={
+                "ok": True, "txHash": tx_hex, "cropId": payload.cropId, "txStatus": "pending",
+                "statusUrl": f"/api/v1/status/tx/{tx_hex}",
+            })
+        if result.get("status") != "mined":
             raise HTTPException(status_code=500, detail="onchain_register_failed")
 
         # Optional read-back (safe-guarded)
@@ -619,14 +589,15 @@ def farmer_register_crop(payload: RegisterCropRequest, identity: Dict[str, Any]
 
 # ---------- Record Harvest (FastAPI port of backend/routes/record_harvest.py) ----------
 
-import re, json, time, base64, hashlib, hmac
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import requests
+import re, json, time
+
+# chain fan-out goes through the shared, admission-controlled RPC pool
+from backend.utils.rpc_governor import RpcOverloaded, fan_out
 
-# Optional: qr generator (if present)
+# Optional: QR rendering (content-addressed, in memory; needs qrcode installed)
 try:
-    from qr_generator import generate_qr_code  # type: ignore
-    _QR_READY = True
+    from backend.services.qr.qr_service import qr_images, remember as remember_qr, qrcode as _qrcode
+    _QR_READY = _qrcode is not None
 except Exception:
     _QR_READY = False
 
@@ -635,8 +606,20 @@ except Exception:
 
 # Collections used here
 CropCache   = db["crop_cache"]
-RfidPlans   = db["rfid_write_plans"]
-RfidEvents  = db["rfid_write_events"]
+RfidPlans   = db["rfid_write_plans"]    # legacy (pre time-series); read-only now
+RfidEvents  = db["rfid_write_events"]   # legacy (pre time-series); read-only now
+
+# Tag plans / write attempts go to the buffered time-series event store
+from backend.services.rfid.rfid_event_store import get_event_store
+
+def _rfid_events():
+    return get_event_store(db)
+
+# Bags live in bucketed harvest_bags docs (unique EPC index), not in farmer_request.rfidEpcs
+from backend.services.farmer.harvest_bag_service import get_bag_store, BagConflict
+
+def _bags():
+    return get_bag_store(db)
 
 # ----------------- EPC helpers -----------------
 EPC_EXPECTED_HEX_LEN = int(os.environ.get("RFID_EPC_HEX_LEN", "24"))
@@ -667,7 +650,6 @@ def _now_ts() -> int:
     return int(time.time())
 
 _MAX_FETCH_SECONDS   = float(os.environ.get("CROP_LIST_BUDGET_SECONDS", "3.0"))
-_MAX_WORKERS         = int(os.environ.get("CROP_LIST_MAX_WORKERS", "16"))
 _CACHE_TTL_SECONDS   = int(os.environ.get("CROP_LIST_CACHE_TTL_SECONDS", "300"))  # 5 min
 
 def _cache_get_harvest_flag(crop_id: str):
@@ -706,6 +688,8 @@ def _get_user_unharvested_crops_fast(user_id: str) -> list:
     # Step 1: all cropIds (dedup)
     try:
         all_crops_list = contract.functions.getUserCrops(user_id).call()
+    except RpcOverloaded:
+        raise
     except Exception:
         return []
 
@@ -730,36 +714,18 @@ def _get_user_unharvested_crops_fast(user_id: str) -> list:
     if not to_fetch:
         return unharvested
 
-    # Step 3: fetch details in parallel within budget
-    started = time.time()
+    # Step 3: fetch details in parallel within budget (shared RPC pool; 503 if shed)
     budget = max(0.4, _MAX_FETCH_SECONDS)
-    def remaining(): return max(0.0, budget - (time.time() - started))
 
     def _fetch_one(cid: str):
-        try:
-            # getCrop returns (..., datePlanted, harvestDate, areaSize); harvestDate index 7
-            details = contract.functions.getCrop(cid).call()
-            hdt = details[7] if isinstance(details, (list, tuple)) and len(details) > 7 else ""
-            _cache_put_harvest(cid, hdt or "")
-            return (cid, hdt)
-        except Exception:
-            return (cid, None)
+        # getCrop returns (..., datePlanted, harvestDate, areaSize); harvestDate index 7
+        details = contract.functions.getCrop(cid).call()
+        hdt = details[7] if isinstance(details, (list, tuple)) and len(details) > 7 else ""
+        _cache_put_harvest(cid, hdt or "")
+        return hdt
 
-    workers = min(len(to_fetch), max(1, _MAX_WORKERS))
-    results = []
-
-    BATCH = 64
-    for i in range(0, len(to_fetch), BATCH):
-        if remaining() <= 0:
-            break
-        batch = to_fetch[i:i+BATCH]
-        with ThreadPoolExecutor(max_workers=min(workers, len(batch))) as ex:
-            futs = {ex.submit(_fetch_one, cid): cid for cid in batch}
-            try:
-                for fut in as_completed(futs, timeout=remaining()):
-                    results.append(fut.result())
-            except Exception:
-                pass
+    fetched, _failed = fan_out(_fetch_one, to_fetch, budget)
+    results = list(fetched.items())
 
     for (cid, hdt) in results:
         if hdt == "":              # empty → not harvested yet
@@ -825,13 +791,7 @@ def harvest_save(payload: HarvestSaveRequest, identity: Dict[str, Any] = Depends
     # Clean legacy EPC; do not let it collide with other docs
     rfid_epc = _epc_normalize_wedge(payload.rfidEpc or "")
     if rfid_epc:
-        other = FarmerReq.find_one({
-            "$and": [
-                {"$or": [{"rfidEpcs.epc": rfid_epc}, {"rfidEpc": rfid_epc}]},
-                {"$or": [{"cropId": {"$ne": crop_id}}, {"farmerId": {"$ne": user_id}}]}
-            ]
-        }, {"_id": 1})
-        if other:
+        if _bags().epc_in_use_elsewhere(rfid_epc, user_id, crop_id):
             rfid_epc = ""
 
     doc = {
@@ -860,7 +820,12 @@ def harvest_save(payload: HarvestSaveRequest, identity: Dict[str, Any] = Depends
     return {"ok": True, "cropId": crop_id}
 
 @router.post("/harvest/record")
-def harvest_record(payload: HarvestRecordRequest, identity: Dict[str, Any] = Depends(auth_identity)):
+@idempotent_fastapi(_idem_col, "farmer.harvest.record")
+def harvest_record(
+    payload: HarvestRecordRequest,
+    identity: Dict[str, Any] = Depends(auth_identity),
+    wait: bool = Query(True, description="false: return once submitted; status arrives on /api/v1/status/stream"),
+):
     """
     Chain TX registerHarvest + Mongo upsert + optional QR.
     """
@@ -878,13 +843,7 @@ def harvest_record(payload: HarvestRecordRequest, identity: Dict[str, Any] = Dep
     # Legacy EPC collision avoidance
     rfid_epc_single = _epc_normalize_wedge(payload.rfidEpc or "")
     if rfid_epc_single:
-        other = FarmerReq.find_one({
-            "$and": [
-                {"$or": [{"rfidEpcs.epc": rfid_epc_single}, {"rfidEpc": rfid_epc_single}]},
-                {"$or": [{"cropId": {"$ne": crop_id}}, {"farmerId": {"$ne": user_id}}]}
-            ]
-        }, {"_id": 1})
-        if other:
+        if _bags().epc_in_use_elsewhere(rfid_epc_single, user_id, crop_id):
             rfid_epc_single = ""
 
     try:
@@ -907,7 +866,12 @@ def harvest_record(payload: HarvestRecordRequest, identity: Dict[str, Any] = Dep
         if not raw_tx:
             raise HTTPException(status_code=500, detail="unable_to_read_signed_raw_tx")
         tx_hash = web3.eth.send_raw_transaction(raw_tx)
-        web3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
+        tx_hex = watch_tx(tx_hash, user_id, "harvest", {"cropId": crop_id})
+        tx_status = "submitted"
+        if wait:
+            result = tx_watcher.wait(tx_hex, timeout=180)
+            # no receipt yet -> still recorded below, answered 202 with the tx status
+            tx_status = result.get("status") if result is not None else "pending"
 
         # Upsert request doc
         request_data = {
@@ -946,9 +910,9 @@ def harvest_record(payload: HarvestRecordRequest, identity: Dict[str, Any] = Dep
                     "rfidEpc": rfid_epc_single,
                     "txHash": tx_hash.hex()
                 }
-                qr_path = f"static/qrcodes/{crop_id}_harvest.png"
-                generate_qr_code(qr_payload, qr_path)
-                qr_png = "/" + qr_path
+                qr_img = qr_images.render(qr_payload)
+                remember_qr(db, qr_img, {"cropId": crop_id, "farmerId": user_id, "kind": "harvest"})
+                qr_png = qr_img.url
             except Exception:
                 qr_png = None
 
@@ -958,12 +922,17 @@ def harvest_record(payload: HarvestRecordRequest, identity: Dict[str, Any] = Dep
         except Exception:
             pass
 
-        return {
+        out = {
             "ok": True,
             "txHash": tx_hash.hex(),
+            "txStatus": tx_status,
             "cropId": crop_id,
             "qr": qr_png
         }
+        if tx_status == "pending":
+            out["statusUrl"] = f"/api/v1/status/tx/{tx_hex}"
+            return JSONResponse(status_code=202, content=out)
+        return out
 
     except HTTPException:
         raise
@@ -994,12 +963,8 @@ def harvest_record(payload: HarvestRecordRequest, identity: Dict[str, Any] = Dep
 @router.get("/harvest/bags")
 def harvest_bags_list(cropId: str = Query(..., min_length=5), identity: Dict[str, Any] = Depends(auth_identity)):
     user_id = _require_farmer(identity)
-    FarmerReq.create_index([("farmerId", 1), ("cropId", 1)])
-    FarmerReq.create_index([("rfidEpcs.epc", 1)])
-    FarmerReq.create_index([("rfidEpc", 1)])
-
-    doc = FarmerReq.find_one({"farmerId": user_id, "cropId": cropId}) or {}
-    items = [{"epc": d.get("epc"), "bagQty": d.get("bagQty", 0)} for d in (doc.get("rfidEpcs") or [])]
+    bags = _bags().list_bags(user_id, cropId)
+    items = [{"epc": d.get("epc"), "bagQty": d.get("bagQty", 0)} for d in bags]
     return {"ok": True, "items": items, "count": len(items)}
 
 @router.post("/harvest/bag-add")
@@ -1018,45 +983,12 @@ def harvest_bag_add(payload: BagAddRequest, identity: Dict[str, Any] = Depends(a
 
     bag_qty = _int_or(payload.bagQty or 0, 0)
 
-    FarmerReq.update_one(
-        {"farmerId": user_id, "cropId": crop_id},
-        {"$setOnInsert": {"created_at": datetime.utcnow(), "rfidEpcs": []}},
-        upsert=True
-    )
-
-    # reject duplicate anywhere else
-    other = FarmerReq.find_one({
-        "$and": [
-            {"$or": [{"rfidEpcs.epc": epc}, {"rfidEpc": epc}]},
-            {"$or": [{"cropId": {"$ne": crop_id}}, {"farmerId": {"$ne": user_id}}]}
-        ]
-    }, {"_id": 1})
-    if other:
-        raise HTTPException(status_code=409, detail="epc_already_used_in_another_request")
-
-    # reject duplicate in this doc
-    doc = FarmerReq.find_one({"farmerId": user_id, "cropId": crop_id}, {"rfidEpcs": 1}) or {}
-    if any((it or {}).get("epc") == epc for it in (doc.get("rfidEpcs") or [])):
-        raise HTTPException(status_code=409, detail="epc_already_scanned")
-
-    # push
-    FarmerReq.update_one(
-        {"farmerId": user_id, "cropId": crop_id},
-        {"$push": {"rfidEpcs": {"epc": epc, "bagQty": bag_qty, "added_at": datetime.utcnow()}},
-         "$set": {"updated_at": datetime.utcnow()}}
-    )
-
-    # set legacy first-epc if empty
-    doc2 = FarmerReq.find_one({"farmerId": user_id, "cropId": crop_id}, {"rfidEpc": 1, "rfidEpcs": 1}) or {}
-    if not (doc2.get("rfidEpc") or ""):
-        first_epc = (doc2.get("rfidEpcs") or [{}])[0].get("epc", "")
-        if first_epc:
-            FarmerReq.update_one({"farmerId": user_id, "cropId": crop_id}, {"$set": {"rfidEpc": first_epc}})
-
-    # recompute scanned count
-    doc3 = FarmerReq.find_one({"farmerId": user_id, "cropId": crop_id}, {"rfidEpcs": 1}) or {}
-    scanned = len(doc3.get("rfidEpcs") or [])
-    FarmerReq.update_one({"farmerId": user_id, "cropId": crop_id}, {"$set": {"bagQty": scanned}})
+    # unique EPC index rejects duplicates (this harvest or another) atomically;
+    # add_bag skips buckets already holding the EPC so in-bucket repeats hit it too
+    try:
+        scanned = _bags().add_bag(user_id, crop_id, epc, bag_qty)
+    except BagConflict as e:
+        raise HTTPException(status_code=409, detail=e.code)
 
     return {"ok": True, "epc": epc, "scanned": scanned}
 
@@ -1071,43 +1003,14 @@ def harvest_bag_delete(cropId: str = Query(...), epc: str = Query(...), identity
     if not cleaned:
         raise HTTPException(status_code=400, detail="bad_epc")
 
-    FarmerReq.update_one(
-        {"farmerId": user_id, "cropId": cropId},
-        {"$pull": {"rfidEpcs": {"epc": cleaned}}, "$set": {"updated_at": datetime.utcnow()}}
-    )
-
-    doc = FarmerReq.find_one({"farmerId": user_id, "cropId": cropId}) or {}
-    scanned = len(doc.get("rfidEpcs") or [])
-    FarmerReq.update_one({"farmerId": user_id, "cropId": cropId}, {"$set": {"bagQty": scanned}})
+    removed, scanned = _bags().remove_bag(user_id, cropId, cleaned)
 
-    return {"ok": True, "removed": True, "scanned": scanned}
+    return {"ok": True, "removed": removed, "scanned": scanned}
 
 # --- Compact tag payload + optional ESP32 write bridge ---
 
 def _compact_harvest_doc_to_tag(doc: dict, secret: Optional[str] = None) -> str:
-    hqt = doc.get("harvestQuantity", "")
-    try:
-        if hqt not in ("", None):
-            hqt = int(round(float(hqt)))
-    except Exception:
-        hqt = ""
-
-    payload = {
-        "cid": doc.get("cropId", ""),
-        "ctp": doc.get("cropType", ""),
-        "hdt": doc.get("harvestDate", ""),
-        "hnm": doc.get("harvesterName", ""),
-        "fid": doc.get("farmerId", ""),
-        "mid": doc.get("manufacturerId", ""),
-        "hqt": hqt
-    }
-
-    if secret:
-        msg = f"{payload['cid']}|{payload['hdt']}|{payload['fid']}|{payload['mid']}|{payload['hqt']}|{payload['ctp']}"
-        sig = hmac.new(secret.encode(), msg.encode(), hashlib.sha256).digest()
-        payload["sig"] = base64.urlsafe_b64encode(sig[:12]).decode()
-
-    return json.dumps(payload, separators=(",", ":"))
+    return dumps_tag(harvest_tag(doc, get_signer(secret)))
 
 def _latest_harvest_doc(user_id: str, crop_id: str) -> Optional[dict]:
     return FarmerReq.find_one({"farmerId": user_id, "cropId": crop_id}, sort=[("_id", -1)])
@@ -1122,91 +1025,167 @@ def rfid_payload_from_harvest(cropId: str = Query(..., min_length=5), identity:
     secret = os.environ.get("RFID_TAG_SECRET")
     tag_str = _compact_harvest_doc_to_tag(doc, secret)
     try:
-        RfidPlans.insert_one({
-            "farmerId": user_id,
-            "cropId": cropId,
-            "payload": json.loads(tag_str),
-            "created_at": time.time()
-        })
+        store = _rfid_events()
+        if store is not None:
+            store.record_plan(cropId, json.loads(tag_str), user_id=user_id)
     except Exception:
         pass
 
     return {"ok": True, "payload": tag_str}
 
-@router.post("/rfid/write_from_harvest")
-def rfid_write_from_harvest(
-    cropId: str = Query(..., min_length=5),
-    esp32: Optional[str] = Query(None, description="http://<ip-or-host>"),
-    identity: Dict[str, Any] = Depends(auth_identity)
-):
+class TagBatchRequest(BaseModel):
+    cropId: Optional[str] = None
+    cropIds: List[str] = Field(default_factory=list)
+    # label count per harvest when no bags were scanned yet (default: the harvest's bag count)
+    count: Optional[int] = Field(None, ge=1, le=5000)
+    # also emit the binary tag form (tag_codec v1) as hex, fitted to the user-memory budget
+    binary: bool = False
+
+PLAN_FLUSH_EVERY = 500
+
+@router.post("/rfid/payloads_from_harvest")
+def rfid_payloads_from_harvest(payload: TagBatchRequest, identity: Dict[str, Any] = Depends(auth_identity)):
     """
-    Bridge to an ESP32 tag-writer endpoint. Best-effort; returns JSON.
+    Signed per-bag payloads for one or many harvests, streamed as NDJSON:
+      {"cropId","epc"|"bix","payload"[,"bin","binBytes"]}   one line per bag
+      {"cropId","err":"no_harvest"}      for unknown cropIds
+      {"done":true,"count":N}            last line
+    Plans are recorded in batches, not per bag.
     """
     user_id = _require_farmer(identity)
-    doc = _latest_harvest_doc(user_id, cropId)
-    if not doc:
-        raise HTTPException(status_code=404, detail=f"no_harvest_for_{cropId}")
-
-    secret = os.environ.get("RFID_TAG_SECRET")
-    tag_str = _compact_harvest_doc_to_tag(doc, secret)
-
+    crop_ids = [c.strip() for c in ([payload.cropId] if payload.cropId else []) + payload.cropIds if c and c.strip()]
+    crop_ids = list(dict.fromkeys(crop_ids))
+    if not crop_ids:
+        raise HTTPException(status_code=400, detail="cropId_required")
+    if len(crop_ids) > 200:
+        raise HTTPException(status_code=400, detail="too_many_cropIds")
+
+    # latest harvest per cropId in one query
+    docs: Dict[str, dict] = {}
+    for d in FarmerReq.find({"farmerId": user_id, "cropId": {"$in": crop_ids}}).sort([("_id", -1)]):
+        docs.setdefault(d.get("cropId"), d)
+
+    signer = get_signer()
+    store = _rfid_events()
+    bag_store = _bags()
+    # static codebook only: the tag decodes on any reader without a lookup
+    book = tag_codec.default_book if payload.binary else None
+
+    def _lines():
+        plans: List[Dict[str, Any]] = []
+        total = 0
+
+        def _flush():
+            if plans and store is not None:
+                try:
+                    store.record_plans(plans, user_id=user_id)
+                except Exception:
+                    pass
+            plans.clear()
+
+        for crop_id in crop_ids:
+            doc = docs.get(crop_id)
+            if doc is None:
+                yield dumps_bytes({"cropId": crop_id, "err": "no_harvest"}) + b"\n"
+                continue
+            bags = bag_store.list_bags(user_id, crop_id)
+            count = payload.count or expected_bags_from_doc(doc)
+            for tag in bag_tags(doc, bags, count, signer):
+                tag_str = dumps_tag(tag)
+                line = {"cropId": crop_id, **({"epc": tag["epc"]} if "epc" in tag else {"bix": tag["bix"]}),
+                        "payload": tag_str}
+                if book is not None:
+                    try:
+                        blob = tag_codec.encode(tag, book, budget=tag_codec.TAG_USER_MEMORY_BYTES, fit=True)
+                        line.update(bin=blob.hex().upper(), binBytes=len(blob))
+                    except tag_codec.TagBudgetError as e:
+                        line.update(binErr="over_budget", binBytes=e.size)
+                    except tag_codec.TagCodecError as e:
+                        # one bad bag must not cut the stream short
+                        line.update(binErr="encode_failed", binDetail=str(e)[:200])
+                yield dumps_bytes(line) + b"\n"
+                plans.append({"cropId": crop_id, "epc": tag.get("epc") or "", "payload": tag})
+                total += 1
+                if len(plans) >= PLAN_FLUSH_EVERY:
+                    _flush()
+        _flush()
+        yield dumps_bytes({"done": True, "count": total}) + b"\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+def _esp32_base(esp32: Optional[str]) -> str:
     base = (esp32 or os.environ.get("ESP32_BASE", "")).strip().rstrip("/")
     if not base:
         raise HTTPException(status_code=500, detail="ESP32_BASE_not_configured")
+    return base
+
+def _harvest_tag_payload(user_id: str, crop_id: str) -> str:
+    doc = _latest_harvest_doc(user_id, crop_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail=f"no_harvest_for_{crop_id}")
+    return _compact_harvest_doc_to_tag(doc, os.environ.get("RFID_TAG_SECRET"))
 
-    # optional ping
+def _record_tag_write(crop_id: str, tag_str: str, endpoint: str, device: str, user_id: str) -> None:
     try:
-        requests.get(f"{base}/rfid/ping", timeout=3)
+        store = _rfid_events()
+        if store is not None:
+            store.record_write(crop_id, json.loads(tag_str), endpoint=endpoint, device=device, user_id=user_id)
     except Exception:
         pass
 
-    CONNECT_T = 2
-    READ_T    = 25
-    endpoints = ["/rfid/write", "/write", "/rfid/program", "/api/rfid/write"]
-
-    def _try_once(url):
-        try:
-            return requests.post(url, json={"payload": tag_str}, timeout=(CONNECT_T, READ_T))
-        except Exception as e:
-            return e
-
-    last = None
-    for ep in endpoints:
-        url = f"{base}{ep}"
-        res = _try_once(url)
-        if isinstance(res, Exception):
-            last = res
-            continue
+@router.post("/rfid/write_from_harvest")
+def rfid_write_from_harvest(
+    cropId: str = Query(..., min_length=5),
+    esp32: Optional[str] = Query(None, description="http://<ip-or-host>"),
+    tagWait: float = Query(0, ge=0, le=120, description="seconds to wait for a tag on the antenna"),
+    identity: Dict[str, Any] = Depends(auth_identity)
+):
+    """
+    Bridge to an ESP32 tag-writer endpoint (pooled connection, cached endpoint,
+    queued behind other writes to the same device). Best-effort; returns JSON.
+    """
+    user_id = _require_farmer(identity)
+    tag_str = _harvest_tag_payload(user_id, cropId)
+    base = _esp32_base(esp32)
 
-        try:
-            ctype = (res.headers.get("content-type") or "")
-            body = res.json() if "application/json" in ctype else {}
-        except Exception:
-            body = {}
+    try:
+        res = tag_writers.write(base, tag_str, tag_wait=tagWait)
+    except TagWriteError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail or e.code)
 
-        if res.status_code == 200 and body.get("ok") is True:
-            try:
-                RfidEvents.insert_one({
-                    "farmerId": user_id,
-                    "cropId": cropId,
-                    "payload": json.loads(tag_str),
-                    "endpoint": ep,
-                    "at": time.time()
-                })
-            except Exception:
-                pass
-            return {"ok": True, "endpoint": ep}
+    _record_tag_write(cropId, tag_str, res["endpoint"], base, user_id)
+    return {"ok": True, "endpoint": res["endpoint"], "ms": res["ms"]}
 
-        if res.status_code == 409:
-            raise HTTPException(status_code=409, detail="no_tag_present")
+@router.post("/rfid/write_batch_from_harvest")
+def rfid_write_batch_from_harvest(
+    cropId: str = Query(..., min_length=5),
+    count: int = Query(..., ge=1, le=1000, description="number of bags / tags to write"),
+    esp32: Optional[str] = Query(None, description="http://<ip-or-host>"),
+    tagWait: float = Query(15, ge=0, le=120, description="seconds to wait for each next tag"),
+    identity: Dict[str, Any] = Depends(auth_identity)
+):
+    """
+    Queues `count` writes of the harvest payload on one device; they run back to
+    back while the operator swaps tags. 202 + jobId (progress on /api/v1/status/stream).
+    The batch waits on the device's own worker thread, not on the shared job pool;
+    POST /api/v1/status/jobs/{jobId}/cancel stops it at the next tag.
+    """
+    user_id = _require_farmer(identity)
+    tag_str = _harvest_tag_payload(user_id, cropId)
+    base = _esp32_base(esp32)
 
-        if res.status_code == 404:
-            last = res
-            continue
+    def _written(_i: int, res: Dict[str, Any]) -> None:
+        _record_tag_write(cropId, tag_str, res.get("endpoint") or "", base, user_id)
 
-        err_body = body if body else {"text": res.text[:200]}
-        raise HTTPException(status_code=502, detail={"err": "esp32_write_status", "code": res.status_code, "resp": err_body})
+    job = jobs.create(user_id, "rfid_tag_write", total=count, meta={"cropId": cropId, "device": base})
+    tag_writers.start_batch(base, [tag_str] * count, tag_wait=tagWait, job=job, on_write=_written)
+    return json_response(
+        {"ok": True, "message": "queued", "jobId": job.id, "statusUrl": f"/api/v1/status/jobs/{job.id}"},
+        status_code=202,
+    )
 
-    if isinstance(last, Exception):
-        raise HTTPException(status_code=502, detail=f"esp32_write_fail:{last}")
-    raise HTTPException(status_code=502, detail="esp32_no_known_write_endpoint")
+@router.get("/rfid/writers")
+def rfid_writer_health(identity: Dict[str, Any] = Depends(auth_identity)):
+    """Per-device state of the ESP32 tag writers this worker talks to."""
+    _require_farmer(identity)
+    return {"ok": True, "devices": tag_writers.health()}
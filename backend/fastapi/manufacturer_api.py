@@ -9,17 +9,14 @@ import os, json, math
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Header, Query, Security
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
 from pydantic import BaseModel, Field
 from pymongo import MongoClient
-import jwt
 
 # ---------- Mongo & JWT config (MUST match Flask app.py) ----------
 MONGO_URI      = os.environ.get("MONGO_URI", "mongodb://localhost:27017/crop_traceability_db")
-JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "change-me-super-secret")
 
-mongo      = MongoClient(MONGO_URI)
+mongo      = MongoClient(MONGO_URI, connect=False)  # connect lazily (per worker after fork)
 db         = mongo.get_database()
 Users      = db["users"]
 FarmerReq  = db["farmer_request"]
@@ -29,47 +26,12 @@ RatesCol   = db["processing_rates"]
 
 router = APIRouter(prefix="/api/v1/manufacturer", tags=["manufacturer"])
 
-# --- one HTTPBearer scheme for this router (docs will show a lock) ---
-bearer = HTTPBearer(scheme_name="AccessToken", bearerFormat="JWT", auto_error=False)
-
-
-# ---------- Auth helpers (validate Flask-issued JWT access tokens) ----------
-def _jwt_decode(token: str) -> Dict[str, Any]:
-    try:
-        # Your Flask tokens default to HS256
-        return jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-def auth_identity(credentials: HTTPAuthorizationCredentials = Security(bearer)) -> Dict[str, Any]:
-    if not credentials or (credentials.scheme or "").lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-
-    payload = _jwt_decode(credentials.credentials.strip())
-    if payload.get("type") != "access":
-        raise HTTPException(status_code=401, detail="Not an access token")
-
-    # prefer new tokens: identity in 'user'; fallback to legacy 'sub'
-    identity = payload.get("user")
-    if not identity and isinstance(payload.get("sub"), dict):
-        identity = payload["sub"]
-    if not identity and isinstance(payload.get("sub"), str):
-        identity = {"userId": payload["sub"]}
-
-    if not identity:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-    return identity
+from backend.utils.jwt_auth import auth_identity, check_role  # shared JWT auth (verified-token cache)
+from backend.utils.rpc_governor import RpcOverloaded
 
 def _require_manufacturer(identity: Dict[str, Any]) -> str:
-    role = (identity.get("role") or "").lower()
-    if role != "manufacturer":
-        raise HTTPException(status_code=403, detail="Only manufacturers can access this endpoint")
-    uid = identity.get("userId")
-    if not uid:
-        raise HTTPException(status_code=401, detail="Missing userId in token")
-    return uid
+    """Ensure role is manufacturer; return userId."""
+    return check_role(identity, "manufacturer")
 
 # ---------- Utilities copied from Flask dashboard (safe for API use) ----------
 def _parse_dt(val):
@@ -267,6 +229,8 @@ def _scan_recall_events_for_user(
     def safe_get_logs(ev, *, from_block: int, to_block: int):
         try:
             return ev.get_logs(from_block=from_block, to_block=to_block)
+        except RpcOverloaded:
+            raise
         except Exception:
             return ev.get_logs(from_block=hex(from_block), to_block=hex(to_block))
 
@@ -451,5 +415,7 @@ def recall_notifications(
     try:
         items = _scan_recall_events_for_user(uid, span_blocks=span, from_block=fromBlock, to_block=toBlock)
         return {"ok": True, "items": items}
+    except RpcOverloaded:
+        raise  # -> 503 + Retry-After (server.py handler)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -4,63 +4,25 @@ import os, re
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Header, Security
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi import APIRouter, Depends, HTTPException, Query, Header
 from pydantic import BaseModel
 from pymongo import MongoClient
 from bson.objectid import ObjectId
-import jwt
 
 # ---------- Config (must match Flask) ----------
 MONGO_URI      = os.environ.get("MONGO_URI", "mongodb://localhost:27017/crop_traceability_db")
-JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "change-me-super-secret")
 
-mongo = MongoClient(MONGO_URI)
+mongo = MongoClient(MONGO_URI, connect=False)  # connect lazily (per worker after fork)
 db = mongo.get_database()
 RetailInv = db["retailer_inventory"]
 TransReq  = db["transporter_requests"]
 
 router = APIRouter(prefix="/api/v1/retailer", tags=["retailer"])
-# --- one HTTPBearer scheme for this router (docs will show a lock) ---
-bearer = HTTPBearer(scheme_name="AccessToken", bearerFormat="JWT", auto_error=False)
-# ---------- JWT helpers ----------
-def _jwt_decode(token: str) -> Dict[str, Any]:
-    try:
-        # allow legacy tokens with dict sub
-        return jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"], options={"verify_sub": False})
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-# <<< REPLACE your old auth_identity(...) with this >>>
-def auth_identity(credentials: HTTPAuthorizationCredentials = Security(bearer)) -> Dict[str, Any]:
-    if not credentials or (credentials.scheme or "").lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-
-    payload = _jwt_decode(credentials.credentials.strip())
-    if payload.get("type") != "access":
-        raise HTTPException(status_code=401, detail="Not an access token")
-
-    # prefer new tokens: identity in 'user'; fallback to legacy 'sub'
-    identity = payload.get("user")
-    if not identity and isinstance(payload.get("sub"), dict):
-        identity = payload["sub"]
-    if not identity and isinstance(payload.get("sub"), str):
-        identity = {"userId": payload["sub"]}
-
-    if not identity:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-    return identity
+from backend.utils.jwt_auth import auth_identity, check_role  # shared JWT auth (verified-token cache)
 
 def _require_retailer(identity: Dict[str, Any]) -> str:
-    role = (identity.get("role") or "").lower()
-    if role != "retailer":
-        raise HTTPException(status_code=403, detail="Only retailers can access this endpoint")
-    uid = identity.get("userId")
-    if not uid:
-        raise HTTPException(status_code=401, detail="Missing userId in token")
-    return uid
+    """Ensure role is retailer; return userId."""
+    return check_role(identity, "retailer")
 
 # ---------- Helpers (mirrors Flask retailer_dashboard) ----------
 def _parse_dt(val):
@@ -0,0 +1,202 @@
+# backend/fastapi/rfid_scan_api.py
+# Streaming RFID scan channel (WebSocket) for bulk / pallet scanning.
+#
+#   POST   /api/v1/rfid/scan/sessions          {cropId}  -> sessionId + expected counts
+#   WS     /api/v1/rfid/scan/ws?sessionId=...&token=...&reader=dock-1
+#   GET    /api/v1/rfid/scan/sessions/{id}     snapshot + EPC lists + missing
+#   DELETE /api/v1/rfid/scan/sessions/{id}
+#
+# WS client -> server (any mix, any batch size):
+#   {"epcs": ["E200...", ...]}   {"epc": "E200..."}   raw text "E200...\nE200..."
+#   {"op": "status"} | {"op": "missing"} | {"op": "ping"}
+# WS server -> client:
+#   {"type": "progress", expected, scanned, unexpected, missing, mismatch, reads, dupes, ...}
+#   {"type": "alerts", "items": [{kind: unexpected_epc|over_count|complete, ...}]}
+# Progress is pushed at most every RFID_SCAN_PUSH_SECONDS, so a reader firing
+# thousands of reads per second costs one small frame per tick, not one per read.
+#
+# Sessions live in the shared Mongo scan store (RFID_SCAN_STORE=mongo, default):
+# POST, WS, GET and DELETE can each land on a different uvicorn worker. A worker
+# keeps a live copy while it has a socket, persists the EPCs it adds and merges
+# the other workers' EPCs every RFID_SCAN_SYNC_SECONDS. With
+# RFID_SCAN_STORE=memory sessions are per process: run one worker or route
+# /api/v1/rfid/scan/* with sticky sessions.
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field
+from pymongo import MongoClient
+from starlette.concurrency import run_in_threadpool
+
+from backend.services.rfid.rfid_event_store import get_event_store
+from backend.services.rfid.scan_session import SYNC_SECONDS, end_session, load_session, record_new, start_session
+from backend.utils.fast_json import dumps, loads
+from backend.utils.jwt_auth import AuthError, access_identity, auth_identity
+
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/crop_traceability_db")
+PUSH_SECONDS = float(os.getenv("RFID_SCAN_PUSH_SECONDS", "0.25"))
+
+mongo = MongoClient(MONGO_URI, connect=False)  # connect lazily (per worker after fork)
+db = mongo.get_database()
+
+router = APIRouter(prefix="/api/v1/rfid/scan", tags=["rfid"])
+
+
+class ScanStartRequest(BaseModel):
+    cropId: str = Field(..., min_length=1)
+
+
+def _user_id(identity: Dict[str, Any]) -> str:
+    uid = identity.get("userId")
+    if not uid:
+        raise HTTPException(status_code=401, detail="Missing userId in token")
+    return uid
+
+
+# ------------------------------------------------------------
+# Session lifecycle (HTTP)
+# ------------------------------------------------------------
+@router.post("/sessions")
+def scan_session_start(payload: ScanStartRequest, identity: Dict[str, Any] = Depends(auth_identity)):
+    user_id = _user_id(identity)
+    session = start_session(db, payload.cropId.strip(), user_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="crop not found")
+    get_event_store(db)  # warm the read-event writer outside the event loop
+    return {"ok": True, **session.snapshot(), "ws": f"{router.prefix}/ws?sessionId={session.id}"}
+
+
+@router.get("/sessions/{session_id}")
+def scan_session_get(session_id: str, identity: Dict[str, Any] = Depends(auth_identity)):
+    session = load_session(db, session_id, _user_id(identity), sync=True)
+    if session is None:
+        raise HTTPException(status_code=404, detail="scan session not found")
+    return {"ok": True, **session.snapshot(include_epcs=True), "missingEpcs": session.missing()}
+
+
+@router.delete("/sessions/{session_id}")
+def scan_session_end(session_id: str, identity: Dict[str, Any] = Depends(auth_identity)):
+    session = load_session(db, session_id, _user_id(identity), sync=True)
+    if session is None:
+        raise HTTPException(status_code=404, detail="scan session not found")
+    end_session(db, session_id)
+    return {"ok": True, **session.snapshot()}
+
+
+# ------------------------------------------------------------
+# WebSocket channel
+# ------------------------------------------------------------
+def _ws_identity(websocket: WebSocket, token: Optional[str]) -> Optional[Dict[str, Any]]:
+    # native clients send Authorization; browsers can't set WS headers -> ?token=
+    header = websocket.headers.get("authorization") or ""
+    scheme, _, bearer = header.partition(" ")
+    raw = bearer if scheme.lower() == "bearer" and bearer.strip() else (token or "")
+    try:
+        return access_identity(raw)
+    except AuthError:
+        return None
+
+
+def _parse_frame(message: Dict[str, Any]) -> Dict[str, Any]:
+    """-> {"epcs": [...]} or {"op": "..."}"""
+    text = message.get("text")
+    if text is None and message.get("bytes") is not None:
+        text = message["bytes"].decode("utf-8", "ignore")
+    text = (text or "").strip()
+    if not text:
+        return {"epcs": []}
+    if text[0] in "{[":
+        try:
+            data = loads(text)
+        except Exception:
+            return {"op": "bad_frame"}
+        if isinstance(data, list):
+            return {"epcs": [d.get("epc") if isinstance(d, dict) else d for d in data]}
+        if isinstance(data, dict):
+            if data.get("op"):
+                return {"op": str(data["op"])}
+            epcs: List[Any] = list(data.get("epcs") or [])
+            if data.get("epc"):
+                epcs.append(data["epc"])
+            return {"epcs": epcs}
+        return {"op": "bad_frame"}
+    # raw reader output: one EPC per line (or comma separated)
+    return {"epcs": text.replace(",", "\n").split()}
+
+
+@router.websocket("/ws")
+async def scan_ws(
+    websocket: WebSocket,
+    sessionId: str = Query(...),
+    token: Optional[str] = Query(None),
+    reader: str = Query("ws-scan"),
+):
+    identity = _ws_identity(websocket, token)
+    if not identity or not identity.get("userId"):
+        await websocket.close(code=4401)
+        return
+    user_id = identity["userId"]
+    session = await run_in_threadpool(load_session, db, sessionId, user_id)
+    if session is None:
+        await websocket.close(code=4404)
+        return
+
+    store = await run_in_threadpool(get_event_store, db)
+    await websocket.accept()
+
+    async def send(obj: Dict[str, Any]) -> None:
+        await websocket.send_text(dumps(obj))
+
+    async def pusher() -> None:
+        sent_version = -1
+        alert_seq = 0
+        synced = loop.time()
+        while True:
+            if loop.time() - synced >= SYNC_SECONDS:
+                synced = loop.time()
+                try:
+                    # EPCs fed to this session through other workers
+                    await run_in_threadpool(load_session, db, session.id, user_id, True)
+                except Exception as e:
+                    print(f"⚠️ scan session sync failed for {session.id}: {e}")
+            alerts = session.alerts_since(alert_seq)
+            if alerts:
+                alert_seq = alerts[-1]["seq"]
+                await send({"type": "alerts", "items": alerts})
+            if session.version != sent_version:
+                sent_version = session.version
+                await send({"type": "progress", **session.snapshot()})
+            await asyncio.sleep(PUSH_SECONDS)
+
+    loop = asyncio.get_running_loop()
+    push_task = asyncio.create_task(pusher())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            frame = _parse_frame(message)
+            op = frame.get("op")
+            if op == "ping":
+                await send({"type": "pong"})
+            elif op == "status":
+                await send({"type": "progress", **session.snapshot()})
+            elif op == "missing":
+                await send({"type": "missing", "epcs": session.missing()})
+            elif op:
+                await send({"type": "error", "err": op if op == "bad_frame" else f"unknown op: {op}"})
+            else:
+                delta = session.ingest(frame["epcs"])
+                if delta["new"]:
+                    await run_in_threadpool(record_new, db, session, delta["new"])
+                if delta["fresh"] and store is not None:
+                    # buffered append; flushed in batches by the event store's writer thread
+                    store.record_reads([{"epc": e} for e in delta["fresh"]], reader=reader,
+                                       crop_id=session.crop_id, user_id=user_id)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        push_task.cancel()
@@ -0,0 +1,85 @@
+# backend/fastapi/status_api.py
+# Status event stream (SSE) for the mobile app: tx lifecycle + job progress.
+# The only SSE endpoint: Flask /api/status/stream redirects here (adding a
+# short-lived ?token= for session users, since EventSource can't send headers),
+# and events published by either app arrive through the Mongo bus
+# (backend/utils/status_events.py).
+
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Security
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+
+from backend.utils.jwt_auth import AuthError, auth_identity, bearer, stream_identity
+from backend.utils.status_events import SSE_HEADERS, broker, jobs, sse_stream_async, tx_watcher
+
+router = APIRouter(prefix="/api/v1/status", tags=["status"])
+
+
+def _user_id(identity: Dict[str, Any]) -> str:
+    uid = identity.get("userId")
+    if not uid:
+        raise HTTPException(status_code=401, detail="Missing userId in token")
+    return uid
+
+
+def _stream_identity(
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(bearer),
+    token: Optional[str] = Query(None, description="stream token from Flask GET /api/status/stream-token"),
+) -> Dict[str, Any]:
+    """Bearer access token (mobile), else a short-lived stream token in ?token= (browser EventSource)."""
+    if credentials is not None or not token:
+        return auth_identity(credentials)
+    try:
+        return stream_identity(token)
+    except AuthError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+
+
+@router.get("/stream")
+async def status_stream(
+    request: Request,
+    identity: Dict[str, Any] = Depends(_stream_identity),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    lastEventId: Optional[str] = Query(None),
+):
+    """
+    text/event-stream:
+      event: tx   {txHash, kind, status: submitted|mined|failed|timeout, ...}
+      event: job  {jobId, kind, state, done, total, ...}
+    """
+    sub = broker.subscribe(_user_id(identity), last_event_id or lastEventId)
+    return StreamingResponse(
+        sse_stream_async(sub, request.is_disconnected),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str, identity: Dict[str, Any] = Depends(auth_identity)):
+    job = jobs.snapshot(job_id, _user_id(identity))
+    if job is None:
+        raise HTTPException(status_code=404, detail="job_not_found")
+    return {"ok": True, "job": job}
+
+
+@router.post("/jobs/{job_id}/cancel")
+def job_cancel(job_id: str, identity: Dict[str, Any] = Depends(auth_identity)):
+    """Cooperative: the job stops at its next checkpoint (e.g. the next tag of a write batch)."""
+    try:
+        job = jobs.cancel(job_id, _user_id(identity))
+    except LookupError:
+        raise HTTPException(status_code=404, detail="job_not_found")
+    if job is None:
+        return {"ok": True, "cancelRequested": True}  # running on another worker
+    return {"ok": True, "cancelRequested": True, "job": job.to_dict(with_result=False)}
+
+
+@router.get("/tx/{tx_hash}")
+def tx_status(tx_hash: str, identity: Dict[str, Any] = Depends(auth_identity)):
+    st = tx_watcher.status(tx_hash, _user_id(identity))
+    if st is None:
+        raise HTTPException(status_code=404, detail="tx_not_watched")
+    return {"ok": True, "tx": st}
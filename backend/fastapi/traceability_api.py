@@ -5,11 +5,9 @@
 import os
 from datetime import datetime
 from typing import Any, Dict, List
-from fastapi import APIRouter, Depends, HTTPException, Query, Security
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import jwt
+from fastapi import APIRouter, Depends, HTTPException, Query
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from backend.utils.rpc_governor import RpcOverloaded, executor as rpc_executor
 
 # Import the blockchain contract instance
 from blockchain_setup import contract
@@ -17,37 +15,13 @@ from blockchain_setup import contract
 # ==========================================================
 # CONFIG
 # ==========================================================
-JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "change-me-super-secret")
 
 router = APIRouter(prefix="/api/v1/traceability", tags=["traceability"])
 
 # ==========================================================
 # AUTH HELPERS
 # ==========================================================
-bearer = HTTPBearer(scheme_name="AccessToken", bearerFormat="JWT", auto_error=False)
-
-def _jwt_decode(token: str) -> Dict[str, Any]:
-    try:
-        return jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"], options={"verify_sub": False})
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-def auth_identity(credentials: HTTPAuthorizationCredentials = Security(bearer)) -> Dict[str, Any]:
-    if not credentials or (credentials.scheme or "").lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-
-    payload = _jwt_decode(credentials.credentials.strip())
-    if payload.get("type") != "access":
-        raise HTTPException(status_code=401, detail="Not an access token")
-
-    identity = payload.get("user") or payload.get("sub")
-    if isinstance(identity, str):
-        identity = {"userId": identity}
-    if not identity:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-    return identity
+from backend.utils.jwt_auth import auth_identity  # shared JWT auth (verified-token cache)
 
 # ==========================================================
 # INTERNAL HELPERS
@@ -238,7 +212,6 @@ def _normalize_for_ui(raw: List[Any]) -> List[Dict[str, Any]]:
 # ==========================================================
 # THREADPOOL & CACHE
 # ==========================================================
-executor = ThreadPoolExecutor(max_workers=5)
 crop_history_cache: Dict[str, List[Dict[str, Any]]] = {}
 
 async def fetch_crop_history(crop_id: str) -> List[Dict[str, Any]]:
@@ -247,7 +220,8 @@ async def fetch_crop_history(crop_id: str) -> List[Dict[str, Any]]:
         return crop_history_cache[crop_id]
 
     loop = asyncio.get_event_loop()
-    raw = await loop.run_in_executor(executor, contract.functions.getCropHistory(crop_id).call)
+    # shared bounded pool (per process); the RPC itself is admission-controlled
+    raw = await loop.run_in_executor(rpc_executor(), contract.functions.getCropHistory(crop_id).call)
     events = _normalize_for_ui(raw)
 
     # Cache result
@@ -267,6 +241,8 @@ async def get_crop_history(
     try:
         events = await fetch_crop_history(crop_id)
         return {"ok": True, "crop_id": crop_id, "events": events}
+    except RpcOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Blockchain error: {e}")
 
@@ -277,6 +253,8 @@ async def public_crop_history(crop_id: str = Query(..., description="Crop ID for
     try:
         events = await fetch_crop_history(crop_id)
         return {"ok": True, "crop_id": crop_id, "events": events}
+    except RpcOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Blockchain error: {e}")
 
@@ -82,3 +82,15 @@ class RFIDListPayload(RFIDBasePayload):
             seen.add(epc)
             out.append(epc)
         return out
+
+
+class RFIDRangePayload(RFIDBasePayload):
+    # serial-range allocation: `count` consecutive EPCs (defaults to totalBags)
+    count: Optional[int] = None
+    harvestId: Optional[str] = None
+
+    def range_count(self) -> int:
+        try:
+            return int(self.count) if self.count else self.total_bags_int()
+        except Exception:
+            return 0
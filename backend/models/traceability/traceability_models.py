@@ -62,6 +62,9 @@ class TraceabilityViewModel:
     shipment: Optional[ShipmentBlock] = None
     sale: Optional[SaleBlock] = None
 
+    # True when a source missed its deadline and its block is left out
+    degraded: bool = False
+
     # raw debug (optional)
     debug: Dict[str, Any] = field(default_factory=dict)
 
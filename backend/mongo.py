@@ -6,6 +6,9 @@ from flask_pymongo import PyMongo
 
 mongo = PyMongo()
 
+# app passed to init_mongo (so workers can rebuild the client after fork)
+_APP = None
+
 
 def init_mongo(app):
     """
@@ -23,6 +26,9 @@ def init_mongo(app):
         print("⚠️ MONGO_URI not set. Mongo will not be initialized.")
         return mongo
 
+    global _APP
+    _APP = app
+
     try:
         mongo.init_app(app)
 
@@ -34,3 +40,28 @@ def init_mongo(app):
         print(f"⚠️ Mongo init failed: {e}")
 
     return mongo
+
+
+def reconnect_mongo():
+    """
+    Rebuild the Flask-PyMongo client in the current process.
+    Used by the gunicorn post_fork hook: a MongoClient created in the master
+    before fork must not be shared by workers.
+    """
+    if _APP is None or not _APP.config.get("MONGO_URI"):
+        return mongo
+
+    old = getattr(mongo, "cx", None)
+    try:
+        mongo.init_app(_APP)
+        print(f"✅ Mongo reconnected in worker pid={os.getpid()}")
+    except Exception as e:
+        print(f"⚠️ Mongo reconnect failed: {e}")
+        return mongo
+
+    if old is not None and old is not getattr(mongo, "cx", None):
+        try:
+            old.close()
+        except Exception:
+            pass
+    return mongo
@@ -46,36 +46,33 @@ def _epc_norm(s: str) -> str:
     s = re.sub(r"[^0-9a-fA-F]", "", s).upper()
     return s[:EPC_EXPECTED_HEX_LEN] if EPC_EXPECTED_HEX_LEN else s
 
+_FARMER_INDEXES_DONE = False
+
 def _ensure_farmer_indexes(mongo):
+    # once per process: resolve is called per scanned tag
+    global _FARMER_INDEXES_DONE
+    if _FARMER_INDEXES_DONE:
+        return
     try:
-        mongo.db.farmer_request.create_index([("rfidEpcs.epc", 1)])
-        mongo.db.farmer_request.create_index([("rfidEpc", 1)])
         mongo.db.farmer_request.create_index([("cropId", 1)])
         mongo.db.farmer_request.create_index([("updated_at", -1), ("created_at", -1)])
+        _FARMER_INDEXES_DONE = True
     except Exception as e:
         current_app.logger.warning("index error: %s", e)
 
 def _find_harvest_by_epc(mongo, epc_hex: str):
-    q = {"$or": [{"rfidEpcs.epc": epc_hex}, {"rfidEpc": epc_hex}]}
-    doc = mongo.db.farmer_request.find_one(q, sort=[("updated_at", -1), ("created_at", -1), ("_id", -1)])
-    if not doc:
-        return None, None
-    matched = None
-    bags = doc.get("rfidEpcs") if isinstance(doc.get("rfidEpcs"), list) else []
-    for b in bags or []:
-        try:
-            if (b.get("epc") or "").upper() == epc_hex:
-                matched = b
-                break
-        except Exception:
-            pass
-    return doc, matched
+    # _id lookup on epc_index (falls back to harvest_bags.uq_bag_epc / legacy arrays)
+    from backend.services.farmer.harvest_bag_service import get_bag_store
+    return get_bag_store(mongo.db).resolve(epc_hex)
 
 def _expected_bags_from_doc(doc) -> int:
     if not doc: return 0
     if doc.get("bagQty"):
         try: return int(doc["bagQty"])
         except Exception: pass
+    if doc.get("bagsScanned") is not None:
+        try: return int(doc["bagsScanned"])
+        except Exception: pass
     arr = doc.get("rfidEpcs") if isinstance(doc.get("rfidEpcs"), list) else []
     try:
         return len({(b.get("epc") or "").upper() for b in arr if b and b.get("epc")})
@@ -85,74 +82,113 @@ def _expected_bags_from_doc(doc) -> int:
 # ============================================================
 #                 Scan APIs
 # ============================================================
+def _scan_store():
+    from backend.mongo import mongo
+    from backend.services.rfid.scan_session import get_scan_store
+    return get_scan_store(mongo.db)
+
+def _scan_session_id(data=None) -> str:
+    # cookie only carries the id; handhelds sharing a scan pass sessionId explicitly
+    sid = ((data or {}).get("sessionId") or request.args.get("sessionId") or "").strip()
+    return sid or session.get("recall_scan_id") or ""
+
+def _scan_user() -> str:
+    # the store only hands a session to the user who started it
+    return session.get("user_id") or ""
+
 @bp.post("/scan/init")
 def recall_scan_init():
-    from app import mongo
+    from backend.mongo import mongo
+    from backend.services.rfid.scan_session import load_expected
     data = request.get_json(silent=True) or {}
     crop_id = (data.get("cropId") or "").strip()
     if not crop_id:
         return jsonify({"ok": False, "err": "cropId required"}), 400
 
     _ensure_farmer_indexes(mongo)
-    doc = mongo.db.farmer_request.find_one({"cropId": crop_id}, sort=[("updated_at", -1), ("created_at", -1), ("_id", -1)])
-    if not doc:
+    found = load_expected(mongo.db, crop_id)
+    if found is None:
         return jsonify({"ok": False, "err": "crop not found"}), 404
 
-    expected = _expected_bags_from_doc(doc)
-    session["recall_scan"] = {
-        "cropId": crop_id,
-        "expected": int(expected),
-        "scanned": [],
-        "startedAt": int(time.time()),
-    }
-    return jsonify({"ok": True, "expected": int(expected), "scanned": 0})
+    farmer_id, expected, expected_epcs = found
+    store = _scan_store()
+    old = session.pop("recall_scan_id", None)
+    if old:
+        store.delete(old, _scan_user())
+    state = store.create(crop_id, _scan_user(), farmer_id, expected, expected_epcs)
+    session["recall_scan_id"] = state["sessionId"]
+    return jsonify({"ok": True, "sessionId": state["sessionId"], "expected": state["expected"], "scanned": 0})
 
 @bp.post("/scan/add")
 def recall_scan_add():
-    stash = session.get("recall_scan")
-    if not stash or not stash.get("cropId"):
+    data = request.get_json(silent=True) or {}
+    sid = _scan_session_id(data)
+    if not sid:
         return jsonify({"ok": False, "err": "scan not initialized"}), 400
 
-    data = request.get_json(silent=True) or {}
-    epc = _epc_norm(data.get("epc") or "")
-    if not epc or len(epc) < EPC_EXPECTED_HEX_LEN:
+    # single {"epc"} or a reader batch {"epcs": [...]}
+    raw = list(data.get("epcs") or [])
+    if data.get("epc"):
+        raw.append(data["epc"])
+    epcs = [e for e in (_epc_norm(str(x or "")) for x in raw) if len(e) >= EPC_EXPECTED_HEX_LEN]
+    if not epcs:
         return jsonify({"ok": False, "err": "bad_or_short_epc"}), 400
 
-    time.sleep(5)
-    scanned = list(stash.get("scanned") or [])
-    if epc not in scanned:
-        scanned.append(epc)
+    store = _scan_store()
+    state = store.add(sid, epcs, _scan_user())
+    if state is None:
+        return jsonify({"ok": False, "err": "scan not initialized"}), 400
 
-    stash["scanned"] = scanned
-    session["recall_scan"] = stash
-    expected = int(stash.get("expected") or 0)
-    count = len(scanned)
-    mismatch = (expected != 0) and (count != expected)
+    try:
+        from backend.services.rfid.rfid_event_store import get_event_store
+        events = get_event_store()
+        if events is not None:
+            events.record_reads([{"epc": e} for e in epcs], reader=(data.get("reader") or "recall-scan"),
+                                crop_id=state.get("cropId") or "", user_id=session.get("user_id"))
+    except Exception:
+        pass
 
+    expected = state["expected"]
+    count = state["scanned"]
+    # only what this call added; the full list is GET /scan/status
     return jsonify({
         "ok": True,
-        "cropId": stash.get("cropId"),
+        "sessionId": sid,
+        "cropId": state.get("cropId"),
         "expected": expected,
         "scanned": count,
-        "epcs": scanned,
-        "mismatch": mismatch
+        "added": state["added"],
+        "unexpected": state["unexpected"],
+        "new": state["new"],
+        "newUnexpected": state["newUnexpected"],
+        "mismatch": bool(state["unexpected"]) or ((expected != 0) and (count != expected)),
     })
 
 @bp.get("/scan/status")
 def recall_scan_status():
-    stash = session.get("recall_scan") or {}
+    sid = _scan_session_id()
+    store = _scan_store()
+    state = store.get(sid, _scan_user()) if sid else None
+    if state is None:
+        return jsonify({"ok": True, "cropId": None, "expected": 0, "scanned": 0, "epcs": [], "startedAt": None})
     return jsonify({
         "ok": True,
-        "cropId": stash.get("cropId"),
-        "expected": int(stash.get("expected") or 0),
-        "scanned": len(stash.get("scanned") or []),
-        "epcs": list(stash.get("scanned") or []),
-        "startedAt": stash.get("startedAt")
+        "sessionId": sid,
+        "cropId": state.get("cropId"),
+        "expected": state["expected"],
+        "scanned": state["scanned"],
+        "unexpected": state["unexpected"],
+        "epcs": store.epcs(sid, _scan_user()),
+        "startedAt": state.get("startedAt"),
     })
 
 @bp.post("/scan/reset")
 def recall_scan_reset():
-    session.pop("recall_scan", None)
+    data = request.get_json(silent=True) or {}
+    sid = _scan_session_id(data)
+    session.pop("recall_scan_id", None)
+    if sid:
+        _scan_store().delete(sid, _scan_user())
     return jsonify({"ok": True})
 
 @bp.post("/write")
@@ -181,7 +217,19 @@ def recall_resolve_epc():
     from app import mongo
 
     _ensure_farmer_indexes(mongo)
-    epc = _epc_norm(request.args.get("epc") or "")
+    # ?tag=<user-memory hex> (binary tag, tag_codec v1): decoded + signature checked here;
+    # its epc is used when the reader did not send one
+    tag_payload, tag_verified = None, None
+    tag_hex = re.sub(r"[^0-9a-fA-F]", "", request.args.get("tag") or "")
+    if tag_hex:
+        from backend.services.rfid import tag_codec
+        from backend.services.rfid.tag_payload import get_signer
+        try:
+            tag_payload, tag_verified = tag_codec.read(bytes.fromhex(tag_hex), get_signer())
+        except (ValueError, tag_codec.TagCodecError) as e:
+            return jsonify({"ok": False, "err": "bad_tag", "detail": str(e)}), 400
+
+    epc = _epc_norm(request.args.get("epc") or (tag_payload or {}).get("epc") or "")
     if not epc or len(epc) < EPC_EXPECTED_HEX_LEN:
         return jsonify({"ok": False, "err": "bad_or_short_epc"}), 400
 
@@ -189,16 +237,19 @@ def recall_resolve_epc():
     if not doc:
         return jsonify({"ok": False, "err": "unknown_epc"}), 404
 
-    arr = doc.get("rfidEpcs") if isinstance(doc.get("rfidEpcs"), list) else []
-    bag_list, total_units = [], 0
-    for b in arr or []:
-        try:
-            e = (b.get("epc") or "").upper()
-            q = int(b.get("bagQty") or 0)
-            bag_list.append({"epc": e, "bagQty": q, "added_at": b.get("added_at")})
-            total_units += q
-        except Exception:
-            pass
+    from backend.services.farmer.harvest_bag_service import bag_summary, get_bag_store
+    summary = bag_summary(doc)
+    total_units = summary["units"]
+    # full bag list only on request (?bags=1); totals come from the parent counters
+    bag_list = None
+    if request.args.get("bags") in ("1", "true", "yes"):
+        bag_list = []
+        for b in get_bag_store(mongo.db).list_bags(doc.get("farmerId") or "", doc.get("cropId") or ""):
+            try:
+                bag_list.append({"epc": (b.get("epc") or "").upper(), "bagQty": int(b.get("bagQty") or 0),
+                                 "added_at": b.get("added_at")})
+            except Exception:
+                pass
 
     payload = {
         "cropId":          doc.get("cropId") or "",
@@ -225,7 +276,11 @@ def recall_resolve_epc():
         "bagCount": int(expected),
         "totalUnits": int(total_units),
         "bagEpcs": bag_list,
-        "matchedBag": matched_bag
+        "matchedBag": matched_bag,
+        # binary tag only: what the tag itself says, and whether its signature holds
+        "tagPayload": tag_payload,
+        "tagVerified": tag_verified,
+        "tagMatches": None if tag_payload is None else tag_payload.get("cid") == payload["cropId"],
     })
 
 # ---------- Linked parties ----------
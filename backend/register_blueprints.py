@@ -56,6 +56,10 @@ def register_all_blueprints(app):
     from backend.routes.traceability.trace_routes import traceability_bp
     app.register_blueprint(traceability_bp)
 
+    # Status events (SSE: tx lifecycle + job progress)
+    from backend.routes.status.status_routes import status_bp
+    app.register_blueprint(status_bp)
+
     print("✓ All blueprints registered")
 
 
@@ -24,7 +24,6 @@ from flask import (
     current_app,
 )
 
-from flask_bcrypt import Bcrypt
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
@@ -39,6 +38,9 @@ from backend.services.auth_api_client import (
     AuthApiError,
 )
 
+# bcrypt in a bounded process pool (see backend/utils/passwords.py)
+from backend.utils.passwords import PasswordPoolBusy, verify_and_upgrade
+
 # Local Mongo (lazy import)
 def _get_mongo():
     from backend.mongo import mongo
@@ -51,16 +53,6 @@ USE_REMOTE_AUTH_API = os.getenv("USE_REMOTE_AUTH_API", "0") == "1"
 
 auth_bp = Blueprint("auth", __name__)
 
-_bcrypt: Bcrypt | None = None
-
-
-def get_bcrypt() -> Bcrypt:
-    global _bcrypt
-    if _bcrypt is None:
-        _bcrypt = Bcrypt(current_app)
-    return _bcrypt
-
-
 # -------------------------------------------------------------------
 # Helpers
 # -------------------------------------------------------------------
@@ -98,8 +90,6 @@ def _norm(v: str | None) -> str:
 # -------------------------------------------------------------------
 @auth_bp.route("/newlogin", methods=["GET", "POST"])
 def newlogin():
-    bcrypt = get_bcrypt()
-
     if request.method == "POST":
         data = request.get_json(silent=True) or {}
         email = _norm(data.get("email"))
@@ -140,8 +130,16 @@ def newlogin():
         if not user:
             return jsonify(success=False, message="User not found"), 404
 
-        if not bcrypt.check_password_hash(user["password"], password):
+        try:
+            ok, new_hash = verify_and_upgrade(password, user.get("password"))
+        except PasswordPoolBusy:
+            resp = jsonify(success=False, message="Server busy, retry shortly")
+            resp.headers["Retry-After"] = "2"
+            return resp, 503
+        if not ok:
             return jsonify(success=False, message="Invalid password"), 401
+        if new_hash:
+            mongo.db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
 
         session["user_id"] = user["userId"]
         session["role"] = user["role"]
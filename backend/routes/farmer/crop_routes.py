@@ -51,24 +51,13 @@ def my_crops():
         total_harvest_qtl=data["total_harvest_qtl"],
         total_sold_qtl=data["total_sold_qtl"],
     )
-def _get_farmer_id_web_or_jwt():
-    # 1) Web session auth
-    if session.get("role") == "farmer" and session.get("user_id"):
-        return session.get("user_id")
 
-    # 2) JWT auth (mobile)
-    try:
-        verify_jwt_in_request(optional=True)
 
-        user_id = get_jwt_identity()   # ✅ string now
-        claims = get_jwt() or {}
-        role = (claims.get("role") or "").lower()
+from backend.utils.jwt_auth import get_user_id_web_or_jwt
 
-        if role == "farmer" and user_id:
-            return user_id
-        return None
-    except Exception:
-        return None
+def _get_farmer_id_web_or_jwt():
+    # web session first, then mobile JWT (shared verified-token cache)
+    return get_user_id_web_or_jwt("farmer")
 
 # ------------------  MY CROPS (JSON) ------------------
 from flask import jsonify
@@ -271,22 +260,8 @@ from typing import Optional
 farm_coord_bp = Blueprint("farm_coord_bp", __name__, url_prefix="/farmer")
 
 def _get_farmer_id_web_or_jwt() -> Optional[str]:
-    # Web session auth
-    if session.get("role") == "farmer" and session.get("user_id"):
-        return session.get("user_id")
-
-    # JWT auth (mobile)
-    try:
-        verify_jwt_in_request(optional=True)
-        user_id = get_jwt_identity()  # string
-        claims = get_jwt() or {}
-        role = (claims.get("role") or "").lower()
-
-        if role == "farmer" and user_id:
-            return user_id
-        return None
-    except Exception:
-        return None
+    # web session first, then mobile JWT (shared verified-token cache)
+    return get_user_id_web_or_jwt("farmer")
 
 
 @farm_coord_bp.post("/api/save_farm_coordinates")
@@ -30,25 +30,11 @@ def _require_farmer():
     return True, None, farmer_id
 
 
-def _get_farmer_id_web_or_jwt():
-    # 1) Web session auth
-    if session.get("role") == "farmer" and session.get("user_id"):
-        return session.get("user_id")
-
-    # 2) JWT auth mobile/API
-    try:
-        verify_jwt_in_request(optional=True)
-
-        user_id = get_jwt_identity()
-        claims = get_jwt() or {}
-        role = (claims.get("role") or "").lower()
+from backend.utils.jwt_auth import get_user_id_web_or_jwt
 
-        if role == "farmer" and user_id:
-            return user_id
-
-        return None
-    except Exception:
-        return None
+def _get_farmer_id_web_or_jwt():
+    # web session first, then mobile JWT (shared verified-token cache)
+    return get_user_id_web_or_jwt("farmer")
 
 
 def _load_add_marketplace_context(farmer_id: str):
@@ -9,6 +9,7 @@ from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
 from backend.mongo_safe import get_db
 from backend.services.farmer.orders_service import OrderService
 from backend.services.farmer.crop_service import CropService
+from backend.utils.idempotency import idempotent_flask
 
 sales_bp = Blueprint("farmer_sales_bp", __name__, url_prefix="/farmer/sales")
 
@@ -39,24 +40,11 @@ def _users_collection():
     return db, db.users
 
 
-def _get_farmer_id_web_or_jwt():
-    # 1) Web session auth
-    if session.get("role") == "farmer" and session.get("user_id"):
-        return session.get("user_id")
-
-    # 2) JWT auth (mobile)
-    try:
-        verify_jwt_in_request(optional=True)
-
-        user_id = get_jwt_identity()   # ✅ string now
-        claims = get_jwt() or {}
-        role = (claims.get("role") or "").lower()
+from backend.utils.jwt_auth import get_user_id_web_or_jwt
 
-        if role == "farmer" and user_id:
-            return user_id
-        return None
-    except Exception:
-        return None
+def _get_farmer_id_web_or_jwt():
+    # web session first, then mobile JWT (shared verified-token cache)
+    return get_user_id_web_or_jwt("farmer")
 
 
 # -------------------- PAGES --------------------
@@ -256,6 +244,7 @@ def api_buyer_details(buyer_id):
 # -------------------- CREATE ORDER --------------------
 
 @sales_bp.post("/order/create")
+@idempotent_flask("farmer.order.create")
 def create_order():
     farmer_id = _get_farmer_id_web_or_jwt()
     if not farmer_id:
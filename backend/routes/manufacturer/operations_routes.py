@@ -14,22 +14,11 @@ operations_bp = Blueprint(
 )
 
 
-def _get_manufacturer_id_web_or_jwt() -> Optional[str]:
-    if session.get("role") == "manufacturer" and session.get("user_id"):
-        return session.get("user_id")
-
-    try:
-        verify_jwt_in_request(optional=True)
-        user_id = get_jwt_identity()
-        claims = get_jwt() or {}
-        role = (claims.get("role") or "").lower()
+from backend.utils.jwt_auth import get_user_id_web_or_jwt
 
-        if role == "manufacturer" and user_id:
-            return user_id
-
-        return None
-    except Exception:
-        return None
+def _get_manufacturer_id_web_or_jwt() -> Optional[str]:
+    # web session first, then mobile JWT (shared verified-token cache)
+    return get_user_id_web_or_jwt("manufacturer")
 
 
 # HTML: /manufacturer/operations/my
@@ -20,24 +20,11 @@ products_bp = Blueprint(
     url_prefix="/manufacturer/product",
 )
 
+from backend.utils.jwt_auth import get_user_id_web_or_jwt
+
 def _get_manufacturer_id_web_or_jwt():
-    # 1) Web session auth
-    if session.get("role") == "manufacturer" and session.get("user_id"):
-        return session.get("user_id")
-
-    # 2) JWT auth (mobile)
-    try:
-        verify_jwt_in_request(optional=True)
-
-        user_id = get_jwt_identity()   # ✅ string now
-        claims = get_jwt() or {}
-        role = (claims.get("role") or "").lower()
-
-        if role == "manufacturer" and user_id:
-            return user_id
-        return None
-    except Exception:
-        return None
+    # web session first, then mobile JWT (shared verified-token cache)
+    return get_user_id_web_or_jwt("manufacturer")
 
 
 # ----------------------------------------------------
@@ -1,22 +1,47 @@
 # backend/routes/qr/qr_routes.py
 
-from flask import Blueprint, jsonify, send_file, request
+from flask import Blueprint, jsonify, send_file, request, Response, stream_with_context
 import os
-import qrcode
-from io import BytesIO
+import re
 from backend.mongo import mongo
+from backend.services.qr.qr_service import CACHE_CONTROL, load, qr_images, remember
+from backend.services.qr.qr_decode import MAX_IMAGES, decode_pool, iter_dir, match_results
+from backend.services.qr.label_sheets import (
+    BATCH_MAX,
+    batch_items,
+    batch_slot,
+    default_layout,
+    stream_pdf,
+    stream_zip,
+)
+from backend.utils.jwt_auth import flask_identity
+from backend.utils.status_events import jobs
 
 
 qr_bp = Blueprint("qr_bp", __name__, url_prefix="/qr")
 
 
+def _image_response(img, download: bool = False):
+    if request.if_none_match.contains(img.etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(img.data, mimetype=img.content_type)
+    resp.set_etag(img.etag)
+    resp.headers["Cache-Control"] = CACHE_CONTROL
+    if download:
+        resp.headers["Content-Disposition"] = f'attachment; filename="qr_{img.key[:12]}.png"'
+    return resp
+
+
 # ---------------------------------------------------
 # GENERATE QR IMAGE AND STORE METADATA
 # ---------------------------------------------------
 @qr_bp.post("/generate")
 def generate_qr():
     """
-    Create a QR code from a payload and return the saved file path.
+    Create a QR code from a payload; returns its content-addressed URL.
+    Same payload + options -> same key, served from cache without re-rendering.
+    Body: { payload, boxSize?, border?, ecc? }
     """
     data = request.json or {}
     payload = data.get("payload")
@@ -24,29 +49,40 @@ def generate_qr():
     if not payload:
         return jsonify({"ok": False, "err": "payload is required"}), 400
 
-    # Generate QR
-    img = qrcode.make(payload)
+    img = qr_images.render(
+        payload,
+        box_size=data.get("boxSize", 10),
+        border=data.get("border", 4),
+        ecc=data.get("ecc", "L"),
+    )
+    remember(mongo.db, img)
 
-    os.makedirs("static/qrcodes", exist_ok=True)
-    filename = f"qr_{mongo.db.qr_codes.count_documents({}) + 1}.png"
-    filepath = os.path.join("static/qrcodes", filename)
+    return jsonify({"ok": True, "key": img.key, "file": img.url, "url": img.url, "cached": img.cached})
 
-    img.save(filepath)
 
-    # Save metadata
-    mongo.db.qr_codes.insert_one({
-        "payload": payload,
-        "file": filepath
-    })
-
-    return jsonify({"ok": True, "file": filepath})
+# ---------------------------------------------------
+# SERVE QR IMAGE (by content key)
+# ---------------------------------------------------
+@qr_bp.get("/img/<key>.png")
+def qr_image(key):
+    img = load(mongo.db, key)
+    if img is None:
+        return jsonify({"ok": False, "err": "not found"}), 404
+    return _image_response(img)
 
 
 # ---------------------------------------------------
-# DOWNLOAD QR (served file)
+# DOWNLOAD QR (by key, or a legacy saved file)
 # ---------------------------------------------------
 @qr_bp.get("/download")
 def download_qr():
+    key = request.args.get("key")
+    if key:
+        img = load(mongo.db, key)
+        if img is None:
+            return jsonify({"ok": False, "err": "Invalid key"}), 400
+        return _image_response(img, download=True)
+
     file_path = request.args.get("file")
     if not file_path or not os.path.isfile(file_path):
         return jsonify({"ok": False, "err": "Invalid file"}), 400
@@ -59,10 +95,141 @@ def download_qr():
 # ---------------------------------------------------
 @qr_bp.get("/list")
 def list_qr_codes():
-    cur = mongo.db.qr_codes.find().sort([("_id", -1)])
-    data = []
-    for d in cur:
-        d["_id"] = str(d["_id"])
-        data.append(d)
+    data = list(mongo.db.qr_codes.find().sort([("created_at", -1), ("_id", -1)]))
+    for x in data:
+        x["_id"] = str(x["_id"])
 
     return jsonify({"ok": True, "items": data})
+
+
+# ---------------------------------------------------
+# BATCH LABELS (streamed ZIP of PNG labels, or PDF A4 sheets)
+# Body: { baseCode, data: {cropId, productName?}, count, format: "zip"|"pdf",
+#         cols?, rows?, title? }
+# Progress: X-Job-Id header -> /api/status/stream "job" events
+# Signed-in users only; QR_BATCH_CONCURRENCY batches per process, one per user
+# (503 + Retry-After when busy)
+# ---------------------------------------------------
+@qr_bp.post("/batch/labels")
+def batch_labels():
+    user_id = (flask_identity() or {}).get("userId")
+    if not user_id:
+        return jsonify({"ok": False, "err": "auth"}), 401
+
+    data = request.get_json(silent=True) or {}
+    base_code = str(data.get("baseCode") or "").strip()
+    template = data.get("data") or {}
+    fmt = (data.get("format") or "pdf").lower()
+    try:
+        count = int(data.get("count") or 0)
+    except (TypeError, ValueError):
+        count = 0
+
+    if not base_code or not isinstance(template, dict):
+        return jsonify({"ok": False, "err": "baseCode and data are required"}), 400
+    if not 1 <= count <= BATCH_MAX:
+        return jsonify({"ok": False, "err": f"count must be 1..{BATCH_MAX}"}), 400
+    if fmt not in ("zip", "pdf"):
+        return jsonify({"ok": False, "err": "format must be zip or pdf"}), 400
+
+    try:
+        layout = default_layout(data.get("cols", 4), data.get("rows", 6), title=data.get("title") or base_code)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "err": "cols and rows must be integers"}), 400
+    items = batch_items(base_code, template, count)
+
+    release = batch_slot(user_id)
+    if release is None:
+        resp = jsonify({"ok": False, "err": "label batches busy, retry shortly"})
+        resp.headers["Retry-After"] = "5"
+        return resp, 503
+
+    job = jobs.create(user_id, "qr_batch_labels", total=count, meta={"baseCode": base_code, "format": fmt})
+
+    def _gen():
+        job.start()
+        try:
+            writer = stream_pdf if fmt == "pdf" else stream_zip
+            yield from writer(items, layout, job=job)
+            job.finish({"count": count, "format": fmt})
+        except Exception as e:
+            job.fail(str(e))
+            raise
+        finally:
+            release()
+            if not job.finished:
+                job.fail("client disconnected")  # GeneratorExit mid-stream
+
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", base_code)[:60]
+    resp = Response(stream_with_context(_gen()),
+                    mimetype="application/pdf" if fmt == "pdf" else "application/zip")
+    resp.headers["Content-Disposition"] = f'attachment; filename="{safe}_labels.{fmt}"'
+    resp.headers["X-Job-Id"] = job.id
+    resp.call_on_close(release)  # client gone before / during the stream
+    return resp
+
+
+# ---------------------------------------------------
+# BATCH DECODE (shipment label photos)
+# multipart: images=<file> (repeatable) + cropId, cropType, harvestQuantity,
+#            packagingType, manufacturerId (optional -> match report)
+# JSON:      { dir: "<path under QR_DECODE_ROOT>", expected?: {...} }
+# Options:   gray=1, maxSide=1600, multi=1; ?async=1 -> 202 {jobId}
+# ---------------------------------------------------
+_EXPECTED_FIELDS = ("cropId", "cropType", "harvestQuantity", "packagingType", "manufacturerId")
+
+
+@qr_bp.post("/decode")
+def decode_qr_batch():
+    body = request.get_json(silent=True) if request.is_json else None
+    opts = body or request.form
+
+    if body is not None:
+        try:
+            sources = list(iter_dir(str(body.get("dir") or "")))
+        except PermissionError as e:
+            return jsonify({"ok": False, "err": str(e)}), 403
+        expected = body.get("expected") or {}
+    else:
+        files = request.files.getlist("images")
+        if len(files) > MAX_IMAGES:
+            return jsonify({"ok": False, "err": f"at most {MAX_IMAGES} images"}), 400
+        sources = [(f.filename or f"image{i}", f.read()) for i, f in enumerate(files)]
+        expected = {k: request.form.get(k) for k in _EXPECTED_FIELDS if request.form.get(k) is not None}
+
+    if not sources:
+        return jsonify({"ok": False, "err": "no images"}), 400
+
+    gray = str(opts.get("gray", "1")) != "0"
+    multi = str(opts.get("multi", "1")) != "0"
+    try:
+        max_side = int(opts.get("maxSide") or 1600)
+    except (TypeError, ValueError):
+        max_side = 1600
+
+    def _run(job=None):
+        results = []
+        for res in decode_pool.decode(sources, gray=gray, max_side=max_side, multi=multi):
+            results.append(res)
+            if job is not None:
+                job.advance()
+        if expected:
+            return match_results(results, expected)
+        return {"images": len(results), "codes": sum(len(r["codes"]) for r in results), "results": results}
+
+    user_id = (flask_identity() or {}).get("userId")
+    if request.args.get("async") == "1" and user_id:
+        job = jobs.run(user_id, "qr_decode", _run, total=len(sources), meta={"images": len(sources)})
+        return jsonify({"ok": True, "message": "queued", "jobId": job.id,
+                        "statusUrl": f"/api/status/jobs/{job.id}"}), 202
+
+    try:
+        out = _run()
+    except RuntimeError as e:
+        return jsonify({"ok": False, "err": str(e)}), 503
+    return jsonify({"ok": True, **out})
+
+
+@qr_bp.get("/cache/stats")
+def qr_cache_stats():
+    return jsonify({"ok": True, **qr_images.stats()})
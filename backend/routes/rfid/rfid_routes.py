@@ -1,10 +1,18 @@
 # backend/rfid_routes.py
 
+from datetime import datetime, timedelta
+
 from flask import Blueprint, request, jsonify, session
 
 from backend.mongo import mongo
 from backend.services.rfid.rfid_services import RFIDService  
+from backend.services.rfid.rfid_event_store import get_event_store
+from backend.services.rfid.epc_ranges import get_range_store, range_public
+from backend.services.rfid.reconciliation import reconcile_scan
 from backend.models.rfid.rfid_models import normalize_epc
+from backend.utils.idempotency import idempotent_flask
+from backend.utils.jwt_auth import flask_identity
+from backend.utils.status_events import jobs
 
 rfid_bp = Blueprint("rfid_bp", __name__, url_prefix="/rfid")
 
@@ -34,6 +42,7 @@ def _get_authed_user():
 #   { epc: "...." }   OR   { epcs: ["..",".."] }
 # ------------------------------------------------------------
 @rfid_bp.post("/register")
+@idempotent_flask("rfid.register")
 def register_rfid_auto():
     user_id, username, err = _get_authed_user()
     if err:
@@ -61,6 +70,7 @@ def register_rfid_auto():
 # Body: { epc: "....", ... }
 # ------------------------------------------------------------
 @rfid_bp.post("/register-single")
+@idempotent_flask("rfid.register_single")
 def register_rfid_single():
     user_id, username, err = _get_authed_user()
     if err:
@@ -89,8 +99,10 @@ def register_rfid_single():
 # ------------------------------------------------------------
 # BULK REGISTER
 # Body: { epcs: ["..",".."], ... }
+# ?async=1 -> 202 {jobId}; progress + result arrive on /api/status/stream
 # ------------------------------------------------------------
 @rfid_bp.post("/register-bulk")
+@idempotent_flask("rfid.register_bulk")
 def register_rfid_bulk():
     user_id, username, err = _get_authed_user()
     if err:
@@ -113,6 +125,15 @@ def register_rfid_bulk():
         cleaned.append(c)
     data["epcs"] = cleaned
 
+    if request.args.get("async") == "1":
+        job = jobs.run(
+            user_id, "rfid_register_bulk",
+            lambda j: RFIDService.register_epc_list(data, job=j),
+            total=len(cleaned),
+            meta={"cropId": data.get("cropId")},
+        )
+        return jsonify(ok=True, message="queued", jobId=job.id, statusUrl=f"/api/status/jobs/{job.id}"), 202
+
     try:
         out = RFIDService.register_epc_list(data)
         # bulk can return ok False but with partial successes (fallback case)
@@ -129,6 +150,74 @@ def register_rfid_bulk():
         return jsonify(ok=False, message="server_error", error=str(e)), 500
 
 
+# ------------------------------------------------------------
+# SERIAL RANGE REGISTER
+# Body: { cropId, count? (default totalBags), harvestId?, ... same fields as /register }
+# -> one [startEpc, endEpc] range instead of an explicit EPC list
+# ------------------------------------------------------------
+@rfid_bp.post("/register-range")
+@idempotent_flask("rfid.register_range")
+def register_rfid_range():
+    user_id, username, err = _get_authed_user()
+    if err:
+        return err
+
+    data = request.get_json(silent=True) or {}
+    data["userId"] = user_id
+    data["username"] = username
+
+    if request.args.get("async") == "1":
+        job = jobs.run(
+            user_id, "rfid_register_range",
+            lambda j: RFIDService.register_range(data, job=j),
+            meta={"cropId": data.get("cropId")},
+        )
+        return jsonify(ok=True, message="queued", jobId=job.id, statusUrl=f"/api/status/jobs/{job.id}"), 202
+
+    try:
+        out = RFIDService.register_range(data)
+        if not out.pop("ok", False):
+            return jsonify(ok=False, message=out.get("err") or "failed", **out), 400
+        return jsonify(ok=True, message="RFID range registered", **out), 200
+
+    except Exception as e:
+        return jsonify(ok=False, message="server_error", error=str(e)), 500
+
+
+# ------------------------------------------------------------
+# RANGE EXPAND / LOOKUP
+# GET /rfid/range?epc=...                -> range containing the EPC
+# GET /rfid/range?cropId=...&expand=1&limit=1000
+# ------------------------------------------------------------
+@rfid_bp.get("/range")
+def rfid_range():
+    user_id = (flask_identity() or {}).get("userId")
+    if not user_id:
+        return jsonify(ok=False, message="auth"), 401
+
+    store = get_range_store()
+    if store is None:
+        return jsonify(ok=False, message="MongoDB is disabled or unavailable"), 503
+
+    epc = normalize_epc(request.args.get("epc") or "")
+    if epc:
+        hit = store.lookup(epc)
+        if not hit:
+            return jsonify(ok=False, message="not_found", epc=epc), 404
+        return jsonify(ok=True, epc=epc, range=range_public(hit)), 200
+
+    crop_id = (request.args.get("cropId") or "").strip()
+    if not crop_id:
+        return jsonify(ok=False, message="epc or cropId required"), 400
+
+    ranges = [range_public(d) for d in store.for_crops([crop_id])]
+    out = {"ok": True, "cropId": crop_id, "ranges": ranges, "count": sum(r["count"] for r in ranges)}
+    if request.args.get("expand") == "1":
+        limit = request.args.get("limit", default=1000, type=int) or 1000
+        out["epcs"] = store.expand_crop(crop_id, limit=max(1, min(limit, 100000)))
+    return jsonify(**out), 200
+
+
 # ------------------------------------------------------------
 # LIST (Mongo)
 # GET /rfid/list?cropId=...
@@ -184,3 +273,113 @@ def rfid_detail():
 
     except Exception as e:
         return jsonify(ok=False, message="server_error", error=str(e)), 500
+
+
+# ------------------------------------------------------------
+# READ EVENTS (time-series, buffered)
+# POST /rfid/reads
+# Body: { reader: "dock-1", cropId?: "...", reads: [{epc, ts?, rssi?, antenna?}, ...] }
+# ------------------------------------------------------------
+@rfid_bp.post("/reads")
+def ingest_reads():
+    # web session or Bearer token (fixed readers post via uhf_ingest.py)
+    user_id = (flask_identity() or {}).get("userId")
+    if not user_id:
+        return jsonify(ok=False, message="auth"), 401
+
+    data = request.get_json(silent=True) or {}
+    reads = data.get("reads")
+    if not isinstance(reads, list) or not reads:
+        return jsonify(ok=False, message="reads must be a non-empty list"), 400
+
+    store = get_event_store()
+    if store is None:
+        return jsonify(ok=False, message="MongoDB is disabled or unavailable"), 503
+
+    cleaned = []
+    rejected = 0
+    for r in reads:
+        r = r if isinstance(r, dict) else {"epc": r}
+        epc = normalize_epc(str(r.get("epc") or ""))
+        if not epc:
+            rejected += 1
+            continue
+        cleaned.append({**r, "epc": epc})
+
+    accepted = store.record_reads(
+        cleaned,
+        reader=(data.get("reader") or "").strip(),
+        crop_id=(data.get("cropId") or "").strip(),
+        user_id=user_id,
+    )
+    # 202: events are buffered and flushed in batches
+    return jsonify(ok=True, accepted=accepted, rejected=rejected), 202
+
+
+# ------------------------------------------------------------
+# ROLLUP: reads per minute per reader
+# GET /rfid/reads/per-minute?reader=...&cropId=...&minutes=60
+# ------------------------------------------------------------
+@rfid_bp.get("/reads/per-minute")
+def reads_per_minute():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify(ok=False, message="auth"), 401
+
+    store = get_event_store()
+    if store is None:
+        return jsonify(ok=False, message="MongoDB is disabled or unavailable"), 503
+
+    minutes = request.args.get("minutes", default=60, type=int) or 60
+    minutes = max(1, min(minutes, 7 * 24 * 60))
+    until = datetime.utcnow()
+    since = until - timedelta(minutes=minutes)
+
+    try:
+        rows = store.reads_per_minute(
+            reader=(request.args.get("reader") or "").strip() or None,
+            crop_id=(request.args.get("cropId") or "").strip() or None,
+            since=since,
+            until=until,
+        )
+        for r in rows:
+            if isinstance(r.get("minute"), datetime):
+                r["minute"] = r["minute"].strftime("%Y-%m-%dT%H:%M:00Z")
+        return jsonify(ok=True, since=since.isoformat() + "Z", items=rows, writer=store.writer.stats()), 200
+    except Exception as e:
+        return jsonify(ok=False, message="server_error", error=str(e)), 500
+
+
+# ------------------------------------------------------------
+# RECONCILE: expected (crops / shipments) vs scanned EPCs
+# POST /rfid/reconcile
+# Body: { cropIds?: [...], shipmentIds?: [...], epcs: [...], limit?: 500 }
+# ------------------------------------------------------------
+@rfid_bp.post("/reconcile")
+def reconcile_epcs():
+    user_id = (flask_identity() or {}).get("userId")
+    if not user_id:
+        return jsonify(ok=False, message="auth"), 401
+
+    data = request.get_json(silent=True) or {}
+    epcs = data.get("epcs")
+    crop_ids = [str(c).strip() for c in (data.get("cropIds") or []) if str(c or "").strip()]
+    shipment_ids = [str(s).strip() for s in (data.get("shipmentIds") or []) if str(s or "").strip()]
+    if not isinstance(epcs, list):
+        return jsonify(ok=False, message="epcs must be a list"), 400
+    if not crop_ids and not shipment_ids:
+        return jsonify(ok=False, message="cropIds or shipmentIds required"), 400
+
+    try:
+        limit = int(data.get("limit") or 500)
+    except (TypeError, ValueError):
+        limit = 500
+    limit = max(1, min(limit, 100000))
+
+    try:
+        # only the caller's own crops / shipments / tags are expected or named
+        out = reconcile_scan(mongo.db, epcs, crop_ids, shipment_ids, farmer_id=user_id, list_limit=limit)
+        ok = out.pop("ok")
+        return jsonify(ok=True, complete=ok, **out), 200
+    except Exception as e:
+        return jsonify(ok=False, message="server_error", error=str(e)), 500
@@ -0,0 +1,5 @@
+# backend/routes/status/__init__.py
+
+from .status_routes import status_bp
+
+__all__ = ["status_bp"]
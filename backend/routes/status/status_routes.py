@@ -0,0 +1,124 @@
+# backend/routes/status/status_routes.py
+
+import os
+from urllib.parse import urlencode, urlsplit
+
+from flask import Blueprint, jsonify, redirect, request
+
+from backend.utils.jwt_auth import STREAM_TOKEN_SECONDS, flask_identity, issue_stream_token
+from backend.utils.status_events import broker, jobs, tx_watcher
+
+status_bp = Blueprint("status_bp", __name__, url_prefix="/api/status")
+
+# the SSE stream is served by the async app (FastAPI status_api), another origin:
+# STATUS_STREAM_URL (absolute), else this request's host on STATUS_STREAM_PORT
+STATUS_STREAM_URL = os.getenv("STATUS_STREAM_URL", "")
+STATUS_STREAM_PORT = os.getenv("STATUS_STREAM_PORT", "8000")
+
+
+def _user_id():
+    identity = flask_identity() or {}
+    return identity.get("userId")
+
+
+def _stream_url() -> str:
+    if STATUS_STREAM_URL:
+        return STATUS_STREAM_URL
+    host = urlsplit(request.host_url).hostname or "localhost"
+    if ":" in host:
+        host = f"[{host}]"
+    return f"{request.scheme}://{host}:{STATUS_STREAM_PORT}/api/v1/status/stream"
+
+
+def _stream_token():
+    identity = flask_identity() or {}
+    if not identity.get("userId"):
+        return None
+    return issue_stream_token(identity)
+
+
+# ------------------------------------------------------------
+# EVENT STREAM (SSE) -> async app
+# GET /api/status/stream  ->  307 stream URL (same query string + ?token= for
+#   a signed-in user; EventSource re-enters here on reconnect for a fresh one)
+#   event: tx   {txHash, kind, status: submitted|mined|failed|timeout, ...}
+#   event: job  {jobId, kind, state, done, total, ...}
+# GET /api/status/stream-token -> {url, token} to open the stream directly
+# A WSGI stream would hold one gthread worker thread per open client for the
+# whole stream; events from these workers reach it through the Mongo bus.
+# ------------------------------------------------------------
+@status_bp.get("/stream")
+def status_stream():
+    params = [(k, v) for k, v in request.args.items(multi=True) if k != "token"]
+    token = _stream_token()
+    if token:
+        params.append(("token", token))
+    url = _stream_url()
+    return redirect(f"{url}?{urlencode(params)}" if params else url, code=307)
+
+
+@status_bp.get("/stream-token")
+def status_stream_token():
+    token = _stream_token()
+    if not token:
+        return jsonify(ok=False, message="auth"), 401
+    return jsonify(ok=True, url=_stream_url(), token=token, expiresIn=STREAM_TOKEN_SECONDS), 200
+
+
+# ------------------------------------------------------------
+# SHORT POLL
+# GET /api/status/events?lastEventId=<id>  -> events after that id
+# (no id: the recent replay buffer). Returns immediately.
+# ------------------------------------------------------------
+@status_bp.get("/events")
+def status_events():
+    user_id = _user_id()
+    if not user_id:
+        return jsonify(ok=False, message="auth"), 401
+
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    events = broker.recent(user_id, last_id)
+    items = [{"id": e["id"], "event": e["type"], "ts": e["ts"], **e["data"]} for e in events]
+    return jsonify(ok=True, events=items, lastEventId=items[-1]["id"] if items else last_id), 200
+
+
+# ------------------------------------------------------------
+# POLLING FALLBACKS
+# ------------------------------------------------------------
+@status_bp.get("/jobs/<job_id>")
+def job_status(job_id):
+    user_id = _user_id()
+    if not user_id:
+        return jsonify(ok=False, message="auth"), 401
+
+    job = jobs.snapshot(job_id, user_id)
+    if job is None:
+        return jsonify(ok=False, message="job_not_found"), 404
+    return jsonify(ok=True, job=job), 200
+
+
+@status_bp.post("/jobs/<job_id>/cancel")
+def job_cancel(job_id):
+    user_id = _user_id()
+    if not user_id:
+        return jsonify(ok=False, message="auth"), 401
+
+    try:
+        job = jobs.cancel(job_id, user_id)
+    except LookupError:
+        return jsonify(ok=False, message="job_not_found"), 404
+    if job is None:
+        return jsonify(ok=True, cancelRequested=True), 200  # running on another worker
+    return jsonify(ok=True, cancelRequested=True, job=job.to_dict(with_result=False)), 200
+
+
+@status_bp.get("/tx/<tx_hash>")
+def tx_status(tx_hash):
+    user_id = _user_id()
+    if not user_id:
+        return jsonify(ok=False, message="auth"), 401
+
+    st = tx_watcher.status(tx_hash, user_id)
+    if st is None:
+        return jsonify(ok=False, message="tx_not_watched"), 404
+    return jsonify(ok=True, tx=st), 200
@@ -28,31 +28,12 @@ traceability_bp = Blueprint(
 )
 
 
-def _get_farmer_id_web_or_jwt():
-    """
-    Supports:
-    1. Web session auth
-    2. JWT auth for mobile/API
-    """
-    # 1) Web session auth
-    if session.get("role") == "farmer" and session.get("user_id"):
-        return session.get("user_id")
-
-    # 2) JWT auth
-    try:
-        verify_jwt_in_request(optional=True)
-
-        user_id = get_jwt_identity()
-        claims = get_jwt() or {}
-        role = (claims.get("role") or "").lower()
-
-        if role == "farmer" and user_id:
-            return user_id
+from backend.utils.jwt_auth import get_user_id_web_or_jwt
+from backend.utils.rpc_governor import RpcOverloaded
 
-        return None
-
-    except Exception:
-        return None
+def _get_farmer_id_web_or_jwt():
+    # web session first, then mobile JWT (shared verified-token cache)
+    return get_user_id_web_or_jwt("farmer")
 
 
 # ------------------------------
@@ -146,6 +127,9 @@ def traceability_api():
             err=str(e) or "not_found_or_unauthorized",
         ), 404
 
+    except RpcOverloaded:
+        raise  # -> 503 + Retry-After (app-level handler)
+
     except Exception as e:
         print("TRACEABILITY API ERROR:", e)
         return jsonify(
@@ -7,6 +7,8 @@ import threading
 import requests
 from typing import Any, Dict, Optional
 
+from backend.utils.tracing import TracedSession
+
 API_BASE = (os.getenv("AUTH_API_BASE_URL", "") or "").rstrip("/")
 
 DEFAULT_TIMEOUT = int(os.getenv("AUTH_API_TIMEOUT", "15"))
@@ -22,8 +24,12 @@ WARMUP_EVERY_SECONDS = int(os.getenv("AUTH_API_WARMUP_EVERY_SECONDS", "600"))  #
 class AuthApiError(Exception):
     pass
 
+def _new_session() -> requests.Session:
+    # traced: client span per call + traceparent forwarded to the auth API
+    return TracedSession() if TracedSession is not None else requests.Session()
+
 # Reuse connections (reduces overhead)
-_session = requests.Session()
+_session = _new_session()
 
 # Warmup state
 _warm_lock = threading.Lock()
@@ -15,6 +15,7 @@ from backend.blockchain import (
 from backend.models.farmer.crop_models import CropRegistrationModel, CropInfoModel
 from backend.mongo_safe import get_db
 from backend.mongo_safe import get_col
+from backend.utils.status_events import watch_tx
 
 class CropService:
     # ------------------------------------------------------------
@@ -339,11 +340,14 @@ class CropService:
         else:
             print("⚠️ Skipping txHash update (Mongo off or insert missing)")
 
+        # mined / failed is pushed on the user's status stream (/api/status/stream)
+        watch_tx(tx_hash, model.farmerId, "crop_register", {"cropId": model.cropId})
 
         return {
             "ok": True,
             "cropId": model.cropId,
             "txHash": tx_hash,
+            "txStatus": "submitted",
             "mongo_saved": bool(inserted_id),
         }
 
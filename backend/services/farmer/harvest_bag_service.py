@@ -0,0 +1,374 @@
+# backend/services/farmer/harvest_bag_service.py
+
+from __future__ import annotations
+
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# ------------------------------------------------------------
+# Bucketed bag storage
+#
+#   harvest_bags: { farmerId, cropId, count, bags: [{epc, bagQty, added_at}], created_at, updated_at }
+#     - at most BUCKET_SIZE bags per bucket doc (new bucket when full)
+#     - unique multikey index on bags.epc -> an EPC can live in one bucket only
+#
+#   farmer_request (parent) keeps counters instead of the array:
+#     bagsScanned, bagUnits, bagQty (= bagsScanned, legacy), rfidEpc (first EPC, legacy)
+#     -> the per-harvest bag summary, no bucket scan needed
+#
+#   epc_index: { _id: epc, harvestId, farmerId, cropId, bagQty, added_at }
+#     - written on add / remove / migration, read-repaired on a miss
+#     - resolve(epc) = _id lookup here + _id lookup on the parent
+# ------------------------------------------------------------
+BAGS_COL = "harvest_bags"
+PARENT_COL = "farmer_request"
+EPC_INDEX_COL = "epc_index"
+BUCKET_SIZE = int(os.getenv("HARVEST_BAG_BUCKET_SIZE", "200"))
+# set to 0 once every pre-bucket rfidEpcs array has been migrated
+LEGACY_CHECK = os.getenv("HARVEST_BAGS_LEGACY_CHECK", "1") == "1"
+
+
+class BagConflict(Exception):
+    """EPC already used (same harvest -> 'epc_already_scanned', other -> 'epc_already_used_in_another_request')."""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+
+class HarvestBagStore:
+
+    def __init__(self, db):
+        self.db = db
+        self.bags = db[BAGS_COL]
+        self.parent = db[PARENT_COL]
+        self.epc_index = db[EPC_INDEX_COL]
+        self._ensure_indexes()
+
+    # -------------------------
+    # Indexes
+    # -------------------------
+    def _ensure_indexes(self) -> None:
+        try:
+            # partial: empty buckets have no bags.epc and must not collide on the unique key
+            self.bags.create_index([("bags.epc", ASCENDING)], unique=True, name="uq_bag_epc",
+                                   partialFilterExpression={"bags.epc": {"$exists": True}})
+            self.bags.create_index([("farmerId", ASCENDING), ("cropId", ASCENDING), ("count", ASCENDING)],
+                                   name="idx_owner_crop_count")
+            self.parent.create_index([("farmerId", ASCENDING), ("cropId", ASCENDING)])
+            # legacy lookups (pre-bucket docs)
+            self.parent.create_index([("rfidEpcs.epc", ASCENDING)])
+            self.parent.create_index([("rfidEpc", ASCENDING)])
+            self.epc_index.create_index([("farmerId", ASCENDING), ("cropId", ASCENDING)])
+        except Exception as e:
+            print(f"⚠️ harvest_bags index error: {e}")
+
+    # -------------------------
+    # Writes
+    # -------------------------
+    def add_bag(self, farmer_id: str, crop_id: str, epc: str, bag_qty: int = 0) -> int:
+        """
+        Atomic push into a non-full bucket (or a new one). Raises BagConflict on duplicates.
+        Returns scanned count for the harvest.
+        """
+        now = datetime.utcnow()
+        bag = {"epc": epc, "bagQty": int(bag_qty or 0), "added_at": now}
+
+        try:
+            # uq_bag_epc only compares documents, not entries inside one array: a bucket that
+            # already holds this EPC must not match, so the upsert inserts and hits the index
+            self.bags.update_one(
+                {"farmerId": farmer_id, "cropId": crop_id, "count": {"$lt": BUCKET_SIZE},
+                 "bags.epc": {"$ne": epc}},
+                {"$push": {"bags": bag},
+                 "$inc": {"count": 1},
+                 "$set": {"updated_at": now},
+                 "$setOnInsert": {"created_at": now}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            raise BagConflict(self._conflict_code(farmer_id, crop_id, epc))
+
+        # legacy embedded arrays are not covered by uq_bag_epc
+        if LEGACY_CHECK and self._legacy_owner(epc, exclude=(farmer_id, crop_id)):
+            self._pull_from_bucket(farmer_id, crop_id, epc)
+            raise BagConflict("epc_already_used_in_another_request")
+
+        parent = self._bump_parent(farmer_id, crop_id, +1, int(bag_qty or 0), first_epc=epc)
+        self._index_put(parent.get("_id"), farmer_id, crop_id, bag)
+        return int(parent.get("bagsScanned") or 0)
+
+    def remove_bag(self, farmer_id: str, crop_id: str, epc: str) -> Tuple[bool, int]:
+        """
+        Atomic pull from the bucket that holds this EPC. Returns (removed, scanned).
+        """
+        doc = self.bags.find_one_and_update(
+            {"farmerId": farmer_id, "cropId": crop_id, "bags.epc": epc},
+            {"$pull": {"bags": {"epc": epc}},
+             "$inc": {"count": -1},
+             "$set": {"updated_at": datetime.utcnow()}},
+            projection={"bags": {"$elemMatch": {"epc": epc}}},
+        )
+        if not doc:
+            # maybe a pre-bucket harvest -> drop from the embedded array
+            res = self.parent.update_one(
+                {"farmerId": farmer_id, "cropId": crop_id, "rfidEpcs.epc": epc},
+                {"$pull": {"rfidEpcs": {"epc": epc}}, "$set": {"updated_at": datetime.utcnow()}},
+            )
+            if res.modified_count:
+                self._index_drop(epc, farmer_id, crop_id)
+            return bool(res.modified_count), self.scanned_count(farmer_id, crop_id)
+
+        removed = (doc.get("bags") or [{}])[0]
+        parent = self._bump_parent(farmer_id, crop_id, -1, -int(removed.get("bagQty") or 0))
+        self._index_drop(epc, farmer_id, crop_id)
+        self.bags.delete_many({"farmerId": farmer_id, "cropId": crop_id, "count": {"$lte": 0}})
+        return True, int(parent.get("bagsScanned") or 0)
+
+    def _pull_from_bucket(self, farmer_id: str, crop_id: str, epc: str) -> None:
+        self.bags.update_one(
+            {"farmerId": farmer_id, "cropId": crop_id, "bags.epc": epc},
+            {"$pull": {"bags": {"epc": epc}}, "$inc": {"count": -1}},
+        )
+
+    def _bump_parent(self, farmer_id: str, crop_id: str, delta: int, units: int,
+                     first_epc: Optional[str] = None) -> Dict[str, Any]:
+        """
+        One pipeline update on the parent: counters + legacy bagQty/rfidEpc fields.
+        Returns {_id, bagsScanned}.
+        """
+        # counters start from the legacy embedded array when it was never migrated
+        legacy = {"$ifNull": ["$rfidEpcs", []]}
+        scanned = {"$max": [0, {"$add": [{"$ifNull": ["$bagsScanned", {"$size": legacy}]}, delta]}]}
+        stage: Dict[str, Any] = {
+            "bagsScanned": scanned,
+            "bagQty": scanned,
+            "bagUnits": {"$max": [0, {"$add": [{"$ifNull": ["$bagUnits", {"$sum": "$rfidEpcs.bagQty"}]}, units]}]},
+            "updated_at": "$$NOW",
+            "created_at": {"$ifNull": ["$created_at", "$$NOW"]},
+        }
+        if first_epc:
+            stage["rfidEpc"] = {"$cond": [
+                {"$gt": [{"$strLenCP": {"$ifNull": ["$rfidEpc", ""]}}, 0]}, "$rfidEpc", first_epc
+            ]}
+
+        doc = self.parent.find_one_and_update(
+            {"farmerId": farmer_id, "cropId": crop_id},
+            [{"$set": stage}],
+            upsert=True,
+            projection={"bagsScanned": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc or {}
+
+    # -------------------------
+    # EPC index
+    # -------------------------
+    def _index_put(self, harvest_id: Any, farmer_id: str, crop_id: str, bag: Dict[str, Any]) -> None:
+        try:
+            self.epc_index.replace_one(
+                {"_id": bag["epc"]},
+                {"harvestId": harvest_id, "farmerId": farmer_id, "cropId": crop_id,
+                 "bagQty": int(bag.get("bagQty") or 0), "added_at": bag.get("added_at")},
+                upsert=True,
+            )
+        except Exception as e:
+            # the index is derived data: a miss falls back to the bucket lookup and repairs it
+            print(f"⚠️ epc_index write failed for {bag.get('epc')}: {e}")
+
+    def _index_drop(self, epc: str, farmer_id: str, crop_id: str) -> None:
+        try:
+            self.epc_index.delete_one({"_id": epc, "farmerId": farmer_id, "cropId": crop_id})
+        except Exception as e:
+            print(f"⚠️ epc_index delete failed for {epc}: {e}")
+
+    def rebuild_epc_index(self, farmer_id: str, crop_id: str) -> int:
+        """Re-derives the index rows of one harvest from its buckets. Returns rows written."""
+        parent = self.parent.find_one({"farmerId": farmer_id, "cropId": crop_id}, {"_id": 1}) or {}
+        ops = [
+            ReplaceOne({"_id": b["epc"]},
+                       {"harvestId": parent.get("_id"), "farmerId": farmer_id, "cropId": crop_id,
+                        "bagQty": int(b.get("bagQty") or 0), "added_at": b.get("added_at")},
+                       upsert=True)
+            for b in self.list_bags(farmer_id, crop_id) if (b or {}).get("epc")
+        ]
+        self.epc_index.delete_many({"farmerId": farmer_id, "cropId": crop_id})
+        for start in range(0, len(ops), 1000):
+            self.epc_index.bulk_write(ops[start:start + 1000], ordered=False)
+        return len(ops)
+
+    # -------------------------
+    # Reads
+    # -------------------------
+    def list_bags(self, farmer_id: str, crop_id: str) -> List[Dict[str, Any]]:
+        # pre-bucket harvest: move the embedded array into buckets once (no-op afterwards)
+        if LEGACY_CHECK:
+            self.migrate_embedded(farmer_id, crop_id)
+
+        out: List[Dict[str, Any]] = []
+        cur = self.bags.find({"farmerId": farmer_id, "cropId": crop_id}, {"bags": 1}).sort([("_id", ASCENDING)])
+        for b in cur:
+            out.extend(b.get("bags") or [])
+        return out
+
+    def scanned_count(self, farmer_id: str, crop_id: str) -> int:
+        doc = self.parent.find_one({"farmerId": farmer_id, "cropId": crop_id},
+                                   {"bagsScanned": 1, "rfidEpcs": 1}) or {}
+        if doc.get("bagsScanned") is not None:
+            return int(doc.get("bagsScanned") or 0)
+        return len(doc.get("rfidEpcs") or [])
+
+    def find_by_epc(self, epc: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Point lookup on uq_bag_epc -> (parent harvest doc, matched bag).
+        """
+        hit = self.bags.find_one({"bags.epc": epc},
+                                 {"farmerId": 1, "cropId": 1, "bags": {"$elemMatch": {"epc": epc}}})
+        if hit:
+            parent = self.parent.find_one({"farmerId": hit.get("farmerId"), "cropId": hit.get("cropId")})
+            matched = (hit.get("bags") or [None])[0]
+            return parent, matched
+
+        # legacy: embedded array or single rfidEpc
+        doc = self.parent.find_one({"$or": [{"rfidEpcs.epc": epc}, {"rfidEpc": epc}]},
+                                   sort=[("updated_at", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
+        if not doc:
+            return None, None
+        matched = next((b for b in (doc.get("rfidEpcs") or []) if (b or {}).get("epc") == epc), None)
+        return doc, matched
+
+    def resolve(self, epc: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Same contract as find_by_epc, served from epc_index: two _id lookups, no array match.
+        """
+        row = self.epc_index.find_one({"_id": epc})
+        if row:
+            parent = self.parent.find_one({"_id": row.get("harvestId")})
+            if parent:
+                return parent, {"epc": epc, "bagQty": int(row.get("bagQty") or 0), "added_at": row.get("added_at")}
+
+        parent, matched = self.find_by_epc(epc)
+        if parent and matched:
+            # read-repair (bags added before the index existed, legacy arrays)
+            self._index_put(parent.get("_id"), parent.get("farmerId") or "", parent.get("cropId") or "",
+                            {**matched, "epc": epc})
+        return parent, matched
+
+    def epc_in_use_elsewhere(self, epc: str, farmer_id: str, crop_id: str) -> bool:
+        hit = self.bags.find_one({"bags.epc": epc}, {"farmerId": 1, "cropId": 1})
+        if hit:
+            return (hit.get("farmerId"), hit.get("cropId")) != (farmer_id, crop_id)
+        return LEGACY_CHECK and self._legacy_owner(epc, exclude=(farmer_id, crop_id))
+
+    def _legacy_owner(self, epc: str, exclude: Tuple[str, str]) -> bool:
+        farmer_id, crop_id = exclude
+        other = self.parent.find_one({
+            "$and": [
+                {"$or": [{"rfidEpcs.epc": epc}, {"rfidEpc": epc}]},
+                {"$or": [{"cropId": {"$ne": crop_id}}, {"farmerId": {"$ne": farmer_id}}]},
+            ]
+        }, {"_id": 1})
+        return bool(other)
+
+    def _conflict_code(self, farmer_id: str, crop_id: str, epc: str) -> str:
+        hit = self.bags.find_one({"bags.epc": epc}, {"farmerId": 1, "cropId": 1}) or {}
+        if (hit.get("farmerId"), hit.get("cropId")) == (farmer_id, crop_id):
+            return "epc_already_scanned"
+        return "epc_already_used_in_another_request"
+
+    # -------------------------
+    # Migration (pre-bucket docs)
+    # -------------------------
+    def migrate_embedded(self, farmer_id: str, crop_id: str) -> int:
+        """
+        Moves a legacy rfidEpcs array into buckets and unsets it. Returns bags moved.
+        """
+        doc = self.parent.find_one({"farmerId": farmer_id, "cropId": crop_id}, {"rfidEpcs": 1}) or {}
+        # legacy arrays were never deduped; keep the first copy of each EPC
+        legacy: List[Dict[str, Any]] = []
+        seen = set()
+        for b in doc.get("rfidEpcs") or []:
+            epc = (b or {}).get("epc")
+            if epc and epc not in seen:
+                seen.add(epc)
+                legacy.append(b)
+        if not legacy:
+            return 0
+
+        now = datetime.utcnow()
+        moved = 0
+        for start in range(0, len(legacy), BUCKET_SIZE):
+            chunk = legacy[start:start + BUCKET_SIZE]
+            try:
+                self.bags.insert_one({"farmerId": farmer_id, "cropId": crop_id, "count": len(chunk),
+                                      "bags": chunk, "created_at": now, "updated_at": now})
+                moved += len(chunk)
+            except DuplicateKeyError:
+                # some EPC already bucketed -> fall back to per-bag adds for this chunk
+                for b in chunk:
+                    try:
+                        self.bags.update_one(
+                            {"farmerId": farmer_id, "cropId": crop_id, "count": {"$lt": BUCKET_SIZE},
+                             "bags.epc": {"$ne": b["epc"]}},
+                            {"$push": {"bags": b}, "$inc": {"count": 1}, "$set": {"updated_at": now}},
+                            upsert=True,
+                        )
+                        moved += 1
+                    except DuplicateKeyError:
+                        continue
+
+        # recount from buckets (bags may have been added before the migration ran)
+        agg = list(self.bags.aggregate([
+            {"$match": {"farmerId": farmer_id, "cropId": crop_id}},
+            {"$unwind": "$bags"},
+            {"$group": {"_id": None, "n": {"$sum": 1}, "units": {"$sum": {"$ifNull": ["$bags.bagQty", 0]}}}},
+        ]))
+        total = agg[0] if agg else {"n": 0, "units": 0}
+        self.parent.update_one(
+            {"farmerId": farmer_id, "cropId": crop_id},
+            {"$unset": {"rfidEpcs": ""},
+             "$set": {"bagsScanned": int(total["n"]), "bagQty": int(total["n"]),
+                      "bagUnits": int(total["units"]), "updated_at": now}},
+        )
+        self.rebuild_epc_index(farmer_id, crop_id)
+        return moved
+
+
+def bag_summary(parent: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """{bags, units} of a harvest from the parent counters (legacy array as fallback)."""
+    parent = parent or {}
+    legacy = [b for b in (parent.get("rfidEpcs") or []) if b]
+    bags = parent.get("bagsScanned")
+    units = parent.get("bagUnits")
+    if bags is None:
+        bags = len(legacy)
+    if units is None:
+        units = sum(int(b.get("bagQty") or 0) for b in legacy)
+    return {"bags": int(bags or 0), "units": int(units or 0)}
+
+
+# ------------------------------------------------------------
+# One store per database
+# ------------------------------------------------------------
+_STORES: Dict[int, HarvestBagStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_bag_store(db) -> HarvestBagStore:
+    key = id(db)
+    store = _STORES.get(key)
+    if store is None:
+        with _STORES_LOCK:
+            store = _STORES.get(key)
+            if store is None:
+                store = HarvestBagStore(db)
+                _STORES[key] = store
+    return store
+
+
+__all__ = ["HarvestBagStore", "BagConflict", "get_bag_store", "bag_summary", "BUCKET_SIZE"]
@@ -6,8 +6,8 @@ from typing import Any, Dict
 from backend.blockchain import register_crop_onchain, register_harvest_onchain
 from backend.models.farmer.harvest_record import HarvestRecordModel
 from backend.mongo import mongo
-import qrcode
-import os
+from backend.utils.status_events import watch_tx
+from backend.services.qr.qr_service import load, qr_images, remember
 
 
 class HarvestService:
@@ -26,19 +26,12 @@ class HarvestService:
 
         mongo.db.harvest_batches.insert_one(doc)
 
-        # generate QR
+        # generate QR (in memory, content-addressed; no file written on this path)
         qr_url = f"/farmer/harvest/qr/download/{batch_id}"
-        os.makedirs("static/qrcodes", exist_ok=True)
-        file_path = f"static/qrcodes/{batch_id}.png"
-        qrcode.make(qr_url).save(file_path)
+        img = qr_images.render(qr_url)
+        remember(mongo.db, img, {"batchId": batch_id, "farmerId": farmer_id, "path": img.url})
 
-        mongo.db.qr_codes.insert_one({
-            "batchId": batch_id,
-            "farmerId": farmer_id,
-            "path": file_path
-        })
-
-        return {"ok": True, "batchId": batch_id}
+        return {"ok": True, "batchId": batch_id, "qr": img.url}
 
     @staticmethod
     def get_qr_labels(farmer_id: str):
@@ -51,10 +44,16 @@ class HarvestService:
 
     @staticmethod
     def download_qr(batch_id: str):
-        path = f"static/qrcodes/{batch_id}.png"
-        if not os.path.exists(path):
+        doc = mongo.db.qr_codes.find_one({"batchId": batch_id}, {"_id": 1, "path": 1})
+        if not doc:
             return {"ok": False, "err": "QR not found"}
-        return {"ok": True, "file": path}
+        if not isinstance(doc["_id"], str):
+            # labels recorded before content-addressed QR: file on disk
+            return {"ok": True, "file": doc.get("path")}
+        img = load(mongo.db, doc["_id"])
+        if img is None:
+            return {"ok": False, "err": "QR not found"}
+        return {"ok": True, "file": img.url, "key": img.key}
 
     @staticmethod
     def list_bags(farmer_id: str):
@@ -130,7 +129,20 @@ class HarvestService:
 
         mongo.db.harvest_batches.update_one(
             {"_id": insert_res.inserted_id},
-            {"$set": {"txHash": tx_hash, "updated_at": datetime.now(timezone.utc)}},
+            {"$set": {"txHash": tx_hash, "chainStatus": "submitted", "updated_at": datetime.now(timezone.utc)}},
+        )
+
+        def _on_receipt(result):
+            mongo.db.harvest_batches.update_one(
+                {"_id": insert_res.inserted_id},
+                {"$set": {"chainStatus": result["status"], "updated_at": datetime.now(timezone.utc)}},
+            )
+
+        # mined / failed is pushed on the user's status stream (/api/status/stream)
+        watch_tx(
+            tx_hash, model.farmerId, "harvest",
+            {"cropId": model.cropId, "harvestId": str(insert_res.inserted_id)},
+            on_done=_on_receipt,
         )
 
         return {
@@ -138,4 +150,5 @@ class HarvestService:
             "harvestId": str(insert_res.inserted_id),
             "cropId": model.cropId,
             "txHash": tx_hash,
+            "txStatus": "submitted",
         }
@@ -6,10 +6,10 @@ from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
 from werkzeug.utils import secure_filename
-from flask_bcrypt import Bcrypt
 from flask import current_app
 
 from backend.mongo import mongo
+from backend.utils.passwords import PasswordPoolBusy, hash_password, verify_password
 
 
 ALLOWED_DOC_KEYS = {"aadhaar", "khasar"}
@@ -100,8 +100,6 @@ class SettingsService:
         This assumes your main backend Mongo 'users' doc stores 'password' hash (bcrypt).
         If password is stored ONLY in auth_api, then instead call auth_api endpoint here.
         """
-        bcrypt = Bcrypt(current_app)
-
         u = mongo.db.users.find_one({"userId": user_id})
         if not u:
             return {"ok": False, "message": "User not found"}
@@ -110,13 +108,16 @@ class SettingsService:
         if not hashed:
             return {"ok": False, "message": "Password not available in this service"}
 
-        if not bcrypt.check_password_hash(hashed, current_password or ""):
-            return {"ok": False, "message": "Current password is incorrect"}
+        try:
+            if not verify_password(current_password or "", hashed):
+                return {"ok": False, "message": "Current password is incorrect"}
 
-        if len(new_password or "") < 6:
-            return {"ok": False, "message": "New password must be at least 6 characters"}
+            if len(new_password or "") < 6:
+                return {"ok": False, "message": "New password must be at least 6 characters"}
 
-        new_hash = bcrypt.generate_password_hash(new_password).decode("utf-8")
+            new_hash = hash_password(new_password)
+        except PasswordPoolBusy:
+            return {"ok": False, "message": "Server busy, please retry"}
 
         mongo.db.users.update_one(
             {"userId": user_id},
@@ -0,0 +1,385 @@
+# backend/services/qr/label_sheets.py
+#
+# Batch QR labels rendered across a process pool and streamed as ZIP or PDF.
+#
+#   items = batch_items("MFG-B12", {"cropId": "CROP-1", ...}, count=1000)
+#   for chunk in stream_zip(items):  ...   # one PNG label per unit (QR + caption)
+#   for chunk in stream_pdf(items):  ...   # print-ready A4 sheets, cols x rows grid
+#
+# - The work unit is one page (cols * rows labels); pages are rendered in a
+#   spawn-started ProcessPoolExecutor (QR_SHEET_WORKERS, 0 = inline) and
+#   consumed in order through a window of at most 2 * workers pages, so memory
+#   stays flat whether the batch is 50 labels or 50,000.
+# - Nothing is written to disk: ZIP entries and PDF objects are emitted as
+#   soon as their page arrives (ZIP with data descriptors, PDF with the xref
+#   written last).
+# - `job` (status_events.Job) gets one advance per label.
+# - At most QR_BATCH_CONCURRENCY batches stream at once per process (one per
+#   user): batch_slot() hands out a release callback or None -> 503.
+
+from __future__ import annotations
+
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    import qrcode
+    import qrcode.constants
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # optional at import time; rendering raises without them
+    qrcode = None
+    Image = ImageDraw = ImageFont = None
+
+# ------------------------------------------------------------
+# Config
+# ------------------------------------------------------------
+WORKERS = int(os.getenv("QR_SHEET_WORKERS", str(max(1, (multiprocessing.cpu_count() or 2) - 1))))
+START_METHOD = os.getenv("QR_SHEET_POOL_START", "spawn")
+BATCH_MAX = int(os.getenv("QR_BATCH_MAX", "20000"))
+# batches streaming at once per process; they all share the one sheet pool
+BATCH_CONCURRENCY = max(1, int(os.getenv("QR_BATCH_CONCURRENCY", "2")))
+TRACE_BASE_URL = os.getenv("QR_TRACE_BASE_URL", "http://localhost:5000").rstrip("/")
+
+# A4 in PDF points; raster resolution of a sheet
+A4_POINTS = (595.28, 841.89)
+SHEET_DPI = int(os.getenv("QR_SHEET_DPI", "200"))
+FONT_PATH = os.getenv("QR_LABEL_FONT", "arial.ttf")
+
+
+def default_layout(cols: int = 4, rows: int = 6, dpi: int = SHEET_DPI, title: str = "") -> Dict[str, Any]:
+    cols = max(1, min(int(cols or 4), 10))
+    rows = max(1, min(int(rows or 6), 14))
+    dpi = max(72, min(int(dpi or SHEET_DPI), 600))
+    return {
+        "cols": cols,
+        "rows": rows,
+        "dpi": dpi,
+        "title": str(title or "")[:120],
+        "width": int(A4_POINTS[0] / 72 * dpi),
+        "height": int(A4_POINTS[1] / 72 * dpi),
+    }
+
+
+def batch_items(base_code: str, template: Dict[str, Any], count: int,
+                base_url: str = TRACE_BASE_URL) -> Iterator[Dict[str, Any]]:
+    """
+    Same numbering as product_qrcode.generate_batch_qr_codes: <base>-1 .. <base>-count.
+    Each label's QR carries the crop trace URL plus its own batch number.
+    """
+    crop_id = (template or {}).get("cropId", "")
+    for i in range(1, max(0, int(count or 0)) + 1):
+        batch_no = f"{base_code}-{i}"
+        yield {
+            "text": f"{base_url}/track?crop_id={crop_id}&batch={batch_no}",
+            "caption": batch_no,
+            "sub": (template or {}).get("productName") or crop_id,
+        }
+
+
+# ------------------------------------------------------------
+# Worker side (module level -> picklable)
+# ------------------------------------------------------------
+_FONTS: Dict[int, Any] = {}
+
+
+def _font(size: int):
+    f = _FONTS.get(size)
+    if f is None:
+        try:
+            f = ImageFont.truetype(FONT_PATH, size)
+        except Exception:
+            try:
+                f = ImageFont.load_default(size)
+            except TypeError:  # Pillow < 10.1
+                f = ImageFont.load_default()
+        _FONTS[size] = f
+    return f
+
+
+def _qr_image(text: str, size: int):
+    """QR as an L image of `size` px: module matrix scaled with NEAREST (no per-module drawing)."""
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=2)
+    qr.add_data(text)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    n = len(matrix)
+    raw = bytes(0 if cell else 255 for row in matrix for cell in row)
+    return Image.frombytes("L", (n, n), raw).resize((size, size), Image.NEAREST)
+
+
+def _draw_centered(draw, text: str, cx: int, y: int, font) -> None:
+    if not text:
+        return
+    box = draw.textbbox((0, 0), text, font=font)
+    draw.text((cx - (box[2] - box[0]) // 2, y), text, fill=0, font=font)
+
+
+def _label(item: Dict[str, Any], qr_size: int, font_size: int):
+    pad = font_size // 2
+    caption_h = (font_size + pad) * (2 if item.get("sub") else 1) + pad
+    img = Image.new("L", (qr_size, qr_size + caption_h), 255)
+    img.paste(_qr_image(item["text"], qr_size), (0, 0))
+    draw = ImageDraw.Draw(img)
+    _draw_centered(draw, item.get("caption") or "", qr_size // 2, qr_size + pad // 2, _font(font_size))
+    if item.get("sub"):
+        _draw_centered(draw, str(item["sub"])[:40], qr_size // 2, qr_size + font_size + pad,
+                       _font(max(8, font_size * 3 // 4)))
+    return img
+
+
+def render_labels(items: List[Dict[str, Any]], layout: Dict[str, Any]) -> List[Tuple[str, bytes]]:
+    """One PNG per label (ZIP output): [(filename, png), ...]."""
+    qr_size = max(120, layout["dpi"] * 3 // 2)
+    font_size = max(10, qr_size // 14)
+    out = []
+    for item in items:
+        buf = io.BytesIO()
+        _label(item, qr_size, font_size).save(buf, format="PNG", optimize=False)
+        out.append((f"{item.get('caption') or 'label'}.png", buf.getvalue()))
+    return out
+
+
+def render_page(items: List[Dict[str, Any]], layout: Dict[str, Any], page_no: int = 1) -> Tuple[int, int, bytes]:
+    """One A4 sheet (PDF output) -> (width, height, zlib-compressed 8-bit gray pixels)."""
+    w, h, cols, rows = layout["width"], layout["height"], layout["cols"], layout["rows"]
+    margin = layout["dpi"] // 3
+    header = layout["dpi"] // 4 if layout.get("title") else 0
+    cell_w = (w - 2 * margin) // cols
+    cell_h = (h - 2 * margin - header) // rows
+    font_size = max(8, cell_h // 14)
+    caption_h = (font_size + font_size // 2) * 2 + font_size // 2
+    qr_size = max(40, min(cell_w, cell_h - caption_h) - font_size)
+
+    page = Image.new("L", (w, h), 255)
+    draw = ImageDraw.Draw(page)
+    if header:
+        draw.text((margin, margin // 2), f"{layout['title']}  ·  page {page_no}", fill=0,
+                  font=_font(max(10, header // 2)))
+
+    for i, item in enumerate(items[:cols * rows]):
+        r, c = divmod(i, cols)
+        x = margin + c * cell_w + (cell_w - qr_size) // 2
+        y = margin + header + r * cell_h + font_size // 2
+        page.paste(_label(item, qr_size, font_size), (x, y))
+
+    return w, h, zlib.compress(page.tobytes(), 6)
+
+
+# ------------------------------------------------------------
+# Pool
+# ------------------------------------------------------------
+class SheetRenderer:
+    def __init__(self, size: int = WORKERS):
+        self.size = max(0, size)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.pages = 0
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.size == 0:
+            return None
+        pid = os.getpid()
+        with self._lock:
+            if self._pool is None or self._pid != pid:
+                try:
+                    ctx = multiprocessing.get_context(START_METHOD)
+                    self._pool = ProcessPoolExecutor(max_workers=self.size, mp_context=ctx)
+                    self._pid = pid
+                except Exception as e:
+                    print(f"⚠️ QR sheet pool unavailable, rendering inline: {e}")
+                    self.size = 0
+                    return None
+            return self._pool
+
+    def submit(self, fn, *args) -> Future:
+        ex = self._executor()
+        if ex is not None:
+            try:
+                return ex.submit(fn, *args)
+            except BrokenProcessPool:
+                with self._lock:
+                    self._pool = None
+        f: Future = Future()
+        try:
+            f.set_result(fn(*args))
+        except Exception as e:
+            f.set_exception(e)
+        return f
+
+    def map_ordered(self, fn, chunks: Iterable[List[Dict[str, Any]]], *args) -> Iterator[Tuple[List[Dict[str, Any]], Any]]:
+        """fn(chunk, *args, page_no) over chunks, results in order, at most 2 * workers in flight."""
+        window = max(1, self.size * 2)
+        pending: Deque[Tuple[List[Dict[str, Any]], Future]] = deque()
+        for page_no, chunk in enumerate(chunks, 1):
+            pending.append((chunk, self.submit(fn, chunk, *args, page_no)))
+            if len(pending) >= window:
+                c, f = pending.popleft()
+                self.pages += 1
+                yield c, f.result()
+        while pending:
+            c, f = pending.popleft()
+            self.pages += 1
+            yield c, f.result()
+
+    def stats(self) -> Dict[str, int]:
+        return {"workers": self.size, "pages": self.pages}
+
+
+sheet_renderer = SheetRenderer()
+
+
+def _chunks(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _render_labels_task(items, layout, _page_no):
+    return render_labels(items, layout)
+
+
+# ------------------------------------------------------------
+# Streaming writers
+# ------------------------------------------------------------
+class _Sink(io.RawIOBase):
+    """Unseekable byte sink: zipfile falls back to data descriptors, we drain it after each entry."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def take(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+_batch_lock = threading.Lock()
+_batch_users: Set[str] = set()
+
+
+def batch_slot(user_id: str) -> Optional[Callable[[], None]]:
+    """
+    Reserve one of the BATCH_CONCURRENCY slots for `user_id` (one batch per user).
+    Returns an idempotent release callback, or None when busy.
+    """
+    with _batch_lock:
+        if user_id in _batch_users or len(_batch_users) >= BATCH_CONCURRENCY:
+            return None
+        _batch_users.add(user_id)
+    released = False
+
+    def release() -> None:
+        nonlocal released
+        with _batch_lock:
+            if not released:
+                released = True
+                _batch_users.discard(user_id)
+
+    return release
+
+
+def stream_zip(items: Iterable[Dict[str, Any]], layout: Optional[Dict[str, Any]] = None,
+               job=None, renderer: SheetRenderer = sheet_renderer) -> Iterator[bytes]:
+    layout = layout or default_layout()
+    sink = _Sink()
+    per_task = layout["cols"] * layout["rows"]
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for chunk, labels in renderer.map_ordered(_render_labels_task, _chunks(items, per_task), layout):
+            for name, png in labels:
+                zf.writestr(name, png)  # PNG is already deflated
+            if job is not None:
+                job.advance(len(chunk))
+            data = sink.take()
+            if data:
+                yield data
+    data = sink.take()
+    if data:
+        yield data
+
+
+def stream_pdf(items: Iterable[Dict[str, Any]], layout: Optional[Dict[str, Any]] = None,
+               job=None, renderer: SheetRenderer = sheet_renderer) -> Iterator[bytes]:
+    """
+    Minimal PDF 1.4 written front to back: per page an image XObject (Flate,
+    DeviceGray), its content stream and the page object; Pages/Catalog and
+    the xref table go last once every offset is known.
+    """
+    layout = layout or default_layout()
+    per_page = layout["cols"] * layout["rows"]
+    pw, ph = A4_POINTS
+    offsets: Dict[int, int] = {}
+    pos = 0
+    kids: List[int] = []
+    next_obj = 3  # 1 = catalog, 2 = pages
+
+    def obj(num: int, body: bytes) -> bytes:
+        nonlocal pos
+        offsets[num] = pos
+        data = b"%d 0 obj\n" % num + body + b"\nendobj\n"
+        pos += len(data)
+        return data
+
+    head = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    pos = len(head)
+    yield head
+
+    for chunk, (w, h, pixels) in renderer.map_ordered(render_page, _chunks(items, per_page), layout):
+        img_n, content_n, page_n = next_obj, next_obj + 1, next_obj + 2
+        next_obj += 3
+        content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (pw, ph)
+        out = obj(img_n, b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                         b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n"
+                  % (w, h, len(pixels)) + pixels + b"\nendstream")
+        out += obj(content_n, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        out += obj(page_n, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+                           b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+                   % (pw, ph, img_n, content_n))
+        kids.append(page_n)
+        if job is not None:
+            job.advance(len(chunk))
+        yield out
+
+    out = obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>"
+              % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+    out += obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    xref_at = pos
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % next_obj
+    out += b"".join(b"%010d 00000 n \n" % offsets.get(n, 0) for n in range(1, next_obj))
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (next_obj, xref_at)
+    yield out
+
+
+__all__ = [
+    "default_layout",
+    "batch_items",
+    "render_labels",
+    "render_page",
+    "SheetRenderer",
+    "sheet_renderer",
+    "stream_zip",
+    "stream_pdf",
+    "batch_slot",
+    "BATCH_MAX",
+    "BATCH_CONCURRENCY",
+]
@@ -0,0 +1,273 @@
+# backend/services/qr/qr_decode.py
+#
+# Batch QR decoding for shipment label photos.
+#
+#   results = decode_many([("img1.jpg", raw_bytes), ...])          # uploads
+#   results = decode_many(iter_dir("shipment-42"))                 # directory under QR_DECODE_ROOT
+#   report  = match_results(results, expected)                     # qr_utils.match_data per code
+#
+# - Images are decoded on a spawn-started process pool (QR_DECODE_WORKERS,
+#   0 = inline). Each worker builds its cv2.QRCodeDetector once (pool
+#   initializer) and reuses it for every image it gets.
+# - Preprocessing: decode straight to grayscale (IMREAD_GRAYSCALE), downscale
+#   so the long side is <= QR_DECODE_MAX_SIDE; full resolution is retried only
+#   when the downscaled image finds nothing.
+# - detectAndDecodeMulti first (label sheets carry many codes), single-code
+#   detectAndDecode as fallback.
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:  # optional at import time; decoding raises without them
+    cv2 = None
+    np = None
+
+# ------------------------------------------------------------
+# Config
+# ------------------------------------------------------------
+WORKERS = int(os.getenv("QR_DECODE_WORKERS", str(max(1, (multiprocessing.cpu_count() or 2) - 1))))
+START_METHOD = os.getenv("QR_DECODE_POOL_START", "spawn")
+MAX_SIDE = int(os.getenv("QR_DECODE_MAX_SIDE", "1600"))
+MAX_IMAGES = int(os.getenv("QR_DECODE_MAX_IMAGES", "500"))
+# directory input is only accepted below this root (empty = disabled)
+DECODE_ROOT = os.getenv("QR_DECODE_ROOT", "")
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff")
+
+Source = Union[str, Tuple[str, bytes]]
+
+
+# ------------------------------------------------------------
+# Worker side (module level -> picklable)
+# ------------------------------------------------------------
+_DETECTOR = None
+
+
+def _init_worker() -> None:
+    global _DETECTOR
+    if cv2 is not None:
+        cv2.setNumThreads(1)  # parallelism comes from the pool, not OpenCV threads
+        _DETECTOR = cv2.QRCodeDetector()
+
+
+def _detector():
+    global _DETECTOR
+    if _DETECTOR is None:
+        _DETECTOR = cv2.QRCodeDetector()
+    return _DETECTOR
+
+
+def _load(source: Source, gray: bool):
+    flag = cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR
+    if isinstance(source, tuple):
+        buf = np.frombuffer(source[1], dtype=np.uint8)
+    else:
+        buf = np.fromfile(source, dtype=np.uint8)
+    return cv2.imdecode(buf, flag)
+
+
+def _downscale(img, max_side: int):
+    h, w = img.shape[:2]
+    side = max(h, w)
+    if not max_side or side <= max_side:
+        return img, 1.0
+    scale = max_side / side
+    return cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA), scale
+
+
+def _detect(img, multi: bool) -> List[str]:
+    det = _detector()
+    if multi:
+        try:
+            ok, texts, _points, _ = det.detectAndDecodeMulti(img)
+        except cv2.error:
+            ok, texts = False, ()
+        found = [t for t in (texts or ()) if t] if ok else []
+        if found:
+            return found
+    text, _points, _ = det.detectAndDecode(img)
+    return [text] if text else []
+
+
+def _parse(text: str) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def decode_one(source: Source, gray: bool = True, max_side: int = MAX_SIDE, multi: bool = True) -> Dict[str, Any]:
+    name = source[0] if isinstance(source, tuple) else os.path.basename(source)
+    started = time.perf_counter()
+    out: Dict[str, Any] = {"source": name, "codes": []}
+    try:
+        img = _load(source, gray)
+        if img is None:
+            out["error"] = "unreadable_image"
+        else:
+            small, scale = _downscale(img, max_side)
+            texts = _detect(small, multi)
+            if not texts and scale < 1.0:
+                texts = _detect(img, multi)  # small codes can vanish when downscaled
+            # one sheet can show the same code twice (reflections, overlaps)
+            out["codes"] = [{"text": t, "data": _parse(t)} for t in dict.fromkeys(texts)]
+    except Exception as e:
+        out["error"] = str(e)[:200]
+    out["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return out
+
+
+# ------------------------------------------------------------
+# Pool
+# ------------------------------------------------------------
+class DecodePool:
+    def __init__(self, size: int = WORKERS):
+        self.size = max(0, size)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.images = 0
+        self.codes = 0
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.size == 0:
+            return None
+        pid = os.getpid()
+        with self._lock:
+            if self._pool is None or self._pid != pid:
+                try:
+                    ctx = multiprocessing.get_context(START_METHOD)
+                    self._pool = ProcessPoolExecutor(max_workers=self.size, mp_context=ctx,
+                                                     initializer=_init_worker)
+                    self._pid = pid
+                except Exception as e:
+                    print(f"⚠️ QR decode pool unavailable, decoding inline: {e}")
+                    self.size = 0
+                    return None
+            return self._pool
+
+    def decode(self, sources: Iterable[Source], gray: bool = True, max_side: int = MAX_SIDE,
+               multi: bool = True) -> Iterator[Dict[str, Any]]:
+        """Results in input order; at most 4 * workers images in flight."""
+        if cv2 is None:
+            raise RuntimeError("opencv-python is not installed")
+        ex = self._executor()
+        if ex is None:
+            for s in sources:
+                yield self._count(decode_one(s, gray, max_side, multi))
+            return
+
+        window = self.size * 4
+        pending = []
+        try:
+            for s in sources:
+                pending.append(ex.submit(decode_one, s, gray, max_side, multi))
+                if len(pending) >= window:
+                    yield self._count(pending.pop(0).result())
+            for f in pending:
+                yield self._count(f.result())
+        except BrokenProcessPool:
+            with self._lock:
+                self._pool = None
+            raise
+
+    def _count(self, res: Dict[str, Any]) -> Dict[str, Any]:
+        self.images += 1
+        self.codes += len(res.get("codes") or ())
+        return res
+
+    def stats(self) -> Dict[str, int]:
+        return {"workers": self.size, "images": self.images, "codes": self.codes}
+
+
+decode_pool = DecodePool()
+
+
+def decode_many(sources: Iterable[Source], gray: bool = True, max_side: int = MAX_SIDE,
+                multi: bool = True) -> List[Dict[str, Any]]:
+    return list(decode_pool.decode(sources, gray, max_side, multi))
+
+
+def iter_dir(path: str, root: str = DECODE_ROOT, limit: int = MAX_IMAGES) -> Iterator[str]:
+    """Image files directly under `path`, which must resolve inside `root`."""
+    if not root:
+        raise PermissionError("directory input disabled (QR_DECODE_ROOT not set)")
+    real_root = os.path.realpath(root)
+    real = os.path.realpath(os.path.join(real_root, path))
+    if os.path.commonpath([real_root, real]) != real_root or not os.path.isdir(real):
+        raise PermissionError("directory outside QR_DECODE_ROOT")
+    n = 0
+    for entry in sorted(os.scandir(real), key=lambda e: e.name):
+        if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTS):
+            yield entry.path
+            n += 1
+            if n >= limit:
+                return
+
+
+# ------------------------------------------------------------
+# Matching (existing qr_utils.match_data rules)
+# ------------------------------------------------------------
+def match_results(results: List[Dict[str, Any]], expected: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    expected: {cropId, cropType, harvestQuantity, packagingType, manufacturerId}
+    Every decoded JSON code is compared with qr_utils.match_data.
+    """
+    from qr_utils import match_data
+
+    matched = mismatched = undecoded = 0
+    for res in results:
+        if not res.get("codes"):
+            undecoded += 1
+        for code in res.get("codes") or ():
+            data = code.get("data")
+            if data is None:
+                code["match"] = {"status": "invalid", "message": "QR payload is not JSON"}
+            else:
+                try:
+                    code["match"] = match_data(
+                        data,
+                        expected.get("cropId"),
+                        expected.get("cropType"),
+                        expected.get("harvestQuantity"),
+                        expected.get("packagingType"),
+                        expected.get("manufacturerId"),
+                    )
+                except (TypeError, ValueError) as e:
+                    code["match"] = {"status": "mismatch", "message": f"Harvest Quantity unreadable: {e}"}
+            if code["match"]["status"] == "match":
+                matched += 1
+            else:
+                mismatched += 1
+    return {
+        "images": len(results),
+        "codes": matched + mismatched,
+        "matched": matched,
+        "mismatched": mismatched,
+        "undecoded": undecoded,
+        "allMatched": mismatched == 0 and undecoded == 0 and matched > 0,
+        "results": results,
+    }
+
+
+__all__ = [
+    "decode_one",
+    "DecodePool",
+    "decode_pool",
+    "decode_many",
+    "iter_dir",
+    "match_results",
+    "MAX_IMAGES",
+]
@@ -0,0 +1,344 @@
+# backend/services/qr/qr_service.py
+#
+# Content-addressed QR rendering.
+#
+#   img = qr_images.render(payload, box_size=10, border=4, ecc="L")
+#   img.key            # sha256(payload + options) -> same input, same key, no re-render
+#   img.data           # PNG bytes (rendered in memory, never via a temp file)
+#   qr_images.get(key) # memory -> disk -> None
+#   remember(db, img, meta)   # qr_codes {_id: key, payload, opts}: lets any process re-render
+#
+# Tiers:
+#   - memory: LRU bounded by QR_MEM_CACHE_BYTES
+#   - disk:   QR_CACHE_DIR/<key>.png written by one background thread (off the
+#             request path), pruned to QR_DISK_MAX_FILES oldest-first
+# Images are immutable per key, so they are served with a strong ETag (the key)
+# and a year-long immutable Cache-Control.
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import qrcode
+    import qrcode.constants
+except ImportError:  # optional at import time; render_png raises without it
+    qrcode = None
+
+# ------------------------------------------------------------
+# Config
+# ------------------------------------------------------------
+MEM_CACHE_BYTES = int(os.getenv("QR_MEM_CACHE_BYTES", str(32 * 1024 * 1024)))
+CACHE_DIR = os.getenv("QR_CACHE_DIR", os.path.join("static", "qrcodes", "cache"))
+DISK_MAX_FILES = int(os.getenv("QR_DISK_MAX_FILES", "20000"))
+DISK_QUEUE_LIMIT = int(os.getenv("QR_DISK_QUEUE_LIMIT", "1000"))
+PRUNE_EVERY = 200  # disk writes between prune passes
+
+QR_COL = "qr_codes"
+IMAGE_URL = "/qr/img/{key}.png"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# bumped when rendering changes, so old keys are not served for new output
+RENDER_VERSION = 1
+
+_ECC = {"L": "ERROR_CORRECT_L", "M": "ERROR_CORRECT_M", "Q": "ERROR_CORRECT_Q", "H": "ERROR_CORRECT_H"}
+
+
+def normalize_options(box_size: Any = 10, border: Any = 4, ecc: Any = "L",
+                      fill: Any = "black", back: Any = "white") -> Dict[str, Any]:
+    """Clamped, canonical render options (part of the cache key)."""
+    try:
+        box_size = max(1, min(int(box_size), 40))
+    except (TypeError, ValueError):
+        box_size = 10
+    try:
+        border = max(0, min(int(border), 16))
+    except (TypeError, ValueError):
+        border = 4
+    ecc = str(ecc or "L").upper()[:1]
+    if ecc not in _ECC:
+        ecc = "L"
+    return {
+        "box_size": box_size,
+        "border": border,
+        "ecc": ecc,
+        "fill": str(fill or "black")[:32],
+        "back": str(back or "white")[:32],
+    }
+
+
+def payload_text(payload: Any) -> str:
+    """Dict/list payloads are encoded canonically so key order doesn't change the key."""
+    if isinstance(payload, (dict, list)):
+        return json.dumps(payload, separators=(",", ":"), sort_keys=True, default=str)
+    return str(payload)
+
+
+def qr_key(text: str, opts: Dict[str, Any]) -> str:
+    h = hashlib.sha256()
+    h.update(f"v{RENDER_VERSION}|".encode())
+    h.update(json.dumps(opts, sort_keys=True, separators=(",", ":")).encode())
+    h.update(b"|")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()[:40]
+
+
+def valid_key(key: str) -> bool:
+    return len(key or "") == 40 and all(c in "0123456789abcdef" for c in key)
+
+
+def render_png(text: str, opts: Dict[str, Any]) -> bytes:
+    if qrcode is None:
+        raise RuntimeError("qrcode is not installed")
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=getattr(qrcode.constants, _ECC[opts["ecc"]]),
+        box_size=opts["box_size"],
+        border=opts["border"],
+    )
+    qr.add_data(text)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color=opts["fill"], back_color=opts["back"])
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class QRImage:
+    __slots__ = ("key", "data", "text", "opts", "cached")
+
+    content_type = "image/png"
+
+    def __init__(self, key: str, data: bytes, text: str = "", opts: Optional[Dict[str, Any]] = None,
+                 cached: bool = False):
+        self.key = key
+        self.data = data
+        self.text = text
+        self.opts = opts or {}
+        self.cached = cached
+
+    @property
+    def etag(self) -> str:
+        return self.key
+
+    @property
+    def url(self) -> str:
+        return IMAGE_URL.format(key=self.key)
+
+
+# ------------------------------------------------------------
+# Cache
+# ------------------------------------------------------------
+class QRImageCache:
+    def __init__(self, max_bytes: int = MEM_CACHE_BYTES, cache_dir: Optional[str] = CACHE_DIR,
+                 disk_max_files: int = DISK_MAX_FILES):
+        self.max_bytes = max(0, max_bytes)
+        self.cache_dir = cache_dir or None
+        self.disk_max_files = disk_max_files
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+
+        self._disk_q: "queue.Queue[Tuple[str, bytes]]" = queue.Queue(maxsize=DISK_QUEUE_LIMIT)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._writes_since_prune = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+        self.disk_writes = 0
+        self.disk_dropped = 0
+
+    # -------------------------
+    # Memory tier
+    # -------------------------
+    def _mem_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+            return data
+
+    def _mem_put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            self._mem[key] = data
+            self._mem_bytes += len(data)
+            while self._mem_bytes > self.max_bytes and self._mem:
+                _, evicted = self._mem.popitem(last=False)
+                self._mem_bytes -= len(evicted)
+
+    # -------------------------
+    # Disk tier
+    # -------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _ensure_thread(self) -> None:
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._disk_loop, name="qr-disk-cache", daemon=True)
+            self._thread.start()
+
+    def _disk_put_async(self, key: str, data: bytes) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            self._disk_q.put_nowait((key, data))
+        except queue.Full:
+            self.disk_dropped += 1  # memory tier still has it; disk is best-effort
+            return
+        self._ensure_thread()
+
+    def _disk_loop(self) -> None:
+        while True:
+            key, data = self._disk_q.get()
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                path = self._path(key)
+                if not os.path.exists(path):
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp, path)
+                    self.disk_writes += 1
+                    self._writes_since_prune += 1
+                if self._writes_since_prune >= PRUNE_EVERY:
+                    self._writes_since_prune = 0
+                    self._prune()
+            except Exception as e:
+                print(f"⚠️ QR disk cache write failed: {e}")
+
+    def _prune(self) -> None:
+        try:
+            entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".png")]
+        except OSError:
+            return
+        excess = len(entries) - self.disk_max_files
+        if excess <= 0:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for e in entries[:excess]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+    # -------------------------
+    # API
+    # -------------------------
+    def get(self, key: str) -> Optional[QRImage]:
+        if not valid_key(key):
+            return None
+        data = self._mem_get(key)
+        if data is not None:
+            self.hits += 1
+            return QRImage(key, data, cached=True)
+        data = self._disk_get(key)
+        if data is not None:
+            self.disk_hits += 1
+            self._mem_put(key, data)
+            return QRImage(key, data, cached=True)
+        return None
+
+    def render(self, payload: Any, **options: Any) -> QRImage:
+        text = payload_text(payload)
+        opts = normalize_options(**options)
+        key = qr_key(text, opts)
+        hit = self.get(key)
+        if hit is not None:
+            hit.text, hit.opts = text, opts
+            return hit
+        data = render_png(text, opts)
+        self.renders += 1
+        self._mem_put(key, data)
+        self._disk_put_async(key, data)
+        return QRImage(key, data, text, opts)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = len(self._mem), self._mem_bytes
+        return {
+            "mem_entries": entries,
+            "mem_bytes": size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "renders": self.renders,
+            "disk_writes": self.disk_writes,
+            "disk_queued": self._disk_q.qsize(),
+            "disk_dropped": self.disk_dropped,
+        }
+
+
+qr_images = QRImageCache()
+
+
+# ------------------------------------------------------------
+# Metadata (qr_codes, keyed by content hash)
+# ------------------------------------------------------------
+def remember(db, img: QRImage, meta: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Upserts {_id: key, payload, opts, ...meta}. Idempotent: the same image
+    registered twice is one document; no collection count needed.
+    """
+    now = datetime.utcnow()
+    db[QR_COL].update_one(
+        {"_id": img.key},
+        {"$set": {**(meta or {}), "updated_at": now},
+         "$setOnInsert": {"payload": img.text, "opts": img.opts, "url": img.url, "created_at": now}},
+        upsert=True,
+    )
+
+
+def load(db, key: str) -> Optional[QRImage]:
+    """Cached image for `key`, re-rendered from its qr_codes doc when evicted everywhere."""
+    img = qr_images.get(key)
+    if img is not None:
+        return img
+    doc = db[QR_COL].find_one({"_id": key}, {"payload": 1, "opts": 1})
+    if not doc or doc.get("payload") is None:
+        return None
+    img = qr_images.render(doc["payload"], **(doc.get("opts") or {}))
+    return img if img.key == key else None
+
+
+__all__ = [
+    "QRImage",
+    "QRImageCache",
+    "qr_images",
+    "normalize_options",
+    "payload_text",
+    "qr_key",
+    "valid_key",
+    "render_png",
+    "remember",
+    "load",
+    "CACHE_CONTROL",
+]
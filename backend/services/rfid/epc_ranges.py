@@ -0,0 +1,325 @@
+# backend/services/rfid/epc_ranges.py
+#
+# Serial-range EPC allocation (SGTIN-96 style) with interval storage.
+#
+#   store = get_range_store()
+#   rng = store.allocate(500, crop_id="CROP-1", harvest_id=..., user_id=...)
+#   rng["startEpc"], rng["endEpc"]            # 500 consecutive EPCs, one document
+#   store.lookup("3034...")                   # range doc containing the EPC, or None
+#   store.index(docs)                         # IntervalIndex: membership without expanding
+#   list(expand_range(rng["startEpc"], rng["endEpc"]))   # only when a list is needed
+#
+# EPC layout (96 bits, 24 hex):
+#   header 0x30 (8) | filter (3) | partition (3) | company + item (44) | serial (38)
+# Everything above the serial is the "prefix". A harvest gets one contiguous
+# serial block under its prefix, stored as {prefix, start, end} instead of one
+# rfid_records doc per tag. Membership is an interval lookup:
+#   find_one({prefix, start <= s}, sort start desc) -> hit if s <= end
+#
+# Counters: epc_serial_counters {_id: prefix hex, next}; $inc reserves a block
+# atomically, so concurrent allocations never overlap.
+
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import DESCENDING, ReturnDocument
+
+from backend.mongo_safe import get_db
+
+# ------------------------------------------------------------
+# Config
+# ------------------------------------------------------------
+SGTIN_HEADER = 0x30
+SERIAL_BITS = 38
+SERIAL_MAX = (1 << SERIAL_BITS) - 1
+
+COMPANY_PREFIX = int(os.getenv("RFID_SGTIN_COMPANY_PREFIX", "0") or 0)
+ITEM_REFERENCE = int(os.getenv("RFID_SGTIN_ITEM_REF", "0") or 0)
+FILTER_VALUE = int(os.getenv("RFID_SGTIN_FILTER", "1") or 1)
+PARTITION = int(os.getenv("RFID_SGTIN_PARTITION", "5") or 5)
+MAX_RANGE = int(os.getenv("RFID_MAX_RANGE", "100000"))
+
+RANGES_COL = "epc_ranges"
+COUNTERS_COL = "epc_serial_counters"
+
+# partition -> (company prefix bits, item reference bits), GS1 TDS SGTIN-96
+_PARTITIONS = {0: (40, 4), 1: (37, 7), 2: (34, 10), 3: (30, 14), 4: (27, 17), 5: (24, 20), 6: (20, 24)}
+
+
+# ------------------------------------------------------------
+# Codec
+# ------------------------------------------------------------
+def sgtin_prefix(company_prefix: int = COMPANY_PREFIX, item_ref: int = ITEM_REFERENCE,
+                 filter_value: int = FILTER_VALUE, partition: int = PARTITION) -> int:
+    """Top 58 bits of an SGTIN-96 EPC (everything except the serial)."""
+    if partition not in _PARTITIONS:
+        raise ValueError(f"bad_partition: {partition}")
+    cbits, ibits = _PARTITIONS[partition]
+    if not 0 <= company_prefix < 1 << cbits:
+        raise ValueError(f"company_prefix_out_of_range: {company_prefix}")
+    if not 0 <= item_ref < 1 << ibits:
+        raise ValueError(f"item_ref_out_of_range: {item_ref}")
+    if not 0 <= filter_value < 8:
+        raise ValueError(f"bad_filter: {filter_value}")
+    v = SGTIN_HEADER
+    v = v << 3 | filter_value
+    v = v << 3 | partition
+    v = v << cbits | company_prefix
+    return v << ibits | item_ref
+
+
+def prefix_hex(prefix: int) -> str:
+    return "%015X" % prefix
+
+
+def epc_int(epc: str) -> int:
+    return int(epc, 16)
+
+
+def epc_hex(n: int) -> str:
+    return "%024X" % n
+
+
+def make_epc(prefix: int, serial: int) -> str:
+    return epc_hex(prefix << SERIAL_BITS | serial)
+
+
+def split_epc(epc: str) -> Tuple[int, int]:
+    """EPC hex -> (prefix, serial)."""
+    n = epc_int(epc)
+    return n >> SERIAL_BITS, n & SERIAL_MAX
+
+
+def expand_range(start_epc: str, end_epc: str, limit: Optional[int] = None) -> Iterator[str]:
+    """Every EPC in [start, end] (inclusive), optionally the first `limit`."""
+    a, b = epc_int(start_epc), epc_int(end_epc)
+    if limit is not None:
+        b = min(b, a + max(0, limit) - 1)
+    for n in range(a, b + 1):
+        yield "%024X" % n
+
+
+# ------------------------------------------------------------
+# In-memory interval index (sorted, non-overlapping)
+# ------------------------------------------------------------
+class IntervalIndex:
+    """
+    Inclusive [start, end] integer intervals with a value each.
+    find(point) is one bisect; built once per request from range docs.
+    """
+
+    def __init__(self):
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def add(self, start: int, end: int, value: Any = None) -> None:
+        if end < start:
+            raise ValueError("end < start")
+        i = bisect.bisect_right(self._starts, start)
+        if i and self._ends[i - 1] >= start:
+            raise ValueError("overlapping_range")
+        if i < len(self._starts) and self._starts[i] <= end:
+            raise ValueError("overlapping_range")
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self._values.insert(i, value)
+
+    def find(self, point: int) -> Optional[Any]:
+        i = bisect.bisect_right(self._starts, point) - 1
+        if i >= 0 and point <= self._ends[i]:
+            return self._values[i]
+        return None
+
+    def __contains__(self, point: int) -> bool:
+        i = bisect.bisect_right(self._starts, point) - 1
+        return i >= 0 and point <= self._ends[i]
+
+    def size(self) -> int:
+        """Number of points covered."""
+        return sum(e - s + 1 for s, e in zip(self._starts, self._ends))
+
+    def intervals(self) -> Iterator[Tuple[int, int, Any]]:
+        return zip(self._starts, self._ends, self._values)
+
+
+# ------------------------------------------------------------
+# Mongo store
+# ------------------------------------------------------------
+def range_public(doc: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: v for k, v in doc.items() if k != "_id"}
+    out["id"] = str(doc.get("_id"))
+    for k in ("created_at", "updated_at"):
+        if isinstance(out.get(k), datetime):
+            out[k] = out[k].isoformat() + "Z"
+    return out
+
+
+class EpcRangeStore:
+    def __init__(self, db):
+        self.db = db
+        self.ranges = db[RANGES_COL]
+        self.counters = db[COUNTERS_COL]
+        self._ensure_indexes()
+
+    def _ensure_indexes(self) -> None:
+        try:
+            self.ranges.create_index([("prefix", 1), ("start", 1)], unique=True, name="uq_prefix_start")
+            self.ranges.create_index([("cropId", 1)], name="idx_crop")
+            self.ranges.create_index([("harvestId", 1)], name="idx_harvest", sparse=True)
+        except Exception:
+            pass
+
+    # -------------------------
+    # Allocation
+    # -------------------------
+    def reserve(self, count: int, prefix: Optional[int] = None) -> Tuple[int, int, int]:
+        """Atomically reserves `count` serials under `prefix` -> (prefix, start, end)."""
+        if count <= 0:
+            raise ValueError("count must be > 0")
+        if count > MAX_RANGE:
+            raise ValueError(f"count exceeds RFID_MAX_RANGE ({MAX_RANGE})")
+        prefix = sgtin_prefix() if prefix is None else prefix
+        doc = self.counters.find_one_and_update(
+            {"_id": prefix_hex(prefix)},
+            {"$inc": {"next": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        end = int(doc["next"]) - 1
+        start = end - count + 1
+        if end > SERIAL_MAX:
+            raise ValueError("serial_space_exhausted")
+        return prefix, start, end
+
+    def allocate(self, count: int, crop_id: str, harvest_id: Optional[str] = None,
+                 farmer_id: Optional[str] = None, user_id: Optional[str] = None,
+                 prefix: Optional[int] = None, status: str = "ALLOCATED") -> Dict[str, Any]:
+        prefix, start, end = self.reserve(count, prefix)
+        return self._insert(prefix, start, end, crop_id, harvest_id, farmer_id, user_id, status)
+
+    def _insert(self, prefix: int, start: int, end: int, crop_id: str, harvest_id: Optional[str],
+                farmer_id: Optional[str], user_id: Optional[str], status: str) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        doc = {
+            "prefix": prefix_hex(prefix),
+            "start": start,
+            "end": end,
+            "count": end - start + 1,
+            "startEpc": make_epc(prefix, start),
+            "endEpc": make_epc(prefix, end),
+            "cropId": crop_id,
+            "harvestId": harvest_id,
+            "farmerId": farmer_id,
+            "userId": user_id,
+            "status": status,
+            "txHash": None,
+            "error_message": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        res = self.ranges.insert_one(doc)
+        doc["_id"] = res.inserted_id
+        return doc
+
+    def set_status(self, range_id, status: str, tx_hash: Optional[str] = None,
+                   error: Optional[str] = None) -> None:
+        self.ranges.update_one(
+            {"_id": range_id},
+            {"$set": {"status": status, "txHash": tx_hash, "error_message": error,
+                      "updated_at": datetime.utcnow()}},
+        )
+
+    # -------------------------
+    # Lookup
+    # -------------------------
+    def lookup(self, epc: str) -> Optional[Dict[str, Any]]:
+        """Range doc containing `epc` (one indexed query), or None."""
+        try:
+            prefix, serial = split_epc(epc)
+        except ValueError:
+            return None
+        doc = self.ranges.find_one(
+            {"prefix": prefix_hex(prefix), "start": {"$lte": serial}},
+            sort=[("start", DESCENDING)],
+        )
+        if doc and serial <= int(doc.get("end", -1)):
+            return doc
+        return None
+
+    def for_crops(self, crop_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        ids = [c for c in crop_ids if c]
+        if not ids:
+            return []
+        return list(self.ranges.find({"cropId": {"$in": ids}}))
+
+    def index(self, docs: Iterable[Dict[str, Any]],
+              value: Optional[Callable[[Dict[str, Any]], Any]] = None) -> IntervalIndex:
+        """IntervalIndex over full EPC ints -> range doc (or value(doc))."""
+        idx = IntervalIndex()
+        for d in docs:
+            p = int(d["prefix"], 16)
+            idx.add(p << SERIAL_BITS | int(d["start"]), p << SERIAL_BITS | int(d["end"]),
+                    d if value is None else value(d))
+        return idx
+
+    def expand_crop(self, crop_id: str, limit: Optional[int] = None) -> List[str]:
+        out: List[str] = []
+        for d in sorted(self.for_crops([crop_id]), key=lambda d: (d["prefix"], d["start"])):
+            left = None if limit is None else limit - len(out)
+            if left is not None and left <= 0:
+                break
+            out.extend(expand_range(d["startEpc"], d["endEpc"], left))
+        return out
+
+
+# ------------------------------------------------------------
+# One store per database
+# ------------------------------------------------------------
+_STORES: Dict[int, EpcRangeStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_range_store(db=None) -> Optional[EpcRangeStore]:
+    if db is None:
+        db = get_db()
+    if db is None:
+        return None
+
+    key = id(db)
+    store = _STORES.get(key)
+    if store is not None:
+        return store
+
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            try:
+                store = EpcRangeStore(db)
+            except Exception as e:
+                print(f"⚠️ EPC range store unavailable: {e}")
+                return None
+            _STORES[key] = store
+        return store
+
+
+__all__ = [
+    "SERIAL_BITS",
+    "sgtin_prefix",
+    "make_epc",
+    "split_epc",
+    "expand_range",
+    "epc_int",
+    "IntervalIndex",
+    "EpcRangeStore",
+    "range_public",
+    "get_range_store",
+]
@@ -0,0 +1,99 @@
+# backend/services/rfid/esp32_simulator.py
+#
+# Fake ESP32 tag writer on a local HTTP port, so the bridge (tag_writer_bridge)
+# can be exercised without hardware.
+#
+#   dev = FakeTagWriter(write_path="/write", no_tag=2, latency=0.05).start()
+#   tag_writers.write(dev.base, payload, tag_wait=5)
+#   dev.writes, dev.stop()
+#
+# no_tag = how many write attempts answer 409 (no tag on the antenna) before the
+# next one succeeds; it re-arms after each successful write when rearm=True, like
+# an operator who needs a moment to swap tags.
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+
+class FakeTagWriter:
+    def __init__(self, write_path: str = "/rfid/write", no_tag: int = 0, rearm: bool = False,
+                 latency: float = 0.0, fail_status: Optional[int] = None):
+        self.write_path = write_path
+        self.no_tag = no_tag
+        self.rearm = rearm
+        self.latency = latency
+        self.fail_status = fail_status
+        self.writes: List[str] = []
+        self.requests = 0
+        self.pings = 0
+        self._waiting = no_tag
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeTagWriter":
+        sim = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def log_message(self, *_args) -> None:
+                pass
+
+            def _send(self, status: int, body: dict) -> None:
+                raw = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_GET(self) -> None:
+                if self.path == "/rfid/ping":
+                    sim.pings += 1
+                    self._send(200, {"ok": True})
+                else:
+                    self._send(404, {"ok": False})
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != sim.write_path:
+                    self._send(404, {"ok": False})
+                    return
+                if sim.latency:
+                    time.sleep(sim.latency)
+                with sim._lock:
+                    sim.requests += 1
+                    if sim.fail_status:
+                        status, out = sim.fail_status, {"ok": False, "err": "write_failed"}
+                    elif sim._waiting > 0:
+                        sim._waiting -= 1
+                        status, out = 409, {"ok": False, "err": "no_tag"}
+                    else:
+                        sim.writes.append(body.get("payload") or "")
+                        if sim.rearm:
+                            sim._waiting = sim.no_tag
+                        status, out = 200, {"ok": True}
+                self._send(status, out)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-esp32", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+__all__ = ["FakeTagWriter"]
@@ -0,0 +1,334 @@
+# backend/services/rfid/reconciliation.py
+#
+# Expected-vs-scanned reconciliation for a dock / pallet read.
+#
+#   rec = Reconciler()
+#   rec.add_group("crop:CROP-1", epcs_of_crop_1)      # or load_groups(db, crop_ids, shipment_ids)
+#   out = rec.reconcile(scanned_epcs, owner_of=lookup) # missing / extra / foreign in one pass
+#
+# Every EPC gets a dense int id (first seen -> 0, 1, 2, ...). A set of EPCs is
+# a bitmap held in a Python int, so union / intersection / difference over
+# thousands of tags are single C-level big-int ops:
+#   missing(g) = expected(g) & ~scanned
+#   matched(g) = expected(g) & scanned
+#   extra      = scanned & ~(expected(g1) | expected(g2) | ...)
+# Ids only have to be consistent inside one Reconciler, so there is no global
+# state to keep in sync.
+#
+# Serial ranges (epc_ranges) are never expanded: they sit in one IntervalIndex
+# (value = owning group) and each scanned EPC costs one bisect. Counts come
+# from the range sizes; missing range EPCs are only enumerated up to list_limit.
+
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from backend.models.rfid.rfid_models import normalize_epc
+from backend.services.rfid.epc_ranges import IntervalIndex, epc_hex, epc_int, get_range_store
+
+# bit offsets set in each byte value (bitmap -> ids without a per-bit loop)
+_BYTE_BITS = tuple(tuple(i for i in range(8) if b >> i & 1) for b in range(256))
+
+# bags of a harvest (epc_index) + tags registered through /rfid/register (rfid_records)
+# + serial ranges (epc_ranges, kept as intervals)
+EPC_INDEX_COL = "epc_index"
+RFID_RECORDS_COL = "rfid_records"
+SHIPMENTS_COL = "transporter_request"
+
+
+class EpcIdMap:
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._epcs: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._epcs)
+
+    def bitmap(self, epcs: Iterable[str], add: bool = True) -> int:
+        """Bitmap of `epcs`; unknown EPCs get new ids (add=True) or are ignored."""
+        ids = self._ids
+        rev = self._epcs
+        hit: List[int] = []
+        for epc in epcs:
+            i = ids.get(epc)
+            if i is None:
+                if not add:
+                    continue
+                i = ids[epc] = len(rev)
+                rev.append(epc)
+            hit.append(i)
+        if not hit:
+            return 0
+        buf = bytearray(max(hit) // 8 + 1)
+        for i in hit:
+            buf[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(buf, "little")
+
+    def epcs(self, bitmap: int) -> List[str]:
+        if not bitmap:
+            return []
+        rev = self._epcs
+        out: List[str] = []
+        raw = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+        for byte_no, b in enumerate(raw):
+            if b:
+                base = byte_no << 3
+                out.extend(rev[base + off] for off in _BYTE_BITS[b])
+        return out
+
+
+def _point(epc: str) -> Optional[int]:
+    try:
+        return epc_int(epc)
+    except ValueError:
+        return None
+
+
+class Reconciler:
+    def __init__(self):
+        self.ids = EpcIdMap()
+        self.groups: Dict[str, int] = {}
+        # serial ranges: interval -> owning group; group -> owners whose ranges it expects
+        self.ranges = IntervalIndex()
+        self.range_owners: Dict[str, Set[str]] = {}
+        self._range_sizes: Dict[str, int] = defaultdict(int)
+
+    def add_ranges(self, index: IntervalIndex) -> int:
+        """Ranges whose values are group names (EpcRangeStore.index(docs, value=...)). Call before add_group."""
+        n = 0
+        for start, end, name in index.intervals():
+            self.ranges.add(start, end, name)
+            self.range_owners.setdefault(name, set()).add(name)
+            self._range_sizes[name] += end - start + 1
+            n += end - start + 1
+        return n
+
+    def add_group(self, name: str, epcs: Iterable[str]) -> int:
+        if len(self.ranges):
+            # a bag scanned from a pre-encoded range is already expected through the range
+            epcs = [e for e in epcs if _point(e) is None or self.ranges.find(_point(e)) != name]
+        bm = self.ids.bitmap(epcs)
+        self.groups[name] = self.groups.get(name, 0) | bm
+        return bm.bit_count()
+
+    def union_group(self, name: str, members: Iterable[str]) -> None:
+        """Group defined as the union of other groups (a shipment of several crops)."""
+        bm = 0
+        owners: Set[str] = set()
+        for m in members:
+            bm |= self.groups.get(m, 0)
+            owners |= self.range_owners.get(m, set())
+        self.groups[name] = self.groups.get(name, 0) | bm
+        if owners:
+            self.range_owners.setdefault(name, set()).update(owners)
+
+    def _range_missing(self, owners: Iterable[str], hits: Dict[str, Set[int]]) -> Iterator[str]:
+        """Unscanned EPCs of the owners' ranges, in order, generated lazily."""
+        owners = set(owners)
+        for start, end, name in self.ranges.intervals():
+            if name not in owners:
+                continue
+            seen = hits.get(name, ())
+            for n in range(start, end + 1):
+                if n not in seen:
+                    yield epc_hex(n)
+
+    def reconcile(self, scanned: Iterable[str], groups: Optional[Iterable[str]] = None,
+                  owner_of: Optional[Callable[[List[str]], Dict[str, str]]] = None,
+                  list_limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        scanned: raw EPCs (normalized + deduped here)
+        groups: names to reconcile against (default: all)
+        owner_of: EPCs -> {epc: owner} for scanned tags outside every selected
+                  group (foreign = known elsewhere, unknown = not known at all)
+        list_limit: cap on EPCs listed per bucket (counts are always exact)
+        """
+        started = time.perf_counter()
+        seen = {e for e in (normalize_epc(str(x or "")) for x in scanned) if e}
+        scan = self.ids.bitmap(seen)
+        names = list(groups) if groups is not None else list(set(self.groups) | set(self.range_owners))
+
+        # one bisect per scanned EPC against every loaded range
+        hits: Dict[str, Set[int]] = defaultdict(set)
+        in_range: Dict[str, str] = {}
+        if len(self.ranges):
+            for epc in seen:
+                n = _point(epc)
+                owner = self.ranges.find(n) if n is not None else None
+                if owner is not None:
+                    hits[owner].add(n)
+                    in_range[epc] = owner
+
+        def _list(bm: int, owners: Set[str]) -> List[str]:
+            out = self.ids.epcs(bm)
+            if list_limit is not None:
+                out = out[:list_limit]
+            if owners and (list_limit is None or len(out) < list_limit):
+                more = self._range_missing(owners, hits)
+                if list_limit is not None:
+                    more = (e for _, e in zip(range(list_limit - len(out)), more))
+                out.extend(more)
+            return out
+
+        selected = 0
+        selected_owners: Set[str] = set()
+        rows = []
+        for name in names:
+            exp = self.groups.get(name, 0)
+            owners = self.range_owners.get(name, set())
+            selected |= exp
+            selected_owners |= owners
+            missing = exp & ~scan
+            range_exp = sum(self._range_sizes[o] for o in owners)
+            range_hit = sum(len(hits.get(o, ())) for o in owners)
+            n_exp = exp.bit_count() + range_exp
+            n_missing = missing.bit_count() + range_exp - range_hit
+            rows.append({
+                "group": name,
+                "expected": n_exp,
+                "matched": n_exp - n_missing,
+                "missingCount": n_missing,
+                "missing": _list(missing, owners),
+                "complete": n_missing == 0,
+            })
+
+        extra_bm = scan & ~selected
+        extra = [e for e in self.ids.epcs(extra_bm) if in_range.get(e) not in selected_owners]
+        foreign: Dict[str, List[str]] = {}
+        unknown = extra
+        if extra and owner_of is not None:
+            owners = owner_of(extra)
+            unknown = []
+            for epc in extra:
+                owner = owners.get(epc)
+                if owner:
+                    foreign.setdefault(owner, []).append(epc)
+                else:
+                    unknown.append(epc)
+
+        n_missing = sum(r["missingCount"] for r in rows)
+        return {
+            "scanned": len(seen),
+            "expected": selected.bit_count() + sum(self._range_sizes[o] for o in selected_owners),
+            "matched": (scan & selected).bit_count() + sum(len(hits.get(o, ())) for o in selected_owners),
+            "missingCount": n_missing,
+            "extraCount": len(extra),
+            "groups": rows,
+            "foreign": {k: (v[:list_limit] if list_limit is not None else v) for k, v in foreign.items()},
+            "foreignCount": sum(len(v) for v in foreign.values()),
+            "unknown": unknown[:list_limit] if list_limit is not None else unknown,
+            "unknownCount": len(unknown),
+            "ok": n_missing == 0 and not extra,
+            "ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+
+# ------------------------------------------------------------
+# Mongo loaders
+# ------------------------------------------------------------
+def crop_group(crop_id: str) -> str:
+    return f"crop:{crop_id}"
+
+
+def shipment_group(shipment_id: str) -> str:
+    return f"shipment:{shipment_id}"
+
+
+def load_groups(db, crop_ids: Iterable[str] = (), shipment_ids: Iterable[str] = (),
+                farmer_id: Optional[str] = None) -> Reconciler:
+    """
+    One Reconciler with a group per crop and per shipment (union of its crops).
+    Expected EPCs = harvest bags (epc_index) + registered tags (rfid_records)
+    + serial ranges (epc_ranges, as intervals), one $in query per collection for
+    every crop at once. With farmer_id only that farmer's shipments, bags, tags
+    and ranges count (someone else's crop id yields an empty group).
+    """
+    rec = Reconciler()
+    crops = [c for c in dict.fromkeys(crop_ids) if c]
+    shipment_crops: Dict[str, List[str]] = {}
+
+    sids = [s for s in dict.fromkeys(shipment_ids) if s]
+    if sids:
+        from bson import ObjectId
+
+        oids = []
+        for s in sids:
+            try:
+                oids.append(ObjectId(s))
+            except Exception:
+                continue
+        q: Dict[str, Any] = {"_id": {"$in": oids}}
+        if farmer_id:
+            q["farmer_id"] = farmer_id
+        for doc in db[SHIPMENTS_COL].find(q, {"shipment_items.crop_id": 1}):
+            items = [(it or {}).get("crop_id") for it in doc.get("shipment_items") or []]
+            shipment_crops[str(doc["_id"])] = [c for c in items if c]
+        for cs in shipment_crops.values():
+            crops.extend(c for c in cs if c not in crops)
+
+    by_crop: Dict[str, set] = {c: set() for c in crops}
+    if crops:
+        ranges = get_range_store(db)
+        if ranges is not None:
+            docs = ranges.for_crops(crops)
+            if farmer_id:
+                docs = [d for d in docs if farmer_id in (d.get("farmerId"), d.get("userId"))]
+            rec.add_ranges(ranges.index(docs, value=lambda d: crop_group(d.get("cropId") or "")))
+        bag_q: Dict[str, Any] = {"cropId": {"$in": crops}}
+        tag_q: Dict[str, Any] = {"crop_id": {"$in": crops}}
+        if farmer_id:
+            bag_q["farmerId"] = farmer_id
+            tag_q["user_id"] = farmer_id
+        for row in db[EPC_INDEX_COL].find(bag_q, {"cropId": 1}):
+            by_crop.setdefault(row.get("cropId"), set()).add(row["_id"])
+        for row in db[RFID_RECORDS_COL].find(tag_q, {"crop_id": 1, "rfid_epc": 1, "_id": 0}):
+            if row.get("rfid_epc"):
+                by_crop.setdefault(row.get("crop_id"), set()).add(row["rfid_epc"])
+
+    for crop_id in crops:
+        rec.add_group(crop_group(crop_id), by_crop.get(crop_id) or ())
+    for sid, cs in shipment_crops.items():
+        rec.union_group(shipment_group(sid), [crop_group(c) for c in cs])
+    return rec
+
+
+def epc_owner_lookup(db, farmer_id: Optional[str] = None) -> Callable[[List[str]], Dict[str, str]]:
+    """
+    Owner (crop group) of EPCs outside the selection: one _id $in on epc_index.
+    With farmer_id only that farmer's crops are named; other tags stay unknown.
+    """
+    def _lookup(epcs: List[str]) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        for start in range(0, len(epcs), 5000):
+            q: Dict[str, Any] = {"_id": {"$in": epcs[start:start + 5000]}}
+            if farmer_id:
+                q["farmerId"] = farmer_id
+            for row in db[EPC_INDEX_COL].find(q, {"cropId": 1}):
+                out[row["_id"]] = crop_group(row.get("cropId") or "")
+        return out
+    return _lookup
+
+
+def reconcile_scan(db, scanned: Iterable[str], crop_ids: Iterable[str] = (),
+                   shipment_ids: Iterable[str] = (), farmer_id: Optional[str] = None,
+                   list_limit: Optional[int] = None) -> Dict[str, Any]:
+    crop_ids = list(crop_ids)
+    shipment_ids = list(shipment_ids)
+    rec = load_groups(db, crop_ids, shipment_ids, farmer_id)
+    # report the groups asked for (shipments as a whole, crops on their own)
+    names = [crop_group(c) for c in dict.fromkeys(crop_ids) if c]
+    names += [n for n in rec.groups if n.startswith("shipment:")]
+    return rec.reconcile(scanned, names, owner_of=epc_owner_lookup(db, farmer_id), list_limit=list_limit)
+
+
+__all__ = [
+    "EpcIdMap",
+    "Reconciler",
+    "crop_group",
+    "shipment_group",
+    "load_groups",
+    "epc_owner_lookup",
+    "reconcile_scan",
+]
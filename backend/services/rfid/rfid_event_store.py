@@ -0,0 +1,416 @@
+# backend/services/rfid/rfid_event_store.py
+
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from backend.mongo_safe import get_db
+
+# ------------------------------------------------------------
+# Config
+# ------------------------------------------------------------
+EVENTS_COL = os.getenv("RFID_EVENTS_COL", "rfid_events_ts")
+EVENTS_TTL_SECONDS = int(os.getenv("RFID_EVENTS_TTL_SECONDS", str(90 * 24 * 3600)))  # 90 days
+FLUSH_MAX_EVENTS = int(os.getenv("RFID_EVENTS_FLUSH_MAX", "500"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("RFID_EVENTS_FLUSH_SECONDS", "1.0"))
+BUFFER_HARD_LIMIT = int(os.getenv("RFID_EVENTS_BUFFER_LIMIT", "50000"))
+
+KIND_READ = "read"
+KIND_PLAN = "plan"
+KIND_WRITE = "write"
+
+
+def _is_timeseries(db, name: str) -> bool:
+    try:
+        for info in db.list_collections(filter={"name": name}):
+            return info.get("type") == "timeseries"
+    except Exception:
+        pass
+    return False
+
+
+def _ensure_timeseries(db, name: str) -> bool:
+    """
+    Creates the time-series collection once:
+      timeField = ts, metaField = meta {kind, reader, epc, cropId}
+    Falls back to a regular collection + ts index on servers < 5.0.
+    Returns True when the collection is time-series (5.0+ rollup operators are safe).
+    """
+    timeseries = True
+    try:
+        db.create_collection(
+            name,
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "seconds"},
+            expireAfterSeconds=EVENTS_TTL_SECONDS,
+        )
+    except CollectionInvalid:
+        timeseries = _is_timeseries(db, name)  # already exists (maybe from a pre-5.0 server)
+    except OperationFailure as e:
+        # NamespaceExists (48) -> fine; anything else -> old server, use a plain collection
+        if getattr(e, "code", None) == 48:
+            timeseries = _is_timeseries(db, name)
+        else:
+            timeseries = False
+            print(f"⚠️ time-series collection unavailable ({e}); using regular collection '{name}'")
+    if not timeseries:
+        try:
+            db[name].create_index([("ts", 1)], name="idx_ts", expireAfterSeconds=EVENTS_TTL_SECONDS)
+        except Exception:
+            pass
+
+    try:
+        db[name].create_index([("meta.reader", 1), ("ts", 1)], name="idx_reader_ts")
+        db[name].create_index([("meta.cropId", 1), ("ts", 1)], name="idx_crop_ts")
+        db[name].create_index([("meta.epc", 1), ("ts", 1)], name="idx_epc_ts")
+    except Exception:
+        pass
+    return timeseries
+
+
+class BufferedEventWriter:
+    """
+    Collects event docs in memory and writes them with insert_many:
+      - flush-on-size: as soon as FLUSH_MAX_EVENTS are buffered
+      - flush-on-interval: a daemon thread flushes every FLUSH_INTERVAL_SECONDS
+    The flusher thread is started lazily (and restarted after fork).
+    """
+
+    def __init__(self, col, max_events: int = FLUSH_MAX_EVENTS, interval: float = FLUSH_INTERVAL_SECONDS):
+        self.col = col
+        self.max_events = max(1, int(max_events))
+        self.interval = max(0.05, float(interval))
+
+        self._buf: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+        self.flushed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    # -------------------------
+    # Public
+    # -------------------------
+    def add(self, doc: Dict[str, Any]) -> None:
+        self.add_many([doc])
+
+    def add_many(self, docs: List[Dict[str, Any]]) -> None:
+        if not docs:
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._buf.extend(docs)
+            overflow = len(self._buf) - BUFFER_HARD_LIMIT
+            if overflow > 0:
+                # Mongo is down or too slow: drop oldest instead of growing without bound
+                del self._buf[:overflow]
+                self.dropped += overflow
+            full = len(self._buf) >= self.max_events
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Writes everything currently buffered. Returns number of docs written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buf = self._buf, []
+            if not batch:
+                return 0
+
+            written = 0
+            for start in range(0, len(batch), self.max_events):
+                chunk = batch[start:start + self.max_events]
+                try:
+                    self.col.insert_many(chunk, ordered=False)
+                    written += len(chunk)
+                except Exception as e:
+                    # keep partial successes from unordered inserts; the rest of the chunk is gone
+                    details = getattr(e, "details", None) or {}
+                    inserted = int(details.get("nInserted") or 0)
+                    written += inserted
+                    self.dropped += len(chunk) - inserted
+                    self.errors += 1
+                    self.last_error = str(e)[:300]
+            self.flushed += written
+            return written
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buf)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending(),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "lastError": self.last_error,
+            "maxEvents": self.max_events,
+            "intervalSeconds": self.interval,
+        }
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _ensure_thread(self) -> None:
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="rfid-event-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)[:300]
+
+
+class RFIDEventStore:
+    """
+    RFID read / tag-plan / tag-write events in one Mongo time-series collection.
+      { ts: datetime, meta: {kind, reader, epc, cropId}, ...measurements }
+    """
+
+    def __init__(self, db, name: str = EVENTS_COL):
+        self.db = db
+        self.name = name
+        self.timeseries = _ensure_timeseries(db, name)
+        self.col = db[name]
+        self.writer = BufferedEventWriter(self.col)
+
+    # -------------------------
+    # Writes (buffered)
+    # -------------------------
+    @staticmethod
+    def _event(kind: str, epc: str = "", reader: str = "", crop_id: str = "",
+               ts: Optional[datetime] = None, **fields) -> Dict[str, Any]:
+        doc = {
+            "ts": ts or datetime.utcnow(),
+            "meta": {
+                "kind": kind,
+                "reader": reader or "",
+                "epc": epc or "",
+                "cropId": crop_id or "",
+            },
+        }
+        for k, v in fields.items():
+            if v is not None:
+                doc[k] = v
+        return doc
+
+    def record_read(self, epc: str, reader: str = "", crop_id: str = "",
+                    ts: Optional[datetime] = None, rssi: Optional[int] = None,
+                    antenna: Optional[int] = None, user_id: Optional[str] = None) -> None:
+        self.writer.add(self._event(KIND_READ, epc, reader, crop_id, ts,
+                                    rssi=rssi, antenna=antenna, userId=user_id))
+
+    def record_reads(self, reads: List[Dict[str, Any]], reader: str = "",
+                     crop_id: str = "", user_id: Optional[str] = None) -> int:
+        """
+        reads: [{epc, ts?, rssi?, antenna?, cropId?}, ...] — one buffer append for the batch.
+        """
+        docs = []
+        for r in reads or []:
+            epc = (r.get("epc") or "").strip()
+            if not epc:
+                continue
+            docs.append(self._event(
+                KIND_READ, epc, r.get("reader") or reader, r.get("cropId") or crop_id,
+                _coerce_ts(r.get("ts")),
+                rssi=r.get("rssi"), antenna=r.get("antenna"), userId=user_id,
+            ))
+        self.writer.add_many(docs)
+        return len(docs)
+
+    def record_plan(self, crop_id: str, payload: Any, user_id: Optional[str] = None,
+                    epc: str = "") -> None:
+        self.writer.add(self._event(KIND_PLAN, epc, "", crop_id, None,
+                                    payload=payload, farmerId=user_id))
+
+    def record_plans(self, plans: List[Dict[str, Any]], user_id: Optional[str] = None) -> int:
+        """
+        plans: [{cropId, payload, epc?}, ...] — one buffer append for a whole label batch.
+        """
+        docs = [
+            self._event(KIND_PLAN, p.get("epc") or "", "", p.get("cropId") or "", None,
+                        payload=p.get("payload"), farmerId=user_id)
+            for p in plans or []
+        ]
+        self.writer.add_many(docs)
+        return len(docs)
+
+    def record_write(self, crop_id: str, payload: Any, endpoint: str = "",
+                     device: str = "", user_id: Optional[str] = None,
+                     epc: str = "", ok: bool = True) -> None:
+        self.writer.add(self._event(KIND_WRITE, epc, device, crop_id, None,
+                                    payload=payload, endpoint=endpoint,
+                                    farmerId=user_id, ok=ok))
+
+    def flush(self) -> int:
+        return self.writer.flush()
+
+    # -------------------------
+    # Rollups
+    # -------------------------
+    def reads_per_minute(self, reader: Optional[str] = None, crop_id: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         limit: int = 10_000) -> List[Dict[str, Any]]:
+        """
+        [{reader, minute, reads, uniqueEpcs}, ...] sorted by minute, reader.
+        """
+        until = until or datetime.utcnow()
+        since = since or (until - timedelta(hours=1))
+
+        match: Dict[str, Any] = {"meta.kind": KIND_READ, "ts": {"$gte": since, "$lt": until}}
+        if reader:
+            match["meta.reader"] = reader
+        if crop_id:
+            match["meta.cropId"] = crop_id
+
+        if self.timeseries:
+            minute = {"$dateTrunc": {"date": "$ts", "unit": "minute"}}
+        else:
+            # pre-5.0 fallback collection: no $dateTrunc; ts - (ms since epoch mod 60000) is still a date
+            minute = {"$subtract": ["$ts", {"$mod": [{"$toLong": "$ts"}, 60_000]}]}
+
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "reader": "$meta.reader",
+                    "minute": minute,
+                },
+                "reads": {"$sum": 1},
+                "epcs": {"$addToSet": "$meta.epc"},
+            }},
+            {"$sort": {"_id.minute": 1, "_id.reader": 1}},
+            {"$limit": int(limit)},
+            {"$project": {
+                "_id": 0,
+                "reader": "$_id.reader",
+                "minute": "$_id.minute",
+                "reads": 1,
+                "uniqueEpcs": {"$size": "$epcs"},
+            }},
+        ]
+        return list(self.col.aggregate(pipeline, allowDiskUse=True))
+
+    def reads_by_reader(self, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        [{reader, reads, uniqueEpcs, firstSeen, lastSeen}, ...] over a window.
+        """
+        until = until or datetime.utcnow()
+        since = since or (until - timedelta(hours=1))
+        pipeline = [
+            {"$match": {"meta.kind": KIND_READ, "ts": {"$gte": since, "$lt": until}}},
+            {"$group": {
+                "_id": "$meta.reader",
+                "reads": {"$sum": 1},
+                "epcs": {"$addToSet": "$meta.epc"},
+                "firstSeen": {"$min": "$ts"},
+                "lastSeen": {"$max": "$ts"},
+            }},
+            {"$sort": {"reads": -1}},
+            {"$project": {
+                "_id": 0,
+                "reader": "$_id",
+                "reads": 1,
+                "uniqueEpcs": {"$size": "$epcs"},
+                "firstSeen": 1,
+                "lastSeen": 1,
+            }},
+        ]
+        return list(self.col.aggregate(pipeline, allowDiskUse=True))
+
+
+def _coerce_ts(v: Any) -> Optional[datetime]:
+    if isinstance(v, datetime):
+        return v
+    if isinstance(v, (int, float)):
+        # accept seconds or milliseconds since epoch
+        secs = v / 1000.0 if v > 1e11 else float(v)
+        try:
+            return datetime.utcfromtimestamp(secs)
+        except Exception:
+            return None
+    if isinstance(v, str) and v.strip():
+        try:
+            return datetime.fromisoformat(v.strip().replace("Z", "+00:00")).replace(tzinfo=None)
+        except Exception:
+            return None
+    return None
+
+
+# ------------------------------------------------------------
+# One store per database (Flask mongo.db or a FastAPI MongoClient db)
+# ------------------------------------------------------------
+_STORES: Dict[int, RFIDEventStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_event_store(db=None) -> Optional[RFIDEventStore]:
+    """
+    Returns the shared RFIDEventStore for `db` (defaults to Flask mongo.db).
+    None when Mongo is disabled / not initialized.
+    """
+    if db is None:
+        db = get_db()
+    if db is None:
+        return None
+
+    key = id(db)
+    store = _STORES.get(key)
+    if store is not None:
+        return store
+
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            try:
+                store = RFIDEventStore(db)
+            except Exception as e:
+                print(f"⚠️ RFID event store unavailable: {e}")
+                return None
+            _STORES[key] = store
+        return store
+
+
+def flush_all() -> None:
+    for store in list(_STORES.values()):
+        try:
+            store.flush()
+        except Exception:
+            pass
+
+
+atexit.register(flush_all)
+
+__all__ = [
+    "RFIDEventStore",
+    "BufferedEventWriter",
+    "get_event_store",
+    "flush_all",
+    "KIND_READ",
+    "KIND_PLAN",
+    "KIND_WRITE",
+]
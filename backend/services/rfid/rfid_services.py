@@ -2,29 +2,43 @@
 
 from __future__ import annotations
 
+import os
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from pymongo.errors import DuplicateKeyError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from backend.mongo_safe import get_col
 from backend.models.rfid.rfid_models import (
     RFIDSinglePayload,
     RFIDListPayload,
+    RFIDRangePayload,
     normalize_epc,
 )
 
 from backend.blockchain import (
     register_rfid_onchain_single,
     register_rfids_onchain,
+    register_rfid_ranges_onchain,
+    has_contract_function,
     get_rfid_epcs_by_crop,
     get_rfid_record,
 )
+from backend.services.rfid.epc_ranges import expand_range, get_range_store, range_public
+from backend.utils.status_events import watch_tx
 
 
 class RFIDService:
     COL = "rfid_records"
 
+    # max UpdateOne ops per bulk_write round trip (2,000 tags -> 2 trips)
+    BULK_BATCH = int(os.getenv("RFID_BULK_BATCH", "1000"))
+
+    # register-range without registerRFIDRanges sends the expanded list in one
+    # registerRFIDs tx; past this many EPCs it won't fit a block's gas
+    RANGE_LIST_MAX = int(os.getenv("RFID_RANGE_LIST_MAX", "200"))
+
     # ------------------------------------------------------------
     # Entry point (AUTO): supports payload having either `epc` OR `epcs`
     # ------------------------------------------------------------
@@ -81,6 +95,7 @@ class RFIDService:
             )
 
             RFIDService._upsert_doc(col, p, epc, status="MINED", tx_hash=txh, error=None)
+            RFIDService._watch(col, p, [epc], txh)
             return {"ok": True, "cropId": p.cropId, "rfidEPC": epc, "status": "MINED", "txHash": txh}
 
         except Exception as e:
@@ -92,7 +107,11 @@ class RFIDService:
     # List EPC flow (Mongo + chain, uses bulk tx ideally)
     # ------------------------------------------------------------
     @staticmethod
-    def register_epc_list(payload_dict: Dict[str, Any]) -> Dict[str, Any]:
+    def register_epc_list(payload_dict: Dict[str, Any], job=None) -> Dict[str, Any]:
+        """
+        `job` (status_events.Job, optional) receives per-EPC progress when the
+        route runs this in the background (POST /rfid/register-bulk?async=1).
+        """
         p = RFIDListPayload(**payload_dict)
         epcs = p.cleaned_epcs()
 
@@ -115,9 +134,16 @@ class RFIDService:
             if epc in existing_chain:
                 return {"ok": False, "err": f"epc_already_registered: {epc}"}
 
-        # Save all as PENDING in Mongo (upsert)
-        for epc in epcs:
-            RFIDService._upsert_doc(col, p, epc, status="PENDING", tx_hash=None, error=None)
+        # Save all as PENDING in Mongo (unordered bulk upsert, one trip per batch)
+        stored = RFIDService._bulk_upsert(col, p, epcs, status="PENDING", tx_hash=None, error=None)
+        failed = {e: o for e, o in stored.items() if o.startswith("error")}
+        if failed:
+            return {
+                "ok": False,
+                "err": f"mongo_write_failed: {len(failed)} EPC(s)",
+                "cropId": p.cropId,
+                "failed": failed,
+            }
 
         # Chain bulk tx
         try:
@@ -136,13 +162,19 @@ class RFIDService:
 
             # mark all mined with same tx hash
             RFIDService._bulk_update(col, p.cropId, epcs, status="MINED", tx_hash=txh, error=None)
+            RFIDService._watch(col, p, epcs, txh)
+            if job is not None:
+                job.advance(len(epcs), total=len(epcs))
 
             return {
                 "ok": True,
                 "cropId": p.cropId,
                 "count": len(epcs),
                 "txHash": txh,
-                "results": [{"rfidEPC": e, "status": "MINED", "txHash": txh} for e in epcs],
+                "results": [
+                    {"rfidEPC": e, "status": "MINED", "txHash": txh, "stored": stored.get(e)}
+                    for e in epcs
+                ],
             }
 
         except Exception as bulk_err:
@@ -152,6 +184,7 @@ class RFIDService:
             bulk_msg = str(bulk_err)
 
             results = []
+            updates: List[Tuple[str, str, Optional[str], Optional[str]]] = []
             for epc in epcs:
                 try:
                     tx1 = register_rfid_onchain_single(
@@ -166,12 +199,20 @@ class RFIDService:
                         total_bags=str(tb if tb else len(epcs)),
                         rfid_epc=epc,
                     )
-                    RFIDService._update_one(col, p.cropId, epc, status="MINED", tx_hash=tx1, error=None)
+                    updates.append((epc, "MINED", tx1, None))
                     results.append({"rfidEPC": epc, "status": "MINED", "txHash": tx1})
+                    RFIDService._watch(col, p, [epc], tx1)
                 except Exception as e:
                     msg = str(e)
-                    RFIDService._update_one(col, p.cropId, epc, status="FAILED", tx_hash=None, error=msg)
+                    updates.append((epc, "FAILED", None, msg))
                     results.append({"rfidEPC": epc, "status": "FAILED", "error": msg})
+                if job is not None:
+                    job.advance(1, total=len(epcs))
+
+            # persist all per-EPC outcomes in one bulk pass instead of N update_one calls
+            stored = RFIDService._bulk_set_status(col, p.cropId, updates)
+            for r in results:
+                r["stored"] = stored.get(r["rfidEPC"])
 
             return {
                 "ok": False,  # bulk failed, but some may succeed in fallback
@@ -181,6 +222,79 @@ class RFIDService:
                 "results": results,
             }
 
+    # ------------------------------------------------------------
+    # Serial-range flow: one range doc + one tx for `count` EPCs
+    # ------------------------------------------------------------
+    @staticmethod
+    def register_range(payload_dict: Dict[str, Any], job=None) -> Dict[str, Any]:
+        """
+        Allocates `count` consecutive SGTIN serials for the crop and registers
+        them as a single [startEpc, endEpc] interval (epc_ranges), not one
+        rfid_records doc per tag. On-chain it uses registerRFIDRanges when the
+        deployed ABI has it, otherwise the expanded list via registerRFIDs
+        (at most RANGE_LIST_MAX EPCs, checked before any serials are reserved).
+        """
+        p = RFIDRangePayload(**payload_dict)
+        count = p.range_count()
+        if count <= 0:
+            return {"ok": False, "err": "count (or totalBags) must be > 0"}
+
+        ranges_abi = has_contract_function("registerRFIDRanges")
+        if not ranges_abi and count > RFIDService.RANGE_LIST_MAX:
+            return {"ok": False, "err": f"count exceeds RFID_RANGE_LIST_MAX ({RFIDService.RANGE_LIST_MAX}); "
+                                        "the deployed contract has no registerRFIDRanges"}
+
+        store = get_range_store()
+        if store is None:
+            return {"ok": False, "err": "MongoDB is disabled or unavailable"}
+
+        try:
+            rng = store.allocate(count, crop_id=p.cropId, harvest_id=p.harvestId, user_id=p.userId,
+                                 status="PENDING")
+        except ValueError as e:
+            return {"ok": False, "err": str(e)}
+
+        chain_args = dict(
+            user_id=p.userId,
+            username=p.username,
+            crop_name=(p.cropName or ""),
+            crop_type=p.cropType,
+            crop_id=p.cropId,
+            packaging_date=p.packagingDate,
+            expiry_date=p.expiryDate,
+            bag_capacity=p.bagCapacity,
+            total_bags=str(count),
+        )
+        try:
+            if ranges_abi:
+                mode = "ranges"
+                txh = register_rfid_ranges_onchain(start_epcs=[rng["startEpc"]], end_epcs=[rng["endEpc"]],
+                                                   **chain_args)
+            else:
+                mode = "list"
+                txh = register_rfids_onchain(epcs=list(expand_range(rng["startEpc"], rng["endEpc"])),
+                                             **chain_args)
+        except Exception as e:
+            msg = str(e)
+            store.set_status(rng["_id"], "FAILED", error=msg)
+            rng.update(status="FAILED", error_message=msg)
+            return {"ok": False, "cropId": p.cropId, "err": "chain_failed", "error": msg,
+                    "range": range_public(rng)}
+
+        store.set_status(rng["_id"], "MINED", tx_hash=txh)
+        rng.update(status="MINED", txHash=txh)
+
+        def _on_receipt(result):
+            if result["status"] == "failed":
+                store.set_status(rng["_id"], "FAILED", tx_hash=txh, error="tx reverted")
+
+        watch_tx(txh, p.userId, "rfid_register", {"cropId": p.cropId, "count": count}, on_done=_on_receipt)
+        if job is not None:
+            job.advance(count, total=count)
+
+        return {"ok": True, "cropId": p.cropId, "count": count, "txHash": txh, "onchain": mode,
+                "range": range_public(rng)}
+
     # ------------------------------------------------------------
     # Read APIs
     # ------------------------------------------------------------
@@ -191,7 +305,9 @@ class RFIDService:
             return {"ok": False, "err": "MongoDB unavailable"}
 
         docs = list(col.find({"crop_id": crop_id}, {"_id": 0}))
-        return {"ok": True, "cropId": crop_id, "records": docs}
+        store = get_range_store()
+        ranges = [range_public(d) for d in store.for_crops([crop_id])] if store is not None else []
+        return {"ok": True, "cropId": crop_id, "records": docs, "ranges": ranges}
 
     @staticmethod
     def fetch_rfid_details(crop_id: str, epc: str) -> Dict[str, Any]:
@@ -204,17 +320,35 @@ class RFIDService:
             return {"ok": False, "err": "bad_epc"}
 
         doc = col.find_one({"crop_id": crop_id, "rfid_epc": epc}, {"_id": 0})
+        rng = None
+        if doc is None:
+            # serial-range tags have no per-EPC doc: interval lookup instead
+            store = get_range_store()
+            hit = store.lookup(epc) if store is not None else None
+            if hit and hit.get("cropId") == crop_id:
+                rng = range_public(hit)
         chain = None
         try:
             chain = get_rfid_record(crop_id, epc)
         except Exception:
             chain = None
 
-        return {"ok": True, "cropId": crop_id, "rfidEPC": epc, "mongo": doc, "chain": chain}
+        return {"ok": True, "cropId": crop_id, "rfidEPC": epc, "mongo": doc, "range": rng, "chain": chain}
 
     # ------------------------------------------------------------
     # Internals
     # ------------------------------------------------------------
+    @staticmethod
+    def _watch(col, p, epcs: List[str], tx_hash: str) -> None:
+        """Push tx lifecycle to the user's status stream; flip the docs to FAILED if it reverts."""
+        def _on_receipt(result):
+            if result["status"] == "failed":
+                RFIDService._bulk_update(col, p.cropId, epcs, status="FAILED", tx_hash=tx_hash,
+                                         error="tx reverted")
+
+        watch_tx(tx_hash, p.userId, "rfid_register", {"cropId": p.cropId, "count": len(epcs)},
+                 on_done=_on_receipt)
+
     @staticmethod
     def _ensure_indexes(col):
         try:
@@ -240,9 +374,8 @@ class RFIDService:
             return False
 
     @staticmethod
-    def _upsert_doc(col, p, epc: str, status: str, tx_hash: Optional[str], error: Optional[str]):
-        now = datetime.utcnow()
-        doc = {
+    def _doc_fields(p, epc: str, status: str, tx_hash: Optional[str], error: Optional[str], now: datetime) -> Dict[str, Any]:
+        return {
             "crop_id": p.cropId,
             "user_id": p.userId,
             "username": p.username,
@@ -258,6 +391,11 @@ class RFIDService:
             "error_message": error,
             "updated_at": now,
         }
+
+    @staticmethod
+    def _upsert_doc(col, p, epc: str, status: str, tx_hash: Optional[str], error: Optional[str]):
+        now = datetime.utcnow()
+        doc = RFIDService._doc_fields(p, epc, status, tx_hash, error, now)
         try:
             col.update_one(
                 {"crop_id": p.cropId, "rfid_epc": epc},
@@ -272,12 +410,102 @@ class RFIDService:
             )
 
     @staticmethod
-    def _update_one(col, crop_id: str, epc: str, status: str, tx_hash: Optional[str], error: Optional[str]):
+    def _bulk_upsert(col, p, epcs: List[str], status: str, tx_hash: Optional[str], error: Optional[str]) -> Dict[str, str]:
+        """
+        Upsert a whole pallet of EPC docs with unordered bulk_write batches.
+        Returns {epc: "inserted" | "updated" | "error: ..."}.
+        """
         now = datetime.utcnow()
-        col.update_one(
-            {"crop_id": crop_id, "rfid_epc": epc},
-            {"$set": {"status": status, "txHash": tx_hash, "error_message": error, "updated_at": now}},
-        )
+        ops = [
+            UpdateOne(
+                {"crop_id": p.cropId, "rfid_epc": epc},
+                {"$set": RFIDService._doc_fields(p, epc, status, tx_hash, error, now),
+                 "$setOnInsert": {"created_at": now}},
+                upsert=True,
+            )
+            for epc in epcs
+        ]
+        outcomes, dup_epcs = RFIDService._run_bulk(col, epcs, ops)
+
+        # Same as _upsert_doc: an upsert that lost a race on the unique index
+        # becomes a plain status update (one extra trip for all of them).
+        if dup_epcs:
+            retry_ops = [
+                UpdateOne(
+                    {"crop_id": p.cropId, "rfid_epc": epc},
+                    {"$set": {"status": status, "txHash": tx_hash, "error_message": error, "updated_at": now}},
+                )
+                for epc in dup_epcs
+            ]
+            retried, _ = RFIDService._run_bulk(col, dup_epcs, retry_ops)
+            outcomes.update(retried)
+
+        return outcomes
+
+    @staticmethod
+    def _bulk_set_status(
+        col,
+        crop_id: str,
+        updates: List[Tuple[str, str, Optional[str], Optional[str]]],
+    ) -> Dict[str, str]:
+        """
+        updates: [(epc, status, tx_hash, error), ...] -> one bulk pass.
+        """
+        if not updates:
+            return {}
+        now = datetime.utcnow()
+        epcs = [u[0] for u in updates]
+        ops = [
+            UpdateOne(
+                {"crop_id": crop_id, "rfid_epc": epc},
+                {"$set": {"status": status, "txHash": tx_hash, "error_message": error, "updated_at": now}},
+            )
+            for epc, status, tx_hash, error in updates
+        ]
+        outcomes, _ = RFIDService._run_bulk(col, epcs, ops)
+        return outcomes
+
+    @staticmethod
+    def _run_bulk(col, epcs: List[str], ops: List[UpdateOne]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Executes ops in BULK_BATCH sized unordered bulk_write calls and maps
+        the bulk result back to EPCs (ops[i] belongs to epcs[i]).
+        Returns (outcomes, epcs_that_hit_duplicate_key).
+        """
+        outcomes: Dict[str, str] = {}
+        dup_epcs: List[str] = []
+        size = max(1, RFIDService.BULK_BATCH)
+
+        for start in range(0, len(ops), size):
+            batch_epcs = epcs[start:start + size]
+            batch_ops = ops[start:start + size]
+            upserted: Dict[int, Any] = {}
+            failed: Dict[int, Dict[str, Any]] = {}
+
+            try:
+                res = col.bulk_write(batch_ops, ordered=False)
+                upserted = dict(res.upserted_ids or {})
+            except BulkWriteError as bwe:
+                details = bwe.details or {}
+                upserted = {u.get("index"): u.get("_id") for u in (details.get("upserted") or [])}
+                failed = {e.get("index"): e for e in (details.get("writeErrors") or [])}
+            except Exception as e:
+                for epc in batch_epcs:
+                    outcomes[epc] = f"error: {e}"
+                continue
+
+            for i, epc in enumerate(batch_epcs):
+                if i in failed:
+                    err = failed[i]
+                    if err.get("code") == 11000:
+                        dup_epcs.append(epc)
+                    outcomes[epc] = f"error: {err.get('errmsg') or 'write_error'}"
+                elif i in upserted:
+                    outcomes[epc] = "inserted"
+                else:
+                    outcomes[epc] = "updated"
+
+        return outcomes, dup_epcs
 
     @staticmethod
     def _bulk_update(col, crop_id: str, epcs: List[str], status: str, tx_hash: Optional[str], error: Optional[str]):
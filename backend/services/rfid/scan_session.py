@@ -0,0 +1,580 @@
+# backend/services/rfid/scan_session.py
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from backend.models.rfid.rfid_models import normalize_epc
+
+# ------------------------------------------------------------
+# Config
+# ------------------------------------------------------------
+# a re-read of the same tag inside this window is a duplicate (readers report
+# every tag in the field several times per second)
+DEDUPE_WINDOW_SECONDS = float(os.getenv("RFID_SCAN_DEDUPE_SECONDS", "2.0"))
+SESSION_TTL_SECONDS = int(os.getenv("RFID_SCAN_SESSION_TTL_SECONDS", str(2 * 3600)))
+MAX_ALERTS_KEPT = int(os.getenv("RFID_SCAN_ALERTS_KEPT", "500"))
+MAX_SESSIONS = int(os.getenv("RFID_SCAN_MAX_SESSIONS", "5000"))
+# sockets of one session on different workers re-read the shared EPC rows this often
+SYNC_SECONDS = float(os.getenv("RFID_SCAN_SYNC_SECONDS", "2.0"))
+
+
+def expected_bags_from_doc(doc: Optional[Dict[str, Any]]) -> int:
+    """Expected bag count of a farmer_request doc (bagQty, else bagsScanned, else embedded EPCs)."""
+    if not doc:
+        return 0
+    if doc.get("bagQty"):
+        try:
+            return int(doc["bagQty"])
+        except Exception:
+            pass
+    if doc.get("bagsScanned") is not None:
+        try:
+            return int(doc["bagsScanned"])
+        except Exception:
+            pass
+    arr = doc.get("rfidEpcs") if isinstance(doc.get("rfidEpcs"), list) else []
+    try:
+        return len({(b.get("epc") or "").upper() for b in arr if b and b.get("epc")})
+    except Exception:
+        return len(arr or [])
+
+
+def load_expected(db, crop_id: str) -> Optional[Tuple[str, int, Set[str]]]:
+    """
+    (farmerId, expected count, expected EPC set) for the latest harvest of crop_id,
+    or None if the crop has no harvest request.
+    """
+    from backend.services.farmer.harvest_bag_service import get_bag_store
+
+    doc = db.farmer_request.find_one(
+        {"cropId": crop_id},
+        sort=[("updated_at", -1), ("created_at", -1), ("_id", -1)],
+    )
+    if not doc:
+        return None
+    farmer_id = doc.get("farmerId") or ""
+    epcs: Set[str] = set()
+    try:
+        for b in get_bag_store(db).list_bags(farmer_id, crop_id):
+            e = normalize_epc((b or {}).get("epc") or "")
+            if e:
+                epcs.add(e)
+    except Exception as e:
+        print(f"⚠️ scan session: bag list unavailable for {crop_id}: {e}")
+    expected = expected_bags_from_doc(doc) or len(epcs)
+    return farmer_id, int(expected), epcs
+
+
+# ------------------------------------------------------------
+# Session
+# ------------------------------------------------------------
+class ScanSession:
+    """
+    Server-side state of one scan (any number of readers/sockets may feed it).
+    scanned / unexpected are sets: O(1) insert + membership.
+    """
+
+    def __init__(self, crop_id: str, farmer_id: str = "", user_id: str = "",
+                 expected: int = 0, expected_epcs: Optional[Iterable[str]] = None,
+                 session_id: Optional[str] = None):
+        self.id = session_id or uuid.uuid4().hex
+        self.crop_id = crop_id
+        self.farmer_id = farmer_id
+        self.user_id = user_id
+        self.expected_epcs: Set[str] = set(expected_epcs or ())
+        self.expected = int(expected or len(self.expected_epcs))
+        self.scanned: Set[str] = set()
+        self.unexpected: Set[str] = set()
+        self.reads = 0
+        self.dupes = 0
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+        # bumped on every state change; sockets push only when it moved
+        self.version = 0
+        self.alerts: Deque[Dict[str, Any]] = deque(maxlen=MAX_ALERTS_KEPT)
+        self._alert_seq = 0
+        self._completed = False
+        self._last_seen: Dict[str, float] = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # Ingest
+    # -------------------------
+    def _alert(self, kind: str, **data: Any) -> None:
+        self._alert_seq += 1
+        self.alerts.append({"seq": self._alert_seq, "kind": kind, "ts": time.time(), **data})
+
+    def _sweep(self, now: float) -> None:
+        if now - self._last_sweep < DEDUPE_WINDOW_SECONDS:
+            return
+        cutoff = now - DEDUPE_WINDOW_SECONDS
+        self._last_seen = {e: t for e, t in self._last_seen.items() if t >= cutoff}
+        self._last_sweep = now
+
+    def ingest(self, raw_epcs: Iterable[str]) -> Dict[str, Any]:
+        """
+        Feed a batch of raw reads. Returns
+          {"new": [...], "fresh": [...], "rejected": n, "dupes": n}
+        fresh = reads outside the dedupe window (worth recording as events).
+        """
+        now = time.monotonic()
+        new: List[str] = []
+        fresh: List[str] = []
+        rejected = dupes = 0
+        with self._lock:
+            self._sweep(now)
+            for raw in raw_epcs:
+                epc = normalize_epc(str(raw or ""))
+                if not epc:
+                    rejected += 1
+                    continue
+                self.reads += 1
+                last = self._last_seen.get(epc)
+                self._last_seen[epc] = now
+                if last is not None and now - last < DEDUPE_WINDOW_SECONDS:
+                    dupes += 1
+                    continue
+                fresh.append(epc)
+                if epc in self.scanned or epc in self.unexpected:
+                    continue
+                if self.expected_epcs and epc not in self.expected_epcs:
+                    self.unexpected.add(epc)
+                    self._alert("unexpected_epc", epc=epc)
+                else:
+                    self.scanned.add(epc)
+                new.append(epc)
+
+            self.dupes += dupes
+            if new or fresh:
+                self.version += 1
+                self.updated_at = time.time()
+            if new:
+                self._check_counts()
+        return {"new": new, "fresh": fresh, "rejected": rejected, "dupes": dupes}
+
+    def merge(self, scanned: Iterable[str], unexpected: Iterable[str] = ()) -> bool:
+        """Adopt EPCs recorded elsewhere (shared store / another worker). True if anything changed."""
+        with self._lock:
+            before = (len(self.scanned), len(self.unexpected))
+            self.unexpected.update(e for e in unexpected if e not in self.scanned)
+            self.scanned.update(e for e in scanned if e not in self.unexpected)
+            changed = (len(self.scanned), len(self.unexpected)) != before
+            if changed:
+                self.version += 1
+                self.updated_at = time.time()
+                self._check_counts()
+            return changed
+
+    def _check_counts(self) -> None:
+        count = len(self.scanned)
+        if not self.expected:
+            return
+        if count > self.expected and not self.expected_epcs:
+            self._alert("over_count", scanned=count, expected=self.expected)
+        if count == self.expected and not self.unexpected and not self._completed:
+            self._completed = True
+            self._alert("complete", scanned=count, expected=self.expected)
+
+    # -------------------------
+    # Views
+    # -------------------------
+    def missing(self) -> List[str]:
+        with self._lock:
+            return sorted(self.expected_epcs - self.scanned)
+
+    def alerts_since(self, seq: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [a for a in self.alerts if a["seq"] > seq]
+
+    def snapshot(self, include_epcs: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            count = len(self.scanned)
+            out = {
+                "sessionId": self.id,
+                "cropId": self.crop_id,
+                "expected": self.expected,
+                "scanned": count,
+                "unexpected": len(self.unexpected),
+                "missing": max(0, self.expected - count),
+                "mismatch": bool(self.unexpected) or (self.expected != 0 and count != self.expected),
+                "reads": self.reads,
+                "dupes": self.dupes,
+                "startedAt": int(self.started_at),
+                "version": self.version,
+            }
+            if include_epcs:
+                out["epcs"] = sorted(self.scanned)
+                out["unexpectedEpcs"] = sorted(self.unexpected)
+            return out
+
+
+# ------------------------------------------------------------
+# In-process registry
+# ------------------------------------------------------------
+class ScanSessionRegistry:
+    """Live sessions of this process, expired SESSION_TTL_SECONDS after the last read."""
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS, max_sessions: int = MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self._sessions: Dict[str, ScanSession] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        for sid in [sid for sid, s in self._sessions.items() if s.updated_at < cutoff]:
+            del self._sessions[sid]
+
+    def add(self, session: ScanSession) -> ScanSession:
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                oldest = min(self._sessions.values(), key=lambda s: s.updated_at)
+                del self._sessions[oldest.id]
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str, user_id: Optional[str] = None) -> Optional[ScanSession]:
+        with self._lock:
+            s = self._sessions.get(session_id or "")
+            if s is not None and s.updated_at < time.time() - self.ttl:
+                del self._sessions[s.id]
+                s = None
+        if s is None or (user_id is not None and s.user_id and s.user_id != user_id):
+            return None
+        return s
+
+    def get_or_add(self, session: ScanSession) -> ScanSession:
+        """The live session with session.id if there is one, else `session` (concurrent loads)."""
+        with self._lock:
+            live = self._sessions.get(session.id)
+            if live is not None:
+                return live
+        return self.add(session)
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id or "", None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions)}
+
+
+scan_sessions = ScanSessionRegistry()
+
+
+def start_session(db, crop_id: str, user_id: str) -> Optional[ScanSession]:
+    """
+    Create a session for crop_id with its expected bag set; None if the crop is unknown.
+    With the Mongo store the session is also persisted, so the WebSocket (and
+    GET / DELETE) can land on any worker: see load_session.
+    """
+    found = load_expected(db, crop_id)
+    if found is None:
+        return None
+    farmer_id, expected, epcs = found
+    store = get_scan_store(db)
+    session_id = None
+    if isinstance(store, MongoScanStore):
+        session_id = store.create(crop_id, user_id, farmer_id, expected, epcs)["sessionId"]
+    return scan_sessions.add(ScanSession(crop_id, farmer_id, user_id, expected, epcs, session_id=session_id))
+
+
+def load_session(db, session_id: str, user_id: Optional[str] = None,
+                 sync: bool = False) -> Optional[ScanSession]:
+    """
+    Live session of this worker, else rebuilt from the Mongo store (started on
+    another worker). sync=True also merges EPCs other workers recorded since.
+    """
+    store = get_scan_store(db)
+    session = scan_sessions.get(session_id, user_id)
+    if session is not None and not sync:
+        return session
+    if not isinstance(store, MongoScanStore):
+        return session
+
+    found = store.load(session_id)
+    if found is None:
+        return None  # expired / deleted in the shared store
+    doc, scanned, unexpected = found
+    if user_id is not None and doc.get("userId") and doc["userId"] != user_id:
+        return None
+    if session is None:
+        session = scan_sessions.get_or_add(ScanSession(
+            doc.get("cropId") or "", doc.get("farmerId") or "", doc.get("userId") or "",
+            int(doc.get("expected") or 0), doc.get("expectedEpcs") or (), session_id=doc["_id"],
+        ))
+    session.merge(scanned, unexpected)
+    return session
+
+
+def record_new(db, session: ScanSession, epcs: List[str]) -> None:
+    """Persist EPCs a worker just added to its live session (no-op for the memory store)."""
+    store = get_scan_store(db)
+    if epcs and isinstance(store, MongoScanStore):
+        store.add(session.id, epcs)
+
+
+def end_session(db, session_id: str) -> None:
+    scan_sessions.remove(session_id)
+    store = get_scan_store(db)
+    if isinstance(store, MongoScanStore):
+        store.delete(session_id)
+
+
+# ------------------------------------------------------------
+# Scan-session stores (HTTP scan flow: cookie holds only the session id)
+#
+#   store = get_scan_store(db)
+#   state = store.create(crop_id, user_id, farmer_id, expected, expected_epcs)
+#   state = store.add(session_id, epcs)      # None if expired / unknown
+#   state = store.get(session_id); store.epcs(session_id); store.delete(session_id)
+#
+# Every call takes user_id=...: a session owned by another user is treated as
+# unknown (same rule as load_session; sessions started signed out have no owner).
+#
+# state = {sessionId, cropId, userId, expected, scanned, unexpected, added, startedAt}
+# add() also returns the EPCs that call added: new (expected) / newUnexpected
+# ------------------------------------------------------------
+SCAN_STORE_BACKEND = os.getenv("RFID_SCAN_STORE", "mongo")  # "mongo" | "memory"
+SESSIONS_COL = os.getenv("RFID_SCAN_SESSIONS_COL", "rfid_scan_sessions")
+SESSION_EPCS_COL = os.getenv("RFID_SCAN_EPCS_COL", "rfid_scan_epcs")
+# EPC rows outlive any session; swept by their own TTL
+EPC_ROWS_TTL_SECONDS = int(os.getenv("RFID_SCAN_EPCS_TTL_SECONDS", str(24 * 3600)))
+
+
+class MemoryScanStore:
+    """Backed by the in-process registry (shared with the WebSocket channel)."""
+
+    def __init__(self, registry: ScanSessionRegistry = scan_sessions):
+        self.registry = registry
+
+    @staticmethod
+    def _state(s: ScanSession, added: int = 0) -> Dict[str, Any]:
+        snap = s.snapshot()
+        return {
+            "sessionId": s.id,
+            "cropId": s.crop_id,
+            "userId": s.user_id,
+            "expected": snap["expected"],
+            "scanned": snap["scanned"],
+            "unexpected": snap["unexpected"],
+            "added": added,
+            "startedAt": snap["startedAt"],
+        }
+
+    def create(self, crop_id: str, user_id: str, farmer_id: str = "", expected: int = 0,
+               expected_epcs: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        s = self.registry.add(ScanSession(crop_id, farmer_id, user_id, expected, expected_epcs))
+        return self._state(s)
+
+    def add(self, session_id: str, epcs: Iterable[str], user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        s = self.registry.get(session_id, user_id)
+        if s is None:
+            return None
+        delta = s.ingest(epcs)
+        state = self._state(s, added=len(delta["new"]))
+        state["newUnexpected"] = [e for e in delta["new"] if e in s.unexpected]
+        state["new"] = [e for e in delta["new"] if e not in s.unexpected]
+        return state
+
+    def get(self, session_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        s = self.registry.get(session_id, user_id)
+        return self._state(s) if s is not None else None
+
+    def epcs(self, session_id: str, user_id: Optional[str] = None) -> List[str]:
+        s = self.registry.get(session_id, user_id)
+        return s.snapshot(include_epcs=True)["epcs"] if s is not None else []
+
+    def delete(self, session_id: str, user_id: Optional[str] = None) -> None:
+        if self.registry.get(session_id, user_id) is not None:
+            self.registry.remove(session_id)
+
+
+class MongoScanStore:
+    """
+    Shared by every worker / process. One doc per session (counters, TTL on
+    expiresAt) and one row per scanned EPC with a unique (sessionId, epc) key:
+    insert_many(ordered=False) is the O(1) set insert, and concurrent scanners
+    on one session can't double count.
+    """
+
+    def __init__(self, db):
+        self.sessions = db[SESSIONS_COL]
+        self.rows = db[SESSION_EPCS_COL]
+        # session id -> (owner userId, expected EPCs)
+        self._expected_cache: Dict[str, Tuple[str, Set[str]]] = {}
+        self._lock = threading.Lock()
+        self._ensure_indexes()
+
+    def _ensure_indexes(self) -> None:
+        try:
+            self.sessions.create_index("expiresAt", name="ttl_expires", expireAfterSeconds=0)
+            self.rows.create_index([("sessionId", 1), ("epc", 1)], unique=True, name="uq_session_epc")
+            self.rows.create_index("at", name="ttl_at", expireAfterSeconds=EPC_ROWS_TTL_SECONDS)
+        except Exception as e:
+            print(f"⚠️ scan session index error: {e}")
+
+    @staticmethod
+    def _expires() -> datetime:
+        return datetime.utcnow() + timedelta(seconds=SESSION_TTL_SECONDS)
+
+    @staticmethod
+    def _state(doc: Dict[str, Any], added: int = 0) -> Dict[str, Any]:
+        return {
+            "sessionId": doc["_id"],
+            "cropId": doc.get("cropId"),
+            "userId": doc.get("userId"),
+            "expected": int(doc.get("expected") or 0),
+            "scanned": int(doc.get("scanned") or 0),
+            "unexpected": int(doc.get("unexpected") or 0),
+            "added": added,
+            "startedAt": doc.get("startedAt"),
+        }
+
+    @staticmethod
+    def _owned(owner: Optional[str], user_id: Optional[str]) -> bool:
+        return user_id is None or not owner or owner == user_id
+
+    def _expected_set(self, session_id: str, user_id: Optional[str] = None) -> Optional[Set[str]]:
+        # owner + expected set are immutable after create -> cache per process
+        with self._lock:
+            hit = self._expected_cache.get(session_id)
+        if hit is None:
+            doc = self.sessions.find_one({"_id": session_id}, {"expectedEpcs": 1, "userId": 1})
+            if doc is None:
+                return None
+            hit = (doc.get("userId") or "", set(doc.get("expectedEpcs") or ()))
+            with self._lock:
+                if len(self._expected_cache) >= MAX_SESSIONS:
+                    self._expected_cache.clear()
+                self._expected_cache[session_id] = hit
+        owner, exp = hit
+        return exp if self._owned(owner, user_id) else None
+
+    def create(self, crop_id: str, user_id: str, farmer_id: str = "", expected: int = 0,
+               expected_epcs: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        exp = sorted(set(expected_epcs or ()))
+        doc = {
+            "_id": uuid.uuid4().hex,
+            "cropId": crop_id,
+            "userId": user_id,
+            "farmerId": farmer_id,
+            "expected": int(expected or len(exp)),
+            "expectedEpcs": exp,
+            "scanned": 0,
+            "unexpected": 0,
+            "startedAt": int(time.time()),
+            "expiresAt": self._expires(),
+        }
+        self.sessions.insert_one(doc)
+        return self._state(doc)
+
+    def add(self, session_id: str, epcs: Iterable[str], user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        expected = self._expected_set(session_id, user_id)
+        if expected is None:
+            return None
+
+        now = datetime.utcnow()
+        rows, seen = [], set()
+        for raw in epcs:
+            epc = normalize_epc(str(raw or ""))
+            if epc and epc not in seen:
+                seen.add(epc)
+                rows.append({
+                    "sessionId": session_id,
+                    "epc": epc,
+                    "unexpected": bool(expected) and epc not in expected,
+                    "at": now,
+                })
+
+        inserted: List[Dict[str, Any]] = rows
+        if rows:
+            try:
+                self.rows.insert_many(rows, ordered=False)
+            except BulkWriteError as e:
+                # duplicates = already scanned (possibly by another scanner)
+                failed = {w.get("index") for w in e.details.get("writeErrors", [])}
+                if any(w.get("code") != 11000 for w in e.details.get("writeErrors", [])):
+                    raise
+                inserted = [r for i, r in enumerate(rows) if i not in failed]
+
+        n_unexpected = sum(1 for r in inserted if r["unexpected"])
+        doc = self.sessions.find_one_and_update(
+            {"_id": session_id},
+            {
+                "$inc": {"scanned": len(inserted) - n_unexpected, "unexpected": n_unexpected},
+                "$set": {"expiresAt": self._expires()},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return None
+        state = self._state(doc, added=len(inserted))
+        state["new"] = [r["epc"] for r in inserted if not r["unexpected"]]
+        state["newUnexpected"] = [r["epc"] for r in inserted if r["unexpected"]]
+        return state
+
+    def get(self, session_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        doc = self.sessions.find_one({"_id": session_id or ""}, {"expectedEpcs": 0})
+        if doc is None or not self._owned(doc.get("userId"), user_id):
+            return None
+        return self._state(doc)
+
+    def load(self, session_id: str) -> Optional[Tuple[Dict[str, Any], List[str], List[str]]]:
+        """(session doc incl. expectedEpcs, scanned EPCs, unexpected EPCs) or None."""
+        doc = self.sessions.find_one({"_id": session_id or ""})
+        if doc is None:
+            return None
+        scanned: List[str] = []
+        unexpected: List[str] = []
+        for r in self.rows.find({"sessionId": doc["_id"]}, {"epc": 1, "unexpected": 1, "_id": 0}):
+            (unexpected if r.get("unexpected") else scanned).append(r["epc"])
+        return doc, scanned, unexpected
+
+    def epcs(self, session_id: str, user_id: Optional[str] = None) -> List[str]:
+        if user_id is not None and self._expected_set(session_id, user_id) is None:
+            return []
+        cur = self.rows.find({"sessionId": session_id, "unexpected": False}, {"epc": 1, "_id": 0})
+        return sorted(r["epc"] for r in cur)
+
+    def delete(self, session_id: str, user_id: Optional[str] = None) -> None:
+        if user_id is not None and self._expected_set(session_id, user_id) is None:
+            return
+        self.sessions.delete_one({"_id": session_id})
+        self.rows.delete_many({"sessionId": session_id})
+        with self._lock:
+            self._expected_cache.pop(session_id, None)
+
+
+_stores: Dict[int, Any] = {}
+_stores_lock = threading.Lock()
+
+
+def get_scan_store(db=None):
+    """Mongo-backed store for `db`; in-memory when RFID_SCAN_STORE=memory or Mongo is off."""
+    if SCAN_STORE_BACKEND == "memory" or db is None:
+        return _memory_store
+    key = id(db)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = _stores[key] = MongoScanStore(db)
+    return store
+
+
+_memory_store = MemoryScanStore()
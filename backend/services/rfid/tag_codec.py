@@ -0,0 +1,418 @@
+# backend/services/rfid/tag_codec.py
+#
+# Versioned binary encoding of the compact tag payload (tag_payload.py), small
+# enough for EPC user memory on cheap tags and decoded without a JSON parse.
+#
+#   blob = encode(payload, budget=64)      # bytes, raises TagBudgetError
+#   payload = decode(blob)                 # same dict the JSON form carries
+#   ok = verify(blob, signer)              # HMAC check on the decoded fields
+#   payload, ok = read(blob, signer)       # both; raises TagCodecError (scan / resolve paths)
+#
+# v1 layout
+#   [0]   version (high nibble) | 0
+#   [1]   presence bits: cid ctp hdt hnm fid mid hqt ext      (bit 0 = cid)
+#   [2]   if ext: epc bq bix sig                              (bit 0 = epc)
+#   then the present fields in that order:
+#     strings  1-byte header  type(3) | flag(1) | len(4)   (len 15 -> varint length follows)
+#        0 utf-8            raw bytes
+#        1 number           varint (canonical decimal, no leading zeros)
+#        2 code + digits    sixbit prefix (len chars), digit count byte, varint   e.g. CROP-000123
+#        3 sixbit           [0-9A-Za-z-_] packed 6 bits / char
+#        4 hex              packed 4 bits / char (flag = lower case)
+#        5 codebook         varint code (static cropType table, CROP_TYPES)
+#        6 date             uint16 days since 2000-01-01 (exact "YYYY-MM-DD" only)
+#     hqt, bq, bix          varint
+#     epc                   string (hex)
+#     sig                   12 raw bytes (the urlsafe-b64 text in JSON is 16)
+#
+# Absent string fields decode to "" (the JSON form always carries all seven
+# harvest keys), so the signature message is rebuilt byte for byte.
+#
+# v1 tags are self-contained: the only codebook is the static, append-only
+# CROP_TYPES table compiled into every reader, so a handheld decodes a tag
+# without a database round trip. Farmer / manufacturer IDs are always spelled
+# out (code+digits / sixbit / hex keep them short).
+
+from __future__ import annotations
+
+import base64
+import os
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+VERSION = 1
+TAG_USER_MEMORY_BYTES = int(os.getenv("RFID_TAG_USER_MEMORY_BYTES", "64"))
+
+# field order is part of the format
+BASE_FIELDS = ("cid", "ctp", "hdt", "hnm", "fid", "mid", "hqt")
+EXT_FIELDS = ("epc", "bq", "bix", "sig")
+INT_FIELDS = ("hqt", "bq", "bix")
+# string fields that may be replaced by a codebook reference
+BOOK_FIELDS = ("ctp",)
+# dropped (in this order) by encode(..., fit=True) when over budget; never signed
+DROPPABLE = ("hnm",)
+
+SIG_BYTES = 12
+
+T_UTF8, T_NUMBER, T_CODE_DIGITS, T_SIXBIT, T_HEX, T_BOOK, T_DATE = range(7)
+
+SIXBIT = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-_"
+_SIXBIT_INDEX = {c: i for i, c in enumerate(SIXBIT)}
+_SIXBIT_RE = re.compile(r"^[0-9A-Za-z_-]*$")
+_CODE_DIGITS_RE = re.compile(r"^([0-9A-Za-z_-]*?)([0-9]{3,})$")
+_UPPER_HEX_RE = re.compile(r"^[0-9A-F]+$")
+_LOWER_HEX_RE = re.compile(r"^[0-9a-f]+$")
+_EPOCH = date(2000, 1, 1)
+
+# v1 static codebook: codes 0..255 are fixed forever (append only, never reorder)
+CROP_TYPES = (
+    "Rice", "Wheat", "Maize", "Corn", "Barley", "Sorghum", "Millet", "Oats",
+    "Soybean", "Groundnut", "Peanut", "Mustard", "Sunflower", "Sesame", "Cotton", "Jute",
+    "Sugarcane", "Potato", "Onion", "Tomato", "Chilli", "Garlic", "Ginger", "Turmeric",
+    "Cabbage", "Cauliflower", "Carrot", "Brinjal", "Okra", "Spinach", "Peas", "Beans",
+    "Lentil", "Chickpea", "Pigeon Pea", "Green Gram", "Black Gram", "Coffee", "Tea", "Cocoa",
+    "Banana", "Mango", "Apple", "Orange", "Grapes", "Papaya", "Pineapple", "Coconut",
+    "Cashew", "Almond", "Cardamom", "Pepper", "Clove", "Cinnamon", "Vanilla", "Rubber",
+)
+
+
+class TagCodecError(ValueError):
+    pass
+
+
+class TagBudgetError(TagCodecError):
+    def __init__(self, size: int, budget: int):
+        super().__init__(f"encoded tag is {size} bytes, budget {budget}")
+        self.size = size
+        self.budget = budget
+
+
+# ------------------------------------------------------------
+# Codebook
+# ------------------------------------------------------------
+class CodeBook:
+    """String <-> small int over the static v1 table (crop types at 0..255)."""
+
+    def __init__(self, static: Iterable[str] = CROP_TYPES):
+        self._by_code: Dict[int, str] = {}
+        self._by_value: Dict[str, int] = {}
+        for i, v in enumerate(static):
+            self._by_code[i] = v
+            self._by_value.setdefault(v, i)
+
+    def code(self, value: str, field: str = "") -> Optional[int]:
+        return self._by_value.get(value)
+
+    def value(self, code: int) -> str:
+        try:
+            return self._by_code[code]
+        except KeyError:
+            raise TagCodecError(f"unknown codebook entry {code}") from None
+
+
+default_book = CodeBook()
+
+
+# ------------------------------------------------------------
+# Primitives
+# ------------------------------------------------------------
+def _varint(n: int) -> bytes:
+    if n < 0:
+        raise TagCodecError("negative varint")
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise TagCodecError("truncated varint")
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return n, pos
+        shift += 7
+
+
+def _header(kind: int, length: int, flag: int = 0) -> bytes:
+    if length < 15:
+        return bytes(((kind << 5) | (flag << 4) | length,))
+    return bytes(((kind << 5) | (flag << 4) | 15,)) + _varint(length)
+
+
+def _pack_sixbit(s: str) -> bytes:
+    acc = bits = 0
+    out = bytearray()
+    for c in s:
+        acc = (acc << 6) | _SIXBIT_INDEX[c]
+        bits += 6
+        while bits >= 8:
+            bits -= 8
+            out.append((acc >> bits) & 0xFF)
+    if bits:
+        out.append((acc << (8 - bits)) & 0xFF)
+    return bytes(out)
+
+
+def _unpack_sixbit(buf: bytes, n: int) -> str:
+    v = int.from_bytes(buf, "big") >> (len(buf) * 8 - n * 6)
+    return "".join([SIXBIT[(v >> s) & 0x3F] for s in range(6 * (n - 1), -1, -6)])
+
+
+def _sixbit_len(n: int) -> int:
+    return (n * 6 + 7) // 8
+
+
+def _encode_str(s: str, field: str, book: Optional[CodeBook]) -> bytes:
+    candidates: List[bytes] = []
+
+    if book is not None and field in BOOK_FIELDS:
+        code = book.code(s, field)
+        if code is not None:
+            candidates.append(_header(T_BOOK, 0) + _varint(code))
+
+    if field == "hdt":
+        try:
+            d = date.fromisoformat(s)
+            days = (d - _EPOCH).days
+            if d.isoformat() == s and 0 <= days <= 0xFFFF:
+                candidates.append(_header(T_DATE, 0) + days.to_bytes(2, "big"))
+        except ValueError:
+            pass
+
+    if s.isdigit() and s.isascii() and (s == "0" or not s.startswith("0")):
+        candidates.append(_header(T_NUMBER, 0) + _varint(int(s)))
+
+    if _UPPER_HEX_RE.match(s) or _LOWER_HEX_RE.match(s):
+        lower = s != s.upper()
+        padded = s + "0" if len(s) % 2 else s
+        candidates.append(_header(T_HEX, len(s), int(lower)) + bytes.fromhex(padded))
+
+    if _SIXBIT_RE.match(s):
+        candidates.append(_header(T_SIXBIT, len(s)) + _pack_sixbit(s))
+        m = _CODE_DIGITS_RE.match(s)
+        if m and len(m.group(2)) <= 0xFF:  # digit count is one byte
+            prefix, digits = m.groups()
+            candidates.append(_header(T_CODE_DIGITS, len(prefix)) + _pack_sixbit(prefix)
+                              + bytes((len(digits),)) + _varint(int(digits)))
+
+    raw = s.encode("utf-8")
+    candidates.append(_header(T_UTF8, len(raw)) + raw)
+    return min(candidates, key=len)
+
+
+def _decode_str(buf: bytes, pos: int, book: Optional[CodeBook]) -> Tuple[str, int]:
+    if pos >= len(buf):
+        raise TagCodecError("truncated string header")
+    h = buf[pos]
+    pos += 1
+    kind, length = h >> 5, h & 0x0F
+    if length == 15:
+        length, pos = _read_varint(buf, pos)
+
+    if kind == T_UTF8:
+        end = pos + length
+        s = buf[pos:end].decode("utf-8")
+    elif kind == T_HEX:
+        end = pos + (length + 1) // 2
+        s = buf[pos:end].hex()[:length]
+        if not h & 0x10:
+            s = s.upper()
+    elif kind == T_SIXBIT:
+        end = pos + _sixbit_len(length)
+        s = _unpack_sixbit(buf[pos:end], length)
+    elif kind == T_CODE_DIGITS:
+        end = pos + _sixbit_len(length)
+        prefix = _unpack_sixbit(buf[pos:end], length) if length else ""
+        if end >= len(buf):
+            raise TagCodecError("truncated string")
+        n, pos = _read_varint(buf, end + 1)
+        return prefix + str(n).zfill(buf[end]), pos
+    elif kind == T_NUMBER:
+        n, pos = _read_varint(buf, pos)
+        return str(n), pos
+    elif kind == T_BOOK:
+        code, pos = _read_varint(buf, pos)
+        if book is None:
+            raise TagCodecError("codebook reference without a codebook")
+        return book.value(code), pos
+    elif kind == T_DATE:
+        end = pos + 2
+        s = (_EPOCH + timedelta(days=int.from_bytes(buf[pos:end], "big"))).isoformat()
+    else:
+        raise TagCodecError(f"unknown string type {kind}")
+
+    if end > len(buf):
+        raise TagCodecError("truncated string")
+    return s, end
+
+
+# ------------------------------------------------------------
+# Encode / decode
+# ------------------------------------------------------------
+def _int_or_none(v: Any) -> Optional[int]:
+    if v in ("", None):
+        return None
+    if isinstance(v, bool) or not isinstance(v, int):
+        raise TagCodecError(f"expected an int, got {v!r}")
+    return v
+
+
+def _encode(payload: Dict[str, Any], book: Optional[CodeBook]) -> bytes:
+    present = 0
+    ext = 0
+    body = bytearray()
+
+    for i, f in enumerate(BASE_FIELDS):
+        v = payload.get(f, "")
+        if f in INT_FIELDS:
+            n = _int_or_none(v)
+            if n is None:
+                continue
+            body += _varint(n)
+        else:
+            if v in ("", None):
+                continue
+            body += _encode_str(str(v), f, book)
+        present |= 1 << i
+
+    for i, f in enumerate(EXT_FIELDS):
+        if f not in payload:
+            continue
+        v = payload[f]
+        if f == "sig":
+            raw = base64.urlsafe_b64decode(str(v) + "=" * (-len(str(v)) % 4))
+            if len(raw) != SIG_BYTES:
+                raise TagCodecError("sig must be 12 bytes")
+            body += raw
+        elif f in INT_FIELDS:
+            body += _varint(int(v or 0))
+        else:
+            body += _encode_str(str(v), f, book)
+        ext |= 1 << i
+
+    head = bytearray((VERSION << 4, present | (0x80 if ext else 0)))
+    if ext:
+        head.append(ext)
+    return bytes(head + body)
+
+
+def encode(payload: Dict[str, Any], book: Optional[CodeBook] = default_book,
+           budget: Optional[int] = None, fit: bool = False) -> bytes:
+    """
+    Binary form of a tag payload dict. With `budget`, raises TagBudgetError when
+    larger; fit=True first drops unsigned display fields (harvester name).
+    Anything else it can't encode raises TagCodecError.
+    """
+    try:
+        blob = _encode(payload, book)
+        if budget is None or len(blob) <= budget:
+            return blob
+        if fit:
+            trimmed = dict(payload)
+            for f in DROPPABLE:
+                trimmed.pop(f, None)
+                blob = _encode(trimmed, book)
+                if len(blob) <= budget:
+                    return blob
+    except TagCodecError:
+        raise
+    except (ValueError, OverflowError) as e:
+        # e.g. a number past int()'s digit limit
+        raise TagCodecError(f"unencodable payload: {e}") from None
+    raise TagBudgetError(len(blob), budget)
+
+
+def decode(blob: bytes, book: Optional[CodeBook] = default_book) -> Dict[str, Any]:
+    if len(blob) < 2:
+        raise TagCodecError("tag too short")
+    version = blob[0] >> 4
+    if version != VERSION:
+        raise TagCodecError(f"unsupported tag version {version}")
+    present = blob[1]
+    pos = 2
+    ext = 0
+    if present & 0x80:
+        if len(blob) < 3:
+            raise TagCodecError("truncated ext byte")
+        ext = blob[2]
+        pos = 3
+
+    out: Dict[str, Any] = {}
+    for i, f in enumerate(BASE_FIELDS):
+        if not present & (1 << i):
+            out[f] = ""
+        elif f in INT_FIELDS:
+            out[f], pos = _read_varint(blob, pos)
+        else:
+            out[f], pos = _decode_str(blob, pos, book)
+
+    for i, f in enumerate(EXT_FIELDS):
+        if not ext & (1 << i):
+            continue
+        if f == "sig":
+            raw = blob[pos:pos + SIG_BYTES]
+            if len(raw) != SIG_BYTES:
+                raise TagCodecError("truncated sig")
+            out[f] = base64.urlsafe_b64encode(raw).decode()
+            pos += SIG_BYTES
+        elif f in INT_FIELDS:
+            out[f], pos = _read_varint(blob, pos)
+        else:
+            out[f], pos = _decode_str(blob, pos, book)
+
+    if pos != len(blob):
+        raise TagCodecError(f"{len(blob) - pos} trailing bytes")
+    return out
+
+
+def read(blob: bytes, signer, book: Optional[CodeBook] = default_book) -> Tuple[Dict[str, Any], bool]:
+    """
+    Decode + HMAC check (tag_payload.TagSigner) in one pass: (payload, verified).
+    Raises TagCodecError for undecodable tags; an unsigned tag only verifies
+    when no secret is configured.
+    """
+    payload = decode(blob, book)
+    if "sig" not in payload and signer:
+        return payload, False
+    return payload, signer.verify(payload)
+
+
+def verify(blob: bytes, signer, book: Optional[CodeBook] = default_book) -> bool:
+    """False for undecodable or forged tags."""
+    try:
+        return read(blob, signer, book)[1]
+    except TagCodecError:
+        return False
+
+
+def fits(payload: Dict[str, Any], budget: int = TAG_USER_MEMORY_BYTES,
+         book: Optional[CodeBook] = default_book) -> Tuple[bool, int]:
+    size = len(_encode(payload, book))
+    return size <= budget, size
+
+
+__all__ = [
+    "VERSION",
+    "TAG_USER_MEMORY_BYTES",
+    "CROP_TYPES",
+    "TagCodecError",
+    "TagBudgetError",
+    "CodeBook",
+    "default_book",
+    "encode",
+    "decode",
+    "read",
+    "verify",
+    "fits",
+]
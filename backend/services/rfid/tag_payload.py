@@ -0,0 +1,122 @@
+# backend/services/rfid/tag_payload.py
+#
+# Compact tag payload for a harvest (what the ESP32 writer puts on a tag):
+#   {"cid","ctp","hdt","hnm","fid","mid","hqt"[,"epc","bq"|"bix"][,"sig"]}
+#   sig = urlsafe-b64(HMAC-SHA256(RFID_TAG_SECRET, "cid|hdt|fid|mid|hqt|ctp[|epc|bq][|bix]")[:12])
+#
+# Harvest-level payloads (no epc / bix) sign exactly the six fields, as before.
+# Bag-level payloads also sign the bag's EPC + quantity (or its label index),
+# so a signed label can't be copied onto another bag.
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+
+def tag_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    hqt = doc.get("harvestQuantity", "")
+    try:
+        if hqt not in ("", None):
+            hqt = int(round(float(hqt)))
+    except Exception:
+        hqt = ""
+
+    return {
+        "cid": doc.get("cropId", ""),
+        "ctp": doc.get("cropType", ""),
+        "hdt": doc.get("harvestDate", ""),
+        "hnm": doc.get("harvesterName", ""),
+        "fid": doc.get("farmerId", ""),
+        "mid": doc.get("manufacturerId", ""),
+        "hqt": hqt,
+    }
+
+
+def signature_message(payload: Dict[str, Any]) -> str:
+    msg = f"{payload['cid']}|{payload['hdt']}|{payload['fid']}|{payload['mid']}|{payload['hqt']}|{payload['ctp']}"
+    if "epc" in payload:
+        msg += f"|{payload['epc']}|{payload.get('bq', '')}"
+    if "bix" in payload:
+        msg += f"|{payload['bix']}"
+    return msg
+
+
+class TagSigner:
+    """HMAC key schedule built once; each sign() copies the keyed state instead of re-keying."""
+
+    def __init__(self, secret: Optional[str]):
+        self._base = hmac.new(secret.encode(), digestmod=hashlib.sha256) if secret else None
+
+    def __bool__(self) -> bool:
+        return self._base is not None
+
+    def sign(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self._base is not None:
+            h = self._base.copy()
+            h.update(signature_message(payload).encode())
+            payload["sig"] = base64.urlsafe_b64encode(h.digest()[:12]).decode()
+        return payload
+
+    def verify(self, payload: Dict[str, Any]) -> bool:
+        if self._base is None:
+            return True
+        sig = payload.get("sig") or ""
+        h = self._base.copy()
+        h.update(signature_message(payload).encode())
+        return hmac.compare_digest(sig, base64.urlsafe_b64encode(h.digest()[:12]).decode())
+
+
+_signers: Dict[str, TagSigner] = {}
+
+
+def get_signer(secret: Optional[str] = None) -> TagSigner:
+    """Signer for `secret` (default RFID_TAG_SECRET), cached per secret."""
+    secret = os.environ.get("RFID_TAG_SECRET") if secret is None else secret
+    key = secret or ""
+    signer = _signers.get(key)
+    if signer is None:
+        signer = _signers[key] = TagSigner(secret)
+    return signer
+
+
+def dumps_tag(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def harvest_tag(doc: Dict[str, Any], signer: Optional[TagSigner] = None) -> Dict[str, Any]:
+    return (signer or get_signer()).sign(tag_fields(doc))
+
+
+def bag_tags(doc: Dict[str, Any], bags: List[Dict[str, Any]], count: int = 0,
+             signer: Optional[TagSigner] = None) -> Iterator[Dict[str, Any]]:
+    """
+    One signed payload per bag. Bags with an EPC -> epc + bq; when the harvest
+    has no scanned bags yet, `count` label payloads numbered bix=1..count.
+    """
+    signer = signer or get_signer()
+    base = tag_fields(doc)
+    if bags:
+        for b in bags:
+            epc = ((b or {}).get("epc") or "").upper()
+            if not epc:
+                continue
+            yield signer.sign({**base, "epc": epc, "bq": int(b.get("bagQty") or 0)})
+        return
+    for i in range(1, max(0, int(count or 0)) + 1):
+        yield signer.sign({**base, "bix": i})
+
+
+__all__ = [
+    "tag_fields",
+    "signature_message",
+    "TagSigner",
+    "get_signer",
+    "dumps_tag",
+    "harvest_tag",
+    "bag_tags",
+]
@@ -0,0 +1,456 @@
+# backend/services/rfid/tag_writer_bridge.py
+#
+# Client for ESP32 tag-writer devices.
+#
+#   res = tag_writers.write("http://10.0.0.42", payload)          # blocking, one tag
+#   fut = tag_writers.submit(base, payload)                        # queued
+#   batch = tag_writers.start_batch(base, payloads, job=job)       # no thread held; batch.cancel()
+#   tag_writers.health()                                           # per-device state
+#
+# Per device (keyed by base URL):
+#   - one pooled requests.Session (keep-alive to the ESP32)
+#   - the write endpoint discovered once and cached; a 404 on the cached one
+#     triggers one rediscovery (firmware update)
+#   - ping only when the device has been quiet for PING_AFTER_IDLE_SECONDS
+#   - one worker thread draining a FIFO: writes from any request / job go back
+#     to back, never two at once on the same antenna
+#   - 409 (no tag on the antenna) can be waited out: tag_wait seconds of retries
+#   - evicted (MAX_DEVICES) only with nothing queued or in flight; the worker
+#     thread exits on a sentinel and closes the session itself
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ------------------------------------------------------------
+# Config
+# ------------------------------------------------------------
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("ESP32_CONNECT_TIMEOUT", "2"))
+WRITE_TIMEOUT_SECONDS = float(os.getenv("ESP32_WRITE_TIMEOUT", "25"))
+PING_TIMEOUT_SECONDS = float(os.getenv("ESP32_PING_TIMEOUT", "3"))
+PING_AFTER_IDLE_SECONDS = float(os.getenv("ESP32_PING_AFTER_IDLE", "60"))
+TAG_POLL_SECONDS = float(os.getenv("ESP32_TAG_POLL_SECONDS", "0.5"))
+QUEUE_LIMIT = int(os.getenv("ESP32_QUEUE_LIMIT", "1000"))
+MAX_DEVICES = int(os.getenv("ESP32_MAX_DEVICES", "64"))
+
+# candidate write endpoints, tried in order until one answers (not 404)
+WRITE_ENDPOINTS = ("/rfid/write", "/write", "/rfid/program", "/api/rfid/write")
+PING_PATH = "/rfid/ping"
+
+
+class TagWriteError(Exception):
+    """
+    code: no_tag_present | esp32_write_status | esp32_write_fail | esp32_no_known_write_endpoint | queue_full
+          | cancelled | device_closed
+    """
+
+    def __init__(self, code: str, status: int = 502, detail: Any = None):
+        super().__init__(code)
+        self.code = code
+        self.status = status
+        self.detail = detail
+
+
+class _Task:
+    __slots__ = ("payload", "tag_wait", "future", "cancelled")
+
+    def __init__(self, payload: str, tag_wait: float, cancelled: Optional[Callable[[], bool]] = None):
+        self.payload = payload
+        self.tag_wait = tag_wait
+        self.future: Future = Future()
+        # polled before the write and between tag-wait retries
+        self.cancelled = cancelled
+
+
+_STOP = None  # queue sentinel: worker thread exits
+
+
+class TagWriterDevice:
+    def __init__(self, base: str):
+        self.base = base.rstrip("/")
+        self.session = requests.Session()
+        # one antenna -> one in-flight write; a couple of spare sockets for pings
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.endpoint: Optional[str] = None
+        # bounded by `pending` (QUEUE_LIMIT), not maxsize: cancelled tasks stay queued
+        # until the worker skips them, and the stop sentinel must always fit
+        self._queue: "queue.Queue[Optional[_Task]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        # queued + running writes; the device is idle (evictable) only at 0
+        self.pending = 0
+        self.closed = False
+
+        # health
+        self.online: Optional[bool] = None
+        self.last_seen = 0.0
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self.writes_ok = 0
+        self.writes_failed = 0
+        self.discoveries = 0
+        self.pings = 0
+        self._write_seconds = 0.0
+
+    # -------------------------
+    # Queue
+    # -------------------------
+    def _ensure_thread(self) -> None:
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name=f"tag-writer {self.base}", daemon=True)
+            self._thread.start()
+
+    def submit(self, payload: str, tag_wait: float = 0.0,
+               cancelled: Optional[Callable[[], bool]] = None) -> Future:
+        """
+        Queue one write; the Future resolves to {"ok", "endpoint", "ms"} or raises
+        TagWriteError (device_closed: evicted meanwhile, resubmit via the bridge).
+        """
+        task = _Task(payload, tag_wait, cancelled)
+        with self._lock:
+            if self.closed:
+                task.future.set_exception(TagWriteError("device_closed", 503))
+                return task.future
+            if self.pending >= QUEUE_LIMIT:
+                task.future.set_exception(TagWriteError("queue_full", 503))
+                return task.future
+            self.pending += 1
+            self._queue.put_nowait(task)
+        task.future.add_done_callback(self._task_done)
+        self._ensure_thread()
+        return task.future
+
+    def _task_done(self, _fut: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def write(self, payload: str, tag_wait: float = 0.0, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self.submit(payload, tag_wait).result(timeout)
+
+    def close_if_idle(self) -> bool:
+        """Stop the worker thread (and close the session) if nothing is queued or in flight."""
+        with self._lock:
+            if self.pending or self.closed:
+                return False
+            self.closed = True
+            thread = self._thread if self._pid == os.getpid() else None
+            if thread is not None and thread.is_alive():
+                self._queue.put_nowait(_STOP)  # the worker closes the session on its way out
+                return True
+        self.session.close()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            task = self._queue.get()
+            if task is _STOP:
+                self.session.close()
+                return
+            if not task.future.set_running_or_notify_cancel():
+                continue
+            try:
+                if task.cancelled is not None and task.cancelled():
+                    raise TagWriteError("cancelled", 409)
+                task.future.set_result(self._write_waiting(task.payload, task.tag_wait, task.cancelled))
+            except BaseException as e:
+                task.future.set_exception(e)
+
+    # -------------------------
+    # HTTP
+    # -------------------------
+    def _mark(self, ok: bool, error: Optional[str] = None) -> None:
+        self.online = ok
+        if ok:
+            self.last_seen = time.time()
+            self.consecutive_failures = 0
+            self.last_error = None
+        else:
+            self.consecutive_failures += 1
+            self.last_error = (error or "")[:300]
+
+    def ping(self) -> bool:
+        self.pings += 1
+        try:
+            res = self.session.get(f"{self.base}{PING_PATH}", timeout=PING_TIMEOUT_SECONDS)
+            ok = res.status_code < 500
+        except Exception as e:
+            self._mark(False, str(e))
+            return False
+        self._mark(ok, None if ok else f"ping HTTP {res.status_code}")
+        return ok
+
+    def _post(self, endpoint: str, payload: str):
+        return self.session.post(f"{self.base}{endpoint}", json={"payload": payload},
+                                 timeout=(CONNECT_TIMEOUT_SECONDS, WRITE_TIMEOUT_SECONDS))
+
+    def _write_once(self, payload: str) -> Dict[str, Any]:
+        """One attempt. Cached endpoint first; discovery only when there is none (or it 404s)."""
+        if self.online is False or time.time() - self.last_seen > PING_AFTER_IDLE_SECONDS:
+            self.ping()  # best-effort wake-up, like the old per-request ping
+
+        candidates = [self.endpoint] if self.endpoint else []
+        candidates += [ep for ep in WRITE_ENDPOINTS if ep != self.endpoint]
+        probing = False
+        last: Any = None
+
+        for ep in candidates:
+            if ep != self.endpoint and not probing:
+                probing = True
+                self.discoveries += 1
+            try:
+                res = self._post(ep, payload)
+            except Exception as e:
+                self._mark(False, str(e))
+                last = e
+                if self.endpoint == ep:
+                    # the known endpoint is unreachable -> the device is, too
+                    break
+                continue
+
+            try:
+                ctype = res.headers.get("content-type") or ""
+                body = res.json() if "application/json" in ctype else {}
+            except Exception:
+                body = {}
+
+            if res.status_code == 404:
+                if self.endpoint == ep:
+                    self.endpoint = None  # firmware changed -> rediscover
+                last = res
+                continue
+
+            self._mark(True)
+            if res.status_code == 200 and body.get("ok") is True:
+                self.endpoint = ep
+                return {"ok": True, "endpoint": ep}
+            if res.status_code == 409:
+                self.endpoint = ep
+                raise TagWriteError("no_tag_present", 409)
+            err_body = body if body else {"text": res.text[:200]}
+            raise TagWriteError("esp32_write_status", 502,
+                                {"err": "esp32_write_status", "code": res.status_code, "resp": err_body})
+
+        if isinstance(last, Exception):
+            raise TagWriteError("esp32_write_fail", 502, f"esp32_write_fail:{last}")
+        raise TagWriteError("esp32_no_known_write_endpoint", 502)
+
+    def _write_waiting(self, payload: str, tag_wait: float,
+                       cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        started = time.monotonic()
+        deadline = started + max(0.0, tag_wait)
+        while True:
+            try:
+                out = self._write_once(payload)
+            except TagWriteError as e:
+                if e.code == "no_tag_present" and time.monotonic() < deadline:
+                    time.sleep(TAG_POLL_SECONDS)
+                    if cancelled is not None and cancelled():
+                        raise TagWriteError("cancelled", 409)
+                    continue
+                self.writes_failed += 1
+                raise
+            elapsed = time.monotonic() - started
+            self.writes_ok += 1
+            self._write_seconds += elapsed
+            out["ms"] = int(elapsed * 1000)
+            return out
+
+    # -------------------------
+    # Health
+    # -------------------------
+    def health(self) -> Dict[str, Any]:
+        done = self.writes_ok
+        return {
+            "device": self.base,
+            "online": self.online,
+            "endpoint": self.endpoint,
+            "queued": self.pending,
+            "lastSeen": int(self.last_seen) or None,
+            "lastError": self.last_error,
+            "consecutiveFailures": self.consecutive_failures,
+            "writesOk": done,
+            "writesFailed": self.writes_failed,
+            "avgWriteMs": int(self._write_seconds / done * 1000) if done else None,
+            "discoveries": self.discoveries,
+            "pings": self.pings,
+        }
+
+
+class WriteBatch:
+    """
+    Writes of one batch queued on a device. Results are collected by future
+    callbacks, so nothing blocks while the operator swaps tags; `job`
+    (status_events.Job) gets one advance per tag and finish / cancelled at the end.
+    """
+
+    def __init__(self, bridge: "TagWriterBridge", base: str, payloads: List[str], tag_wait: float = 0.0,
+                 job=None, on_write: Optional[Callable[[int, Dict[str, Any]], None]] = None):
+        self.base = base
+        self.total = len(payloads)
+        self.job = job
+        self.on_write = on_write
+        self.results: List[Optional[Dict[str, Any]]] = [None] * self.total
+        self.done = threading.Event()
+        self._left = self.total
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self.futures: List[Future] = []
+
+        if job is not None:
+            job.on_cancel(self.cancel)
+            job.start()
+        for i, p in enumerate(payloads):
+            fut = bridge.submit(base, p, tag_wait, cancelled=self.cancel_requested)
+            self.futures.append(fut)
+            fut.add_done_callback(lambda f, i=i: self._collect(i, f))
+        if not payloads:
+            self._finish()
+
+    def cancel_requested(self) -> bool:
+        if self._cancel.is_set():
+            return True
+        if self.job is not None and self.job.cancel_requested():
+            self._cancel.set()  # cancelled from another worker
+            return True
+        return False
+
+    def cancel(self) -> None:
+        """Queued writes are dropped; the one in flight stops at its next tag-wait poll."""
+        self._cancel.set()
+        for f in self.futures:
+            f.cancel()
+
+    def _collect(self, i: int, fut: Future) -> None:
+        try:
+            res = {"i": i, **fut.result()}
+        except CancelledError:
+            res = {"i": i, "ok": False, "err": "cancelled"}
+        except TagWriteError as e:
+            res = {"i": i, "ok": False, "err": e.code, "detail": e.detail}
+        except Exception as e:
+            res = {"i": i, "ok": False, "err": "esp32_write_fail", "detail": str(e)[:200]}
+        if res.get("ok") and self.on_write is not None:
+            try:
+                self.on_write(i, res)
+            except Exception as e:
+                print(f"⚠️ tag write callback failed: {e}")
+        self.results[i] = res
+        if self.job is not None:
+            self.job.advance()
+        with self._lock:
+            self._left -= 1
+            last = self._left == 0
+        if last:
+            self._finish()
+
+    def summary(self) -> Dict[str, Any]:
+        results = [r for r in self.results if r is not None]
+        written = sum(1 for r in results if r.get("ok"))
+        return {"ok": written == self.total, "written": written, "failed": len(results) - written,
+                "cancelled": self._cancel.is_set(), "results": results}
+
+    def _finish(self) -> None:
+        out = self.summary()
+        if self.job is not None:
+            if out["cancelled"]:
+                self.job.cancelled(out)
+            else:
+                self.job.finish(out)
+        self.done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        self.done.wait(timeout)
+        return self.summary()
+
+
+class TagWriterBridge:
+    """One TagWriterDevice per base URL for the process."""
+
+    def __init__(self, max_devices: int = MAX_DEVICES):
+        self.max_devices = max(1, max_devices)
+        self._devices: Dict[str, TagWriterDevice] = {}
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def device(self, base: str) -> TagWriterDevice:
+        base = (base or "").strip().rstrip("/")
+        dev = self._devices.get(base)
+        if dev is not None and not dev.closed:
+            return dev
+        with self._lock:
+            dev = self._devices.get(base)
+            if dev is None or dev.closed:
+                if len(self._devices) >= self.max_devices:
+                    # drop the longest-idle device that has nothing queued or in flight
+                    for victim in sorted(self._devices.values(), key=lambda d: d.last_seen):
+                        if victim.close_if_idle():
+                            del self._devices[victim.base]
+                            self.evicted += 1
+                            break
+                dev = self._devices[base] = TagWriterDevice(base)
+        return dev
+
+    def submit(self, base: str, payload: str, tag_wait: float = 0.0,
+               cancelled: Optional[Callable[[], bool]] = None) -> Future:
+        for _ in range(3):
+            fut = self.device(base).submit(payload, tag_wait, cancelled)
+            if not fut.done():
+                return fut
+            err = fut.exception() if not fut.cancelled() else None
+            if not (isinstance(err, TagWriteError) and err.code == "device_closed"):
+                return fut
+            # evicted between lookup and submit -> a fresh device on the next try
+        return fut
+
+    def write(self, base: str, payload: str, tag_wait: float = 0.0) -> Dict[str, Any]:
+        return self.submit(base, payload, tag_wait).result()
+
+    def start_batch(self, base: str, payloads: List[str], tag_wait: float = 0.0, job=None,
+                    on_write: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> WriteBatch:
+        """Queues every payload at once (written back to back by the device worker); returns at once."""
+        return WriteBatch(self, base, payloads, tag_wait, job=job, on_write=on_write)
+
+    def write_many(self, base: str, payloads: List[str], tag_wait: float = 0.0, job=None) -> Dict[str, Any]:
+        """Blocking form of start_batch."""
+        out = self.start_batch(base, payloads, tag_wait, job=job).wait()
+        return {**out, "device": self.device(base).health()}
+
+    def health(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            devices = list(self._devices.values())
+        return [d.health() for d in devices]
+
+    def stats(self) -> Dict[str, int]:
+        devices = self.health()
+        return {
+            "devices": len(devices),
+            "online": sum(1 for d in devices if d["online"]),
+            "queued": sum(d["queued"] for d in devices),
+            "writes_ok": sum(d["writesOk"] for d in devices),
+            "writes_failed": sum(d["writesFailed"] for d in devices),
+            "evicted": self.evicted,
+        }
+
+
+tag_writers = TagWriterBridge()
+
+
+__all__ = ["TagWriteError", "TagWriterDevice", "WriteBatch", "TagWriterBridge", "tag_writers"]
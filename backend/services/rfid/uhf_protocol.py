@@ -0,0 +1,214 @@
+# backend/services/rfid/uhf_protocol.py
+#
+# UHFReader18 serial protocol (the reader behind UHFReader18.dll).
+#
+# Command:   Len | Adr | Cmd | Data[...] | CRC-LSB | CRC-MSB
+# Response:  Len | Adr | reCmd | Status | Data[...] | CRC-LSB | CRC-MSB
+#   Len counts every byte after itself (so a frame is Len + 1 bytes).
+#   CRC-16: preset 0xFFFF, poly 0x8408 (reflected), over Len..Data, LSB first.
+#
+# EPC C1G2 inventory (Cmd 0x01) response Data: Num | (EPCLen | EPC[EPCLen]) * Num
+#   Status 0x01 done, 0x02 time out (partial), 0x03 more frames follow, 0x04 buffer full,
+#   0xFB no tag in the field.
+#
+# Pure bytes in / bytes out: shared by the serial driver and the simulator.
+
+from __future__ import annotations
+
+from typing import List, NamedTuple, Optional
+
+BROADCAST_ADDR = 0xFF
+
+CMD_INVENTORY = 0x01
+CMD_GET_READER_INFO = 0x21
+
+STATUS_OK = 0x00
+STATUS_INVENTORY_DONE = 0x01
+STATUS_INVENTORY_TIMEOUT = 0x02
+STATUS_INVENTORY_MORE = 0x03
+STATUS_INVENTORY_FULL = 0x04
+STATUS_NO_TAG = 0xFB
+
+# statuses of an inventory response that carry tags
+INVENTORY_TAG_STATUSES = (STATUS_INVENTORY_DONE, STATUS_INVENTORY_TIMEOUT,
+                          STATUS_INVENTORY_MORE, STATUS_INVENTORY_FULL)
+# statuses after which the reader is idle again (no further frames for this command)
+INVENTORY_FINAL_STATUSES = (STATUS_INVENTORY_DONE, STATUS_INVENTORY_TIMEOUT,
+                            STATUS_INVENTORY_FULL, STATUS_NO_TAG)
+
+MIN_RESPONSE_LEN = 5  # Adr + reCmd + Status + CRC(2)
+MAX_DATA_LEN = 0xFF - MIN_RESPONSE_LEN  # Len is one byte
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Response(NamedTuple):
+    addr: int
+    cmd: int
+    status: int
+    data: bytes
+
+
+# ------------------------------------------------------------
+# CRC / framing
+# ------------------------------------------------------------
+def _crc_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def crc16(data: bytes) -> int:
+    crc = 0xFFFF
+    for b in data:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ b) & 0xFF]
+    return crc
+
+
+def _seal(body: bytes) -> bytes:
+    crc = crc16(body)
+    return body + bytes((crc & 0xFF, crc >> 8))
+
+
+def build_command(cmd: int, data: bytes = b"", addr: int = BROADCAST_ADDR) -> bytes:
+    return _seal(bytes((len(data) + 4, addr & 0xFF, cmd & 0xFF)) + data)
+
+
+def build_response(cmd: int, status: int, data: bytes = b"", addr: int = 0x00) -> bytes:
+    return _seal(bytes((len(data) + 5, addr & 0xFF, cmd & 0xFF, status & 0xFF)) + data)
+
+
+def inventory_command(addr: int = BROADCAST_ADDR) -> bytes:
+    return build_command(CMD_INVENTORY, addr=addr)
+
+
+def inventory_response(epcs: List[bytes], status: int = STATUS_INVENTORY_DONE, addr: int = 0x00) -> bytes:
+    """Inventory response frame for raw EPC byte strings (used by the simulator)."""
+    if not epcs and status in INVENTORY_TAG_STATUSES:
+        status = STATUS_NO_TAG
+    if status == STATUS_NO_TAG:
+        return build_response(CMD_INVENTORY, status, addr=addr)
+    body = bytearray((len(epcs),))
+    for epc in epcs:
+        body.append(len(epc))
+        body += epc
+    if len(body) > MAX_DATA_LEN:
+        raise ProtocolError(f"{len(epcs)} tags do not fit one frame; use inventory_frames()")
+    return build_response(CMD_INVENTORY, status, bytes(body), addr=addr)
+
+
+def inventory_frames(epcs: List[bytes], addr: int = 0x00) -> List[bytes]:
+    """A whole inventory round: as many 0x03 (more) frames as needed, then a final 0x01."""
+    frames: List[bytes] = []
+    chunk: List[bytes] = []
+    size = 1  # Num
+    for epc in epcs:
+        if chunk and size + 1 + len(epc) > MAX_DATA_LEN:
+            frames.append(inventory_response(chunk, STATUS_INVENTORY_MORE, addr))
+            chunk, size = [], 1
+        chunk.append(epc)
+        size += 1 + len(epc)
+    frames.append(inventory_response(chunk, STATUS_INVENTORY_DONE, addr))
+    return frames
+
+
+# ------------------------------------------------------------
+# Parsing
+# ------------------------------------------------------------
+class FrameParser:
+    """
+    Incremental parser for a serial byte stream. feed() returns complete,
+    CRC-checked responses; garbage / corrupt frames are skipped one byte at a
+    time until the stream lines up again.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.crc_errors = 0
+        self.skipped = 0
+
+    def feed(self, chunk: bytes) -> List[Response]:
+        self._buf += chunk
+        out: List[Response] = []
+        buf = self._buf
+        while buf:
+            n = buf[0]
+            if n < MIN_RESPONSE_LEN:
+                del buf[0]
+                self.skipped += 1
+                continue
+            if len(buf) < n + 1:
+                break
+            frame = bytes(buf[:n + 1])
+            if crc16(frame[:-2]) != (frame[-2] | (frame[-1] << 8)):
+                del buf[0]
+                self.crc_errors += 1
+                continue
+            del buf[:n + 1]
+            out.append(Response(frame[1], frame[2], frame[3], frame[4:-2]))
+        return out
+
+    def reset(self) -> int:
+        """Drops buffered bytes (leftovers of a corrupt frame). Returns bytes dropped."""
+        n = len(self._buf)
+        self._buf.clear()
+        self.skipped += n
+        return n
+
+
+def parse_inventory(resp: Response) -> List[str]:
+    """EPC hex strings (upper case) of an inventory response; [] for no-tag / non-tag statuses."""
+    if resp.cmd != CMD_INVENTORY:
+        raise ProtocolError(f"not an inventory response: cmd=0x{resp.cmd:02X}")
+    if resp.status not in INVENTORY_TAG_STATUSES or not resp.data:
+        return []
+    data = resp.data
+    count, pos, out = data[0], 1, []
+    for _ in range(count):
+        if pos >= len(data):
+            raise ProtocolError("truncated inventory response")
+        size = data[pos]
+        epc = data[pos + 1:pos + 1 + size]
+        if len(epc) != size:
+            raise ProtocolError("truncated EPC in inventory response")
+        out.append(epc.hex().upper())
+        pos += 1 + size
+    return out
+
+
+def parse_hex_frame(line: str) -> Optional[bytes]:
+    """One recorded frame per line ("0B 00 01 01 ..." or "0b000101..."); None for blanks / comments."""
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    return bytes.fromhex(line.replace(" ", "").replace(":", ""))
+
+
+__all__ = [
+    "BROADCAST_ADDR",
+    "CMD_INVENTORY",
+    "STATUS_NO_TAG",
+    "STATUS_INVENTORY_DONE",
+    "STATUS_INVENTORY_MORE",
+    "INVENTORY_FINAL_STATUSES",
+    "ProtocolError",
+    "Response",
+    "FrameParser",
+    "crc16",
+    "build_command",
+    "build_response",
+    "inventory_command",
+    "inventory_response",
+    "inventory_frames",
+    "parse_inventory",
+    "parse_hex_frame",
+]
@@ -0,0 +1,411 @@
+# backend/services/rfid/uhf_reader.py
+#
+# Fixed UHF reader (UHFReader18 protocol) -> POST /rfid/reads.
+#
+#   reader = await UHFReader.open_serial("/dev/ttyUSB0")        # pyserial-asyncio
+#   sink = HttpReadSink("http://127.0.0.1:5000", token=...)     # aiohttp
+#   await run_ingest(reader, sink, reader_name="dock-1")
+#
+# Continuous inventory rounds -> EPC frames parsed -> bursts deduped (a tag in
+# the field answers every round) -> reads batched (size / interval) -> one POST
+# per batch. If the API is down the batch is kept and retried with backoff;
+# the buffer is capped (oldest reads dropped first).
+#
+# Auth: access tokens expire (JWT_ACCESS_TOKEN_EXPIRES), so the sink also takes
+# a refresh token and swaps in a new access token on 401 (POST /auth/refresh).
+# A 401 that refreshing cannot fix raises SinkAuthError: ingest stops with a
+# clear error instead of retrying forever while the buffer drops reads.
+#
+# Works on anything that looks like an asyncio stream pair, so the simulator in
+# uhf_simulator.py plugs in without a serial port.
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from backend.services.rfid.uhf_protocol import (
+    CMD_INVENTORY,
+    INVENTORY_FINAL_STATUSES,
+    FrameParser,
+    ProtocolError,
+    build_response,
+    inventory_command,
+    parse_inventory,
+)
+
+try:
+    import serial_asyncio  # pyserial-asyncio
+except ImportError:  # pragma: no cover
+    serial_asyncio = None
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+# ------------------------------------------------------------
+# Config
+# ------------------------------------------------------------
+UHF_PORT = os.getenv("UHF_PORT", "/dev/ttyUSB0")
+UHF_BAUD = int(os.getenv("UHF_BAUD", "57600"))
+UHF_ADDRESS = int(os.getenv("UHF_ADDRESS", "255"))  # 0xFF = broadcast
+INVENTORY_TIMEOUT_SECONDS = float(os.getenv("UHF_INVENTORY_TIMEOUT", "1.0"))
+# pause between inventory rounds (0 = back to back)
+INVENTORY_IDLE_SECONDS = float(os.getenv("UHF_INVENTORY_IDLE", "0"))
+DEDUPE_SECONDS = float(os.getenv("UHF_DEDUPE_SECONDS", "2.0"))
+BATCH_MAX = int(os.getenv("UHF_BATCH_MAX", "500"))
+BATCH_SECONDS = float(os.getenv("UHF_BATCH_SECONDS", "0.5"))
+BUFFER_LIMIT = int(os.getenv("UHF_BUFFER_LIMIT", "50000"))
+RETRY_MAX_SECONDS = float(os.getenv("UHF_RETRY_MAX_SECONDS", "30"))
+
+RFID_API_BASE = os.getenv("RFID_API_BASE", "http://127.0.0.1:5000")
+RFID_API_TOKEN = os.getenv("RFID_API_TOKEN", "")
+RFID_API_REFRESH_TOKEN = os.getenv("RFID_API_REFRESH_TOKEN", "")
+
+# EPC length the backend accepts (normalize_epc keeps the first 24 hex chars)
+EPC_HEX_LEN = int(os.getenv("RFID_EPC_HEX_LEN", "24"))
+
+ReadSink = Callable[[List[Dict[str, Any]]], Awaitable[Any]]
+
+
+# ------------------------------------------------------------
+# Driver
+# ------------------------------------------------------------
+class UHFReader:
+    """
+    One reader on one stream pair. inventory() is a single round; rounds()
+    yields forever. Not safe for concurrent callers (the protocol is strictly
+    request / response).
+    """
+
+    def __init__(self, stream_reader, stream_writer, addr: int = UHF_ADDRESS,
+                 timeout: float = INVENTORY_TIMEOUT_SECONDS, record_to: Optional[str] = None):
+        self.stream_reader = stream_reader
+        self.stream_writer = stream_writer
+        self.addr = addr
+        self.timeout = timeout
+        self.parser = FrameParser()
+        self.rounds_done = 0
+        self.timeouts = 0
+        self.tags_seen = 0
+        # raw response frames as hex lines -> replay file for the simulator
+        self._record = open(record_to, "a", encoding="utf-8") if record_to else None
+        self._command = inventory_command(addr)
+
+    @classmethod
+    async def open_serial(cls, port: str = UHF_PORT, baud: int = UHF_BAUD, **kwargs) -> "UHFReader":
+        if serial_asyncio is None:
+            raise RuntimeError("pyserial-asyncio is not installed (pip install pyserial-asyncio)")
+        r, w = await serial_asyncio.open_serial_connection(url=port, baudrate=baud)
+        return cls(r, w, **kwargs)
+
+    async def _read_frames(self):
+        chunk = await self.stream_reader.read(1024)
+        if not chunk:
+            raise ConnectionError("reader stream closed")
+        return self.parser.feed(chunk)
+
+    async def inventory(self) -> List[str]:
+        """One inventory round -> EPC hex strings (may contain repeats across rounds)."""
+        # strictly request / response: anything still buffered is a broken frame of the last round
+        self.parser.reset()
+        self.stream_writer.write(self._command)
+        await self.stream_writer.drain()
+
+        epcs: List[str] = []
+        deadline = time.monotonic() + self.timeout
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                self.timeouts += 1
+                break
+            try:
+                frames = await asyncio.wait_for(self._read_frames(), left)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                break
+            done = False
+            for resp in frames:
+                if resp.cmd != CMD_INVENTORY:
+                    continue
+                if self._record is not None:
+                    self._record.write(_frame_hex(resp) + "\n")
+                try:
+                    epcs.extend(parse_inventory(resp))
+                except ProtocolError as e:
+                    print(f"⚠️ UHF frame dropped: {e}")
+                if resp.status in INVENTORY_FINAL_STATUSES:
+                    done = True
+            if done:
+                break
+
+        self.rounds_done += 1
+        self.tags_seen += len(epcs)
+        return epcs
+
+    async def rounds(self, idle: float = INVENTORY_IDLE_SECONDS) -> AsyncIterator[List[str]]:
+        while True:
+            yield await self.inventory()
+            if idle > 0:
+                await asyncio.sleep(idle)
+
+    async def close(self) -> None:
+        if self._record is not None:
+            self._record.close()
+            self._record = None
+        self.stream_writer.close()
+        try:
+            await self.stream_writer.wait_closed()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rounds": self.rounds_done,
+            "timeouts": self.timeouts,
+            "tagsSeen": self.tags_seen,
+            "crcErrors": self.parser.crc_errors,
+            "bytesSkipped": self.parser.skipped,
+        }
+
+
+def _frame_hex(resp) -> str:
+    return build_response(resp.cmd, resp.status, resp.data, addr=resp.addr).hex(" ").upper()
+
+
+# ------------------------------------------------------------
+# Burst dedupe
+# ------------------------------------------------------------
+class BurstDeduper:
+    """
+    Drops re-reads of an EPC seen within `window` seconds (a tag sitting in the
+    field answers every inventory round). Same rule as ScanSession.ingest.
+    """
+
+    def __init__(self, window: float = DEDUPE_SECONDS):
+        self.window = window
+        self._last_seen: Dict[str, float] = {}
+        self._last_sweep = time.monotonic()
+        self.dropped = 0
+
+    def filter(self, epcs: List[str], now: Optional[float] = None) -> List[str]:
+        now = time.monotonic() if now is None else now
+        if now - self._last_sweep >= self.window:
+            cutoff = now - self.window
+            self._last_seen = {e: t for e, t in self._last_seen.items() if t >= cutoff}
+            self._last_sweep = now
+        out = []
+        for epc in epcs:
+            if EPC_HEX_LEN and len(epc) > EPC_HEX_LEN:
+                epc = epc[:EPC_HEX_LEN]
+            last = self._last_seen.get(epc)
+            self._last_seen[epc] = now
+            if last is not None and now - last < self.window:
+                self.dropped += 1
+                continue
+            out.append(epc)
+        return out
+
+
+# ------------------------------------------------------------
+# Batching + delivery
+# ------------------------------------------------------------
+class SinkAuthError(RuntimeError):
+    """The API rejected the reader's credentials (401) and they could not be refreshed."""
+
+
+class ReadBatcher:
+    """
+    add() buffers reads; run() delivers them to `sink` in batches of up to
+    max_batch, at least every `interval` seconds. Failed batches stay at the
+    head of the buffer and are retried with exponential backoff.
+    """
+
+    def __init__(self, sink: ReadSink, max_batch: int = BATCH_MAX, interval: float = BATCH_SECONDS,
+                 limit: int = BUFFER_LIMIT):
+        self.sink = sink
+        self.max_batch = max(1, max_batch)
+        self.interval = max(0.01, interval)
+        self.limit = max(self.max_batch, limit)
+        self._buf: List[Dict[str, Any]] = []
+        self._wake = asyncio.Event()
+        self.sent = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = ""
+
+    def add(self, reads: List[Dict[str, Any]]) -> None:
+        if not reads:
+            return
+        self._buf.extend(reads)
+        over = len(self._buf) - self.limit
+        if over > 0:
+            del self._buf[:over]
+            self.dropped += over
+        if len(self._buf) >= self.max_batch:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """Send everything buffered; raises on the first failed batch (buffer kept)."""
+        sent = 0
+        while self._buf:
+            batch = self._buf[:self.max_batch]
+            await self.sink(batch)
+            del self._buf[:len(batch)]
+            sent += len(batch)
+            self.sent += len(batch)
+            self.batches += 1
+        return sent
+
+    async def run(self, stop: asyncio.Event) -> None:
+        backoff = 0.0
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), backoff or self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+                backoff = 0.0
+            except SinkAuthError as e:
+                # retrying cannot help; stop ingest (run_ingest re-raises) with the buffer counted
+                self.errors += 1
+                self.last_error = str(e)[:300]
+                print(f"❌ UHF ingest stopped, credentials rejected ({len(self._buf)} reads not sent): {e}")
+                stop.set()
+                raise
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)[:300]
+                backoff = min(RETRY_MAX_SECONDS, max(self.interval, backoff * 2 or 1.0))
+                print(f"⚠️ UHF ingest post failed ({len(self._buf)} buffered, retry in {backoff:.1f}s): {e}")
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"⚠️ UHF ingest final flush failed, {len(self._buf)} reads lost: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sent": self.sent, "batches": self.batches, "buffered": len(self._buf),
+                "dropped": self.dropped, "errors": self.errors, "lastError": self.last_error}
+
+
+class HttpReadSink:
+    """
+    POST {api}/rfid/reads with a Bearer token (one aiohttp session for the process).
+    With a refresh token, a 401 gets one POST {api}/auth/refresh and a retry;
+    otherwise (or if the refresh is rejected too) SinkAuthError.
+    """
+
+    def __init__(self, api_base: str = RFID_API_BASE, token: str = RFID_API_TOKEN,
+                 reader_name: str = "uhf-1", crop_id: str = "", timeout: float = 10.0,
+                 refresh_token: str = RFID_API_REFRESH_TOKEN):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is not installed")
+        base = api_base.rstrip("/")
+        self.url = base + "/rfid/reads"
+        self.refresh_url = base + "/auth/refresh"
+        self.reader_name = reader_name
+        self.crop_id = crop_id
+        self.token = token
+        self.refresh_token = refresh_token
+        self.refreshes = 0
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    def _auth(self, token: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    async def _refresh(self) -> None:
+        if not self.refresh_token:
+            raise SinkAuthError("401 from /rfid/reads and no refresh token "
+                                "(--refresh-token / RFID_API_REFRESH_TOKEN); log in again")
+        async with self._session.post(self.refresh_url, headers=self._auth(self.refresh_token)) as res:
+            body = await res.json(content_type=None) if res.status < 300 else {}
+            token = (body or {}).get("access_token")
+            if res.status in (401, 422) or (res.status < 300 and not token):
+                raise SinkAuthError(f"refresh token rejected (HTTP {res.status}); log in again")
+            if res.status >= 300:
+                raise RuntimeError(f"refresh HTTP {res.status}")  # transient: retried with backoff
+        self.token = token
+        self.refreshes += 1
+
+    @staticmethod
+    async def _result(res) -> Dict[str, Any]:
+        if res.status >= 300:
+            text = (await res.text())[:200]
+            raise RuntimeError(f"HTTP {res.status}: {text}")
+        return await res.json(content_type=None)
+
+    async def __call__(self, reads: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        body = {"reader": self.reader_name, "cropId": self.crop_id, "reads": reads}
+        async with self._session.post(self.url, json=body, headers=self._auth(self.token)) as res:
+            if res.status != 401:
+                return await self._result(res)
+        await self._refresh()  # access token expired (or revoked)
+        async with self._session.post(self.url, json=body, headers=self._auth(self.token)) as res:
+            if res.status == 401:
+                raise SinkAuthError("401 from /rfid/reads with a freshly refreshed token")
+            return await self._result(res)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+# ------------------------------------------------------------
+# Pipeline
+# ------------------------------------------------------------
+async def run_ingest(reader: UHFReader, sink: ReadSink, stop: Optional[asyncio.Event] = None,
+                     dedupe_seconds: float = DEDUPE_SECONDS, idle: float = INVENTORY_IDLE_SECONDS,
+                     batch_max: int = BATCH_MAX, batch_seconds: float = BATCH_SECONDS,
+                     max_rounds: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Inventory -> dedupe -> batch -> sink until `stop` is set (or max_rounds).
+    Returns final stats.
+    """
+    stop = stop or asyncio.Event()
+    deduper = BurstDeduper(dedupe_seconds)
+    batcher = ReadBatcher(sink, batch_max, batch_seconds)
+    sender = asyncio.create_task(batcher.run(stop))
+    started = time.monotonic()
+    reads = 0
+    try:
+        async for epcs in reader.rounds(idle):
+            fresh = deduper.filter(epcs)
+            if fresh:
+                ts = int(time.time() * 1000)
+                batcher.add([{"epc": e, "ts": ts} for e in fresh])
+                reads += len(fresh)
+            if stop.is_set() or (max_rounds is not None and reader.rounds_done >= max_rounds):
+                break
+    finally:
+        stop.set()
+        await sender
+
+    elapsed = max(1e-9, time.monotonic() - started)
+    return {
+        "reader": reader.stats(),
+        "batcher": batcher.stats(),
+        "reads": reads,
+        "dupes": deduper.dropped,
+        "seconds": round(elapsed, 3),
+        "readsPerSecond": round(reads / elapsed, 1),
+    }
+
+
+__all__ = [
+    "UHFReader",
+    "BurstDeduper",
+    "ReadBatcher",
+    "HttpReadSink",
+    "SinkAuthError",
+    "run_ingest",
+]
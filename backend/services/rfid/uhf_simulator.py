@@ -0,0 +1,168 @@
+# backend/services/rfid/uhf_simulator.py
+#
+# Software UHFReader18: answers inventory commands on an in-memory stream pair
+# so the driver / ingest pipeline can be load-tested without hardware.
+#
+#   reader = open_simulator(frames_file="dock1.frames", rate=2000)   # replay a capture
+#   reader = open_simulator(tags=5000, per_round=40, rate=5000)       # synthetic tag field
+#   stats = await run_ingest(reader, sink, max_rounds=1000)
+#
+# Capture a replay file from a real reader with uhf_ingest.py --record FILE
+# (one response frame per line, hex).
+#
+# rate = tag reads per second the simulated reader delivers; each response is
+# delayed by len(tags) / rate. rate=0 -> as fast as the pipeline can take them.
+
+from __future__ import annotations
+
+import asyncio
+import random
+from typing import Iterator, List, Optional
+
+from backend.services.rfid.uhf_protocol import (
+    CMD_INVENTORY,
+    INVENTORY_FINAL_STATUSES,
+    FrameParser,
+    crc16,
+    inventory_frames,
+    parse_hex_frame,
+    parse_inventory,
+)
+from backend.services.rfid.uhf_reader import UHFReader
+
+
+def load_frames(path: str) -> List[bytes]:
+    frames: List[bytes] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            frame = parse_hex_frame(line)
+            if frame:
+                frames.append(frame)
+    if not frames:
+        raise ValueError(f"no frames in {path}")
+    return frames
+
+
+def random_epcs(n: int, seed: Optional[int] = None) -> List[bytes]:
+    rnd = random.Random(seed)
+    return [rnd.getrandbits(96).to_bytes(12, "big") for _ in range(n)]
+
+
+class _SimWriter:
+    """StreamWriter stand-in: commands written here are answered on the paired StreamReader."""
+
+    def __init__(self, sim: "UHFSimulator"):
+        self._sim = sim
+        self._buf = bytearray()
+        self._closed = False
+
+    def write(self, data: bytes) -> None:
+        self._buf += data
+        # commands: Len | Adr | Cmd | Data | CRC(2), Len >= 4
+        while self._buf and len(self._buf) >= self._buf[0] + 1:
+            n = self._buf[0]
+            frame = bytes(self._buf[:n + 1])
+            del self._buf[:n + 1]
+            if n < 4 or crc16(frame[:-2]) != (frame[-2] | (frame[-1] << 8)):
+                continue
+            self._sim.on_command(frame[2], frame[3:-2])
+
+    async def drain(self) -> None:
+        await asyncio.sleep(0)
+
+    def close(self) -> None:
+        self._closed = True
+        self._sim.close()
+
+    async def wait_closed(self) -> None:
+        return None
+
+
+class UHFSimulator:
+    """
+    Replays recorded response frames (looping) or generates inventory rounds
+    from a synthetic tag population. `noise` = probability a response gets a
+    corrupted byte (exercises the parser's resync path).
+    """
+
+    def __init__(self, frames: Optional[List[bytes]] = None, tags: int = 1000, per_round: int = 30,
+                 rate: float = 0.0, noise: float = 0.0, seed: Optional[int] = None):
+        self.reader = asyncio.StreamReader()
+        self.writer = _SimWriter(self)
+        self.rate = max(0.0, float(rate))
+        self.noise = max(0.0, float(noise))
+        self._rnd = random.Random(seed)
+        self._frames = frames
+        self._replay = self._replay_rounds() if frames else None
+        self._population = random_epcs(tags, seed) if not frames else []
+        self.per_round = max(1, per_round)
+        self._pending: Optional[asyncio.Task] = None
+        self.rounds = 0
+        self.reads_sent = 0
+
+    # -------------------------
+    # Rounds
+    # -------------------------
+    def _replay_rounds(self) -> Iterator[List[bytes]]:
+        """Recorded frames grouped into rounds (a round ends on a final status)."""
+        parser = FrameParser()
+        while True:
+            current: List[bytes] = []
+            for frame in self._frames or []:
+                current.append(frame)
+                resp = parser.feed(frame)
+                if resp and resp[-1].cmd == CMD_INVENTORY and resp[-1].status in INVENTORY_FINAL_STATUSES:
+                    yield current
+                    current = []
+            if current:
+                yield current
+
+    def _synthetic_round(self) -> List[bytes]:
+        k = min(len(self._population), self.per_round)
+        tags = self._rnd.sample(self._population, k) if k else []
+        return inventory_frames(tags)
+
+    @staticmethod
+    def _tag_count(frames: List[bytes]) -> int:
+        parser = FrameParser()
+        return sum(len(parse_inventory(r)) for f in frames for r in parser.feed(f) if r.cmd == CMD_INVENTORY)
+
+    # -------------------------
+    # Command handling
+    # -------------------------
+    def on_command(self, cmd: int, data: bytes) -> None:
+        if cmd != CMD_INVENTORY:
+            return
+        frames = next(self._replay) if self._replay is not None else self._synthetic_round()
+        self._pending = asyncio.get_running_loop().create_task(self._respond(frames))
+
+    async def _respond(self, frames: List[bytes]) -> None:
+        tags = self._tag_count(frames)
+        if self.rate > 0:
+            await asyncio.sleep(max(tags, 1) / self.rate)
+        for frame in frames:
+            if self.noise and self._rnd.random() < self.noise:
+                i = self._rnd.randrange(1, len(frame))
+                frame = frame[:i] + bytes((frame[i] ^ 0xFF,)) + frame[i + 1:]
+            self.reader.feed_data(frame)
+        self.rounds += 1
+        self.reads_sent += tags
+
+    def close(self) -> None:
+        if self._pending is not None:
+            self._pending.cancel()
+        self.reader.feed_eof()
+
+
+def open_simulator(frames_file: Optional[str] = None, tags: int = 1000, per_round: int = 30,
+                   rate: float = 0.0, noise: float = 0.0, seed: Optional[int] = None,
+                   **reader_kwargs) -> UHFReader:
+    """UHFReader wired to a simulator instead of a serial port (call inside a running loop)."""
+    frames = load_frames(frames_file) if frames_file else None
+    sim = UHFSimulator(frames, tags=tags, per_round=per_round, rate=rate, noise=noise, seed=seed)
+    reader = UHFReader(sim.reader, sim.writer, **reader_kwargs)
+    reader.simulator = sim
+    return reader
+
+
+__all__ = ["UHFSimulator", "open_simulator", "load_frames", "random_epcs"]
@@ -1,8 +1,13 @@
 # backend/services/traceability/traceability_services.py
+import os
 import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from typing import Any, Dict, List, Optional
 
 from backend.blockchain import contract  # your existing wiring
+from backend.utils.rpc_governor import RpcOverloaded, deadline, submit
 from backend.models.traceability.traceability_models import (
     TraceabilityViewModel,
     OriginHarvestBlock,
@@ -17,11 +22,50 @@ from backend.mongo import mongo
 # We'll import lazily inside functions to avoid circular imports
 
 
+# per-source deadlines for build_traceability (seconds)
+CHAIN_TIMEOUT_SECONDS = float(os.getenv("TRACE_CHAIN_TIMEOUT", "4"))
+MONGO_TIMEOUT_SECONDS = float(os.getenv("TRACE_MONGO_TIMEOUT", "1.5"))
+# Mongo probes run here, not on the rpc_governor pool (which is sized for chain calls)
+MONGO_WORKERS = int(os.getenv("TRACE_MONGO_WORKERS", "16"))
+
+# probed in this order; the first collection with data wins
+STORAGE_COLS = ("warehouse_storage", "storage_events", "warehouse_events")
+SHIPMENT_COLS = ("shipments", "shipment_events", "transporter_shipments", "transport_events")
+
+_mongo_pool: Optional[ThreadPoolExecutor] = None
+_mongo_pool_pid: Optional[int] = None
+_mongo_pool_lock = threading.Lock()
+
+
+def _mongo_executor() -> ThreadPoolExecutor:
+    """Own bounded pool for the Mongo probes (one per process, recreated after fork)."""
+    global _mongo_pool, _mongo_pool_pid
+    pid = os.getpid()
+    with _mongo_pool_lock:
+        if _mongo_pool is None or _mongo_pool_pid != pid:
+            _mongo_pool = ThreadPoolExecutor(max_workers=max(1, MONGO_WORKERS), thread_name_prefix="trace-mongo")
+            _mongo_pool_pid = pid
+        return _mongo_pool
+
+
+def _max_time_ms(end: float) -> int:
+    """Server-side time limit for a query that has to finish by `end` (monotonic)."""
+    left = end - time.monotonic()
+    if left <= 0:
+        raise FuturesTimeout("deadline passed before the query started")
+    return max(1, int(left * 1000))
+
+
 class TraceabilityService:
     """
     Compose traceability timeline data:
       - On-chain: crop + history (Planted/Harvested/Processed/Distributed/Sold)
       - Mongo: storage + shipments (warehouse/transporter not on chain)
+
+    build_traceability issues every read at once: chain reads on the shared
+    rpc_governor pool, Mongo probes on their own pool with max_time_ms. Each
+    source has its own deadline, and a source that misses it or fails is left
+    out (vm.degraded = True) instead of holding up the page.
     """
 
     # -------------------------
@@ -30,9 +74,62 @@ class TraceabilityService:
     @staticmethod
     def build_traceability(crop_id: str, user_id: Optional[str] = None) -> TraceabilityViewModel:
         vm = TraceabilityViewModel(cropId=crop_id)
+        started = time.monotonic()
 
-        crop = TraceabilityService._get_crop_onchain(crop_id)
-        hist = TraceabilityService._get_history_onchain(crop_id)
+        # fan out: 2 chain reads + every collection probe, each with its own deadline
+        tasks: Dict[str, Any] = {}
+
+        def _spawn_chain(name: str, fn, *args) -> None:
+            try:
+                with deadline(CHAIN_TIMEOUT_SECONDS):
+                    fut = submit(fn, *args)
+            except RpcOverloaded as e:
+                fut = e
+            tasks[name] = (fut, started + CHAIN_TIMEOUT_SECONDS)
+
+        mongo_end = started + MONGO_TIMEOUT_SECONDS
+
+        def _spawn_mongo(name: str, fn, *args) -> None:
+            tasks[name] = (_mongo_executor().submit(fn, *args, mongo_end), mongo_end)
+
+        _spawn_chain("crop", TraceabilityService._fetch_crop_onchain, crop_id)
+        _spawn_chain("history", TraceabilityService._fetch_history_onchain, crop_id)
+        for col in STORAGE_COLS:
+            _spawn_mongo(f"storage:{col}", TraceabilityService._storage_probe, col, crop_id, user_id)
+        for col in SHIPMENT_COLS:
+            _spawn_mongo(f"shipments:{col}", TraceabilityService._shipment_probe, col, crop_id, user_id)
+
+        missing: List[str] = []
+        shed: Dict[str, RpcOverloaded] = {}
+
+        def _result(name: str, default: Any) -> Any:
+            fut, end = tasks[name]
+            if isinstance(fut, RpcOverloaded):
+                shed[name] = fut
+                missing.append(name)
+                return default
+            try:
+                return fut.result(timeout=max(0.0, end - time.monotonic()))
+            except FuturesTimeout:
+                fut.cancel()
+                missing.append(name)
+                return default
+            except RpcOverloaded as e:
+                shed[name] = e
+                missing.append(name)
+                return default
+            except Exception as e:
+                print(f"traceability source {name} failed:", str(e))
+                missing.append(name)
+                return default
+
+        crop = _result("crop", {})
+        hist = _result("history", [])
+        if "crop" in shed and "history" in shed:
+            for fut, _end in tasks.values():
+                if not isinstance(fut, RpcOverloaded):
+                    fut.cancel()
+            raise shed["crop"]  # nothing to show -> 503 + Retry-After
 
         # 1) Origin + Harvest (mostly crop fields + harvest event)
         vm.originHarvest = TraceabilityService._compose_origin_harvest(crop, hist)
@@ -47,22 +144,34 @@ class TraceabilityService:
         if sale:
             vm.sale = sale
 
-        # 4) Storage (Mongo)
-        storage = TraceabilityService._get_storage_mongo(crop_id, user_id=user_id)
-        if storage:
-            vm.storage = storage
+        # 4) Storage (Mongo): first collection, in priority order, that has a doc
+        storage = None
+        for col in STORAGE_COLS:
+            storage = _result(f"storage:{col}", None)
+            if storage:
+                vm.storage = storage
+                break
 
         # 5) Shipments (Mongo)
-        shipments = TraceabilityService._get_shipments_mongo(crop_id, user_id=user_id)
-        if shipments and shipments.shipments:
+        docs: List[Dict[str, Any]] = []
+        for col in SHIPMENT_COLS:
+            docs = _result(f"shipments:{col}", [])
+            if docs:
+                break
+        shipments = TraceabilityService._shipment_block(docs)
+        if shipments.shipments:
             vm.shipment = shipments
 
+        vm.degraded = bool(missing)
+
         # Optional debug
         vm.debug = {
             "hasOnchainCrop": bool(crop),
             "onchainHistoryCount": len(hist),
             "hasStorageMongo": bool(storage),
-            "shipmentCount": len(shipments.shipments) if shipments else 0,
+            "shipmentCount": len(shipments.shipments),
+            "degradedSources": missing,
+            "ms": int((time.monotonic() - started) * 1000),
         }
         return vm
 
@@ -70,34 +179,46 @@ class TraceabilityService:
     # Blockchain reads
     # -------------------------
     @staticmethod
-    def _get_crop_onchain(crop_id: str) -> Dict[str, Any]:
+    def _fetch_crop_onchain(crop_id: str) -> Dict[str, Any]:
         """
         Your contract getCrop returns tuple.
         Your current trace.sol returns:
           (cropId, cropType, farmerName, farmingType, seedType, location, datePlanted, harvestDate, areaSize)
         If you later add cropName, update mapping here.
+        Raises on RPC errors (RpcOverloaded included); see _get_crop_onchain.
         """
+        t = contract.functions.getCrop(crop_id).call()
+        # Defensive mapping (by your current contract)
+        return {
+            "cropId": t[0] if len(t) > 0 else crop_id,
+            "cropType": t[1] if len(t) > 1 else "",
+            "cropName": t[2] if len(t) > 2 else "",
+            "farmerName": t[3] if len(t) > 3 else "",
+            "farmingType": t[4] if len(t) > 4 else "",
+            "seedType": t[5] if len(t) > 5 else "",
+            "location": t[6] if len(t) > 6 else "",
+            "datePlanted": t[7] if len(t) > 7 else "",
+            "harvestDate": t[8] if len(t) > 8 else "",
+            "areaSize": int(t[9]) if len(t) > 9 else 0,
+        }
+
+    @staticmethod
+    def _get_crop_onchain(crop_id: str) -> Dict[str, Any]:
         try:
-            t = contract.functions.getCrop(crop_id).call()
-            # Defensive mapping (by your current contract)
-            return {
-                "cropId": t[0] if len(t) > 0 else crop_id,
-                "cropType": t[1] if len(t) > 1 else "",
-                "cropName": t[2] if len(t) > 2 else "",
-                "farmerName": t[3] if len(t) > 3 else "",
-                "farmingType": t[4] if len(t) > 4 else "",
-                "seedType": t[5] if len(t) > 5 else "",
-                "location": t[6] if len(t) > 6 else "",
-                "datePlanted": t[7] if len(t) > 7 else "",
-                "harvestDate": t[8] if len(t) > 8 else "",
-                "areaSize": int(t[9]) if len(t) > 9 else 0,
-            }
+            return TraceabilityService._fetch_crop_onchain(crop_id)
         except Exception as e:
             print("getCrop() failed:", str(e))
             return {}
 
     @staticmethod
     def _get_history_onchain(crop_id: str) -> List[Dict[str, Any]]:
+        try:
+            return TraceabilityService._fetch_history_onchain(crop_id)
+        except Exception:
+            return []
+
+    @staticmethod
+    def _fetch_history_onchain(crop_id: str) -> List[Dict[str, Any]]:
         """
         getCropHistory returns CropEvent[].
         Your CropEvent struct order currently is large; we parse safely by index.
@@ -107,12 +228,10 @@ class TraceabilityService:
           packagingType, harvesterName,
           harvestQuantity, processedQuantity, batchCode,
           userId, cropId, cropType
+        Raises on RPC errors; see _get_history_onchain.
         """
         out: List[Dict[str, Any]] = []
-        try:
-            arr = contract.functions.getCropHistory(crop_id).call()
-        except Exception:
-            return out
+        arr = contract.functions.getCropHistory(crop_id).call()
 
         for ev in arr or []:
             # ev is tuple; parse defensively
@@ -237,59 +356,61 @@ class TraceabilityService:
     # Mongo reads (warehouse + shipments)
     # -------------------------
     @staticmethod
-    def _get_storage_mongo(crop_id: str, user_id: Optional[str] = None) -> Optional[StorageBlock]:
+    def _storage_probe(col: str, crop_id: str, user_id: Optional[str] = None,
+                       end: Optional[float] = None) -> Optional[StorageBlock]:
         """
-        Expecting a collection like: warehouse_storage / storage_events etc.
-        We'll try multiple names so your existing DB still works.
+        Latest storage doc for the crop in one collection.
         Document example (you can match):
           { cropId, userId, warehouseName, city, storedOn, qualityCheck }
+        end: monotonic deadline -> max_time_ms, so the server stops the query too
         """
-         # adjust if your mongo instance lives elsewhere
-
         queries = {"cropId": crop_id}
         if user_id:
             # optional guard to only show own records
             queries["userId"] = user_id
 
-        for col in ["warehouse_storage", "storage_events", "warehouse_events"]:
+        opts: Dict[str, Any] = {"max_time_ms": _max_time_ms(end)} if end is not None else {}
+        doc = mongo.db[col].find_one(queries, sort=[("storedOn", -1), ("created_at", -1)], **opts)
+        if not doc:
+            return None
+        return StorageBlock(
+            warehouseName=str(doc.get("warehouseName") or doc.get("warehouse") or ""),
+            city=str(doc.get("city") or doc.get("location") or ""),
+            storedOn=str(doc.get("storedOn") or doc.get("storedDate") or doc.get("date") or ""),
+            qualityCheck=str(doc.get("qualityCheck") or doc.get("qcStatus") or ""),
+        )
+
+    @staticmethod
+    def _get_storage_mongo(crop_id: str, user_id: Optional[str] = None) -> Optional[StorageBlock]:
+        """
+        Expecting a collection like: warehouse_storage / storage_events etc.
+        We'll try multiple names so your existing DB still works (sequential;
+        build_traceability probes them concurrently).
+        """
+        for col in STORAGE_COLS:
             try:
-                doc = mongo.db[col].find_one(queries, sort=[("storedOn", -1), ("created_at", -1)])
-                if doc:
-                    return StorageBlock(
-                        warehouseName=str(doc.get("warehouseName") or doc.get("warehouse") or ""),
-                        city=str(doc.get("city") or doc.get("location") or ""),
-                        storedOn=str(doc.get("storedOn") or doc.get("storedDate") or doc.get("date") or ""),
-                        qualityCheck=str(doc.get("qualityCheck") or doc.get("qcStatus") or ""),
-                    )
+                block = TraceabilityService._storage_probe(col, crop_id, user_id)
+                if block:
+                    return block
             except Exception:
                 continue
 
         return None
 
     @staticmethod
-    def _get_shipments_mongo(crop_id: str, user_id: Optional[str] = None) -> ShipmentBlock:
-        """
-        Expect shipments stored in Mongo (since transporter isn't on chain).
-        Document example:
-          { cropId, userId, transporter, deliveredTo, fromCity, toCity, date }
-        """
-
+    def _shipment_probe(col: str, crop_id: str, user_id: Optional[str] = None,
+                        end: Optional[float] = None) -> List[Dict[str, Any]]:
         q = {"cropId": crop_id}
         if user_id:
             q["userId"] = user_id
+        cur = mongo.db[col].find(q).sort([("date", 1), ("created_at", 1)])
+        if end is not None:
+            cur = cur.max_time_ms(_max_time_ms(end))
+        return list(cur)
 
+    @staticmethod
+    def _shipment_block(docs: List[Dict[str, Any]]) -> ShipmentBlock:
         items: List[ShipmentItem] = []
-        docs: List[Dict[str, Any]] = []
-
-        for col in ["shipments", "shipment_events", "transporter_shipments", "transport_events"]:
-            try:
-                cur = list(mongo.db[col].find(q).sort([("date", 1), ("created_at", 1)]))
-                if cur:
-                    docs = cur
-                    break
-            except Exception:
-                continue
-
         for idx, d in enumerate(docs, start=1):
             from_city = (d.get("fromCity") or d.get("from") or d.get("origin") or "").strip()
             to_city = (d.get("toCity") or d.get("to") or d.get("destination") or "").strip()
@@ -311,6 +432,24 @@ class TraceabilityService:
 
         return ShipmentBlock(shipments=items)
 
+    @staticmethod
+    def _get_shipments_mongo(crop_id: str, user_id: Optional[str] = None) -> ShipmentBlock:
+        """
+        Expect shipments stored in Mongo (since transporter isn't on chain).
+        Document example:
+          { cropId, userId, transporter, deliveredTo, fromCity, toCity, date }
+        """
+        docs: List[Dict[str, Any]] = []
+        for col in SHIPMENT_COLS:
+            try:
+                docs = TraceabilityService._shipment_probe(col, crop_id, user_id)
+                if docs:
+                    break
+            except Exception:
+                continue
+
+        return TraceabilityService._shipment_block(docs)
+
     @staticmethod
     def get_crops_for_user(user_id: str) -> List[Dict[str, Any]]:
         """
@@ -0,0 +1,98 @@
+# backend/serving.py
+"""
+Helpers for the production launchers (serve.py / wsgi.py / asgi.py).
+
+- warm_templates(app): compile every Jinja template once in the gunicorn
+  master (preload_app) so forked workers inherit the compiled cache.
+- after_fork(): rebuild per-process network clients in each worker
+  (Mongo, web3 HTTP provider, auth API session).
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from typing import Any
+
+
+def warm_templates(app: Any) -> int:
+    """Compile all templates into app.jinja_env's cache. Returns count."""
+    env = app.jinja_env
+    n = 0
+    for name in env.list_templates():
+        if not name.endswith((".html", ".htm", ".jinja", ".j2", ".txt")):
+            continue
+        try:
+            env.get_template(name)
+            n += 1
+        except Exception as e:
+            print(f"⚠️ template warmup failed for {name}: {e}")
+    return n
+
+
+def _reset_flask_mongo() -> None:
+    mod = sys.modules.get("backend.mongo")
+    if mod is not None:
+        mod.reconnect_mongo()
+
+
+def _reset_web3() -> None:
+    mod = sys.modules.get("blockchain_setup")
+    if mod is not None and hasattr(mod, "reset_connections"):
+        try:
+            mod.reset_connections()
+        except Exception as e:
+            print(f"⚠️ web3 provider reset failed: {e}")
+
+
+def _reset_auth_api_session() -> None:
+    mod = sys.modules.get("backend.services.auth_api_client")
+    if mod is None:
+        return
+    try:
+        old = getattr(mod, "_session", None)
+        mod._session = mod._new_session()
+        if old is not None:
+            old.close()
+    except Exception as e:
+        print(f"⚠️ auth API session reset failed: {e}")
+
+
+def _warm_module_mongo_clients() -> None:
+    """
+    FastAPI routers and server.py hold module-level MongoClient(connect=False).
+    They never connected in the master; open the pool here so the first
+    request in each worker doesn't pay for server selection. Runs in a
+    background thread (see after_fork): an unreachable Mongo costs up to
+    serverSelectionTimeoutMS (30s) per client, which must not hold up boot.
+    """
+    try:
+        from pymongo import MongoClient
+    except Exception:
+        return
+
+    seen = set()
+    for name, mod in list(sys.modules.items()):
+        if mod is None or not (name == "server" or name.startswith("backend.fastapi.")):
+            continue
+        client = getattr(mod, "mongo", None)
+        if not isinstance(client, MongoClient) or id(client) in seen:
+            continue
+        seen.add(id(client))
+        try:
+            client.admin.command("ping")
+        except Exception as e:
+            print(f"⚠️ Mongo ping failed in {name}: {e}")
+
+
+def after_fork() -> None:
+    """gunicorn post_fork: give this worker its own connections."""
+    _reset_flask_mongo()
+    _reset_web3()
+    _reset_auth_api_session()
+    threading.Thread(target=_warm_module_mongo_clients, name="mongo-warmup", daemon=True).start()
+    print(f"✓ worker pid={os.getpid()} connections rebuilt")
+
+
+__all__ = ["warm_templates", "after_fork"]
@@ -0,0 +1,213 @@
+# backend/utils/fast_json.py
+"""
+Shared JSON response layer (orjson) for the Flask web app and the FastAPI API.
+
+orjson serializes datetime/date, UUID, dataclasses (TraceabilityViewModel,
+dashboard blocks, ...) and non-str dict keys natively; `_default` adds the
+Mongo / web3 types we return everywhere (ObjectId, Decimal128, HexBytes,
+AttributeDict, sets) so routes no longer need `d["_id"] = str(d["_id"])` loops.
+
+If a payload can't go through orjson (e.g. uint256 chain values larger than
+64 bits) we fall back to stdlib json with the same default hook.
+
+Wiring:
+    Flask:    app.json = FastJSONProvider(app)                     (app.py)
+    FastAPI:  FastAPI(default_response_class=FastJSONResponse)     (server.py)
+              install_fastapi_encoders()   # ObjectId etc. in jsonable_encoder
+              return json_response({...})  # big payloads: skip jsonable_encoder
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Mapping
+from dataclasses import asdict, is_dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from backend.utils.metrics import record as record_metric
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback keeps the app running without the wheel
+    orjson = None
+
+try:
+    from bson import ObjectId
+    from bson.decimal128 import Decimal128
+except ImportError:
+    ObjectId = Decimal128 = None
+
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS
+else:
+    _OPTS = 0
+
+
+def _default(obj: Any) -> Any:
+    """Types orjson / json don't know about."""
+    if ObjectId is not None and isinstance(obj, ObjectId):
+        return str(obj)
+    if Decimal128 is not None and isinstance(obj, Decimal128):
+        obj = obj.to_decimal()
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        # web3 HexBytes / tx hashes
+        return "0x" + bytes(obj).hex()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Mapping):
+        # web3 AttributeDict and friends
+        return dict(obj)
+    if hasattr(obj, "to_dict") and callable(obj.to_dict):
+        return obj.to_dict()
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _std_dumps(obj: Any, indent: Optional[int] = None, sort_keys: bool = False) -> str:
+    return json.dumps(
+        obj,
+        default=_default,
+        indent=indent,
+        sort_keys=sort_keys,
+        ensure_ascii=False,
+        separators=None if indent else (",", ":"),
+    )
+
+
+def dumps_bytes(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Serialize to UTF-8 bytes (fast path orjson, fallback stdlib)."""
+    if orjson is not None:
+        opts = _OPTS
+        if indent:
+            opts |= orjson.OPT_INDENT_2
+        if sort_keys:
+            opts |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=_default, option=opts)
+        except (TypeError, orjson.JSONEncodeError):
+            # e.g. ints beyond 64 bits from the chain -> stdlib handles them
+            pass
+    return _std_dumps(obj, indent=2 if indent else None, sort_keys=sort_keys).encode("utf-8")
+
+
+def dumps(obj: Any, **kwargs: Any) -> str:
+    return dumps_bytes(obj, indent=bool(kwargs.get("indent")), sort_keys=bool(kwargs.get("sort_keys"))).decode("utf-8")
+
+
+def loads(s: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(s)
+    if isinstance(s, (bytes, bytearray)):
+        s = s.decode("utf-8")
+    return json.loads(s)
+
+
+# ------------------------------------------------------------
+# Flask
+# ------------------------------------------------------------
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = None
+
+
+if DefaultJSONProvider is not None:
+
+    class FastJSONProvider(DefaultJSONProvider):
+        """
+        app.json provider: jsonify / request.get_json / |tojson go through orjson.
+        Keys are not sorted for responses (Flask's default sorts every dict).
+        """
+
+        sort_keys = False
+
+        def dumps(self, obj: Any, **kwargs: Any) -> str:
+            indent = kwargs.pop("indent", None)
+            sort_keys = kwargs.pop("sort_keys", self.sort_keys)
+            kwargs.pop("default", None)
+            kwargs.pop("ensure_ascii", None)
+            if kwargs:
+                # unusual options (cls=, separators=...) -> stdlib, same semantics as before
+                kwargs.setdefault("default", _default)
+                return json.dumps(obj, indent=indent, sort_keys=sort_keys, **kwargs)
+            return dumps_bytes(obj, indent=bool(indent), sort_keys=bool(sort_keys)).decode("utf-8")
+
+        def loads(self, s: Any, **kwargs: Any) -> Any:
+            if kwargs:
+                return super().loads(s, **kwargs)
+            return loads(s)
+
+        def response(self, *args: Any, **kwargs: Any):
+            obj = self._prepare_response_obj(args, kwargs)
+            pretty = self._app.debug if self.compact is None else not self.compact
+            t0 = time.perf_counter()
+            body = dumps_bytes(obj, indent=pretty)
+            record_metric("serialize", time.perf_counter() - t0, app="flask")
+            return self._app.response_class(body, mimetype=self.mimetype)
+
+else:
+    FastJSONProvider = None
+
+
+# ------------------------------------------------------------
+# FastAPI / Starlette
+# ------------------------------------------------------------
+try:
+    from starlette.responses import JSONResponse as _StarletteJSONResponse
+except ImportError:
+    _StarletteJSONResponse = None
+
+
+if _StarletteJSONResponse is not None:
+
+    class FastJSONResponse(_StarletteJSONResponse):
+        media_type = "application/json"
+
+        def render(self, content: Any) -> bytes:
+            t0 = time.perf_counter()
+            body = dumps_bytes(content)
+            record_metric("serialize", time.perf_counter() - t0, app="fastapi")
+            return body
+
+    def json_response(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> "FastJSONResponse":
+        """
+        Return this from a FastAPI endpoint to serialize straight with orjson
+        (FastAPI skips jsonable_encoder for Response objects).
+        """
+        return FastJSONResponse(content=content, status_code=status_code, headers=headers)
+
+else:
+    FastJSONResponse = None
+    json_response = None
+
+
+def install_fastapi_encoders() -> None:
+    """Teach fastapi.encoders.jsonable_encoder about ObjectId / Decimal128."""
+    try:
+        from fastapi import encoders
+    except ImportError:
+        return
+    if ObjectId is not None:
+        encoders.ENCODERS_BY_TYPE.setdefault(ObjectId, str)
+    if Decimal128 is not None:
+        encoders.ENCODERS_BY_TYPE.setdefault(Decimal128, lambda d: _default(d.to_decimal()))
+
+
+__all__ = [
+    "dumps",
+    "dumps_bytes",
+    "loads",
+    "FastJSONProvider",
+    "FastJSONResponse",
+    "json_response",
+    "install_fastapi_encoders",
+]
@@ -0,0 +1,391 @@
+# backend/utils/idempotency.py
+"""
+Idempotency-Key support for POST endpoints that write to chain / Mongo.
+
+A client sends `Idempotency-Key: <uuid>` with a write. The first request
+claims the key (atomic insert into `idempotency_keys`), runs, and stores its
+response. Repeats with the same key replay the stored response instead of
+re-executing (no second gas-paying tx). A duplicate that arrives while the
+first one is still running waits for it to finish.
+
+Once the running request has broadcast a tx (watch_tx calls mark_submitted),
+the key is never released: if the request then fails or is still waiting for
+the receipt, duplicates get 202 with the tx hash(es) instead of a re-run.
+
+Records expire through a TTL index on `expires_at`.
+
+Usage (Flask):
+    @sales_bp.post("/order/create")
+    @idempotent_flask("farmer.order.create")
+    def create_order(): ...
+
+Usage (FastAPI):
+    @router.post("/harvest/record")
+    @idempotent_fastapi(lambda: db["idempotency_keys"], "farmer.harvest.record")
+    def harvest_record(payload: ..., identity = Depends(auth_identity)): ...
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+HEADER = "Idempotency-Key"
+COL_NAME = "idempotency_keys"
+
+TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# a claimed key whose owner died is taken over after this (chain writes wait up to 180s for a receipt)
+LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "240"))
+# how long a concurrent duplicate waits for the first request before answering 409
+WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "60"))
+POLL_SECONDS = 0.2
+MAX_KEY_LEN = 200
+
+STATE_IN_FLIGHT = "in_flight"
+STATE_SUBMITTED = "submitted"
+STATE_DONE = "done"
+
+# (store, rid) of the key the current request owns; set by the decorators
+_claimed: contextvars.ContextVar[Optional[Tuple["IdempotencyStore", str]]] = \
+    contextvars.ContextVar("idempotency_claimed", default=None)
+
+
+class IdempotencyConflict(Exception):
+    """Key reused with a different payload (422) or still in flight after waiting (409)."""
+
+    def __init__(self, status: int, code: str):
+        super().__init__(code)
+        self.status = status
+        self.code = code
+
+
+def _ensure_indexes(col) -> None:
+    if getattr(col, "_idem_indexed", False):
+        return
+    try:
+        col.create_index([("expires_at", 1)], expireAfterSeconds=0, name="ttl_expires_at")
+    except Exception as e:
+        print(f"⚠️ idempotency index error: {e}")
+    try:
+        col._idem_indexed = True
+    except Exception:
+        pass
+
+
+def fingerprint(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Mongo-backed claim / complete / release of idempotency keys.
+    _id = "<scope>|<actor>|<key>" so keys are per endpoint and per user.
+    """
+
+    def __init__(self, col):
+        self.col = col
+        _ensure_indexes(col)
+
+    @staticmethod
+    def record_id(scope: str, actor: str, key: str) -> str:
+        return f"{scope}|{actor or '-'}|{key}"
+
+    def claim(self, rid: str, fp: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Returns (owner, stored):
+          (True, None)    -> caller must execute and then complete()/release()
+          (False, record) -> replay record["status"], record["body"]
+        Raises IdempotencyConflict.
+        """
+        now = datetime.utcnow()
+        try:
+            self.col.insert_one({
+                "_id": rid,
+                "state": STATE_IN_FLIGHT,
+                "fingerprint": fp,
+                "locked_until": now + timedelta(seconds=LOCK_SECONDS),
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=TTL_SECONDS),
+            })
+            return True, None
+        except DuplicateKeyError:
+            pass
+
+        deadline = time.monotonic() + WAIT_SECONDS
+        delay = POLL_SECONDS
+        while True:
+            doc = self.col.find_one({"_id": rid})
+            if doc is None:
+                # released by a failed owner -> try to claim again
+                return self.claim(rid, fp)
+
+            if doc.get("fingerprint") != fp:
+                raise IdempotencyConflict(422, "idempotency_key_reused_with_different_payload")
+
+            if doc.get("state") == STATE_DONE:
+                return False, doc
+
+            now = datetime.utcnow()
+            if doc.get("state") == STATE_SUBMITTED:
+                # tx already broadcast: never re-run; wait for the owner, else replay 202
+                if doc.get("locked_until", now) < now or time.monotonic() >= deadline:
+                    return False, doc
+                time.sleep(delay)
+                delay = min(delay * 1.5, 2.0)
+                continue
+
+            # owner crashed / timed out -> take over the lock
+            taken = self.col.find_one_and_update(
+                {"_id": rid, "state": STATE_IN_FLIGHT, "locked_until": {"$lt": now}},
+                {"$set": {"locked_until": now + timedelta(seconds=LOCK_SECONDS)}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if taken:
+                return True, None
+
+            if time.monotonic() >= deadline:
+                raise IdempotencyConflict(409, "request_in_progress")
+            time.sleep(delay)
+            delay = min(delay * 1.5, 2.0)
+
+    @staticmethod
+    def submitted_body(tx_hashes: List[str]) -> Dict[str, Any]:
+        return {
+            "ok": True,
+            "txStatus": "submitted",
+            "txHash": tx_hashes[-1] if tx_hashes else None,
+            "txHashes": tx_hashes,
+            "statusUrl": f"/api/v1/status/tx/{tx_hashes[-1]}" if tx_hashes else None,
+        }
+
+    def submitted(self, rid: str, tx_hash: str) -> None:
+        """The owner broadcast a tx: from now on the key is replayed as 202, not released."""
+        doc = self.col.find_one_and_update(
+            {"_id": rid, "state": {"$in": [STATE_IN_FLIGHT, STATE_SUBMITTED]}},
+            {"$set": {"state": STATE_SUBMITTED, "status": 202}, "$addToSet": {"tx_hashes": tx_hash}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is not None:
+            self.col.update_one({"_id": rid, "state": STATE_SUBMITTED},
+                                {"$set": {"body": self.submitted_body(doc.get("tx_hashes") or [])}})
+
+    def complete(self, rid: str, status: int, body: Any) -> None:
+        self.col.update_one(
+            {"_id": rid},
+            {"$set": {
+                "state": STATE_DONE,
+                "status": int(status),
+                "body": body,
+                "completed_at": datetime.utcnow(),
+            }},
+        )
+
+    def release(self, rid: str) -> None:
+        """
+        Forget an in-flight key (server error) so a retry re-executes. A key
+        that already has a tx stays; it is unlocked so duplicates replay 202.
+        """
+        try:
+            if self.col.delete_one({"_id": rid, "state": STATE_IN_FLIGHT}).deleted_count == 0:
+                self.col.update_one({"_id": rid, "state": STATE_SUBMITTED},
+                                    {"$set": {"locked_until": datetime.utcnow()}})
+        except Exception:
+            pass
+
+
+def mark_submitted(tx_hash: str) -> None:
+    """Record a broadcast tx against the Idempotency-Key this request owns (no-op without one)."""
+    claimed = _claimed.get()
+    if claimed is None or not tx_hash:
+        return
+    store, rid = claimed
+    try:
+        store.submitted(rid, tx_hash)
+    except Exception as e:
+        print(f"⚠️ idempotency submitted-state write failed for {rid}: {e}")
+
+
+def _clean_key(raw: Optional[str]) -> Optional[str]:
+    key = (raw or "").strip()
+    if not key:
+        return None
+    return key[:MAX_KEY_LEN]
+
+
+# ------------------------------------------------------------
+# Flask
+# ------------------------------------------------------------
+def _flask_actor() -> str:
+    from backend.utils.jwt_auth import flask_identity
+    identity = flask_identity() or {}
+    return str(identity.get("userId") or "")
+
+
+def idempotent_flask(scope: str):
+    """
+    Decorator for Flask views. No Idempotency-Key header -> runs as before.
+    Responses with status < 500 are stored and replayed; 5xx / exceptions release the key.
+    """
+
+    def deco(view: Callable):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import jsonify, make_response, request
+
+            key = _clean_key(request.headers.get(HEADER))
+            if not key:
+                return view(*args, **kwargs)
+
+            from backend.mongo_safe import get_col
+            col = get_col(COL_NAME)
+            if col is None:
+                return view(*args, **kwargs)
+
+            store = IdempotencyStore(col)
+            rid = store.record_id(scope, _flask_actor(), key)
+            fp = fingerprint(request.path, kwargs, request.get_data(cache=True).decode("utf-8", "replace"),
+                             request.form.to_dict(flat=False))
+
+            try:
+                owner, stored = store.claim(rid, fp)
+            except IdempotencyConflict as e:
+                resp = jsonify({"ok": False, "err": e.code})
+                resp.status_code = e.status
+                if e.status == 409:
+                    resp.headers["Retry-After"] = "2"
+                return resp
+
+            if not owner:
+                resp = jsonify(stored.get("body"))
+                resp.status_code = int(stored.get("status") or 200)
+                resp.headers["Idempotent-Replayed"] = "true"
+                return resp
+
+            token = _claimed.set((store, rid))
+            try:
+                resp = make_response(view(*args, **kwargs))
+            except Exception:
+                store.release(rid)
+                raise
+            finally:
+                _claimed.reset(token)
+
+            body = resp.get_json(silent=True) if resp.is_json else None
+            if resp.status_code < 500 and body is not None:
+                store.complete(rid, resp.status_code, body)
+            else:
+                store.release(rid)
+            return resp
+
+        return wrapper
+
+    return deco
+
+
+# ------------------------------------------------------------
+# FastAPI
+# ------------------------------------------------------------
+def idempotent_fastapi(col_getter: Callable[[], Any], scope: str):
+    """
+    Decorator for sync FastAPI endpoints. Adds an optional `Idempotency-Key`
+    header parameter to the endpoint signature. The actor is taken from the
+    endpoint's `identity` dependency (userId).
+    """
+    from fastapi import Header, HTTPException
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    def deco(fn: Callable):
+        sig = inspect.signature(fn)
+        params = list(sig.parameters.values())
+        params.append(inspect.Parameter(
+            "idempotency_key",
+            inspect.Parameter.KEYWORD_ONLY,
+            default=Header(None, alias=HEADER),
+            annotation=Optional[str],
+        ))
+
+        @functools.wraps(fn)
+        def wrapper(*args, idempotency_key: Optional[str] = None, **kwargs):
+            key = _clean_key(idempotency_key)
+            if not key:
+                return fn(*args, **kwargs)
+
+            col = col_getter()
+            if col is None:
+                return fn(*args, **kwargs)
+
+            identity = kwargs.get("identity") or {}
+            actor = str(identity.get("userId") or "") if isinstance(identity, dict) else ""
+            store = IdempotencyStore(col)
+            rid = store.record_id(scope, actor, key)
+            fp = fingerprint({k: jsonable_encoder(v) for k, v in kwargs.items() if k != "identity"})
+
+            try:
+                owner, stored = store.claim(rid, fp)
+            except IdempotencyConflict as e:
+                headers = {"Retry-After": "2"} if e.status == 409 else None
+                raise HTTPException(status_code=e.status, detail=e.code, headers=headers)
+
+            if not owner:
+                return JSONResponse(
+                    status_code=int(stored.get("status") or 200),
+                    content=stored.get("body"),
+                    headers={"Idempotent-Replayed": "true"},
+                )
+
+            token = _claimed.set((store, rid))
+            try:
+                result = fn(*args, **kwargs)
+            except HTTPException as e:
+                if e.status_code < 500:
+                    store.complete(rid, e.status_code, {"detail": jsonable_encoder(e.detail)})
+                else:
+                    store.release(rid)
+                raise
+            except Exception:
+                store.release(rid)
+                raise
+            finally:
+                _claimed.reset(token)
+
+            if isinstance(result, JSONResponse):
+                try:
+                    body = json.loads(result.body)
+                except Exception:
+                    body = None
+                if body is not None and result.status_code < 500:
+                    store.complete(rid, result.status_code, body)
+                else:
+                    store.release(rid)
+                return result
+
+            store.complete(rid, 200, jsonable_encoder(result))
+            return result
+
+        wrapper.__signature__ = sig.replace(parameters=params)
+        return wrapper
+
+    return deco
+
+
+__all__ = [
+    "HEADER",
+    "IdempotencyStore",
+    "IdempotencyConflict",
+    "idempotent_flask",
+    "idempotent_fastapi",
+    "mark_submitted",
+    "fingerprint",
+]
@@ -0,0 +1,316 @@
+# backend/utils/jwt_auth.py
+"""
+One place for JWT access-token auth, shared by the FastAPI routers, server.py
+and the Flask "web session or mobile JWT" helpers.
+
+Verified tokens are kept in a small LRU keyed by a hash of the token, so a
+bursty mobile client doesn't pay for the HMAC verify + parse on every call.
+An entry is only served until the token's own `exp`; expired or unknown
+tokens always go through jwt.decode again.
+
+FastAPI:
+    from backend.utils.jwt_auth import auth_identity, require_role, check_role
+
+    @router.get("/overview")
+    def overview(identity = Depends(require_role("farmer"))): ...
+
+Flask:
+    from backend.utils.jwt_auth import get_user_id_web_or_jwt
+    farmer_id = get_user_id_web_or_jwt("farmer")
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import jwt
+
+JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "change-me-super-secret")
+JWT_ALGORITHMS = ["HS256"]
+
+CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+# upper bound on how long a verified token is trusted without re-checking
+CACHE_MAX_SECONDS = int(os.getenv("AUTH_TOKEN_CACHE_MAX_SECONDS", "900"))
+# ?token= for EventSource (which can't send headers); only has to outlive the connect
+STREAM_TOKEN_SECONDS = int(os.getenv("STATUS_STREAM_TOKEN_SECONDS", "60"))
+
+
+class AuthError(Exception):
+    """Framework-neutral auth failure; mapped to HTTPException / JSON by the callers."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+# ------------------------------------------------------------
+# Verified-token cache
+# ------------------------------------------------------------
+class TokenCache:
+    """Thread-safe LRU: token hash -> (decoded payload, valid_until epoch)."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = max(0, maxsize)
+        self._data: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str, secret: str) -> bytes:
+        # secret is part of the key so tokens verified under another key never match
+        return hashlib.sha256(f"{secret}\0{token}".encode("utf-8")).digest()
+
+    def get(self, k: bytes) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(k)
+            if item is None:
+                self.misses += 1
+                return None
+            payload, valid_until = item
+            if valid_until <= now:
+                del self._data[k]
+                self.misses += 1
+                return None
+            self._data.move_to_end(k)
+            self.hits += 1
+            return payload
+
+    def put(self, k: bytes, payload: Dict[str, Any]) -> None:
+        if not self.maxsize:
+            return
+        now = time.time()
+        valid_until = now + CACHE_MAX_SECONDS
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            valid_until = min(valid_until, float(exp))
+        if valid_until <= now:
+            return
+        with self._lock:
+            self._data[k] = (payload, valid_until)
+            self._data.move_to_end(k)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_cache = TokenCache()
+
+
+def decode_token(token: str, secret: Optional[str] = None) -> Dict[str, Any]:
+    """Verify + decode (HS256). Legacy tokens with a dict `sub` are accepted."""
+    secret = secret or JWT_SECRET_KEY
+    token = (token or "").strip()
+    if not token:
+        raise AuthError(401, "Missing or invalid Authorization header")
+
+    k = TokenCache.key(token, secret)
+    payload = _cache.get(k)
+    if payload is not None:
+        return payload
+
+    try:
+        payload = jwt.decode(token, secret, algorithms=JWT_ALGORITHMS, options={"verify_sub": False})
+    except jwt.ExpiredSignatureError:
+        raise AuthError(401, "Token expired")
+    except jwt.InvalidTokenError:
+        raise AuthError(401, "Invalid token")
+
+    _cache.put(k, payload)
+    return payload
+
+
+def identity_from_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Mobile tokens (server.py) carry the identity in `user`; legacy ones in a
+    dict `sub`; Flask-JWT-Extended ones have a string `sub` + `role` claim.
+    """
+    identity = payload.get("user")
+    sub = payload.get("sub")
+    if not identity and isinstance(sub, dict):
+        identity = sub
+    if not identity and isinstance(sub, str) and sub:
+        identity = {"userId": sub}
+    if not identity or not isinstance(identity, dict):
+        raise AuthError(401, "Invalid token payload")
+
+    identity = dict(identity)  # callers may mutate; never hand out the cached dict
+    if not identity.get("role") and payload.get("role"):
+        identity["role"] = payload["role"]
+    return identity
+
+
+def access_identity(token: str, secret: Optional[str] = None) -> Dict[str, Any]:
+    payload = decode_token(token, secret)
+    if payload.get("type") != "access":
+        raise AuthError(401, "Not an access token")
+    return identity_from_payload(payload)
+
+
+def issue_stream_token(identity: Dict[str, Any], ttl: int = STREAM_TOKEN_SECONDS) -> str:
+    """Short-lived token that only opens the status stream (GET /api/v1/status/stream?token=)."""
+    now = int(time.time())
+    return jwt.encode(
+        {"sub": str(identity.get("userId", "")), "user": dict(identity), "type": "stream",
+         "iat": now, "exp": now + max(1, int(ttl))},
+        JWT_SECRET_KEY, algorithm="HS256",
+    )
+
+
+def stream_identity(token: str) -> Dict[str, Any]:
+    payload = decode_token(token)
+    if payload.get("type") != "stream":
+        raise AuthError(401, "Not a stream token")
+    return identity_from_payload(payload)
+
+
+def role_user_id(identity: Dict[str, Any], role: str) -> str:
+    """Return userId if identity has `role`, else AuthError 403/401."""
+    if not identity:
+        raise AuthError(401, "Unauthorized")
+    if (identity.get("role") or "").lower() != role:
+        raise AuthError(403, f"Only {role}s can access this endpoint")
+    uid = identity.get("userId")
+    if not uid:
+        raise AuthError(401, "Missing userId in token")
+    return uid
+
+
+def cache_stats() -> Dict[str, int]:
+    return _cache.stats()
+
+
+def clear_cache() -> None:
+    _cache.clear()
+
+
+# ------------------------------------------------------------
+# FastAPI
+# ------------------------------------------------------------
+try:
+    from fastapi import HTTPException, Security
+    from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+except ImportError:  # Flask-only deployments
+    HTTPException = None
+
+
+if HTTPException is not None:
+    # one HTTPBearer scheme (docs show a lock on every protected route)
+    bearer = HTTPBearer(scheme_name="AccessToken", bearerFormat="JWT", auto_error=False)
+
+    def auth_identity(credentials: HTTPAuthorizationCredentials = Security(bearer)) -> Dict[str, Any]:
+        if not credentials or (credentials.scheme or "").lower() != "bearer":
+            raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+        try:
+            return access_identity(credentials.credentials)
+        except AuthError as e:
+            raise HTTPException(status_code=e.status, detail=e.detail)
+
+    def check_role(identity: Dict[str, Any], role: str) -> str:
+        """Ensure identity has `role`; return userId (HTTPException otherwise)."""
+        try:
+            return role_user_id(identity, role)
+        except AuthError as e:
+            raise HTTPException(status_code=e.status, detail=e.detail)
+
+    def require_role(role: str):
+        """Dependency factory: Depends(require_role("farmer")) -> identity dict."""
+        role = role.lower()
+
+        def _dep(credentials: HTTPAuthorizationCredentials = Security(bearer)) -> Dict[str, Any]:
+            identity = auth_identity(credentials)
+            check_role(identity, role)
+            return identity
+
+        _dep.__name__ = f"require_{role}"
+        return _dep
+
+else:
+    bearer = auth_identity = check_role = require_role = None
+
+
+# ------------------------------------------------------------
+# Flask (web session first, then mobile Bearer token)
+# ------------------------------------------------------------
+def _flask_secret() -> str:
+    try:
+        from flask import current_app
+        return current_app.config.get("JWT_SECRET_KEY") or JWT_SECRET_KEY
+    except Exception:
+        return JWT_SECRET_KEY
+
+
+def _flask_bearer_identity() -> Optional[Dict[str, Any]]:
+    from flask import request
+
+    header = request.headers.get("Authorization") or ""
+    scheme, _, token = header.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    try:
+        return access_identity(token, _flask_secret())
+    except AuthError:
+        return None
+
+
+def flask_identity() -> Optional[Dict[str, Any]]:
+    """Identity for the current Flask request (session, else Bearer token), or None."""
+    from flask import session
+
+    uid = session.get("user_id")
+    if uid:
+        return {"userId": uid, "role": session.get("role") or ""}
+    return _flask_bearer_identity()
+
+
+def get_user_id_web_or_jwt(role: str) -> Optional[str]:
+    """userId if the web session or the Bearer token belongs to `role`, else None."""
+    from flask import session
+
+    role = role.lower()
+    # 1) web session auth
+    if session.get("role") == role and session.get("user_id"):
+        return session.get("user_id")
+
+    # 2) JWT auth (mobile)
+    identity = _flask_bearer_identity()
+    if not identity:
+        return None
+    try:
+        return role_user_id(identity, role)
+    except AuthError:
+        return None
+
+
+__all__ = [
+    "AuthError",
+    "TokenCache",
+    "decode_token",
+    "identity_from_payload",
+    "access_identity",
+    "issue_stream_token",
+    "stream_identity",
+    "role_user_id",
+    "cache_stats",
+    "clear_cache",
+    "bearer",
+    "auth_identity",
+    "check_role",
+    "require_role",
+    "flask_identity",
+    "get_user_id_web_or_jwt",
+]
@@ -0,0 +1,476 @@
+# backend/utils/metrics.py
+"""
+In-process request metrics with a Prometheus text endpoint (/metrics).
+
+No external collector or client library: a small thread-safe registry of
+counters / histograms, rendered in the Prometheus exposition format.
+
+Recorded:
+- trusource_http_request_duration_seconds{app,method,route,status}
+    route is the template ("/api/v1/farmer/crops/<crop_id>"), not the raw path
+- trusource_http_request_subsystem_seconds{app,route,kind}
+    time each request spent in mongo / rpc / render / serialize
+- trusource_mongo_command_duration_seconds{command}   (pymongo CommandListener)
+- trusource_rpc_request_duration_seconds{method}      (web3 provider)
+- trusource_template_render_duration_seconds{template}
+- trusource_serialize_duration_seconds{app}
+- gauges from registered stats sources (RPC governor, password pool, ...)
+
+Each gunicorn worker keeps its own registry; the scrape reports the worker
+that served it (`pid` is exposed as trusource_process_info).
+
+Wiring:
+    install_mongo_listener()    # before any MongoClient is created
+    init_flask(app) / init_fastapi(app)
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+PREFIX = "trusource_"
+ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# optional shared secret for /metrics (Authorization: Bearer <token> or ?token=)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+SUBSYSTEMS = ("mongo", "rpc", "render", "serialize")
+
+# per-request accumulator {kind: seconds}; shared by copied contexts (thread pools)
+_request_timers: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "metrics_request_timers", default=None
+)
+
+
+def _escape(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+# ------------------------------------------------------------
+# Metric types
+# ------------------------------------------------------------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[Any, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: Any, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for lv, v in items:
+            out.append(f"{self.name}{_fmt_labels(self.labelnames, lv)} {_fmt_num(v)}")
+        return out
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts (non-cumulative) ..., +Inf count, sum]
+        self._series: Dict[Tuple[Any, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: Any) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        n = len(self.buckets)
+        with self._lock:
+            s = self._series.get(labelvalues)
+            if s is None:
+                s = self._series[labelvalues] = [0.0] * (n + 2)
+            s[i] += 1
+            s[n + 1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(lv, list(s)) for lv, s in self._series.items()]
+        n = len(self.buckets)
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for lv, s in items:
+            cum = 0.0
+            for le, c in zip(self.buckets + (float("inf"),), s[: n + 1]):
+                cum += c
+                le_label = 'le="%s"' % _fmt_num(le)
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, lv, le_label)} {_fmt_num(cum)}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, lv)} {_fmt_num(s[n + 1])}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, lv)} {_fmt_num(cum)}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._stats: List[Tuple[str, str, Callable[[], Dict[str, Any]]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix: str, help_text: str, fn: Callable[[], Dict[str, Any]]) -> None:
+        """Expose a module's stats() dict as gauges named <prefix>_<key>."""
+        with self._lock:
+            self._stats = [x for x in self._stats if x[0] != prefix]
+            self._stats.append((prefix, help_text, fn))
+
+    def render(self) -> str:
+        lines: List[str] = [
+            f"# HELP {PREFIX}process_info Worker process serving this scrape.",
+            f"# TYPE {PREFIX}process_info gauge",
+            f'{PREFIX}process_info{{pid="{os.getpid()}"}} 1',
+        ]
+        with self._lock:
+            metrics = list(self._metrics)
+            stats = list(self._stats)
+        for m in metrics:
+            lines.extend(m.render())
+        for prefix, help_text, fn in stats:
+            try:
+                data = fn() or {}
+            except Exception as e:
+                print(f"⚠️ metrics stats source {prefix} failed: {e}")
+                continue
+            for key, val in data.items():
+                if isinstance(val, bool) or not isinstance(val, (int, float)):
+                    continue
+                name = f"{PREFIX}{prefix}_{key}"
+                lines.append(f"# HELP {name} {help_text} ({key})")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_fmt_num(val)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request duration by route template.",
+    ("app", "method", "route", "status"),
+))
+HTTP_SUBSYSTEM = REGISTRY.register(Histogram(
+    "http_request_subsystem_seconds", "Time a request spent per subsystem (mongo/rpc/render/serialize).",
+    ("app", "route", "kind"), buckets=FAST_BUCKETS,
+))
+MONGO_DURATION = REGISTRY.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command duration.", ("command",), buckets=FAST_BUCKETS,
+))
+MONGO_FAILURES = REGISTRY.register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands.", ("command",),
+))
+RPC_DURATION = REGISTRY.register(Histogram(
+    "rpc_request_duration_seconds", "Chain JSON-RPC request duration.", ("method",),
+))
+RENDER_DURATION = REGISTRY.register(Histogram(
+    "template_render_duration_seconds", "Jinja template render duration.", ("template",), buckets=FAST_BUCKETS,
+))
+SERIALIZE_DURATION = REGISTRY.register(Histogram(
+    "serialize_duration_seconds", "JSON response serialization duration.", ("app",), buckets=FAST_BUCKETS,
+))
+
+_KIND_HIST = {
+    "mongo": (MONGO_DURATION, MONGO_FAILURES),
+    "rpc": (RPC_DURATION, None),
+    "render": (RENDER_DURATION, None),
+}
+
+
+# ------------------------------------------------------------
+# Sub-timers
+# ------------------------------------------------------------
+def _add_request_time(kind: str, seconds: float) -> None:
+    acc = _request_timers.get()
+    if acc is not None:
+        acc[kind] = acc.get(kind, 0.0) + seconds
+
+
+def record(kind: str, seconds: float, label: str = "", app: str = "") -> None:
+    """Record a sub-timer sample (kind in SUBSYSTEMS) and add it to the current request."""
+    if not ENABLED:
+        return
+    if kind == "serialize":
+        SERIALIZE_DURATION.observe(seconds, app or "-")
+    else:
+        hist = _KIND_HIST.get(kind)
+        if hist is not None:
+            hist[0].observe(seconds, label or "-")
+    _add_request_time(kind, seconds)
+
+
+@contextlib.contextmanager
+def timed(kind: str, label: str = "", app: str = ""):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - t0, label, app)
+
+
+def _begin_request() -> Tuple[contextvars.Token, float]:
+    return _request_timers.set({}), time.perf_counter()
+
+
+def _end_request(app: str, method: str, route: str, status: int, token, t0: float) -> None:
+    elapsed = time.perf_counter() - t0
+    acc = _request_timers.get() or {}
+    try:
+        _request_timers.reset(token)
+    except ValueError:
+        pass  # reset from another context (async generator edge cases)
+    HTTP_DURATION.observe(elapsed, app, method, route, str(status))
+    for kind, secs in acc.items():
+        HTTP_SUBSYSTEM.observe(secs, app, route, kind)
+
+
+def register_stats(prefix: str, help_text: str, fn: Callable[[], Dict[str, Any]]) -> None:
+    REGISTRY.register_stats(prefix, help_text, fn)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _authorized(auth_header: Optional[str], token_arg: Optional[str]) -> bool:
+    if not METRICS_TOKEN:
+        return True
+    if token_arg and token_arg == METRICS_TOKEN:
+        return True
+    return (auth_header or "") == f"Bearer {METRICS_TOKEN}"
+
+
+def _register_default_stats() -> None:
+    """Gauges from the shared runtime pieces (imported lazily, all optional)."""
+    try:
+        from backend.utils.rpc_governor import governor
+        register_stats("rpc_governor", "RPC admission control", governor.stats)
+    except Exception:
+        pass
+    try:
+        from backend.utils import passwords
+        register_stats("password_pool", "bcrypt process pool", passwords.stats)
+    except Exception:
+        pass
+    try:
+        from backend.utils import jwt_auth
+        register_stats("jwt_cache", "verified-token cache", jwt_auth.cache_stats)
+    except Exception:
+        pass
+    try:
+        from backend.utils import status_events
+        register_stats("status_events", "status stream broker / tx watcher / jobs", status_events.stats)
+    except Exception:
+        pass
+    try:
+        from backend.services.rfid.tag_writer_bridge import tag_writers
+        register_stats("tag_writers", "ESP32 tag-writer devices", tag_writers.stats)
+    except Exception:
+        pass
+    try:
+        from backend.services.qr.qr_service import qr_images
+        register_stats("qr_cache", "Content-addressed QR image cache", qr_images.stats)
+    except Exception:
+        pass
+
+
+# ------------------------------------------------------------
+# MongoDB (pymongo command monitoring)
+# ------------------------------------------------------------
+_mongo_installed = False
+
+
+def install_mongo_listener() -> None:
+    """Register a global CommandListener. Must run before MongoClients are created."""
+    global _mongo_installed
+    if _mongo_installed or not ENABLED:
+        return
+    try:
+        from pymongo import monitoring
+    except ImportError:
+        return
+
+    class _MongoTimer(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            record("mongo", event.duration_micros / 1e6, event.command_name)
+
+        def failed(self, event):
+            record("mongo", event.duration_micros / 1e6, event.command_name)
+            MONGO_FAILURES.inc(event.command_name)
+
+    monitoring.register(_MongoTimer())
+    _mongo_installed = True
+
+
+# ------------------------------------------------------------
+# Flask
+# ------------------------------------------------------------
+def init_flask(app, app_label: str = "flask") -> None:
+    if not ENABLED:
+        return
+    from flask import Response, g, request, template_rendered, before_render_template
+
+    @app.before_request
+    def _metrics_begin():
+        g._metrics_state = _begin_request()
+
+    @app.after_request
+    def _metrics_end(response):
+        state = g.pop("_metrics_state", None)
+        if state is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            _end_request(app_label, request.method, route, response.status_code, *state)
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown(exc):
+        # after_request didn't run (unhandled exception)
+        state = g.pop("_metrics_state", None)
+        if state is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            _end_request(app_label, request.method, route, 500, *state)
+
+    def _render_start(sender, template, context, **extra):
+        g._metrics_render_t0 = time.perf_counter()
+
+    def _render_done(sender, template, context, **extra):
+        t0 = g.pop("_metrics_render_t0", None)
+        if t0 is not None:
+            record("render", time.perf_counter() - t0, template.name or "-")
+
+    before_render_template.connect(_render_start, app)
+    template_rendered.connect(_render_done, app)
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        if not _authorized(request.headers.get("Authorization"), request.args.get("token")):
+            return Response("forbidden\n", status=403, mimetype="text/plain")
+        return Response(render(), content_type=CONTENT_TYPE)
+
+    _register_default_stats()
+
+
+# ------------------------------------------------------------
+# FastAPI / ASGI
+# ------------------------------------------------------------
+class ASGIMetricsMiddleware:
+    """Pure ASGI middleware: duration by route template + per-request sub-timers."""
+
+    def __init__(self, app, app_label: str = "fastapi"):
+        self.app = app
+        self.app_label = app_label
+        self._route_cache: Dict[Tuple[str, str], str] = {}
+
+    def _route_template(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None and getattr(route, "path", None):
+            return route.path
+        key = (scope.get("method", ""), scope.get("path", ""))
+        hit = self._route_cache.get(key)
+        if hit is not None:
+            return hit
+        tpl = "<unmatched>"
+        try:
+            from starlette.routing import Match
+            for r in scope["app"].router.routes:
+                match, _ = r.matches(scope)
+                if match == Match.FULL:
+                    tpl = getattr(r, "path", tpl)
+                    break
+        except Exception:
+            pass
+        # only cache static routes; parametrised paths vary per request
+        if tpl != "<unmatched>" and "{" not in tpl and len(self._route_cache) < 5000:
+            self._route_cache[key] = tpl
+        return tpl
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        token, t0 = _begin_request()
+        status_holder = {"status": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _end_request(self.app_label, scope.get("method", ""), self._route_template(scope),
+                         status_holder["status"], token, t0)
+
+
+def init_fastapi(app, app_label: str = "fastapi") -> None:
+    if not ENABLED:
+        return
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    app.add_middleware(ASGIMetricsMiddleware, app_label=app_label)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint(request: Request):
+        if not _authorized(request.headers.get("authorization"), request.query_params.get("token")):
+            return PlainTextResponse("forbidden\n", status_code=403)
+        return PlainTextResponse(render(), media_type=CONTENT_TYPE)
+
+    _register_default_stats()
+
+
+__all__ = [
+    "Counter",
+    "Histogram",
+    "Registry",
+    "REGISTRY",
+    "record",
+    "timed",
+    "register_stats",
+    "render",
+    "install_mongo_listener",
+    "init_flask",
+    "init_fastapi",
+    "ASGIMetricsMiddleware",
+]
@@ -0,0 +1,252 @@
+# backend/utils/passwords.py
+"""
+Password hashing off the request path.
+
+bcrypt runs in a small bounded process pool, so a login storm doesn't pin
+the web workers (sync threads or the FastAPI event loop). The pool is
+created lazily per process (safe with gunicorn preload + fork).
+
+- PASSWORD_POOL_SIZE is per process; the default is cpu_count() // WEB_CONCURRENCY
+  so all gunicorn workers together run about one bcrypt per core.
+- BCRYPT_ROUNDS sets the work factor for new hashes. On a successful login a
+  hash with a different cost is re-hashed transparently (verify_and_upgrade).
+- PASSWORD_QUEUE_LIMIT bounds queued + running jobs; beyond it PasswordPoolBusy
+  is raised and callers answer 503 + Retry-After. A job that doesn't finish
+  within PASSWORD_TIMEOUT_SECONDS raises PasswordPoolBusy too.
+- stats() exposes queue depth and counters for metrics.
+
+Hashes stay standard "$2b$" bcrypt, compatible with Flask-Bcrypt / bcrypt.checkpw.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# PASSWORD_POOL_SIZE=0 -> hash inline (tests / tiny deployments). Every web worker
+# (WEB_CONCURRENCY, see serve.py) has its own pool: split the cores between them
+_WEB_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1") or 1))
+POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", str(max(1, multiprocessing.cpu_count() // _WEB_WORKERS))))
+QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", str(max(64, POOL_SIZE * 16))))
+TIMEOUT_SECONDS = float(os.getenv("PASSWORD_TIMEOUT_SECONDS", "15"))
+# "spawn" keeps children free of the parent's Mongo / web3 sockets and threads
+START_METHOD = os.getenv("PASSWORD_POOL_START", "spawn")
+BCRYPT_MAX_BYTES = 72
+
+
+class PasswordPoolBusy(Exception):
+    """Too many hashing jobs queued (or one timed out); caller should shed load (503)."""
+
+
+# ------------------------------------------------------------
+# Worker functions (module level -> picklable)
+# ------------------------------------------------------------
+def _pw_bytes(password: Any) -> bytes:
+    if isinstance(password, bytes):
+        raw = password
+    else:
+        raw = str(password or "").encode("utf-8")
+    # bcrypt only uses the first 72 bytes (bcrypt>=5 raises instead of truncating)
+    return raw[:BCRYPT_MAX_BYTES]
+
+
+def _hashpw(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except ValueError:
+        # malformed / non-bcrypt hash in the users doc
+        return False
+
+
+# ------------------------------------------------------------
+# Pool
+# ------------------------------------------------------------
+class PasswordHasher:
+    def __init__(self, size: int = POOL_SIZE, queue_limit: int = QUEUE_LIMIT):
+        self.size = max(0, size)
+        self.queue_limit = max(1, queue_limit)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._max_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.size == 0:
+            return None
+        pid = os.getpid()
+        if self._pool is None or self._pid != pid:
+            try:
+                ctx = multiprocessing.get_context(START_METHOD)
+                self._pool = ProcessPoolExecutor(max_workers=self.size, mp_context=ctx)
+                self._pid = pid
+            except Exception as e:
+                print(f"⚠️ password pool unavailable, hashing inline: {e}")
+                self.size = 0
+                return None
+        return self._pool
+
+    def _done(self, _f: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self._rejected += 1
+                raise PasswordPoolBusy("password hashing queue full")
+            self._pending += 1
+            self._max_pending = max(self._max_pending, self._pending)
+            try:
+                ex = self._executor()
+            except Exception:
+                self._pending -= 1
+                raise
+
+        if ex is None:
+            f: Future = Future()
+            try:
+                f.set_result(fn(*args))
+            except Exception as e:
+                f.set_exception(e)
+            self._done(f)
+            return f
+
+        try:
+            f = ex.submit(fn, *args)
+        except BrokenProcessPool:
+            # a child died (OOM kill etc.) -> fresh pool next time, run this one inline
+            with self._lock:
+                self._pool = None
+            f = Future()
+            try:
+                f.set_result(fn(*args))
+            except Exception as e:
+                f.set_exception(e)
+        f.add_done_callback(self._done)
+        return f
+
+    def _timeout(self, f: Future) -> PasswordPoolBusy:
+        # still queued -> drop it; a running bcrypt can't be interrupted and
+        # releases its queue slot when it finishes
+        f.cancel()
+        with self._lock:
+            self._timed_out += 1
+        return PasswordPoolBusy("password hashing timed out")
+
+    def run(self, fn, *args):
+        f = self.submit(fn, *args)
+        try:
+            return f.result(timeout=TIMEOUT_SECONDS)
+        except FuturesTimeoutError:
+            raise self._timeout(f) from None
+
+    async def run_async(self, fn, *args):
+        f = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(f)), TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise self._timeout(f) from None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.size,
+                "rounds": BCRYPT_ROUNDS,
+                "queue_depth": self._pending,
+                "queue_depth_max": self._max_pending,
+                "queue_limit": self.queue_limit,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+
+
+_hasher = PasswordHasher()
+
+
+# ------------------------------------------------------------
+# Public API
+# ------------------------------------------------------------
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor of a "$2b$12$..." hash, or None if not bcrypt."""
+    try:
+        parts = (hashed or "").split("$")
+        return int(parts[2]) if len(parts) > 3 and parts[1].startswith("2") else None
+    except (ValueError, IndexError):
+        return None
+
+
+def needs_rehash(hashed: str) -> bool:
+    return hash_rounds(hashed) != BCRYPT_ROUNDS
+
+
+def hash_password(password: Any) -> str:
+    return _hasher.run(_hashpw, _pw_bytes(password), BCRYPT_ROUNDS)
+
+
+def verify_password(password: Any, hashed: Optional[str]) -> bool:
+    if not hashed:
+        return False
+    return _hasher.run(_checkpw, _pw_bytes(password), hashed.encode("utf-8"))
+
+
+def verify_and_upgrade(password: Any, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Verify; if it matches and the stored cost differs from BCRYPT_ROUNDS,
+    also return a new hash for the caller to persist. -> (ok, new_hash | None)
+    """
+    if not verify_password(password, hashed):
+        return False, None
+    if needs_rehash(hashed or ""):
+        try:
+            return True, hash_password(password)
+        except Exception as e:
+            print(f"⚠️ password rehash skipped: {e}")
+    return True, None
+
+
+async def hash_password_async(password: Any) -> str:
+    return await _hasher.run_async(_hashpw, _pw_bytes(password), BCRYPT_ROUNDS)
+
+
+async def verify_password_async(password: Any, hashed: Optional[str]) -> bool:
+    if not hashed:
+        return False
+    return await _hasher.run_async(_checkpw, _pw_bytes(password), hashed.encode("utf-8"))
+
+
+def stats() -> Dict[str, int]:
+    return _hasher.stats()
+
+
+__all__ = [
+    "BCRYPT_ROUNDS",
+    "PasswordPoolBusy",
+    "PasswordHasher",
+    "hash_password",
+    "verify_password",
+    "verify_and_upgrade",
+    "needs_rehash",
+    "hash_rounds",
+    "hash_password_async",
+    "verify_password_async",
+    "stats",
+]
@@ -0,0 +1,350 @@
+# backend/utils/rpc_governor.py
+"""
+Process-wide admission control for RPC calls to the chain node.
+
+Every JSON-RPC request made through the web3 provider (see
+blockchain_setup.GovernedHTTPProvider) passes through `governor.slot()`:
+
+- a global concurrency limit (RPC_MAX_CONCURRENCY in-flight requests),
+- a token bucket per upstream host (RPC_RATE_PER_SEC, burst RPC_BURST),
+- a bounded wait queue (RPC_MAX_QUEUE) with a deadline.
+
+When the queue is full or the deadline passes, RpcOverloaded is raised and
+the Flask / FastAPI handlers answer 503 + Retry-After instead of piling up.
+
+Sends and what a send depends on (nonce reads, receipt polls; WRITE_METHODS)
+use a separate lane, `governor.write_slot()`: its own concurrency limit
+(RPC_WRITE_CONCURRENCY), still paced by the host's token bucket, but it waits
+instead of shedding. Shedding a receipt poll or a nonce read midway through
+a send leaves a transaction broadcast with nobody tracking it; a burst of
+reads must not do that.
+
+Endpoints that fan out (one eth_call per crop) use `fan_out()`, which runs
+on one shared bounded executor instead of a fresh ThreadPoolExecutor per
+request, and carries the request's deadline into the worker threads.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+MAX_CONCURRENCY = int(os.getenv("RPC_MAX_CONCURRENCY", "24"))
+MAX_QUEUE = int(os.getenv("RPC_MAX_QUEUE", "200"))
+RATE_PER_SEC = float(os.getenv("RPC_RATE_PER_SEC", "40"))
+BURST = int(os.getenv("RPC_BURST", "80"))
+# max wait for a slot when the caller didn't set a deadline
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("RPC_QUEUE_TIMEOUT_SECONDS", "5"))
+RETRY_AFTER_SECONDS = int(os.getenv("RPC_RETRY_AFTER_SECONDS", "2"))
+
+# sends / nonce reads / receipt polls: own lane, never shed
+WRITE_CONCURRENCY = int(os.getenv("RPC_WRITE_CONCURRENCY", "8"))
+WRITE_METHODS = frozenset({
+    "eth_sendRawTransaction",
+    "eth_sendTransaction",
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+    "eth_getTransactionByHash",
+})
+
+FANOUT_WORKERS = int(os.getenv("RPC_FANOUT_WORKERS", str(MAX_CONCURRENCY)))
+FANOUT_MAX_PENDING = int(os.getenv("RPC_FANOUT_MAX_PENDING", "1000"))
+
+# absolute time.monotonic() deadline of the current request (if any)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("rpc_deadline", default=None)
+
+
+class RpcOverloaded(Exception):
+    """RPC admission refused (queue full / deadline passed). Maps to HTTP 503."""
+
+    def __init__(self, reason: str = "rpc_overloaded", retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# ------------------------------------------------------------
+# Token bucket
+# ------------------------------------------------------------
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(0.0, rate)
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, deadline: float) -> bool:
+        """Take one token, sleeping until deadline at most. False if none in time."""
+        if self.rate <= 0:
+            return True  # unlimited
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return True
+                wait_s = (1.0 - self.tokens) / self.rate
+            if now + wait_s > deadline:
+                return False
+            time.sleep(wait_s)
+
+
+# ------------------------------------------------------------
+# Governor
+# ------------------------------------------------------------
+class RpcGovernor:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE,
+                 write_concurrency: int = WRITE_CONCURRENCY):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.write_concurrency = max(1, write_concurrency)
+        self._sem = threading.BoundedSemaphore(self.max_concurrency)
+        self._write_sem = threading.BoundedSemaphore(self.write_concurrency)
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._waiting = 0
+        self._in_flight = 0
+        self._writes_in_flight = 0
+        self.admitted = 0
+        self.writes = 0
+        self.shed = 0
+
+    def bucket(self, upstream: str) -> TokenBucket:
+        with self._lock:
+            b = self._buckets.get(upstream)
+            if b is None:
+                b = self._buckets[upstream] = TokenBucket(RATE_PER_SEC, BURST)
+            return b
+
+    def _shed(self, reason: str) -> RpcOverloaded:
+        with self._lock:
+            self.shed += 1
+        return RpcOverloaded(reason)
+
+    @contextlib.contextmanager
+    def slot(self, upstream: str = "rpc"):
+        deadline = _deadline.get()
+        if deadline is None:
+            deadline = time.monotonic() + QUEUE_TIMEOUT_SECONDS
+
+        with self._lock:
+            if self._waiting >= self.max_queue and self._in_flight >= self.max_concurrency:
+                self.shed += 1
+                raise RpcOverloaded("rpc_queue_full")
+            self._waiting += 1
+        try:
+            got = self._sem.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not got:
+            raise self._shed("rpc_queue_timeout")
+
+        try:
+            if not self.bucket(upstream).take(deadline):
+                raise self._shed("rpc_rate_limited")
+            with self._lock:
+                self._in_flight += 1
+                self.admitted += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+        finally:
+            self._sem.release()
+
+    @contextlib.contextmanager
+    def write_slot(self, upstream: str = "rpc"):
+        """Write lane: ignores the request deadline and the read queue; waits, never raises RpcOverloaded."""
+        self._write_sem.acquire()
+        try:
+            self.bucket(upstream).take(float("inf"))
+            with self._lock:
+                self._writes_in_flight += 1
+                self.writes += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._writes_in_flight -= 1
+        finally:
+            self._write_sem.release()
+
+    def slot_for(self, method: str, upstream: str = "rpc"):
+        """write_slot() for WRITE_METHODS, slot() for everything else."""
+        return self.write_slot(upstream) if method in WRITE_METHODS else self.slot(upstream)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "writes_in_flight": self._writes_in_flight,
+                "writes": self.writes,
+                "fanout_pending": _fanout_pending,
+            }
+
+
+governor = RpcGovernor()
+
+
+@contextlib.contextmanager
+def deadline(seconds: float):
+    """Set the RPC deadline for everything called inside (incl. fan_out workers)."""
+    new = time.monotonic() + max(0.0, seconds)
+    cur = _deadline.get()
+    token = _deadline.set(min(new, cur) if cur is not None else new)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    d = _deadline.get()
+    return None if d is None else max(0.0, d - time.monotonic())
+
+
+# ------------------------------------------------------------
+# Shared fan-out executor
+# ------------------------------------------------------------
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+_fanout_pending = 0
+
+
+def executor() -> ThreadPoolExecutor:
+    """One bounded pool per process (recreated after fork)."""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            _executor = ThreadPoolExecutor(max_workers=max(1, FANOUT_WORKERS), thread_name_prefix="rpc")
+            _executor_pid = pid
+        return _executor
+
+
+def _track(delta: int) -> None:
+    global _fanout_pending
+    with _executor_lock:
+        _fanout_pending += delta
+
+
+def submit(fn: Callable, *args: Any):
+    """Submit to the shared pool carrying the caller's context (deadline)."""
+    with _executor_lock:
+        if _fanout_pending >= FANOUT_MAX_PENDING:
+            raise governor._shed("rpc_fanout_full")
+    ctx = contextvars.copy_context()
+    _track(1)
+    fut = executor().submit(ctx.run, fn, *args)
+    fut.add_done_callback(lambda _f: _track(-1))
+    return fut
+
+
+def fan_out(fn: Callable[[Any], Any], items: Iterable[Any], budget_seconds: float) -> Tuple[Dict[Any, Any], List[Any]]:
+    """
+    Run fn(item) for each item on the shared pool within budget_seconds.
+    Returns (results {item: value}, failed [items]). Items not finished in
+    time are cancelled (if still queued) and count as failed.
+    If nothing succeeded and the governor shed the work, RpcOverloaded is re-raised.
+    """
+    items = list(items)
+    if not items:
+        return {}, []
+
+    results: Dict[Any, Any] = {}
+    failed: List[Any] = []
+    overloaded: Optional[RpcOverloaded] = None
+
+    with deadline(budget_seconds):
+        end = _deadline.get()
+        futs = {}
+        for it in items:
+            try:
+                futs[submit(fn, it)] = it
+            except RpcOverloaded as e:
+                overloaded = e
+                failed.append(it)
+
+        pending = set(futs)
+        while pending:
+            left = end - time.monotonic()
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for f in done:
+                it = futs[f]
+                try:
+                    results[it] = f.result()
+                except RpcOverloaded as e:
+                    overloaded = e
+                    failed.append(it)
+                except Exception:
+                    failed.append(it)
+
+        for f in pending:
+            f.cancel()
+            failed.append(futs[f])
+
+    if overloaded is not None and not results:
+        raise overloaded
+    return results, failed
+
+
+# ------------------------------------------------------------
+# Framework hooks
+# ------------------------------------------------------------
+def _body(e: RpcOverloaded) -> Dict[str, Any]:
+    return {"ok": False, "err": "service_busy", "reason": e.reason, "retry_after": e.retry_after}
+
+
+def init_flask(app) -> None:
+    from flask import jsonify
+
+    @app.errorhandler(RpcOverloaded)
+    def _rpc_overloaded(e: RpcOverloaded):
+        resp = jsonify(_body(e))
+        resp.status_code = 503
+        resp.headers["Retry-After"] = str(e.retry_after)
+        return resp
+
+
+def init_fastapi(app) -> None:
+    from fastapi.responses import JSONResponse
+
+    @app.exception_handler(RpcOverloaded)
+    async def _rpc_overloaded(_request, e: RpcOverloaded):
+        return JSONResponse(status_code=503, content=_body(e), headers={"Retry-After": str(e.retry_after)})
+
+
+__all__ = [
+    "RpcOverloaded",
+    "WRITE_METHODS",
+    "RpcGovernor",
+    "TokenBucket",
+    "governor",
+    "deadline",
+    "remaining",
+    "executor",
+    "submit",
+    "fan_out",
+    "init_flask",
+    "init_fastapi",
+]
@@ -0,0 +1,830 @@
+# backend/utils/status_events.py
+"""
+Per-user status events (tx lifecycle + background job progress) streamed to
+clients over Server-Sent Events instead of long blocking calls / re-polling.
+
+- broker          pub/sub keyed by userId, with a short replay buffer per
+                  user so a reconnect (Last-Event-ID) misses nothing
+- tx_watcher      one poller thread per process watching submitted tx hashes;
+                  publishes "tx" events (submitted -> mined | failed | timeout)
+                  and lets endpoints that still need the receipt wait on it
+                  instead of each running its own wait_for_transaction_receipt
+- jobs            background job registry; publishes throttled "job" events
+                  (queued -> running -> done | failed) with done/total counts
+
+Fan-out across processes: once an app calls broker.use_mongo(get_db),
+publish() inserts into the capped STATUS_EVENTS_COL collection and every
+process that has open streams tails it (one thread per process), so a stream
+sees events from any worker of either app. Without use_mongo the broker is
+in-process only (single worker / dev server).
+
+Job and tx state is also snapshotted into STATUS_JOBS_COL / STATUS_TXS_COL
+(Mongo bus only), so GET .../jobs/<id> and .../tx/<hash> answer on any worker,
+not just the one that created the job or sent the tx. Both are per user.
+
+Streams are served by the async app only (GET /api/v1/status/stream, FastAPI
+status_api): a WSGI stream would hold a worker thread per open client. The
+Flask app redirects /api/status/stream there and offers a JSON short poll
+(GET /api/status/events).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from backend.utils.fast_json import dumps
+from backend.utils.idempotency import mark_submitted
+
+REPLAY_PER_USER = int(os.getenv("STATUS_REPLAY_PER_USER", "100"))
+# in-process replay buffers: users kept (LRU) and how long after their last event
+REPLAY_USERS = int(os.getenv("STATUS_REPLAY_USERS", "1000"))
+REPLAY_TTL_SECONDS = float(os.getenv("STATUS_REPLAY_TTL_SECONDS", "900"))
+SUBSCRIBER_QUEUE = int(os.getenv("STATUS_SUBSCRIBER_QUEUE", "500"))
+HEARTBEAT_SECONDS = float(os.getenv("STATUS_HEARTBEAT_SECONDS", "15"))
+# a stream ends after this long; EventSource reconnects with Last-Event-ID
+STREAM_MAX_SECONDS = float(os.getenv("STATUS_STREAM_MAX_SECONDS", "300"))
+RETRY_MS = int(os.getenv("STATUS_RETRY_MS", "3000"))
+
+TX_POLL_SECONDS = float(os.getenv("TX_POLL_SECONDS", "1.5"))
+TX_WATCH_TIMEOUT_SECONDS = float(os.getenv("TX_WATCH_TIMEOUT_SECONDS", "600"))
+TX_RESULTS_KEEP = int(os.getenv("TX_RESULTS_KEEP", "2000"))
+
+# cross-process bus (broker.use_mongo)
+EVENTS_COL = os.getenv("STATUS_EVENTS_COL", "status_events")
+EVENTS_CAP_BYTES = int(os.getenv("STATUS_EVENTS_CAP_BYTES", str(16 * 1024 * 1024)))
+TAIL_RETRY_SECONDS = 1.0
+
+JOB_WORKERS = int(os.getenv("STATUS_JOB_WORKERS", "4"))
+JOB_PROGRESS_INTERVAL = float(os.getenv("STATUS_JOB_PROGRESS_INTERVAL", "0.5"))
+JOBS_KEEP = int(os.getenv("STATUS_JOBS_KEEP", "1000"))
+# cancel requests for jobs running on another worker (Mongo bus only)
+JOB_CANCELS_COL = os.getenv("STATUS_JOB_CANCELS_COL", "status_job_cancels")
+JOB_CANCEL_POLL_SECONDS = float(os.getenv("STATUS_JOB_CANCEL_POLL_SECONDS", "2"))
+# job / tx snapshots readable from every worker (Mongo bus only)
+JOBS_COL = os.getenv("STATUS_JOBS_COL", "status_jobs")
+TXS_COL = os.getenv("STATUS_TXS_COL", "status_txs")
+SNAPSHOT_TTL_SECONDS = int(os.getenv("STATUS_SNAPSHOT_TTL_SECONDS", str(24 * 3600)))
+
+
+# ------------------------------------------------------------
+# Broker
+# ------------------------------------------------------------
+class Subscription:
+    """One stream's queue. Blocking get() for WSGI, aget() for asyncio."""
+
+    def __init__(self, broker: "EventBroker", user_id: str):
+        self.broker = broker
+        self.user_id = user_id
+        self._q: Deque[Dict[str, Any]] = deque(maxlen=SUBSCRIBER_QUEUE)
+        self._cond = threading.Condition()
+        self._waker: Optional[Callable[[], None]] = None
+        self.closed = False
+
+    def push(self, event: Dict[str, Any]) -> None:
+        with self._cond:
+            self._q.append(event)  # oldest dropped if a client stalls
+            self._cond.notify()
+            if self._waker is not None:
+                self._waker()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        items = list(self._q)
+        self._q.clear()
+        return items
+
+    def get(self, timeout: float) -> List[Dict[str, Any]]:
+        with self._cond:
+            if not self._q and not self.closed:
+                self._cond.wait(timeout)
+            return self._drain()
+
+    async def aget(self, timeout: float) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        with self._cond:
+            if self._q or self.closed:
+                return self._drain()
+            self._waker = lambda: loop.call_soon_threadsafe(ready.set)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._waker = None
+        with self._cond:
+            return self._drain()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+            if self._waker is not None:
+                self._waker()
+
+
+class EventBroker:
+    def __init__(self, replay: int = REPLAY_PER_USER):
+        self.replay = max(0, replay)
+        # local ids are "<boot>.<seq>": a Last-Event-ID from another process/restart is ignored
+        self.boot = uuid.uuid4().hex[:8]
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._subs: Dict[str, Set[Subscription]] = {}
+        # userId -> recent events, least recently published first (pruned in publish)
+        self._recent: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        self.published = 0
+        self.bus_errors = 0
+
+        self._get_db: Optional[Callable[[], Any]] = None
+        self._col_ready = False
+        self._tailer: Optional[threading.Thread] = None
+        self._tailer_pid: Optional[int] = None
+
+    # -------------------------
+    # Mongo bus
+    # -------------------------
+    def use_mongo(self, get_db: Callable[[], Any]) -> None:
+        """Publish through the capped EVENTS_COL collection (get_db is called per use: fork-safe)."""
+        self._get_db = get_db
+
+    def _collection(self):
+        db = self._get_db()
+        if not self._col_ready:
+            from pymongo.errors import CollectionInvalid
+
+            try:
+                db.create_collection(EVENTS_COL, capped=True, size=EVENTS_CAP_BYTES)
+            except CollectionInvalid:
+                pass  # already there
+            self._col_ready = True
+        return db[EVENTS_COL]
+
+    def _publish_mongo(self, user_id: str, event_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        doc = {"user": user_id, "type": event_type, "ts": time.time(), "data": data}
+        try:
+            self._collection().insert_one(doc)
+        except Exception as e:
+            self.bus_errors += 1
+            print(f"⚠️ status event bus insert failed, delivering locally: {e}")
+            return None
+        return self._from_doc(doc)
+
+    @staticmethod
+    def _from_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": str(doc["_id"]), "type": doc["type"], "ts": doc["ts"], "data": doc.get("data") or {}}
+
+    def _ensure_tailer(self) -> None:
+        pid = os.getpid()
+        with self._lock:
+            if self._tailer is not None and self._tailer_pid == pid and self._tailer.is_alive():
+                return
+            self._tailer_pid = pid
+            self._tailer = threading.Thread(target=self._tail, name="status-events-tail", daemon=True)
+            self._tailer.start()
+
+    def _tail(self) -> None:
+        """Delivers bus events to this process's subscribers (tailable await cursor)."""
+        from pymongo import CursorType
+
+        since = time.time() - 1.0
+        # ts has no total order across processes: restarts re-read the last second, deduped here
+        seen: Deque[Any] = deque(maxlen=4096)
+        seen_set: Set[Any] = set()
+        while True:
+            try:
+                cur = self._collection().find({"ts": {"$gte": since}}, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cur.alive:
+                    for doc in cur:
+                        if doc["_id"] in seen_set:
+                            continue
+                        if len(seen) == seen.maxlen:
+                            seen_set.discard(seen[0])
+                        seen.append(doc["_id"])
+                        seen_set.add(doc["_id"])
+                        since = max(since, float(doc.get("ts") or 0) - 1.0)
+                        self._deliver(doc.get("user"), self._from_doc(doc))
+            except Exception as e:
+                print(f"⚠️ status event tail failed: {e}")
+            time.sleep(TAIL_RETRY_SECONDS)  # dead cursor (empty collection) or error
+
+    def _missed_mongo(self, user_id: str, last_event_id: Optional[str]) -> List[Dict[str, Any]]:
+        from bson import ObjectId
+
+        try:
+            last = ObjectId(last_event_id)
+        except Exception:
+            return []
+        # ObjectIds from different processes are only ordered to the second: re-send that
+        # second (events are state snapshots, a duplicate is harmless; a gap is not)
+        q = {"user": user_id, "ts": {"$gte": last.generation_time.timestamp()}, "_id": {"$ne": last}}
+        try:
+            docs = list(self._collection().find(q).sort([("$natural", -1)]).limit(self.replay))
+        except Exception as e:
+            print(f"⚠️ status event replay failed: {e}")
+            return []
+        return [self._from_doc(d) for d in reversed(docs)]
+
+    def _recent_mongo(self, user_id: str) -> List[Dict[str, Any]]:
+        try:
+            docs = list(self._collection().find({"user": user_id}).sort([("$natural", -1)]).limit(self.replay))
+        except Exception as e:
+            print(f"⚠️ status event replay failed: {e}")
+            return []
+        return [self._from_doc(d) for d in reversed(docs)]
+
+    # -------------------------
+    # Pub / sub
+    # -------------------------
+    def publish(self, user_id: Optional[str], event_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not user_id:
+            return None
+        if self._get_db is not None:
+            event = self._publish_mongo(user_id, event_type, data)
+            if event is not None:
+                with self._lock:
+                    self.published += 1
+                return event  # delivered by the tailers (this process included)
+
+        event = {
+            "id": f"{self.boot}.{next(self._seq)}",
+            "type": event_type,
+            "ts": time.time(),
+            "data": data,
+        }
+        with self._lock:
+            self.published += 1
+            if self.replay:
+                buf = self._recent.pop(user_id, None)
+                if buf is None:
+                    buf = deque(maxlen=self.replay)
+                self._recent[user_id] = buf
+                buf.append(event)
+                self._prune_recent(event["ts"])
+        self._deliver(user_id, event)
+        return event
+
+    def _prune_recent(self, now: float) -> None:
+        """Drop replay buffers beyond REPLAY_USERS or idle for REPLAY_TTL_SECONDS (caller holds _lock)."""
+        recent = self._recent
+        while len(recent) > REPLAY_USERS:
+            recent.popitem(last=False)
+        while recent:
+            user_id, buf = next(iter(recent.items()))
+            if buf and now - buf[-1]["ts"] < REPLAY_TTL_SECONDS:
+                break
+            del recent[user_id]
+
+    def _deliver(self, user_id: Optional[str], event: Dict[str, Any]) -> None:
+        with self._lock:
+            subs = list(self._subs.get(user_id, ())) if user_id else []
+        for sub in subs:
+            sub.push(event)
+
+    def subscribe(self, user_id: str, last_event_id: Optional[str] = None) -> Subscription:
+        sub = Subscription(self, user_id)
+        if self._get_db is not None:
+            self._ensure_tailer()
+        with self._lock:
+            self._subs.setdefault(user_id, set()).add(sub)
+        for event in self._missed(user_id, last_event_id):
+            sub.push(event)
+        return sub
+
+    def _missed(self, user_id: str, last_event_id: Optional[str]) -> List[Dict[str, Any]]:
+        if not last_event_id:
+            return []
+        boot, _, seq = last_event_id.partition(".")
+        if not seq:
+            return self._missed_mongo(user_id, last_event_id) if self._get_db is not None else []
+        if boot != self.boot or not seq.isdigit():
+            return []
+        last = int(seq)
+        with self._lock:
+            buf = list(self._recent.get(user_id, ()))
+        return [e for e in buf if int(e["id"].split(".", 1)[1]) > last]
+
+    def recent(self, user_id: str, last_event_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Events after last_event_id (or the replay buffer) without subscribing: short polling."""
+        if last_event_id:
+            return self._missed(user_id, last_event_id)
+        if self._get_db is not None:
+            return self._recent_mongo(user_id)
+        with self._lock:
+            return list(self._recent.get(user_id, ()))
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.user_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "users_streaming": len(self._subs),
+                "streams": sum(len(s) for s in self._subs.values()),
+                "published": self.published,
+                "replay_users": len(self._recent),
+                "bus_errors": self.bus_errors,
+            }
+
+
+broker = EventBroker()
+
+
+def publish(user_id: Optional[str], event_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return broker.publish(user_id, event_type, data)
+
+
+# ------------------------------------------------------------
+# Cross-worker snapshots (jobs / txs), same Mongo as the bus
+# ------------------------------------------------------------
+_snapshot_indexed: Set[str] = set()
+
+
+def _snapshot_col(name: str):
+    db = broker._get_db() if broker._get_db is not None else None
+    if db is None:
+        return None
+    col = db[name]
+    if name not in _snapshot_indexed:
+        try:
+            col.create_index("at", name="ttl_at", expireAfterSeconds=SNAPSHOT_TTL_SECONDS)
+        except Exception as e:
+            print(f"⚠️ status snapshot index error on {name}: {e}")
+        _snapshot_indexed.add(name)
+    return col
+
+
+def _save_snapshot(name: str, key: str, user_id: Optional[str], data: Dict[str, Any]) -> None:
+    try:
+        col = _snapshot_col(name)
+        if col is not None:
+            col.replace_one({"_id": key}, {"user": user_id, "data": data, "at": datetime.utcnow()}, upsert=True)
+    except Exception as e:
+        print(f"⚠️ status snapshot write failed for {name}/{key}: {e}")
+
+
+def _load_snapshot(name: str, key: str, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    try:
+        col = _snapshot_col(name)
+        doc = col.find_one({"_id": key, "user": user_id}, {"data": 1}) if col is not None else None
+    except Exception as e:
+        print(f"⚠️ status snapshot read failed for {name}/{key}: {e}")
+        return None
+    return doc.get("data") if doc else None
+
+
+# ------------------------------------------------------------
+# SSE framing
+# ------------------------------------------------------------
+def format_sse(event: Dict[str, Any]) -> str:
+    body = dumps({"ts": event["ts"], **event["data"]})
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {body}\n\n"
+
+
+async def sse_stream_async(sub: Subscription, is_disconnected: Optional[Callable] = None):
+    """Async generator for Starlette StreamingResponse."""
+    end = time.monotonic() + STREAM_MAX_SECONDS
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            left = end - time.monotonic()
+            if left <= 0 or sub.closed:
+                return
+            if is_disconnected is not None and await is_disconnected():
+                return
+            events = await sub.aget(min(HEARTBEAT_SECONDS, left))
+            if not events:
+                yield ": ping\n\n"
+                continue
+            for event in events:
+                yield format_sse(event)
+    finally:
+        sub.close()
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # nginx: don't buffer the stream
+}
+
+
+# ------------------------------------------------------------
+# Transaction watcher
+# ------------------------------------------------------------
+def _hex(h: Any) -> str:
+    if isinstance(h, (bytes, bytearray)):
+        return "0x" + bytes(h).hex()
+    s = str(h or "")
+    return s if s.startswith("0x") else "0x" + s
+
+
+class _Watch:
+    __slots__ = ("tx_hash", "user_id", "kind", "meta", "on_done", "deadline", "event", "result")
+
+    def __init__(self, tx_hash, user_id, kind, meta, on_done, deadline):
+        self.tx_hash = tx_hash
+        self.user_id = user_id
+        self.kind = kind
+        self.meta = meta
+        self.on_done = on_done
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+
+
+class TxWatcher:
+    """
+    Polls receipts for every watched tx from one thread per process
+    (eth_getTransactionReceipt goes through the governed web3 provider).
+    """
+
+    def __init__(self, poll_seconds: float = TX_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending: Dict[str, _Watch] = {}
+        # tx hash -> (user_id, result)
+        self._results: "OrderedDict[str, Tuple[Optional[str], Dict[str, Any]]]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def _ensure_thread(self) -> None:
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        self._pid = pid
+        self._thread = threading.Thread(target=self._run, name="tx-watcher", daemon=True)
+        self._thread.start()
+
+    def watch(
+        self,
+        tx_hash: Any,
+        user_id: Optional[str],
+        kind: str,
+        meta: Optional[Dict[str, Any]] = None,
+        on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: float = TX_WATCH_TIMEOUT_SECONDS,
+    ) -> str:
+        """Publish "submitted" and track the tx until mined / failed / timeout."""
+        h = _hex(tx_hash)
+        w = _Watch(h, user_id, kind, dict(meta or {}), on_done, time.monotonic() + timeout)
+        with self._lock:
+            self._pending[h] = w
+            self._ensure_thread()
+        submitted = {"txHash": h, "kind": kind, "status": "submitted", **w.meta}
+        _save_snapshot(TXS_COL, h, user_id, submitted)
+        publish(user_id, "tx", submitted)
+        self._wake.set()
+        return h
+
+    def wait(self, tx_hash: Any, timeout: float) -> Optional[Dict[str, Any]]:
+        """Block until the watched tx resolves; None on timeout (tx stays watched)."""
+        h = _hex(tx_hash)
+        with self._lock:
+            done = self._results.get(h)
+            w = self._pending.get(h)
+        if done is not None:
+            return done[1]
+        if w is None:
+            return None
+        w.event.wait(timeout)
+        return w.result
+
+    def status(self, tx_hash: Any, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """State of a tx this user submitted (watched here, else the cross-worker snapshot)."""
+        h = _hex(tx_hash)
+        with self._lock:
+            done = self._results.get(h)
+            w = self._pending.get(h)
+        if done is not None:
+            return done[1] if done[0] == user_id else None
+        if w is not None:
+            if w.user_id != user_id:
+                return None
+            return {"txHash": h, "kind": w.kind, "status": "submitted", **w.meta}
+        return _load_snapshot(TXS_COL, h, user_id)
+
+    def _resolve(self, w: _Watch, result: Dict[str, Any]) -> None:
+        result = {"txHash": w.tx_hash, "kind": w.kind, **w.meta, **result}
+        w.result = result
+        with self._lock:
+            self._pending.pop(w.tx_hash, None)
+            self._results[w.tx_hash] = (w.user_id, result)
+            while len(self._results) > TX_RESULTS_KEEP:
+                self._results.popitem(last=False)
+        w.event.set()
+        _save_snapshot(TXS_COL, w.tx_hash, w.user_id, result)
+        publish(w.user_id, "tx", result)
+        if w.on_done is not None:
+            try:
+                w.on_done(result)
+            except Exception as e:
+                print(f"⚠️ tx on_done failed for {w.tx_hash}: {e}")
+
+    def _check(self, w: _Watch) -> None:
+        from blockchain_setup import web3
+        from backend.utils.rpc_governor import RpcOverloaded
+
+        try:
+            receipt = web3.eth.get_transaction_receipt(w.tx_hash)
+        except RpcOverloaded:
+            return  # try again next tick
+        except Exception as e:
+            # TransactionNotFound -> still pending
+            if type(e).__name__ != "TransactionNotFound":
+                print(f"⚠️ receipt poll failed for {w.tx_hash}: {e}")
+            receipt = None
+
+        if receipt is not None:
+            self._resolve(w, {
+                "status": "mined" if receipt.get("status") == 1 else "failed",
+                "blockNumber": receipt.get("blockNumber"),
+                "gasUsed": receipt.get("gasUsed"),
+            })
+        elif time.monotonic() >= w.deadline:
+            self._resolve(w, {"status": "timeout"})
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            with self._lock:
+                watches = list(self._pending.values())
+            for w in watches:
+                try:
+                    self._check(w)
+                except Exception as e:
+                    print(f"⚠️ tx watcher error: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"pending": len(self._pending), "resolved_cached": len(self._results)}
+
+
+tx_watcher = TxWatcher()
+
+
+def watch_tx(tx_hash: Any, user_id: Optional[str], kind: str, meta: Optional[Dict[str, Any]] = None,
+             on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> str:
+    h = tx_watcher.watch(tx_hash, user_id, kind, meta, on_done)
+    # a retry with the same Idempotency-Key must not send this tx again
+    mark_submitted(h)
+    return h
+
+
+# ------------------------------------------------------------
+# Background jobs
+# ------------------------------------------------------------
+class Job:
+    def __init__(self, registry: "JobRegistry", user_id: str, kind: str, total: int, meta: Dict[str, Any]):
+        self._registry = registry
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.kind = kind
+        self.total = max(0, int(total or 0))
+        self.done = 0
+        self.state = "queued"
+        self.meta = meta
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._cancel_hooks: List[Callable[[], None]] = []
+        self._cancel_polled = 0.0
+
+    def to_dict(self, with_result: bool = True) -> Dict[str, Any]:
+        d = {
+            "jobId": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "done": self.done,
+            "total": self.total,
+            **self.meta,
+        }
+        if self.error:
+            d["error"] = self.error
+        if with_result and self.state in ("done", "cancelled") and self.result is not None:
+            d["result"] = self.result
+        return d
+
+    def _emit(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_emit < JOB_PROGRESS_INTERVAL:
+                return
+            self._last_emit = now
+            # events stay small; the result is fetched via GET .../jobs/<id>
+            payload = self.to_dict(with_result=False)
+            snapshot = self.to_dict() if self.finished else payload
+        _save_snapshot(JOBS_COL, self.id, self.user_id, snapshot)
+        publish(self.user_id, "job", payload)
+
+    def start(self) -> None:
+        self.state = "running"
+        self._emit(force=True)
+
+    def advance(self, n: int = 1, total: Optional[int] = None) -> None:
+        with self._lock:
+            if total is not None:
+                self.total = max(0, int(total))
+            self.done += n
+            finished = self.total and self.done >= self.total
+        self._emit(force=bool(finished))
+
+    def finish(self, result: Any = None) -> None:
+        self.result = result
+        self.state = "done"
+        if self.total and self.done < self.total:
+            self.done = self.total
+        self._emit(force=True)
+
+    def fail(self, error: str) -> None:
+        self.error = str(error)[:500]
+        self.state = "failed"
+        self._emit(force=True)
+
+    # -------------------------
+    # Cancellation (cooperative: the job's code decides where it stops)
+    # -------------------------
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def on_cancel(self, fn: Callable[[], None]) -> None:
+        """fn runs on cancel() in this process (immediately if already cancelled)."""
+        with self._lock:
+            if not self._cancel.is_set():
+                self._cancel_hooks.append(fn)
+                return
+        fn()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancel.is_set():
+                return
+            self._cancel.set()
+            hooks, self._cancel_hooks = self._cancel_hooks, []
+        for fn in hooks:
+            try:
+                fn()
+            except Exception as e:
+                print(f"⚠️ job cancel hook failed for {self.id}: {e}")
+
+    def cancel_requested(self) -> bool:
+        """Cancelled here, or (polled every JOB_CANCEL_POLL_SECONDS) through another worker."""
+        if self._cancel.is_set():
+            return True
+        now = time.monotonic()
+        if now - self._cancel_polled >= JOB_CANCEL_POLL_SECONDS:
+            self._cancel_polled = now
+            if self._registry.remote_cancel_requested(self):
+                self.cancel()
+                return True
+        return False
+
+    def cancelled(self, result: Any = None) -> None:
+        self.result = result
+        self.state = "cancelled"
+        self._emit(force=True)
+
+
+class JobRegistry:
+    def __init__(self, workers: int = JOB_WORKERS, keep: int = JOBS_KEEP):
+        self.workers = max(1, workers)
+        self.keep = max(1, keep)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        if self._pool is None or self._pid != pid:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            self._pid = pid
+        return self._pool
+
+    def create(self, user_id: str, kind: str, total: int = 0, meta: Optional[Dict[str, Any]] = None) -> Job:
+        job = Job(self, user_id, kind, total, dict(meta or {}))
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                self._jobs.popitem(last=False)
+        job._emit(force=True)
+        return job
+
+    def run(self, user_id: str, kind: str, fn: Callable[[Job], Any], total: int = 0,
+            meta: Optional[Dict[str, Any]] = None) -> Job:
+        """Run fn(job) on the shared job pool; fn's return value becomes job.result."""
+        job = self.create(user_id, kind, total, meta)
+
+        def _runner():
+            job.start()
+            try:
+                job.finish(fn(job))
+            except Exception as e:
+                job.fail(str(e))
+
+        with self._lock:
+            ex = self._executor()
+        ex.submit(_runner)
+        return job
+
+    def get(self, job_id: str, user_id: Optional[str] = None) -> Optional[Job]:
+        """The Job object, only in the process running it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or (user_id is not None and job.user_id != user_id):
+            return None
+        return job
+
+    def snapshot(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """to_dict() of this user's job from any worker (the local Job, else its last snapshot)."""
+        job = self.get(job_id, user_id)
+        if job is not None:
+            return job.to_dict()
+        return _load_snapshot(JOBS_COL, job_id, user_id)
+
+    def cancel(self, job_id: str, user_id: str) -> Optional[Job]:
+        """
+        Cancel a job of this user. Returns the local Job, or None when it runs on
+        another worker: the request is then left in JOB_CANCELS_COL for it to pick
+        up (raises LookupError when there is no Mongo bus to leave it in).
+        """
+        job = self.get(job_id, user_id)
+        if job is not None:
+            if not job.finished:
+                job.cancel()
+            return job
+        get_db = broker._get_db
+        if get_db is None or _load_snapshot(JOBS_COL, job_id, user_id) is None:
+            raise LookupError("job_not_found")
+        col = get_db()[JOB_CANCELS_COL]
+        try:
+            col.create_index("at", name="ttl_at", expireAfterSeconds=24 * 3600)
+        except Exception:
+            pass
+        col.update_one({"_id": job_id}, {"$set": {"user": user_id, "at": datetime.utcnow()}}, upsert=True)
+        return None
+
+    def remote_cancel_requested(self, job: Job) -> bool:
+        get_db = broker._get_db
+        if get_db is None:
+            return False
+        try:
+            return get_db()[JOB_CANCELS_COL].find_one({"_id": job.id, "user": job.user_id}, {"_id": 1}) is not None
+        except Exception as e:
+            print(f"⚠️ job cancel poll failed for {job.id}: {e}")
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            states = [j.state for j in self._jobs.values()]
+        return {
+            "jobs_running": states.count("running"),
+            "jobs_queued": states.count("queued"),
+            "jobs_cancelled": states.count("cancelled"),
+            "jobs_kept": len(states),
+        }
+
+
+jobs = JobRegistry()
+
+
+def stats() -> Dict[str, int]:
+    return {**broker.stats(), **tx_watcher.stats(), **jobs.stats()}
+
+
+__all__ = [
+    "EventBroker",
+    "Subscription",
+    "broker",
+    "publish",
+    "format_sse",
+    "sse_stream_async",
+    "SSE_HEADERS",
+    "TxWatcher",
+    "tx_watcher",
+    "watch_tx",
+    "Job",
+    "JobRegistry",
+    "jobs",
+    "stats",
+]
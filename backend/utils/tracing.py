@@ -0,0 +1,666 @@
+# backend/utils/tracing.py
+"""
+In-process request tracing: one span tree per request, written locally.
+
+Names follow OpenTelemetry's tracing API (get_tracer / start_span /
+start_as_current_span / set_attribute / set_status / record_exception /
+update_name / get_span_context) and propagation uses the W3C `traceparent`
+header, so call sites stay the same if we move to the OTel SDK later.
+
+Auto-instrumented:
+- pymongo commands          (CommandListener: "mongo find crops", ...)
+- web3 provider requests    (blockchain_setup.GovernedHTTPProvider)
+- requests.Session calls    (TracedSession, used by auth_api_client;
+                             injects traceparent)
+- Jinja render_template     (Flask template signals)
+- the request itself        (init_flask / TracingASGIMiddleware)
+
+Sampling is decided once per request (root span):
+- TRACE_SAMPLE_RATE   head sampling probability (an incoming sampled
+                      traceparent is always honoured)
+- TRACE_SLOW_MS       unsampled requests are still recorded and exported
+                      when slower than this (0 = off, nothing recorded)
+
+Exporters (TRACE_EXPORTER): "file" -> JSON line per trace in TRACE_FILE,
+"console" -> indented tree on stdout, "none".
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import os
+import random
+import re
+import threading
+import time
+import traceback
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+EXPORTER = os.getenv("TRACE_EXPORTER", "file")  # "file" | "console" | "none"
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/traces.jsonl")
+MAX_SPANS_PER_TRACE = int(os.getenv("TRACE_MAX_SPANS", "2000"))
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class StatusCode:
+    UNSET = "UNSET"
+    OK = "OK"
+    ERROR = "ERROR"
+
+
+class SpanKind:
+    INTERNAL = "internal"
+    SERVER = "server"
+    CLIENT = "client"
+
+
+class SpanContext:
+    __slots__ = ("trace_id", "span_id", "trace_flags")
+
+    def __init__(self, trace_id: int, span_id: int, trace_flags: int):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.trace_flags = trace_flags
+
+    @property
+    def is_valid(self) -> bool:
+        return bool(self.trace_id and self.span_id)
+
+
+def _hex_trace(i: int) -> str:
+    return f"{i:032x}"
+
+
+def _hex_span(i: int) -> str:
+    return f"{i:016x}"
+
+
+# ------------------------------------------------------------
+# Spans
+# ------------------------------------------------------------
+class _Trace:
+    """All spans of one request; exported when the root span ends."""
+
+    __slots__ = ("trace_id", "sampled", "spans", "lock", "dropped")
+
+    def __init__(self, trace_id: int, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+
+class Span:
+    """Recording span (subset of opentelemetry.trace.Span)."""
+
+    def __init__(self, trace: _Trace, name: str, parent_id: int, kind: str, attributes: Optional[Dict[str, Any]]):
+        self._trace = trace
+        self.name = name
+        self.span_id = random.getrandbits(64) or 1
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status = StatusCode.UNSET
+        self.status_description: Optional[str] = None
+        self.start_time = time.time()
+        self._t0 = time.perf_counter()
+        self.duration: Optional[float] = None
+        with trace.lock:
+            if len(trace.spans) < MAX_SPANS_PER_TRACE:
+                trace.spans.append(self)
+            else:
+                trace.dropped += 1
+
+    def get_span_context(self) -> SpanContext:
+        return SpanContext(self._trace.trace_id, self.span_id, 1 if self._trace.sampled else 0)
+
+    def is_recording(self) -> bool:
+        return self.duration is None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.events.append({"name": name, "time": time.time(), "attributes": dict(attributes or {})})
+
+    def record_exception(self, exc: BaseException, attributes: Optional[Dict[str, Any]] = None) -> None:
+        attrs = {
+            "exception.type": type(exc).__name__,
+            "exception.message": str(exc)[:500],
+            "exception.stacktrace": "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))[-2000:],
+        }
+        attrs.update(attributes or {})
+        self.add_event("exception", attrs)
+
+    def set_status(self, status: str, description: Optional[str] = None) -> None:
+        self.status = status
+        self.status_description = description
+
+    def update_name(self, name: str) -> None:
+        self.name = name
+
+    def end(self) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._t0
+        if self.parent_id == 0:
+            _finish_trace(self._trace, self)
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.record_exception(exc)
+            self.set_status(StatusCode.ERROR, str(exc)[:200])
+        self.end()
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {
+            "span_id": _hex_span(self.span_id),
+            "parent_id": _hex_span(self.parent_id) if self.parent_id else None,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start_time,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+        if self.status_description:
+            d["status_description"] = self.status_description
+        if self.events:
+            d["events"] = self.events
+        return d
+
+
+class _NonRecordingSpan:
+    """Returned when the request isn't traced; every call is a no-op."""
+
+    name = ""
+
+    def get_span_context(self) -> SpanContext:
+        return SpanContext(0, 0, 0)
+
+    def is_recording(self) -> bool:
+        return False
+
+    def set_attribute(self, key, value) -> None:
+        pass
+
+    def set_attributes(self, attributes) -> None:
+        pass
+
+    def add_event(self, name, attributes=None) -> None:
+        pass
+
+    def record_exception(self, exc, attributes=None) -> None:
+        pass
+
+    def set_status(self, status, description=None) -> None:
+        pass
+
+    def update_name(self, name) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+INVALID_SPAN = _NonRecordingSpan()
+
+_current: contextvars.ContextVar[Any] = contextvars.ContextVar("trace_current_span", default=INVALID_SPAN)
+
+
+# ------------------------------------------------------------
+# Tracer
+# ------------------------------------------------------------
+def _head_sampled() -> bool:
+    return SAMPLE_RATE > 0 and (SAMPLE_RATE >= 1 or random.random() < SAMPLE_RATE)
+
+
+class Tracer:
+    def __init__(self, name: str = ""):
+        self.instrumentation_name = name
+
+    def start_span(
+        self,
+        name: str,
+        kind: str = SpanKind.INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        traceparent: Optional[str] = None,
+    ):
+        """
+        Child of the current span, or a new root (sampling decided here).
+        `traceparent` (W3C header) continues a trace started upstream.
+        """
+        if not ENABLED:
+            return INVALID_SPAN
+        parent = _current.get()
+        if isinstance(parent, Span):
+            attrs = dict(attributes or {})
+            if self.instrumentation_name:
+                attrs.setdefault("otel.library.name", self.instrumentation_name)
+            return Span(parent._trace, name, parent.span_id, kind, attrs)
+
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+            sampled = sampled or _head_sampled()
+        else:
+            trace_id, parent_id, sampled = random.getrandbits(128) or 1, 0, _head_sampled()
+        if not sampled and SLOW_MS <= 0:
+            return INVALID_SPAN
+        span = Span(_Trace(trace_id, sampled), name, 0, kind, attributes)
+        if parent_id:
+            span.set_attribute("parent.remote_span_id", _hex_span(parent_id))
+        return span
+
+    @contextlib.contextmanager
+    def start_as_current_span(
+        self,
+        name: str,
+        kind: str = SpanKind.INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        record_exception: bool = True,
+        end_on_exit: bool = True,
+    ) -> Iterator[Any]:
+        span = self.start_span(name, kind=kind, attributes=attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if record_exception:
+                span.record_exception(e)
+            span.set_status(StatusCode.ERROR, str(e)[:200])
+            raise
+        finally:
+            _current.reset(token)
+            if end_on_exit:
+                span.end()
+
+
+_tracers: Dict[str, Any] = {}
+
+
+def get_tracer(name: str = "trusource") -> Tracer:
+    """Tracer for an instrumentation scope (name ends up as otel.library.name)."""
+    t = _tracers.get(name)
+    if t is None:
+        t = _tracers.setdefault(name, Tracer(name))
+    return t
+
+
+def get_current_span() -> Any:
+    return _current.get()
+
+
+def use_span(span: Any) -> contextvars.Token:
+    """Make `span` current until detach(token) (for hook pairs like before/after_request)."""
+    return _current.set(span)
+
+
+def detach(token: contextvars.Token) -> None:
+    try:
+        _current.reset(token)
+    except ValueError:
+        pass  # reset from another context
+
+
+def child_span(tracer: Tracer, name: str, kind: str = SpanKind.CLIENT, attributes: Optional[Dict[str, Any]] = None):
+    """Span under the current one, or INVALID_SPAN outside a traced request (no orphan roots)."""
+    cur = get_current_span()
+    if not cur.is_recording():
+        return INVALID_SPAN
+    return tracer.start_span(name, kind=kind, attributes=attributes)
+
+
+@contextlib.contextmanager
+def traced(tracer: Tracer, name: str, kind: str = SpanKind.CLIENT, attributes: Optional[Dict[str, Any]] = None):
+    """Child span made current for the block; no-op outside a traced request."""
+    span = child_span(tracer, name, kind, attributes)
+    if span is INVALID_SPAN:
+        yield span
+        return
+    token = use_span(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        span.set_status(StatusCode.ERROR, str(e)[:200])
+        raise
+    finally:
+        detach(token)
+        span.end()
+
+
+# ------------------------------------------------------------
+# W3C trace context
+# ------------------------------------------------------------
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[int, int, bool]]:
+    m = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not m:
+        return None
+    trace_id, span_id = int(m.group(1), 16), int(m.group(2), 16)
+    if not trace_id or not span_id:
+        return None
+    return trace_id, span_id, bool(int(m.group(3), 16) & 1)
+
+
+def inject(headers: Dict[str, str]) -> Dict[str, str]:
+    """Add `traceparent` for the current span (outgoing HTTP calls)."""
+    ctx = get_current_span().get_span_context()
+    if ctx.is_valid:
+        headers["traceparent"] = f"00-{_hex_trace(ctx.trace_id)}-{_hex_span(ctx.span_id)}-{ctx.trace_flags:02x}"
+    return headers
+
+
+# ------------------------------------------------------------
+# Export
+# ------------------------------------------------------------
+_export_lock = threading.Lock()
+
+
+def _finish_trace(trace: _Trace, root: Span) -> None:
+    if not trace.sampled and (root.duration or 0.0) * 1000 < SLOW_MS:
+        return
+    with trace.lock:
+        spans = [s for s in trace.spans if s.duration is not None]
+        dropped = trace.dropped + len(trace.spans) - len(spans)
+    record = {
+        "trace_id": _hex_trace(trace.trace_id),
+        "root": root.name,
+        "sampled": "head" if trace.sampled else "slow",
+        "duration_ms": round((root.duration or 0.0) * 1000, 3),
+        "pid": os.getpid(),
+        "spans": [s.to_dict() for s in spans],
+    }
+    if dropped:
+        record["dropped_spans"] = dropped
+    try:
+        export(record)
+    except Exception as e:
+        print(f"⚠️ trace export failed: {e}")
+
+
+def _console_tree(record: Dict[str, Any]) -> str:
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in record["spans"]:
+        children.setdefault(s["parent_id"], []).append(s)
+    lines = [f"trace {record['trace_id']} {record['root']} {record['duration_ms']}ms ({record['sampled']})"]
+
+    def walk(parent: Optional[str], depth: int) -> None:
+        for s in sorted(children.get(parent, []), key=lambda x: x["start"]):
+            mark = " !" if s["status"] == StatusCode.ERROR else ""
+            lines.append(f"{'  ' * depth}- {s['name']} {s['duration_ms']}ms{mark}")
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 1)
+    return "\n".join(lines)
+
+
+def export(record: Dict[str, Any]) -> None:
+    if EXPORTER == "console":
+        print(_console_tree(record), flush=True)
+    elif EXPORTER == "file":
+        line = json.dumps(record, default=str, separators=(",", ":")) + "\n"
+        with _export_lock:
+            d = os.path.dirname(TRACE_FILE)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+# ------------------------------------------------------------
+# Instrumentation: pymongo
+# ------------------------------------------------------------
+_mongo_installed = False
+
+
+def install_mongo_listener() -> None:
+    """Global CommandListener; must run before MongoClients are created."""
+    global _mongo_installed
+    if _mongo_installed or not ENABLED:
+        return
+    try:
+        from pymongo import monitoring
+    except ImportError:
+        return
+
+    tracer = get_tracer("pymongo")
+
+    class _MongoTracer(monitoring.CommandListener):
+        def __init__(self):
+            self._spans: Dict[Tuple[Any, int], Any] = {}
+            self._lock = threading.Lock()
+
+        def started(self, event):
+            coll = event.command.get(event.command_name)
+            attrs = {"db.system": "mongodb", "db.name": event.database_name, "db.operation": event.command_name}
+            if isinstance(coll, str):
+                attrs["db.mongodb.collection"] = coll
+            name = f"mongo {event.command_name}" + (f" {coll}" if isinstance(coll, str) else "")
+            span = child_span(tracer, name, SpanKind.CLIENT, attrs)
+            if span is not INVALID_SPAN:
+                with self._lock:
+                    self._spans[(event.connection_id, event.request_id)] = span
+
+        def _pop(self, event):
+            with self._lock:
+                return self._spans.pop((event.connection_id, event.request_id), None)
+
+        def succeeded(self, event):
+            span = self._pop(event)
+            if span is not None:
+                span.end()
+
+        def failed(self, event):
+            span = self._pop(event)
+            if span is not None:
+                span.set_status(StatusCode.ERROR, str(event.failure)[:200])
+                span.end()
+
+    monitoring.register(_MongoTracer())
+    _mongo_installed = True
+
+
+# ------------------------------------------------------------
+# Instrumentation: requests.Session
+# ------------------------------------------------------------
+try:
+    import requests as _requests
+except ImportError:
+    _requests = None
+
+
+if _requests is not None:
+
+    class TracedSession(_requests.Session):
+        """requests.Session with a client span per call and traceparent injection."""
+
+        _tracer = get_tracer("requests")
+
+        def request(self, method, url, *args, **kwargs):
+            attrs = {"http.method": str(method).upper(), "http.url": str(url).split("?", 1)[0]}
+            with traced(self._tracer, f"HTTP {str(method).upper()}", SpanKind.CLIENT, attrs) as span:
+                if span.is_recording():
+                    kwargs["headers"] = inject(dict(kwargs.get("headers") or {}))
+                resp = super().request(method, url, *args, **kwargs)
+                span.set_attribute("http.status_code", resp.status_code)
+                if resp.status_code >= 500:
+                    span.set_status(StatusCode.ERROR, f"HTTP {resp.status_code}")
+                return resp
+
+else:
+    TracedSession = None
+
+
+# ------------------------------------------------------------
+# Flask (request root span + render_template)
+# ------------------------------------------------------------
+def init_flask(app) -> None:
+    if not ENABLED:
+        return
+    from flask import g, request, template_rendered, before_render_template
+
+    tracer = get_tracer("flask")
+
+    @app.before_request
+    def _trace_begin():
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        span = tracer.start_span(
+            f"{request.method} {route}",
+            kind=SpanKind.SERVER,
+            attributes={"http.method": request.method, "http.route": route, "http.target": request.path},
+            traceparent=request.headers.get("traceparent"),
+        )
+        g._trace_state = (span, use_span(span), [])
+
+    def _close(status: int, exc: Optional[BaseException] = None) -> None:
+        state = g.pop("_trace_state", None)
+        if state is None:
+            return
+        span, token, render_stack = state
+        for rspan, rtoken in reversed(render_stack):
+            # render raised before template_rendered fired
+            detach(rtoken)
+            rspan.set_status(StatusCode.ERROR, "render aborted")
+            rspan.end()
+        detach(token)
+        span.set_attribute("http.status_code", status)
+        if exc is not None:
+            span.record_exception(exc)
+        if status >= 500:
+            span.set_status(StatusCode.ERROR, f"HTTP {status}")
+        span.end()
+
+    @app.after_request
+    def _trace_end(response):
+        _close(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _trace_teardown(exc):
+        _close(500, exc)
+
+    def _render_start(sender, template, context, **extra):
+        state = g.get("_trace_state")
+        if state is None:
+            return
+        span = child_span(tracer, f"render {template.name}", SpanKind.INTERNAL, {"template": template.name or "-"})
+        state[2].append((span, use_span(span)))
+
+    def _render_done(sender, template, context, **extra):
+        state = g.get("_trace_state")
+        if state is None or not state[2]:
+            return
+        span, token = state[2].pop()
+        detach(token)
+        span.end()
+
+    before_render_template.connect(_render_start, app)
+    template_rendered.connect(_render_done, app)
+
+
+# ------------------------------------------------------------
+# FastAPI / ASGI
+# ------------------------------------------------------------
+class TracingASGIMiddleware:
+    """Root span per HTTP request; named by route template once routing ran."""
+
+    def __init__(self, app):
+        self.app = app
+        self.tracer = get_tracer("fastapi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for k, v in scope.get("headers") or ():
+            if k == b"traceparent":
+                traceparent = v.decode("latin-1")
+                break
+        method = scope.get("method", "")
+        span = self.tracer.start_span(
+            f"{method} {scope.get('path', '')}",
+            kind=SpanKind.SERVER,
+            attributes={"http.method": method, "http.target": scope.get("path", "")},
+            traceparent=traceparent,
+        )
+        if not span.is_recording():
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = {"status": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        token = use_span(span)
+        try:
+            await self.app(scope, receive, _send)
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            detach(token)
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                span.update_name(f"{method} {route.path}")
+                span.set_attribute("http.route", route.path)
+            status = status_holder["status"]
+            span.set_attribute("http.status_code", status)
+            if status >= 500:
+                span.set_status(StatusCode.ERROR, f"HTTP {status}")
+            span.end()
+
+
+def init_fastapi(app) -> None:
+    if not ENABLED:
+        return
+    app.add_middleware(TracingASGIMiddleware)
+
+
+__all__ = [
+    "StatusCode",
+    "SpanKind",
+    "SpanContext",
+    "Span",
+    "Tracer",
+    "INVALID_SPAN",
+    "get_tracer",
+    "get_current_span",
+    "use_span",
+    "detach",
+    "child_span",
+    "traced",
+    "parse_traceparent",
+    "inject",
+    "export",
+    "install_mongo_listener",
+    "TracedSession",
+    "init_flask",
+    "init_fastapi",
+    "TracingASGIMiddleware",
+]
@@ -0,0 +1,84 @@
+# bench_tag_codec.py — JSON tag payload vs binary tag codec (bytes per tag, decode time)
+#
+#   python bench_tag_codec.py            # 20k synthetic bag payloads
+#   BENCH_TAGS=100000 python bench_tag_codec.py
+#
+# Env: BENCH_TAGS (20000), RFID_TAG_SECRET (signs like production when set, else a bench key),
+#      RFID_TAG_USER_MEMORY_BYTES (64)
+
+import json
+import os
+import random
+import statistics
+import time
+
+from backend.services.rfid.tag_codec import TAG_USER_MEMORY_BYTES, CodeBook, decode, encode, verify
+from backend.services.rfid.tag_payload import TagSigner, bag_tags, dumps_tag
+
+N = int(os.getenv("BENCH_TAGS", "20000"))
+SECRET = os.getenv("RFID_TAG_SECRET") or "bench-secret"
+CROPS = ["Rice", "Wheat", "Maize", "Turmeric", "Black Gram"]
+
+
+def _harvests(rnd: random.Random, n: int):
+    for i in range(n):
+        yield {
+            "cropId": f"CROP-{rnd.randrange(10**6):06d}",
+            "cropType": rnd.choice(CROPS),
+            "harvestDate": f"2025-{rnd.randrange(1, 13):02d}-{rnd.randrange(1, 29):02d}",
+            "harvesterName": rnd.choice(["Ravi Kumar", "Anita", "S. Perera", ""]),
+            "farmerId": f"FARMER{rnd.randrange(1000):04d}",
+            "manufacturerId": rnd.choice(["MFG-0001", "MFG-0002", "665f1c2ab4e2a1d3c9f00a17"]),
+            "harvestQuantity": rnd.randrange(50, 5000),
+        }
+
+
+def main() -> None:
+    rnd = random.Random(7)
+    signer = TagSigner(SECRET)
+    book = CodeBook()
+
+    payloads = []
+    for doc in _harvests(rnd, max(1, N // 50)):
+        bags = [{"epc": "E2%022X" % rnd.getrandbits(88), "bagQty": rnd.randrange(1, 60)} for _ in range(50)]
+        payloads.extend(bag_tags(doc, bags, signer=signer))
+    payloads = payloads[:N]
+
+    texts = [dumps_tag(p).encode() for p in payloads]
+    blobs = [encode(p, book) for p in payloads]
+    blobs_no_name = [encode({k: v for k, v in p.items() if k != "hnm"}, book) for p in payloads]
+
+    for p, b in zip(payloads[:2000], blobs):
+        assert decode(b, book) == p, "round trip mismatch"
+        assert verify(b, signer, book)
+
+    def timed(fn, items):
+        t = time.perf_counter()
+        for x in items:
+            fn(x)
+        return (time.perf_counter() - t) / len(items) * 1e6
+
+    json_us = timed(json.loads, texts)
+    bin_us = timed(lambda b: decode(b, book), blobs)
+    verify_json_us = timed(lambda t: signer.verify(json.loads(t)), texts)
+    verify_bin_us = timed(lambda b: verify(b, signer, book), blobs)
+
+    def sizes(items):
+        lens = [len(x) for x in items]
+        return statistics.mean(lens), max(lens), sum(1 for n in lens if n <= TAG_USER_MEMORY_BYTES) / len(lens)
+
+    print(f"{len(payloads)} bag payloads, budget {TAG_USER_MEMORY_BYTES} bytes")
+    print(f"{'':22} {'mean B':>8} {'max B':>7} {'fit %':>7} {'decode us':>10} {'verify us':>10}")
+    for name, items, dec, ver in (
+        ("json", texts, json_us, verify_json_us),
+        ("binary v1", blobs, bin_us, verify_bin_us),
+        ("binary v1 (no hnm)", blobs_no_name, None, None),
+    ):
+        mean, mx, fit = sizes(items)
+        dec_s = f"{dec:10.2f}" if dec is not None else f"{'-':>10}"
+        ver_s = f"{ver:10.2f}" if ver is not None else f"{'-':>10}"
+        print(f"{name:22} {mean:8.1f} {mx:7d} {fit * 100:6.1f}% {dec_s} {ver_s}")
+
+
+if __name__ == "__main__":
+    main()
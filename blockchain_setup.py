@@ -46,9 +46,38 @@ def suggest_fees(multiplier: float = 1.25, min_prio_gwei: int = 25):
     return prio, max_fee
 
 # ---------- Web3 Setup ----------
-web3 = Web3(Web3.HTTPProvider(AMOY_RPC, request_kwargs={"timeout": 30}))
+RPC_TIMEOUT = 30
+
+from urllib.parse import urlparse
+from backend.utils.rpc_governor import governor as _rpc_governor
+from backend.utils.metrics import timed as _rpc_timed
+from backend.utils.tracing import get_tracer as _get_tracer, traced as _traced
+
+_rpc_tracer = _get_tracer("web3")
+
+_RPC_UPSTREAM = urlparse(AMOY_RPC).hostname or "rpc"
+
+class GovernedHTTPProvider(Web3.HTTPProvider):
+    """HTTPProvider whose requests go through the process-wide RPC governor
+    (concurrency limit + token bucket per upstream; raises RpcOverloaded).
+    Sends, nonce reads and receipt polls take the non-shedding write lane."""
+
+    def make_request(self, method, params):
+        attrs = {"rpc.system": "jsonrpc", "rpc.method": str(method), "net.peer.name": _RPC_UPSTREAM}
+        with _traced(_rpc_tracer, f"rpc {method}", attributes=attrs):
+            with _rpc_governor.slot_for(str(method), _RPC_UPSTREAM), _rpc_timed("rpc", str(method)):
+                return super().make_request(method, params)
+
+def _make_provider():
+    return GovernedHTTPProvider(AMOY_RPC, request_kwargs={"timeout": RPC_TIMEOUT})
+
+web3 = Web3(_make_provider())
 web3.middleware_onion.inject(_POA, layer=0)
 
+def reset_connections():
+    """Swap in a fresh HTTP provider (own connection pool). Call once per worker after fork."""
+    web3.provider = _make_provider()
+
 account = web3.eth.account.from_key(_normalize_pk(RAW_PRIVATE_KEY))
 
 # ---------- Traceability Contract ----------
@@ -101,4 +130,5 @@ __all__ = [
     "recall_contract", "RECALL_ADDR",
     "suggest_fees",
     "file_recall_onchain",
+    "reset_connections",
 ]
@@ -0,0 +1,132 @@
+# check_tag_writer.py — tag-writer bridge against fake ESP32 devices (no hardware)
+#
+#   python check_tag_writer.py          # exits 1 on the first failed check
+#
+# Covers: endpoint discovery + caching, 409 tag waits, back-to-back batches with
+# job progress, cancelling a batch mid-wait, and evicting idle devices (worker
+# thread stopped, session closed, nothing in flight dropped).
+
+import os
+import threading
+import time
+
+os.environ.setdefault("ESP32_TAG_POLL_SECONDS", "0.05")
+
+from backend.services.rfid.esp32_simulator import FakeTagWriter
+from backend.services.rfid.tag_writer_bridge import TagWriteError, TagWriterBridge
+
+
+class _Job:
+    """The parts of status_events.Job a WriteBatch uses."""
+
+    def __init__(self):
+        self.state, self.done, self.result = "queued", 0, None
+        self._hooks, self._cancel = [], False
+
+    def on_cancel(self, fn):
+        self._hooks.append(fn)
+
+    def cancel(self):
+        self._cancel = True
+        for fn in self._hooks:
+            fn()
+
+    def cancel_requested(self):
+        return self._cancel
+
+    def start(self):
+        self.state = "running"
+
+    def advance(self, n=1):
+        self.done += n
+
+    def finish(self, result=None):
+        self.state, self.result = "done", result
+
+    def cancelled(self, result=None):
+        self.state, self.result = "cancelled", result
+
+
+def check(name, cond):
+    print(("ok   " if cond else "FAIL ") + name)
+    if not cond:
+        raise SystemExit(1)
+
+
+def _writer_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("tag-writer ")]
+
+
+def main() -> None:
+    bridge = TagWriterBridge(max_devices=2)
+
+    # discovery on a non-default path, then cached
+    dev = FakeTagWriter(write_path="/write").start()
+    res = bridge.write(dev.base, "P1")
+    check("discovers /write", res["ok"] and res["endpoint"] == "/write")
+    before = dev.requests
+    bridge.write(dev.base, "P2")
+    check("cached endpoint: one request per write", dev.requests - before == 1)
+
+    # 409 no-tag is waited out within tag_wait
+    slow = FakeTagWriter(no_tag=3).start()
+    res = bridge.write(slow.base, "P3", tag_wait=5)
+    check("waits out no_tag_present", res["ok"] and slow.writes == ["P3"])
+    try:
+        nowait = FakeTagWriter(no_tag=1).start()
+        bridge.write(nowait.base, "P4", tag_wait=0)
+        check("no tag_wait -> 409", False)
+    except TagWriteError as e:
+        check("no tag_wait -> 409", e.code == "no_tag_present" and e.status == 409)
+
+    # batch: returns at once, progress via job, written in order
+    batcher = FakeTagWriter(no_tag=1, rearm=True, latency=0.01).start()
+    job = _Job()
+    seen = []
+    batch = bridge.start_batch(batcher.base, [f"B{i}" for i in range(5)], tag_wait=5, job=job,
+                               on_write=lambda i, r: seen.append(i))
+    check("start_batch does not block", job.state == "running")
+    out = batch.wait(10)
+    check("batch written in order", batcher.writes == [f"B{i}" for i in range(5)] and out["written"] == 5)
+    check("batch job finished", job.state == "done" and job.done == 5 and seen == list(range(5)))
+
+    # cancel: queued writes dropped, the one waiting for a tag stops at its next poll
+    stuck = FakeTagWriter(no_tag=10**6).start()
+    job = _Job()
+    batch = bridge.start_batch(stuck.base, [f"C{i}" for i in range(20)], tag_wait=60, job=job)
+    time.sleep(0.3)
+    started = time.monotonic()
+    job.cancel()
+    out = batch.wait(5)
+    check("cancel stops a waiting batch quickly", batch.done.is_set() and time.monotonic() - started < 2)
+    check("cancelled job state", job.state == "cancelled" and out["written"] == 0 and out["cancelled"])
+
+    # eviction: max_devices=2 -> devices are dropped only when idle, and their threads exit
+    for d in (dev, slow, nowait, batcher, stuck):
+        d.stop()
+    time.sleep(0.2)
+    check("cancelled device drained", all(d.pending == 0 for d in bridge._devices.values()))
+    fresh = [FakeTagWriter().start() for _ in range(3)]
+    for d in fresh:
+        bridge.write(d.base, "E")
+    time.sleep(0.3)
+    check("at most max_devices devices kept", len(bridge._devices) <= 2)
+    check("evicted worker threads exited", len(_writer_threads()) <= len(bridge._devices))
+
+    # a device with a write in flight is never evicted
+    busy = FakeTagWriter(latency=1.0).start()
+    small = TagWriterBridge(max_devices=1)
+    fut = small.submit(busy.base, "X")
+    time.sleep(0.2)
+    other = FakeTagWriter().start()
+    small.write(other.base, "Y")
+    check("in-flight write completes", fut.result(5)["ok"] and busy.writes == ["X"])
+    check("busy device kept while in flight", busy.base in small._devices)
+
+    for d in fresh + [busy, other]:
+        d.stop()
+    print("all tag writer checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# loadtest_serving.py — compare worker models under concurrent load
+#
+#   python loadtest_serving.py                 # all configs
+#   python loadtest_serving.py flask-gthread fastapi-uvicorn
+#
+# Starts each config, hammers one GET path with N concurrent clients (stdlib
+# only) and prints req/s, p50, p99 and errors. The *-before configs are how
+# the apps were launched before serve.py (python app.py = Werkzeug dev server
+# with debug; one uvicorn process); the rest go through gunicorn + serve.py.
+# The default paths (landing page, /_health) need no Mongo / RPC.
+#
+# Recorded (1 vCPU, client on the same CPU, 64 clients, 3000 requests, two runs):
+#   flask-before     399-454 req/s  p50 141-157 ms  p99 194-230 ms
+#   flask-gthread    400-475 req/s  p50 124-153 ms  p99 303-312 ms
+#   fastapi-before   506-569 req/s  p50 105-120 ms  p99 196-226 ms
+#   fastapi-uvicorn  498-585 req/s  p50 101-125 ms  p99 291-370 ms
+# i.e. no throughput change for a CPU-light path on one core; the gain from
+# more workers needs more cores and paths that wait on Mongo / RPC.
+#
+# Env: LT_CONCURRENCY (64), LT_REQUESTS (3000), LT_FLASK_PATH (/), LT_FASTAPI_PATH (/_health)
+
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+CONCURRENCY = int(os.getenv("LT_CONCURRENCY", "64"))
+TOTAL = int(os.getenv("LT_REQUESTS", "3000"))
+FLASK_PATH = os.getenv("LT_FLASK_PATH", "/")
+FASTAPI_PATH = os.getenv("LT_FASTAPI_PATH", "/_health")
+
+CONFIGS = {
+    "flask-before":    {"TRUSOURCE_APP": "flask", "CMD": "app.py", "FLASK_DEBUG": "1", "BIND": "127.0.0.1:5000"},
+    "fastapi-before":  {"TRUSOURCE_APP": "fastapi", "CMD": "-m uvicorn server:app --port 5904",
+                        "BIND": "127.0.0.1:5904"},
+    "flask-sync":      {"TRUSOURCE_APP": "flask", "WORKER_CLASS": "sync", "BIND": "127.0.0.1:5901"},
+    "flask-gthread":   {"TRUSOURCE_APP": "flask", "WORKER_CLASS": "gthread", "BIND": "127.0.0.1:5902"},
+    "fastapi-uvicorn": {"TRUSOURCE_APP": "fastapi", "BIND": "127.0.0.1:5903"},
+}
+
+
+def _wait_up(url: str, timeout: float = 60.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return True
+        except Exception:
+            time.sleep(0.5)
+    return False
+
+
+def _hit(url: str):
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as r:
+            r.read()
+            ok = r.status < 500
+    except Exception:
+        ok = False
+    return time.perf_counter() - t0, ok
+
+
+def _pct(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, int(round(p / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+
+def run(name: str, env_over: dict):
+    env = dict(os.environ, ACCESS_LOG="/dev/null", **env_over)
+    path = FASTAPI_PATH if env_over["TRUSOURCE_APP"] == "fastapi" else FLASK_PATH
+    url = f"http://{env_over['BIND']}{path}"
+
+    args = env_over["CMD"].split() if "CMD" in env_over else ["serve.py", env_over["TRUSOURCE_APP"]]
+    # own process group: the Werkzeug reloader and gunicorn workers go down with it
+    proc = subprocess.Popen([sys.executable, *args], env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not _wait_up(url):
+            print(f"{name:16s}  server did not come up")
+            return
+        for _ in range(50):  # warm keep-alive paths / lazy pools
+            _hit(url)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as ex:
+            results = list(ex.map(lambda _: _hit(url), range(TOTAL)))
+        wall = time.perf_counter() - t0
+
+        lat = sorted(r[0] for r in results)
+        errors = sum(1 for r in results if not r[1])
+        print(f"{name:16s}  {TOTAL / wall:8.1f} req/s   p50 {_pct(lat, 50) * 1000:7.1f} ms   "
+              f"p99 {_pct(lat, 99) * 1000:7.1f} ms   errors {errors}")
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(CONFIGS)
+    print(f"concurrency={CONCURRENCY} requests={TOTAL} cpus={os.cpu_count()}")
+    for n in names:
+        if n not in CONFIGS:
+            print(f"unknown config {n}; choose from {', '.join(CONFIGS)}")
+            continue
+        run(n, CONFIGS[n])
@@ -3,29 +3,24 @@ import os
 import qrcode
 from PIL import Image, ImageDraw, ImageFont
 
+from backend.mongo_safe import get_db
+from backend.services.qr.qr_service import qr_images, remember
+
 # 👤 Individual Crop QR code generator
 def product(crop_id):
+    """
+    Returns the URL of the crop's QR image (/qr/img/<key>.png).
+    Rendered in memory and cached by content; no file is written here.
+    """
     traceability_url = f"http://192.168.1.33:5000/consumer/scan?crop_id={crop_id}"
 
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(traceability_url)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    qr_dir = os.path.join("static", "qrcodes")
-    os.makedirs(qr_dir, exist_ok=True)
+    img = qr_images.render(traceability_url, box_size=10, border=4, ecc="L")
 
-    qr_filename = f"{crop_id}_qr.png"
-    qr_file_path = os.path.join(qr_dir, qr_filename)
-    img.save(qr_file_path)
+    db = get_db()
+    if db is not None:
+        remember(db, img, {"cropId": crop_id, "kind": "product"})
 
-    return f"static/qrcodes/{qr_filename}"
+    return img.url
 
 
 import os
@@ -1,16 +1,22 @@
-import qrcode
 import json
 
+from backend.services.qr.qr_service import qr_images
+
+
 def generate_qr_code( harvest_data, output_path):
     """
     Generate a QR code that combines both crop and harvest data.
 
-    :param crop_data: Dictionary containing crop data
     :param harvest_data: Dictionary containing harvest data
     :param output_path: Path to save the QR code image
-    :return: None (QR code is saved to the provided output path)
+    :return: output_path
+
+    Rendering goes through the content-addressed QR cache, so the same
+    harvest payload is rendered once; only the copy to output_path remains.
+    Prefer qr_images.render(...).url where a URL is enough (no file at all).
     """
     qr_data = { **harvest_data}  # Combine crop and harvest data
-    qr_img = qrcode.make(json.dumps(qr_data))  # Generate the QR code image
-    qr_img.save(output_path)  # Save the image at the specified path
+    img = qr_images.render(json.dumps(qr_data))
+    with open(output_path, "wb") as f:
+        f.write(img.data)
     return output_path
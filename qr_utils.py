@@ -1,14 +1,28 @@
 import cv2
 import json
+import threading
 from datetime import datetime
 
+# QRCodeDetector is not thread-safe: one per thread, built once
+_local = threading.local()
+
+
+def _detector():
+    det = getattr(_local, "detector", None)
+    if det is None:
+        det = _local.detector = cv2.QRCodeDetector()
+    return det
+
+
 def decode_qr_code_image(image_path):
     """
     Decode the QR code from the uploaded image and return the data in JSON format.
+    For many images use backend.services.qr.qr_decode.decode_many (process pool).
     """
-    img = cv2.imread(image_path)
-    detector = cv2.QRCodeDetector()
-    data, points, _ = detector.detectAndDecode(img)
+    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    data, points, _ = _detector().detectAndDecode(img)
     if not data:
         return None
     return json.loads(data)  # Return the decoded JSON data
@@ -0,0 +1,110 @@
+# serve.py — production launcher + gunicorn config for both apps
+#
+#   python serve.py flask            # Flask web app  (wsgi:app, gthread workers)
+#   python serve.py fastapi          # FastAPI mobile API (asgi:app, uvicorn workers)
+#
+#   or with the gunicorn CLI (same settings):
+#   TRUSOURCE_APP=fastapi gunicorn -c serve.py
+#
+# Env overrides:
+#   BIND, WEB_CONCURRENCY (workers), GTHREADS (threads per Flask worker),
+#   WORKER_CLASS (e.g. "sync" / "gthread" / "uvicorn_worker.UvicornWorker"),
+#   CHAIN_RECEIPT_TIMEOUT, PRELOAD_APP=0
+
+import multiprocessing
+import os
+import sys
+
+APP_KIND = (os.getenv("TRUSOURCE_APP", "flask") or "flask").strip().lower()
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in ("flask", "fastapi"):
+    APP_KIND = sys.argv[1]
+
+_CPU = multiprocessing.cpu_count()
+
+# Chain writes block on wait_for_transaction_receipt(timeout=180). A worker
+# must not be killed (timeout) or cut off on reload (graceful_timeout) while
+# one is in flight, or the tx is sent but never recorded in Mongo.
+CHAIN_RECEIPT_TIMEOUT = int(os.getenv("CHAIN_RECEIPT_TIMEOUT", "180"))
+
+if APP_KIND == "fastapi":
+    wsgi_app = "asgi:app"
+    bind = os.getenv("BIND", "0.0.0.0:8000")
+    # one event loop per core; sync endpoints run in the loop's threadpool.
+    # At least 2, so a max_requests recycle never takes the whole API down.
+    # uvicorn-worker (requirements.txt); uvicorn.workers is its deprecated in-tree copy
+    worker_class = os.getenv("WORKER_CLASS", "uvicorn_worker.UvicornWorker")
+    workers = int(os.getenv("WEB_CONCURRENCY", str(max(2, _CPU))))
+    threads = 1
+else:
+    wsgi_app = "wsgi:app"
+    bind = os.getenv("BIND", "0.0.0.0:5000")
+    # requests mostly wait on Mongo / RPC -> threads per worker, few processes
+    worker_class = os.getenv("WORKER_CLASS", "gthread")
+    workers = int(os.getenv("WEB_CONCURRENCY", str(max(2, _CPU))))
+    threads = int(os.getenv("GTHREADS", "8"))
+
+# per-process pools sized from the worker count (e.g. bcrypt in backend/utils/passwords.py)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Import the app (ABIs, contracts, blueprints, compiled templates) once in the master
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+
+timeout = CHAIN_RECEIPT_TIMEOUT + 30
+graceful_timeout = CHAIN_RECEIPT_TIMEOUT + 30
+keepalive = 5
+
+# recycle workers now and then (slow leaks in web3 / pymongo caches)
+max_requests = int(os.getenv("MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "200"))
+
+accesslog = os.getenv("ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+proc_name = f"trusource-{APP_KIND}"
+
+
+def post_fork(server, worker):
+    # Mongo clients / web3 HTTP pools created in the master must not be shared
+    from backend.serving import after_fork
+    after_fork()
+
+
+def when_ready(server):
+    server.log.info(
+        "trusource %s ready: %s x %s worker(s), %s thread(s), preload=%s, timeout=%ss",
+        APP_KIND, workers, worker_class, threads, preload_app, timeout,
+    )
+
+
+# ------------------------------------------------------------
+# python serve.py flask|fastapi
+# ------------------------------------------------------------
+def _settings():
+    keys = (
+        "bind", "worker_class", "workers", "threads", "preload_app", "timeout",
+        "graceful_timeout", "keepalive", "max_requests", "max_requests_jitter",
+        "accesslog", "errorlog", "loglevel", "proc_name", "post_fork", "when_ready",
+    )
+    g = globals()
+    return {k: g[k] for k in keys}
+
+
+def main():
+    from gunicorn.app.base import BaseApplication
+
+    class _App(BaseApplication):
+        def load_config(self):
+            for k, v in _settings().items():
+                if k in self.cfg.settings and v is not None:
+                    self.cfg.set(k, v)
+
+        def load(self):
+            module, _, attr = wsgi_app.partition(":")
+            mod = __import__(module)
+            return getattr(mod, attr)
+
+    _App().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 # --- imports (dedupe) ---
-import os, time, jwt, bcrypt
+import os, time, jwt
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Literal, Dict, Any
 
@@ -10,13 +10,28 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field, field_validator
 from pymongo import MongoClient
 
+from backend.utils.fast_json import FastJSONResponse, install_fastapi_encoders
+from backend.utils.passwords import PasswordPoolBusy, hash_password, verify_and_upgrade
+from backend.utils.rpc_governor import init_fastapi as init_rpc_governor
+from backend.utils.metrics import install_mongo_listener, init_fastapi as init_metrics
+from backend.utils import tracing
+from backend.utils.status_events import broker as status_broker
+
 # --- config ---
 MONGO_URI        = os.environ.get("MONGO_URI", "mongodb://localhost:27017/crop_traceability_db")
 JWT_SECRET_KEY   = os.environ.get("JWT_SECRET_KEY", "change-me-super-secret")
 ACCESS_EXPIRES_H = int(os.environ.get("JWT_ACCESS_TOKEN_EXPIRES_H", "6"))
 REFRESH_EXPIRES_D= int(os.environ.get("JWT_REFRESH_TOKEN_EXPIRES_D", "14"))
 
-app = FastAPI(title="Traceability Mobile API", version="1.1.0")
+app = FastAPI(
+    title="Traceability Mobile API",
+    version="1.1.0",
+    default_response_class=FastJSONResponse,  # orjson for every router
+)
+install_fastapi_encoders()
+init_rpc_governor(app)  # RpcOverloaded -> 503 + Retry-After
+init_metrics(app)  # request timing by route template + GET /metrics
+tracing.init_fastapi(app)  # sampled span tree per request
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -25,9 +40,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-mongo = MongoClient(MONGO_URI)
+install_mongo_listener()  # before the first MongoClient (routers create theirs on import)
+tracing.install_mongo_listener()
+mongo = MongoClient(MONGO_URI, connect=False)  # connect lazily (per worker after fork)
 db = mongo.get_database()
 users = db["users"]
+status_broker.use_mongo(lambda: db)  # status events from every worker of both apps
 
 # --- pydantic models (unchanged except EmailStr removed) ---
 class RegisterRequest(BaseModel):
@@ -95,41 +113,8 @@ def _jwt_issue(identity: Dict[str, Any]) -> Dict[str, str]:
     )
     return {"access_token": access, "refresh_token": refresh}
 
-# --- one HTTPBearer scheme for this router (docs will show a lock) ---
-bearer = HTTPBearer(scheme_name="AccessToken", bearerFormat="JWT", auto_error=False)
-
-# <<< REPLACE your old auth_identity(...) with this >>>
-def auth_identity(credentials: HTTPAuthorizationCredentials = Security(bearer)) -> Dict[str, Any]:
-    if not credentials or (credentials.scheme or "").lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-
-    payload = _jwt_decode(credentials.credentials.strip())
-    if payload.get("type") != "access":
-        raise HTTPException(status_code=401, detail="Not an access token")
-
-    # prefer new tokens: identity in 'user'; fallback to legacy 'sub'
-    identity = payload.get("user")
-    if not identity and isinstance(payload.get("sub"), dict):
-        identity = payload["sub"]
-    if not identity and isinstance(payload.get("sub"), str):
-        identity = {"userId": payload["sub"]}
-
-    if not identity:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-    return identity
-
-# keep your existing imports, but REMOVE the "_jwt_decode" import from distributor_api
-# from backend.fastapi.distributor_api import _jwt_decode, router as distributor_router
-
-
-def _jwt_decode(token: str) -> Dict[str, Any]:
-    try:
-        # allow legacy tokens even if sub was a dict; modern ones have string sub + full identity in "user"
-        return jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"], options={"verify_sub": False})
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# --- shared JWT auth (one HTTPBearer scheme, verified-token cache) ---
+from backend.utils.jwt_auth import bearer, auth_identity
 
 
 # --- auth routes (unchanged) ---
@@ -140,7 +125,10 @@ def api_register(req: RegisterRequest):
     if users.find_one({"email": email}):
         raise HTTPException(status_code=400, detail="User already exists")
     user_id = f"{role[:3].upper()}{os.urandom(3).hex().upper()}{int(time.time())}"
-    hashed = bcrypt.hashpw(req.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    try:
+        hashed = hash_password(req.password)  # off-thread bcrypt pool
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "2"})
     user_doc = {
         "userId": user_id, "name": req.name.strip(), "email": email, "password": hashed, "role": role,
         "phone": req.phone, "location": req.location,
@@ -162,8 +150,15 @@ def api_login(req: LoginRequest):
     u = users.find_one(q)
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
-    if not bcrypt.checkpw(req.password.encode("utf-8"), u.get("password","").encode("utf-8")):
+    try:
+        ok, new_hash = verify_and_upgrade(req.password, u.get("password", ""))
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "2"})
+    if not ok:
         raise HTTPException(status_code=400, detail="Invalid password")
+    if new_hash:
+        # BCRYPT_ROUNDS changed -> store the re-hashed password
+        users.update_one({"_id": u["_id"]}, {"$set": {"password": new_hash}})
     tokens = _jwt_issue(_user_public_payload(u))
     return {"ok": True, "user": _user_public_payload(u), **tokens}
 
@@ -197,6 +192,8 @@ from backend.fastapi.distributor_api import router as distributor_router
 from backend.fastapi.transporter_api import router as transporter_router
 from backend.fastapi.retailer_api import router as retailer_router
 from backend.fastapi.traceability_api import router as traceability_router 
+from backend.fastapi.status_api import router as status_router
+from backend.fastapi.rfid_scan_api import router as rfid_scan_router
 
 app.include_router(farmer_router)
 app.include_router(manufacturer_router)
@@ -204,6 +201,8 @@ app.include_router(distributor_router)
 app.include_router(transporter_router)
 app.include_router(retailer_router)
 app.include_router(traceability_router)  
+app.include_router(status_router)
+app.include_router(rfid_scan_router)
 
 # --- diagnostics ---
 @app.get("/_health")
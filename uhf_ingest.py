@@ -0,0 +1,106 @@
+# uhf_ingest.py — stream reads from a fixed UHFReader18 reader into POST /rfid/reads
+#
+#   python uhf_ingest.py --port /dev/ttyUSB0 --reader dock-1 --crop CROP-001
+#   python uhf_ingest.py --port /dev/ttyUSB0 --record dock1.frames      # also capture frames
+#   python uhf_ingest.py --simulate --tags 5000 --rate 5000 --sink null --rounds 2000
+#   python uhf_ingest.py --simulate --frames dock1.frames --rate 800
+#
+# Needs pyserial-asyncio for a real port and aiohttp for --sink http.
+# Env: RFID_API_BASE (http://127.0.0.1:5000), RFID_API_TOKEN (Bearer access token),
+#      RFID_API_REFRESH_TOKEN (from /login; renews the access token, which expires after 6h),
+#      UHF_PORT, UHF_BAUD, UHF_DEDUPE_SECONDS, UHF_BATCH_MAX, UHF_BATCH_SECONDS
+
+import argparse
+import asyncio
+import json
+import signal
+import sys
+
+from backend.services.rfid.uhf_reader import (
+    BATCH_MAX,
+    BATCH_SECONDS,
+    DEDUPE_SECONDS,
+    RFID_API_BASE,
+    RFID_API_REFRESH_TOKEN,
+    RFID_API_TOKEN,
+    UHF_BAUD,
+    UHF_PORT,
+    HttpReadSink,
+    SinkAuthError,
+    UHFReader,
+    run_ingest,
+)
+from backend.services.rfid.uhf_simulator import open_simulator
+
+
+class NullSink:
+    """Counts batches instead of posting them (pipeline throughput only)."""
+
+    def __init__(self):
+        self.reads = 0
+
+    async def __call__(self, reads):
+        self.reads += len(reads)
+        return {"ok": True, "accepted": len(reads)}
+
+
+async def main(args) -> None:
+    if args.simulate:
+        reader = open_simulator(args.frames, tags=args.tags, per_round=args.per_round,
+                                rate=args.rate, noise=args.noise, seed=args.seed)
+    else:
+        reader = await UHFReader.open_serial(args.port, args.baud, record_to=args.record)
+
+    if args.sink == "null":
+        sink = NullSink()
+    else:
+        sink = HttpReadSink(args.api, args.token, reader_name=args.reader, crop_id=args.crop,
+                            refresh_token=args.refresh_token)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows
+
+    try:
+        stats = await run_ingest(reader, sink, stop, dedupe_seconds=args.dedupe,
+                                 batch_max=args.batch_max, batch_seconds=args.batch_seconds,
+                                 max_rounds=args.rounds)
+    except SinkAuthError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        await reader.close()
+        if hasattr(sink, "close"):
+            await sink.close()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="UHFReader18 -> /rfid/reads")
+    p.add_argument("--port", default=UHF_PORT)
+    p.add_argument("--baud", type=int, default=UHF_BAUD)
+    p.add_argument("--record", help="append raw response frames (hex) to this file")
+    p.add_argument("--reader", default="uhf-1", help="reader name stored with each read")
+    p.add_argument("--crop", default="", help="cropId stored with each read")
+    p.add_argument("--api", default=RFID_API_BASE)
+    p.add_argument("--token", default=RFID_API_TOKEN, help="Bearer access token")
+    p.add_argument("--refresh-token", default=RFID_API_REFRESH_TOKEN,
+                   help="refresh token; without it ingest stops when the access token expires")
+    p.add_argument("--sink", choices=("http", "null"), default="http")
+    p.add_argument("--dedupe", type=float, default=DEDUPE_SECONDS)
+    p.add_argument("--batch-max", type=int, default=BATCH_MAX)
+    p.add_argument("--batch-seconds", type=float, default=BATCH_SECONDS)
+    p.add_argument("--rounds", type=int, default=None, help="stop after N inventory rounds")
+    sim = p.add_argument_group("simulator")
+    sim.add_argument("--simulate", action="store_true")
+    sim.add_argument("--frames", help="replay a --record capture instead of synthetic tags")
+    sim.add_argument("--tags", type=int, default=1000, help="synthetic tag population")
+    sim.add_argument("--per-round", type=int, default=30, help="synthetic tags answering per round")
+    sim.add_argument("--rate", type=float, default=0.0, help="tag reads/s delivered (0 = unthrottled)")
+    sim.add_argument("--noise", type=float, default=0.0, help="probability of a corrupted frame")
+    sim.add_argument("--seed", type=int, default=None)
+    asyncio.run(main(p.parse_args()))
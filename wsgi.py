@@ -0,0 +1,11 @@
+# wsgi.py — production WSGI entry point for the Flask web app
+#   gunicorn -c serve.py            (TRUSOURCE_APP=flask, default)
+#   python serve.py flask
+
+from app import create_app
+from backend.serving import warm_templates
+
+app = create_app()
+
+# compile templates once in the master (preload_app) -> inherited by workers
+print(f"✓ {warm_templates(app)} templates precompiled")